@@ -1,8 +1,22 @@
 """
 Market data API clients for the NestEgg application.
+
+The exported names are resolved on first access so that importing one client
+module does not import every client (and pandas/yfinance/aiohttp with them).
 """
+import importlib
+
+_EXPORTS = {
+    "MarketDataSource": "backend.api_clients.data_source_interface",
+    "MarketDataManager": "backend.api_clients.market_data_manager",
+    "YahooFinanceClient": "backend.api_clients.yahoo_finance_client",
+    "PolygonClient": "backend.api_clients.polygon_client",
+}
+
+__all__ = list(_EXPORTS)
+
 
-from backend.api_clients.data_source_interface import MarketDataSource
-from backend.api_clients.market_data_manager import MarketDataManager
-from backend.api_clients.yahoo_finance_client import YahooFinanceClient
-from backend.api_clients.polygon_client import PolygonClient
\ No newline at end of file
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
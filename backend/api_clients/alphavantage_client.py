@@ -2,6 +2,7 @@
 import os
 import csv
 import io
+import time
 import asyncio
 import logging
 from datetime import datetime, timezone, date
@@ -9,10 +10,12 @@ from typing import Dict, List, Tuple, Optional
 
 import httpx
 
+from backend.utils.metrics import observe_provider_call
+
 logger = logging.getLogger("alphavantage_client")
 
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
-ALPHA_VANTAGE_BASE = "https://www.alphavantage.co/query"
+ALPHA_VANTAGE_BASE = os.getenv("ALPHA_VANTAGE_BASE_URL", "https://www.alphavantage.co/query")
 ALPHAVANTAGE_DEBUG = os.getenv("ALPHAVANTAGE_DEBUG", "").lower() in ("1", "true", "yes")
 
 
@@ -111,8 +114,16 @@ class AlphaVantageClient:
 
     async def _get(self, params: Dict[str, str]) -> httpx.Response:
         await self.rate.throttle()
-        r = await self._client.get(ALPHA_VANTAGE_BASE, params={**params, "apikey": self.api_key})
-        r.raise_for_status()
+        # Timed after the throttle so rate-limit waits don't count as provider latency
+        operation = str(params.get("function", "request")).lower()
+        started = time.perf_counter()
+        try:
+            r = await self._client.get(ALPHA_VANTAGE_BASE, params={**params, "apikey": self.api_key})
+            r.raise_for_status()
+        except Exception:
+            observe_provider_call("alphavantage", operation, time.perf_counter() - started, success=False)
+            raise
+        observe_provider_call("alphavantage", operation, time.perf_counter() - started)
         return r
 
     # ---------- Symbol selection (quotes path) --------------------------------
@@ -16,6 +16,10 @@ from backend.api_clients.data_source_interface import MarketDataSource
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("direct_yahoo_client")
 
+# Overridable so the benchmark suite can point the client at a local stub
+YAHOO_QUERY1_URL = os.getenv("YAHOO_QUERY1_URL", "https://query1.finance.yahoo.com")
+YAHOO_QUERY2_URL = os.getenv("YAHOO_QUERY2_URL", "https://query2.finance.yahoo.com")
+
 class DirectYahooFinanceClient(MarketDataSource):
     """
     Client for interacting with Yahoo Finance API directly.
@@ -39,6 +43,11 @@ class DirectYahooFinanceClient(MarketDataSource):
             "company_metrics": 24 * 60 * 60,  # 24 hours
             "historical_prices": 6 * 60 * 60,  # 6 hours
         }
+
+    async def _http_get(self, url: str, timeout: int) -> requests.Response:
+        """requests is blocking; run it on the default executor so concurrent fetches overlap"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: self.session.get(url, timeout=timeout))
     
 
 
@@ -93,10 +102,10 @@ class DirectYahooFinanceClient(MarketDataSource):
                 logger.info(f"Fetching data for {ticker} from direct Yahoo API (attempt {attempt+1}/{retries})")
                 
                 # URL for Yahoo Finance API
-                url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}?interval=1d"
+                url = f"{YAHOO_QUERY1_URL}/v8/finance/chart/{ticker}?interval=1d"
                 
                 # Make the request
-                response = self.session.get(url, timeout=10)
+                response = await self._http_get(url, timeout=10)
                 
                 # Check if successful
                 if response.status_code != 200:
@@ -225,10 +234,10 @@ class DirectYahooFinanceClient(MarketDataSource):
                 logger.info(f"Fetching company info for {ticker} from direct Yahoo API (attempt {attempt+1}/{retries})")
                 
                 # Try a different endpoint that might be more reliable
-                url = f"https://query2.finance.yahoo.com/v10/finance/quoteSummary/{ticker}?modules=summaryProfile,summaryDetail,defaultKeyStatistics,assetProfile,price"
+                url = f"{YAHOO_QUERY2_URL}/v10/finance/quoteSummary/{ticker}?modules=summaryProfile,summaryDetail,defaultKeyStatistics,assetProfile,price"
                 
                 # Make the request
-                response = self.session.get(url, timeout=15)  # Increased timeout
+                response = await self._http_get(url, timeout=15)  # Increased timeout
                 
                 # Check if successful
                 if response.status_code != 200:
@@ -367,10 +376,10 @@ class DirectYahooFinanceClient(MarketDataSource):
                 end_timestamp = int(end_date.timestamp())
                 
                 # URL for Yahoo Finance historical data
-                url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}?period1={start_timestamp}&period2={end_timestamp}&interval=1d"
+                url = f"{YAHOO_QUERY1_URL}/v8/finance/chart/{ticker}?period1={start_timestamp}&period2={end_timestamp}&interval=1d"
                 
                 # Make the request
-                response = self.session.get(url, timeout=10)
+                response = await self._http_get(url, timeout=10)
                 
                 # Check if successful
                 if response.status_code != 200:
@@ -2,6 +2,7 @@
 Market Data Manager to coordinate between different data sources.
 """
 import os
+import time
 import logging
 import random
 from typing import List, Dict, Any, Optional, Tuple
@@ -13,6 +14,7 @@ from backend.api_clients.yahoo_finance_client import YahooFinanceClient
 from backend.api_clients.yahooquery_client import YahooQueryClient
 from backend.api_clients.direct_yahoo_client import DirectYahooFinanceClient
 from backend.api_clients.polygon_client import PolygonClient
+from backend.utils.metrics import observe_provider_call
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -156,14 +158,20 @@ class MarketDataManager:
                 stats["calls"] = 0
                 stats["last_reset"] = now
     
-    def _log_api_usage(self, source: str, success: bool = True):
+    def _log_api_usage(self, source: str, success: bool = True, operation: Optional[str] = None,
+                       started: Optional[float] = None):
         """
         Log usage of a data source and update success rate
         
         Args:
             source: Name of the data source
             success: Whether the API call was successful
+            operation: Data type requested, for the provider call metrics
+            started: time.perf_counter() taken before the call
         """
+        if operation and started is not None:
+            observe_provider_call(source, operation, time.perf_counter() - started, success)
+        
         if source not in self.usage_stats:
             return
             
@@ -264,12 +272,13 @@ class MarketDataManager:
             if not source:
                 continue
                 
+            started = time.perf_counter()
             try:
                 price_data = await source.get_current_price(ticker)
                 
                 # Log API usage and reliability
                 success = price_data is not None
-                self._log_api_usage(source_name, success)
+                self._log_api_usage(source_name, success, "current_price", started)
                 self._record_ticker_source_result(ticker, source_name, success)
                 
                 if price_data:
@@ -277,7 +286,7 @@ class MarketDataManager:
                     
             except Exception as e:
                 logger.warning(f"Error getting price for {ticker} from {source_name}: {str(e)}")
-                self._log_api_usage(source_name, False)
+                self._log_api_usage(source_name, False, "current_price", started)
                 self._record_ticker_source_result(ticker, source_name, False)
         
         # If all sources fail, return None
@@ -307,6 +316,7 @@ class MarketDataManager:
             if not source or not remaining_tickers:
                 continue
                 
+            started = time.perf_counter()
             try:
                 # Convert remaining tickers to list
                 batch_tickers = list(remaining_tickers)
@@ -315,7 +325,7 @@ class MarketDataManager:
                 batch_results = await source.get_batch_prices(batch_tickers)
                 
                 # Log API usage (count as one call for batch)
-                self._log_api_usage(source_name, success=len(batch_results) > 0)
+                self._log_api_usage(source_name, len(batch_results) > 0, "batch_prices", started)
                 
                 # Process results
                 for ticker, data in batch_results.items():
@@ -331,7 +341,7 @@ class MarketDataManager:
                 
             except Exception as e:
                 logger.warning(f"Error in batch lookup from {source_name}: {str(e)}")
-                self._log_api_usage(source_name, False)
+                self._log_api_usage(source_name, False, "batch_prices", started)
         
         # For any remaining tickers, try individual lookups
         if remaining_tickers:
@@ -360,6 +370,7 @@ class MarketDataManager:
             if not source:
                 continue
                 
+            started = time.perf_counter()
             try:
                 metrics_data = await source.get_company_metrics(ticker)
                 
@@ -373,7 +384,7 @@ class MarketDataManager:
                 
                 # Log API usage and reliability
                 success = metrics_data is not None
-                self._log_api_usage(source_name, success)
+                self._log_api_usage(source_name, success, "company_metrics", started)
                 self._record_ticker_source_result(ticker, source_name, success)
                 
                 if metrics_data:
@@ -381,7 +392,7 @@ class MarketDataManager:
                     
             except Exception as e:
                 logger.warning(f"Error getting metrics for {ticker} from {source_name}: {str(e)}")
-                self._log_api_usage(source_name, False)
+                self._log_api_usage(source_name, False, "company_metrics", started)
                 self._record_ticker_source_result(ticker, source_name, False)
         
         # If all sources fail, return None
@@ -406,12 +417,13 @@ class MarketDataManager:
             if not source:
                 continue
                 
+            started = time.perf_counter()
             try:
                 historical_data = await source.get_historical_prices(ticker, start_date, end_date)
                 
                 # Log API usage and reliability
                 success = len(historical_data) > 0
-                self._log_api_usage(source_name, success)
+                self._log_api_usage(source_name, success, "historical_prices", started)
                 self._record_ticker_source_result(ticker, source_name, success)
                 
                 if historical_data:
@@ -419,7 +431,7 @@ class MarketDataManager:
                     
             except Exception as e:
                 logger.warning(f"Error getting historical data for {ticker} from {source_name}: {str(e)}")
-                self._log_api_usage(source_name, False)
+                self._log_api_usage(source_name, False, "historical_prices", started)
                 self._record_ticker_source_result(ticker, source_name, False)
         
         # If all sources fail, return empty list
@@ -1,18 +1,22 @@
 import os
 import json
+import time
 import logging
 from typing import Dict, Iterable, List, Optional, Set, Any, Tuple
 from datetime import datetime, timezone
 
 import httpx
 
+from backend.utils.metrics import observe_provider_call
+
 logger = logging.getLogger("polygon_client")
 
 POLYGON_API_KEY = os.getenv("POLYGON_API_KEY")
 if not POLYGON_API_KEY:
     logger.warning("polygon.missing_api_key_env")
 
-BASE = "https://api.polygon.io"
+# Overridable so the benchmark suite can point the client at a local stub
+BASE = os.getenv("POLYGON_BASE_URL", "https://api.polygon.io")
 SNAPSHOT_V2 = f"{BASE}/v2/snapshot/locale/us/markets/stocks/tickers"
 REF_TICKERS_V3 = f"{BASE}/v3/reference/tickers"
 
@@ -175,7 +179,7 @@ class PolygonClient:
 
         async with httpx.AsyncClient(timeout=HTTP_TIMEOUT, headers=HTTP_HEADERS) as client:
             while url and pages < max_pages:
-                resp = await _get_with_retry(client, url, params=params)
+                resp = await _get_with_retry(client, url, params=params, operation="reference_tickers")
                 params = None  # next_url carries query
                 try:
                     payload = resp.json()
@@ -198,7 +202,7 @@ class PolygonClient:
     # -----------------------------
     async def _get_full_market_snapshot(self) -> Dict[str, Any]:
         async with httpx.AsyncClient(timeout=HTTP_TIMEOUT, headers=HTTP_HEADERS) as client:
-            resp = await _get_with_retry(client, SNAPSHOT_V2, params={"apiKey": self.api_key})
+            resp = await _get_with_retry(client, SNAPSHOT_V2, params={"apiKey": self.api_key}, operation="snapshot")
             try:
                 payload = resp.json()
             except Exception as e:
@@ -213,14 +217,18 @@ async def _get_with_retry(
     url: str,
     params: Optional[Dict[str, Any]] = None,
     retries: int = 3,
+    operation: str = "request",
 ) -> httpx.Response:
     last_exc: Optional[Exception] = None
     for attempt in range(retries):
+        started = time.perf_counter()
         try:
             r = await client.get(url, params=params)
             r.raise_for_status()
+            observe_provider_call("polygon", operation, time.perf_counter() - started)
             return r
         except Exception as e:
+            observe_provider_call("polygon", operation, time.perf_counter() - started, success=False)
             last_exc = e
             sleep = 1.5 ** attempt
             logger.warning(f"polygon.http_retry attempt={attempt+1} sleep={sleep:.2f}s url={url} err={e}")
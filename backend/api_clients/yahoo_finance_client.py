@@ -20,6 +20,10 @@ import json
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("yahoo_finance_client")
 
+# Overridable so the benchmark suite can point the client at a local stub
+YAHOO_QUERY1_URL = os.getenv("YAHOO_QUERY1_URL", "https://query1.finance.yahoo.com")
+YAHOO_QUERY2_URL = os.getenv("YAHOO_QUERY2_URL", "https://query2.finance.yahoo.com")
+
 class YahooFinanceClient:
     """
     Unified client for Yahoo Finance API access.
@@ -191,7 +195,7 @@ class YahooFinanceClient:
             return cached_data
         
         # URL for Yahoo Finance API
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}?interval=1d"
+        url = f"{YAHOO_QUERY1_URL}/v8/finance/chart/{ticker}?interval=1d"
         
         # Make the request
         data = await self._make_request(url)
@@ -277,7 +281,7 @@ class YahooFinanceClient:
             # Try to get batch data in a single API call
             try:
                 # Specifically format URL for quote data
-                url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={batch_str}"
+                url = f"{YAHOO_QUERY1_URL}/v7/finance/quote?symbols={batch_str}"
                 data = await self._make_request(url)
                 
                 if data and "quoteResponse" in data and "result" in data["quoteResponse"]:
@@ -510,7 +514,7 @@ class YahooFinanceClient:
         end_timestamp = int(end_date.timestamp())
         
         # URL for Yahoo Finance historical data
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}?period1={start_timestamp}&period2={end_timestamp}&interval=1d"
+        url = f"{YAHOO_QUERY1_URL}/v8/finance/chart/{ticker}?period1={start_timestamp}&period2={end_timestamp}&interval=1d"
         
         # Make the request
         data = await self._make_request(url)
@@ -635,7 +639,7 @@ class YahooFinanceClient:
         
         # Use the batch endpoint which works well for FX/crypto
         batch_str = ",".join(symbols)
-        url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={batch_str}"
+        url = f"{YAHOO_QUERY1_URL}/v7/finance/quote?symbols={batch_str}"
         
         try:
             # Make a single batch request
@@ -739,7 +743,7 @@ class YahooFinanceClient:
                 for symbol in missing_symbols:
                     try:
                         # Use individual quote endpoint
-                        ind_url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={symbol}"
+                        ind_url = f"{YAHOO_QUERY1_URL}/v7/finance/quote?symbols={symbol}"
                         ind_data = await self._make_request(ind_url)
                         
                         if ind_data and "quoteResponse" in ind_data and "result" in ind_data["quoteResponse"] and ind_data["quoteResponse"]["result"]:
@@ -5,7 +5,6 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional, List
 
-import requests
 from sqlalchemy.exc import IntegrityError
 
 import jwt  # HS256 for app token (your app's JWT)
@@ -19,7 +18,9 @@ from pydantic import BaseModel
 logger = logging.getLogger("auth_clerk")
 
 # ---- import the ONE shared DB + tables ----
-from backend.core_db import database, users  # single source of truth
+from backend.core_db import get_database, users  # single source of truth
+
+database = get_database("auth")
 
 # ---- organize data from clerk to supabase ----
 
@@ -80,6 +81,7 @@ def _get_jwks() -> dict:
         logger.error("CLERK_JWKS_URL not configured")
         raise HTTPException(status_code=500, detail="CLERK_JWKS_URL not configured")
     try:
+        import requests  # imported on first use; keeps ~100ms off cold start
         resp = requests.get(CLERK_JWKS_URL, timeout=5)
         resp.raise_for_status()
         _jwks_cache = resp.json()
@@ -127,6 +129,7 @@ def _fetch_email_from_clerk_api(clerk_id: str) -> Optional[str]:
         logger.info("clerk.api.skip", extra={"has_secret": bool(CLERK_SECRET_KEY), "has_id": bool(clerk_id)})
         return None
     try:
+        import requests
         url = f"{CLERK_API_URL}/v1/users/{clerk_id}"
         resp = requests.get(url, headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"}, timeout=5)
         if resp.status_code != 200:
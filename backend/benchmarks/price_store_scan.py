@@ -0,0 +1,106 @@
+"""
+Benchmark: 1-year, N-ticker close-price scan from Postgres vs the
+memory-mapped PriceHistoryStore.
+
+Both paths compute annualised volatility per ticker so the work done on the
+fetched data is identical; only the data access differs.
+
+    python -m backend.benchmarks.price_store_scan --tickers 5000 --days 365
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.core_db import database_lifespan
+from backend.services.price_history_store import PriceHistoryStore
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _annualised_volatility(closes: np.ndarray) -> np.ndarray:
+    """Row-wise annualised volatility of daily log returns, ignoring gaps"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(closes), axis=1)
+    return np.nanstd(returns, axis=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+
+async def run_benchmark(ticker_count: int, days: int, store_path: str = None) -> dict:
+    async with database_lifespan() as database:
+        end = date.today()
+        start = end - timedelta(days=days)
+
+        rows = await database.fetch_all(
+            """
+            SELECT ticker
+            FROM price_history
+            WHERE date >= :start
+            GROUP BY ticker
+            ORDER BY COUNT(*) DESC
+            LIMIT :limit
+            """,
+            {"start": start, "limit": ticker_count}
+        )
+        tickers = [row["ticker"] for row in rows]
+
+        # --- SQL path: one round trip, row-at-a-time records pivoted in Python ---
+        sql_start = time.perf_counter()
+        records = await database.fetch_all(
+            """
+            SELECT ticker, date, close_price
+            FROM price_history
+            WHERE ticker = ANY(:tickers) AND date BETWEEN :start AND :end
+            ORDER BY ticker, date
+            """,
+            {"tickers": tickers, "start": start, "end": end}
+        )
+        series = {}
+        for record in records:
+            series.setdefault(record["ticker"], []).append(float(record["close_price"]))
+        width = max((len(v) for v in series.values()), default=0)
+        sql_matrix = np.full((len(series), width), np.nan)
+        for i, values in enumerate(series.values()):
+            sql_matrix[i, :len(values)] = values
+        _annualised_volatility(sql_matrix)
+        sql_seconds = time.perf_counter() - sql_start
+
+        # --- Store path: refresh once (not timed in the scan), then slice ---
+        store = PriceHistoryStore(store_path) if store_path else PriceHistoryStore.get_instance()
+        refresh_start = time.perf_counter()
+        refresh = await store.refresh(database)
+        refresh_seconds = time.perf_counter() - refresh_start
+
+        store_start = time.perf_counter()
+        store_matrix = store.matrix(tickers, "close", start, end)
+        _annualised_volatility(store_matrix)
+        store_seconds = time.perf_counter() - store_start
+
+        return {
+            "benchmark": "price_store_scan",
+            "tickers": len(tickers),
+            "days": days,
+            "sql_rows": len(records),
+            "sql_seconds": sql_seconds,
+            "store_refresh_seconds": refresh_seconds,
+            "store_refresh": refresh,
+            "store_scan_seconds": store_seconds,
+            "speedup": (sql_seconds / store_seconds) if store_seconds else None,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price history scan: SQL vs memory-mapped store")
+    parser.add_argument("--tickers", type=int, default=5000, help="Number of tickers to scan")
+    parser.add_argument("--days", type=int, default=365, help="Calendar days of history to scan")
+    parser.add_argument("--store-path", type=str, help="Store directory (defaults to PRICE_STORE_DIR)")
+
+    args = parser.parse_args()
+    result = asyncio.run(run_benchmark(args.tickers, args.days, args.store_path))
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,272 @@
+"""
+Scripted benchmark scenarios against the synthetic dataset.
+
+Times the portfolio and price jobs and the heaviest read endpoints with the
+market-data providers replaced by local stubs:
+
+    calculate_all_portfolios    PortfolioCalculator.calculate_all_portfolios()
+    update_security_prices      PriceUpdaterV2.update_security_prices()
+    polygon_sync_prices_full    POST /market/polygon-sync-prices-full
+    accounts_all_detailed       GET /accounts/all/detailed (per sampled user)
+    datastore                   GET /datastore/* (per sampled user and endpoint)
+
+Endpoints are called in-process through httpx with real bearer tokens for the
+sampled `bench-` users, so authentication and serialization are part of the
+measurement. Each scenario records wall times, database queries issued and
+errors; the report is written as JSON and can be compared with an earlier one:
+
+    python -m backend.benchmarks.synthetic_data --users 1000
+    python -m backend.benchmarks.scenarios --output before.json
+    python -m backend.benchmarks.scenarios --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT)
+
+SCENARIOS = ("calculate_all_portfolios", "update_security_prices", "polygon_sync_prices_full",
+             "accounts_all_detailed", "datastore")
+DATASTORE_ENDPOINTS = (
+    "/datastore/positions/detail",
+    "/datastore/accounts/summary",
+    "/datastore/positions/grouped",
+    "/datastore/accounts/positions",
+    "/datastore/accounts/summary-positions",
+    "/datastore/liabilities/grouped",
+)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def start_stubs(tickers: int, seed: int, port: int, latency_ms: float) -> Tuple[subprocess.Popen, Dict[str, str]]:
+    """Start stub_servers in a subprocess and return it with the environment it advertises"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.stub_servers", "--tickers", str(tickers), "--seed", str(seed),
+         "--port", str(port), "--latency-ms", str(latency_ms)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    for line in process.stdout:
+        if line.startswith("{"):
+            message = json.loads(line)
+            if message.get("ready"):
+                return process, message["environment"]
+    raise RuntimeError(f"Stub servers exited with code {process.wait()}")
+
+
+def _summarize(durations: List[float]) -> Dict[str, Any]:
+    ordered = sorted(durations)
+    if not ordered:
+        return {"runs": 0}
+    return {
+        "runs": len(ordered),
+        "min_seconds": ordered[0],
+        "median_seconds": statistics.median(ordered),
+        "p95_seconds": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "max_seconds": ordered[-1],
+        "total_seconds": sum(ordered),
+    }
+
+
+class ScenarioRunner:
+    """Runs each scenario `repeat` times and collects timings, query counts and errors"""
+
+    def __init__(self, users: List[Dict[str, Any]], repeat: int, max_tickers: Optional[int]):
+        self.users = users
+        self.repeat = repeat
+        self.max_tickers = max_tickers
+
+    @staticmethod
+    def _queries_issued() -> int:
+        from backend.core_db import consumer_stats
+        return sum(stats["calls"] for stats in consumer_stats().values())
+
+    async def _measure(self, call: Callable[[], Awaitable[Any]], repeat: int) -> Dict[str, Any]:
+        durations, errors, details = [], [], None
+        queries_before = self._queries_issued()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                details = await call()
+            except Exception as e:
+                errors.append(repr(e)[:300])
+            durations.append(time.perf_counter() - started)
+        result = _summarize(durations)
+        result["db_queries_per_run"] = (self._queries_issued() - queries_before) / max(repeat, 1)
+        result["errors"] = errors
+        if isinstance(details, dict):
+            result["last_result"] = {k: v for k, v in details.items() if isinstance(v, (int, float, str, bool))}
+        return result
+
+    async def _measure_requests(self, client, method: str, path: str) -> Dict[str, Any]:
+        """One request per sampled user per repeat; non-2xx responses count as errors"""
+        from backend.main import create_access_token
+
+        durations, statuses = [], {}
+        queries_before = self._queries_issued()
+        for _ in range(self.repeat):
+            for user in self.users:
+                headers = {"Authorization": f"Bearer {create_access_token({'user_id': user['id']})}"}
+                started = time.perf_counter()
+                response = await client.request(method, path, headers=headers)
+                durations.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        result = _summarize(durations)
+        result["db_queries_per_request"] = (self._queries_issued() - queries_before) / max(len(durations), 1)
+        result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+        result["errors"] = sum(count for code, count in statuses.items() if code >= 400)
+        return result
+
+    async def calculate_all_portfolios(self, client) -> Dict[str, Any]:
+        from backend.services.portfolio_calculator import PortfolioCalculator
+        return await self._measure(PortfolioCalculator().calculate_all_portfolios, self.repeat)
+
+    async def update_security_prices(self, client) -> Dict[str, Any]:
+        from backend.services.price_updater_v2 import PriceUpdaterV2
+        updater = PriceUpdaterV2()
+        return await self._measure(lambda: updater.update_security_prices(max_tickers=self.max_tickers), self.repeat)
+
+    async def polygon_sync_prices_full(self, client) -> Dict[str, Any]:
+        async def call():
+            response = await client.post("/market/polygon-sync-prices-full")
+            response.raise_for_status()
+            return response.json()
+        return await self._measure(call, self.repeat)
+
+    async def accounts_all_detailed(self, client) -> Dict[str, Any]:
+        return await self._measure_requests(client, "GET", "/accounts/all/detailed")
+
+    async def datastore(self, client) -> Dict[str, Any]:
+        return {path: await self._measure_requests(client, "GET", path) for path in DATASTORE_ENDPOINTS}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Median change per scenario (and per endpoint) relative to a baseline report"""
+    def delta(current: Dict[str, Any], previous: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        before, after = previous.get("median_seconds"), current.get("median_seconds")
+        if not before or after is None:
+            return None
+        return {"baseline_median_seconds": before, "median_seconds": after,
+                "change_pct": (after - before) / before * 100}
+
+    out = {"baseline_commit": baseline.get("git_commit")}
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if name == "datastore":
+            out[name] = {path: delta(result, previous.get(path, {})) for path, result in current.items()}
+        else:
+            out[name] = delta(current, previous)
+    return out
+
+
+async def run(args) -> Dict[str, Any]:
+    # Importing the app reads the provider base URLs, so the stub environment must be set first
+    from backend.core_db import database_lifespan
+    import backend.main as main
+    from backend.benchmarks.synthetic_data import USER_PREFIX, dataset_summary, ensure_benchmark_database
+    import httpx
+
+    # The price scenarios write to securities and price_history
+    ensure_benchmark_database(args.allow_remote)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        for name in list(logging.root.manager.loggerDict):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    selected = [s for s in args.scenarios.split(",") if s] if args.scenarios else list(SCENARIOS)
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    async with database_lifespan() as database:
+        users = [dict(row) for row in await database.fetch_all(
+            # Deterministic sample spread across the id range
+            """
+            SELECT id FROM users
+            WHERE id LIKE :prefix
+            ORDER BY md5(id)
+            LIMIT :limit
+            """,
+            {"prefix": f"{USER_PREFIX}%", "limit": args.sample_users}
+        )]
+        if not users:
+            raise SystemExit("No benchmark users found; run backend.benchmarks.synthetic_data first")
+
+        report = {
+            "benchmark": "scenarios",
+            "git_commit": _git_commit(),
+            "started_at": datetime.utcnow().isoformat(),
+            "config": {"repeat": args.repeat, "sample_users": len(users), "stub_latency_ms": args.stub_latency_ms,
+                       "max_tickers": args.max_tickers, "redis": os.getenv("REDIS_ENABLED", "true")},
+            "dataset": await dataset_summary(database),
+            "scenarios": {},
+        }
+
+        runner = ScenarioRunner(users, args.repeat, args.max_tickers)
+        async with httpx.AsyncClient(app=main.app, base_url="http://benchmark", timeout=None) as client:
+            for name in selected:
+                started = time.perf_counter()
+                report["scenarios"][name] = await getattr(runner, name)(client)
+                print(f"{name}: {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run benchmark scenarios against the synthetic dataset")
+    parser.add_argument("--scenarios", type=str, help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario (per user for endpoints)")
+    parser.add_argument("--sample-users", type=int, default=20, help="Users the endpoint scenarios call as")
+    parser.add_argument("--max-tickers", type=int, help="Limit update_security_prices to N tickers")
+    parser.add_argument("--tickers", type=int, default=2000, help="Universe size used by synthetic_data")
+    parser.add_argument("--seed", type=int, default=42, help="Seed used by synthetic_data")
+    parser.add_argument("--stub-port", type=int, default=9100, help="First of three ports for the stub servers")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Delay added to every stub response")
+    parser.add_argument("--with-cache", action="store_true", help="Leave Redis caching enabled")
+    parser.add_argument("--output", type=str, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", type=str, help="Baseline JSON report to compare medians against")
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logging from the app")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="Allow a DATABASE_URL that isn't a local or test database")
+
+    args = parser.parse_args()
+
+    stubs, environment = start_stubs(args.tickers, args.seed, args.stub_port, args.stub_latency_ms)
+    os.environ.update(environment)
+    if not args.with_cache:
+        os.environ["REDIS_ENABLED"] = "false"
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,185 @@
+"""
+Benchmark: /securities/search engines.
+
+Runs the same typeahead queries through
+
+    like     the original LOWER(TRIM(col)) LIKE '%q%' query (sequential scan)
+    trgm     the same ranking over pg_trgm GIN indexes (--trgm creates them)
+    memory   services.security_search.SecuritySearchIndex
+
+and reports per-query latency percentiles for each, plus how many queries
+returned a different ticker list than the LIKE query.
+
+    python -m backend.benchmarks.security_search --queries 300 --trgm
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.core_db import database_lifespan
+from backend.services.security_search import SecuritySearchIndex, SECURITY_SEARCH_LIMIT
+
+LIKE_QUERY = """
+WITH base AS (
+    SELECT ticker, market_cap,
+        CASE
+            WHEN LOWER(TRIM(ticker)) = :q THEN 0
+            WHEN LOWER(TRIM(ticker)) LIKE :prefix_pattern THEN 1
+            WHEN LOWER(TRIM(company_name)) = :q THEN 2
+            WHEN LOWER(TRIM(company_name)) LIKE :prefix_pattern THEN 3
+            WHEN LOWER(TRIM(ticker)) LIKE :search_pattern THEN 4
+            WHEN LOWER(TRIM(company_name)) LIKE :search_pattern THEN 5
+            WHEN :include_sector_industry
+                 AND (LOWER(TRIM(COALESCE(sector,''))) LIKE :search_pattern
+                  OR  LOWER(TRIM(COALESCE(industry,''))) LIKE :search_pattern) THEN 6
+            ELSE 7
+        END AS rank_key
+    FROM securities
+)
+SELECT ticker FROM base
+WHERE rank_key < 7
+ORDER BY rank_key ASC, market_cap DESC NULLS LAST, ticker ASC
+LIMIT :limit
+"""
+
+# Every tier is a substring match, so one OR of trigram-indexable LIKEs finds all candidates
+TRGM_QUERY = """
+SELECT ticker FROM (
+    SELECT ticker, market_cap,
+        CASE
+            WHEN LOWER(ticker) = :q THEN 0
+            WHEN LOWER(ticker) LIKE :prefix_pattern THEN 1
+            WHEN LOWER(company_name) = :q THEN 2
+            WHEN LOWER(company_name) LIKE :prefix_pattern THEN 3
+            WHEN LOWER(ticker) LIKE :search_pattern THEN 4
+            WHEN LOWER(company_name) LIKE :search_pattern THEN 5
+            ELSE 6
+        END AS rank_key
+    FROM securities
+    WHERE LOWER(ticker) LIKE :search_pattern
+       OR LOWER(company_name) LIKE :search_pattern
+       OR (:include_sector_industry AND (LOWER(sector) LIKE :search_pattern
+                                          OR LOWER(industry) LIKE :search_pattern))
+) matches
+ORDER BY rank_key ASC, market_cap DESC NULLS LAST, ticker ASC
+LIMIT :limit
+"""
+
+TRGM_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_securities_ticker_trgm ON securities USING gin (LOWER(ticker) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_securities_company_trgm ON securities USING gin (LOWER(company_name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_securities_sector_trgm ON securities USING gin (LOWER(sector) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_securities_industry_trgm ON securities USING gin (LOWER(industry) gin_trgm_ops)",
+]
+
+
+def _sample_queries(securities: List[Dict[str, Any]], count: int, seed: int) -> List[str]:
+    """Keystroke-like queries: tickers, ticker/company prefixes, substrings, sectors and misses"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        security = rng.choice(securities)
+        ticker = security["ticker"] or "x"
+        name = (security["company_name"] or ticker).lower()
+        kind = rng.randrange(7)
+        if kind == 0:
+            queries.append(ticker)
+        elif kind == 1:
+            queries.append(ticker[:rng.randint(1, 2)])
+        elif kind in (2, 3):
+            queries.append(name[:rng.randint(2, 8)])
+        elif kind == 4:
+            start = rng.randrange(max(len(name) - 3, 1))
+            queries.append(name[start:start + rng.randint(3, 5)])
+        elif kind == 5:
+            queries.append((security["sector"] or "tech")[:rng.randint(3, 8)])
+        else:
+            queries.append("".join(rng.choice("qxzj") for _ in range(4)))
+    return [q.strip() or "a" for q in queries]
+
+
+def _params(q: str) -> Dict[str, Any]:
+    q = q.strip().lower()
+    return {"q": q, "prefix_pattern": f"{q}%", "search_pattern": f"%{q}%",
+            "include_sector_industry": len(q) >= 3, "limit": SECURITY_SEARCH_LIMIT}
+
+
+def _latency(durations: List[float]) -> Dict[str, float]:
+    ordered = sorted(d * 1000 for d in durations)
+    return {
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "max_ms": ordered[-1],
+    }
+
+
+async def run_benchmark(query_count: int, seed: int, trgm: bool) -> dict:
+    async with database_lifespan() as database:
+        securities = [dict(row) for row in await database.fetch_all(
+            "SELECT ticker, company_name, sector FROM securities"
+        )]
+        if not securities:
+            raise SystemExit("securities is empty; run backend.benchmarks.synthetic_data first")
+        queries = _sample_queries(securities, query_count, seed)
+
+        engines: Dict[str, Dict[str, Any]] = {}
+        expected: List[List[str]] = []
+
+        durations = []
+        for q in queries:
+            started = time.perf_counter()
+            rows = await database.fetch_all(LIKE_QUERY, _params(q))
+            durations.append(time.perf_counter() - started)
+            expected.append([row["ticker"] for row in rows])
+        engines["like"] = _latency(durations)
+
+        if trgm:
+            for statement in TRGM_INDEXES:
+                await database.execute(statement)
+            await database.execute("ANALYZE securities")
+            durations, mismatches = [], 0
+            for q, want in zip(queries, expected):
+                started = time.perf_counter()
+                rows = await database.fetch_all(TRGM_QUERY, _params(q))
+                durations.append(time.perf_counter() - started)
+                mismatches += [row["ticker"] for row in rows] != want
+            engines["trgm"] = {**_latency(durations), "mismatches": mismatches}
+
+        index = SecuritySearchIndex()
+        load_start = time.perf_counter()
+        await index.load(database)
+        load_seconds = time.perf_counter() - load_start
+        durations, mismatches = [], 0
+        for q, want in zip(queries, expected):
+            started = time.perf_counter()
+            results = index.search(q)
+            durations.append(time.perf_counter() - started)
+            mismatches += [row["ticker"] for row in results] != want
+        engines["memory"] = {**_latency(durations), "mismatches": mismatches, "load_seconds": load_seconds}
+
+        return {
+            "benchmark": "security_search",
+            "securities": len(securities),
+            "queries": len(queries),
+            "engines": engines,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Securities search: LIKE vs pg_trgm vs in-memory index")
+    parser.add_argument("--queries", type=int, default=300, help="Number of sampled queries")
+    parser.add_argument("--seed", type=int, default=7, help="Query sampling seed")
+    parser.add_argument("--trgm", action="store_true", help="Create pg_trgm GIN indexes and time the rewrite")
+
+    args = parser.parse_args()
+    result = asyncio.run(run_benchmark(args.queries, args.seed, args.trgm))
+    print(json.dumps(result, indent=2, default=str))
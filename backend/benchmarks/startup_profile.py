@@ -0,0 +1,106 @@
+"""
+Startup profile: per-module import timing of main.py and boot-to-first-request.
+
+Runs `python -X importtime -c "import backend.main"` in a fresh interpreter,
+aggregates the per-module timings, then boots the app in another fresh
+interpreter and times the first request to `/` (served in-process, without
+the database lifespan).
+
+    python -m backend.benchmarks.startup_profile --top 25
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_REQUEST_SCRIPT = """
+import asyncio, json, time
+start = time.perf_counter()
+import backend.main as main
+imported = time.perf_counter()
+import httpx
+
+async def first_request():
+    async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+        return await client.get("/")
+
+response = asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "first_request_seconds": done - imported,
+    "boot_to_first_request_seconds": done - start,
+    "status_code": response.status_code,
+    "lazy_loaded": [repr(m) for m in main.LAZY_MODULES if m.is_loaded],
+}))
+"""
+
+
+def _run(args, env=None):
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, env=env or os.environ.copy(),
+        capture_output=True, text=True,
+    )
+
+
+def parse_importtime(stderr: str):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us, depth) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cumulative_us, raw_name = int(parts[0]), int(parts[1]), parts[2]
+        depth = (len(raw_name) - len(raw_name.lstrip(" ")) - 1) // 2
+        rows.append((raw_name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def import_profile(top: int):
+    result = _run(["-X", "importtime", "-c", "import backend.main"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing backend.main failed:\n{result.stderr[-2000:]}")
+
+    rows = parse_importtime(result.stderr)
+    total_us = next((cumulative for name, _, cumulative, _ in rows if name == "backend.main"), None)
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    return {
+        "modules_imported": len(rows),
+        "total_import_seconds": total_us / 1e6 if total_us else None,
+        "top_cumulative": [
+            {"module": name, "cumulative_ms": cumulative / 1000, "self_ms": self_us / 1000}
+            for name, self_us, cumulative, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:top]
+        ],
+        "top_packages_self": [
+            {"package": package, "self_ms": self_us / 1000}
+            for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+    }
+
+
+def first_request_profile():
+    result = _run(["-c", FIRST_REQUEST_SCRIPT])
+    if result.returncode != 0:
+        raise RuntimeError(f"First-request run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile main.py cold start")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules/packages to list")
+
+    args = parser.parse_args()
+    report = {
+        "benchmark": "startup_profile",
+        "imports": import_profile(args.top),
+        "boot": first_request_profile(),
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,257 @@
+"""
+Local stand-ins for the Polygon, Yahoo Finance and Alpha Vantage HTTP APIs.
+
+Each provider gets its own Starlette app on its own port, answering the
+endpoints the API clients call with prices from the same seeded universe the
+synthetic data generator writes (see synthetic_data.build_universe), plus a
+small random drift per request. `--latency-ms` adds a fixed delay to every
+response to approximate real network round trips.
+
+The clients read their base URLs from the environment, so pointing them at the
+stubs is a matter of exporting the variables printed on startup:
+
+    python -m backend.benchmarks.stub_servers --tickers 2000 --port 9100
+
+The scenario runner starts the stubs in a subprocess automatically so their
+work does not share an event loop with the code being measured.
+"""
+import os
+import sys
+import csv
+import io
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+from datetime import date, datetime, timezone
+from typing import Any, Dict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.benchmarks.synthetic_data import build_universe
+
+PROVIDERS = ("polygon", "yahoo", "alphavantage")
+
+
+def stub_environment(host: str, port: int) -> Dict[str, str]:
+    """Environment variables that route the API clients to stubs started at `port`"""
+    base = f"http://{host}:{port}"
+    return {
+        "POLYGON_BASE_URL": base,
+        "POLYGON_API_KEY": "benchmark",
+        "YAHOO_QUERY1_URL": f"http://{host}:{port + 1}",
+        "YAHOO_QUERY2_URL": f"http://{host}:{port + 1}",
+        "ALPHA_VANTAGE_BASE_URL": f"http://{host}:{port + 2}/query",
+        "ALPHA_VANTAGE_API_KEY": "benchmark",
+    }
+
+
+class StubMarket:
+    """Current prices for the seeded universe, drifting a little on every read"""
+
+    def __init__(self, tickers: int, seed: int, latency_ms: float):
+        self.universe = {s["ticker"]: s for s in build_universe(tickers, seed)}
+        self.rng = random.Random(seed)
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+
+    def quote(self, ticker: str) -> Dict[str, Any]:
+        security = self.universe[ticker]
+        price = round(security["price"] * (1 + self.rng.gauss(0, 0.004)), 4)
+        return {"price": price, "open": round(security["price"], 4), "high": max(price, security["price"]) * 1.004,
+                "low": min(price, security["price"]) * 0.996, "volume": security["volume"],
+                "previous_close": security["price"]}
+
+    async def delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+def polygon_app(market: StubMarket) -> Starlette:
+    def snapshot_item(ticker: str) -> Dict[str, Any]:
+        q = market.quote(ticker)
+        now_ms = int(time.time() * 1000)
+        return {
+            "ticker": ticker,
+            "day": {"o": q["open"], "h": q["high"], "l": q["low"], "c": q["price"], "v": q["volume"]},
+            "min": {"c": q["price"], "t": now_ms},
+            "prevDay": {"c": q["previous_close"]},
+            "updated": now_ms * 1_000_000,
+        }
+
+    async def snapshot(request: Request):
+        await market.delay()
+        wanted = request.query_params.get("tickers")
+        tickers = [t for t in wanted.split(",") if t in market.universe] if wanted else list(market.universe)
+        return JSONResponse({"status": "OK", "count": len(tickers), "tickers": [snapshot_item(t) for t in tickers]})
+
+    async def reference_tickers(request: Request):
+        await market.delay()
+        limit = int(request.query_params.get("limit", 1000))
+        offset = int(request.query_params.get("offset", 0))
+        tickers = list(market.universe)[offset:offset + limit]
+        next_offset = offset + limit
+        return JSONResponse({
+            "status": "OK",
+            "results": [{"ticker": t, "name": market.universe[t]["company_name"], "market": "stocks",
+                         "type": "ETF" if market.universe[t]["asset_type"] == "etf" else "CS", "active": True}
+                        for t in tickers],
+            "next_url": (f"{request.base_url}v3/reference/tickers?limit={limit}&offset={next_offset}"
+                         if next_offset < len(market.universe) else None),
+        })
+
+    return Starlette(routes=[
+        Route("/v2/snapshot/locale/us/markets/stocks/tickers", snapshot),
+        Route("/v3/reference/tickers", reference_tickers),
+    ])
+
+
+def yahoo_app(market: StubMarket) -> Starlette:
+    async def quote(request: Request):
+        await market.delay()
+        results = []
+        for ticker in request.query_params.get("symbols", "").split(","):
+            if ticker not in market.universe:
+                continue
+            q = market.quote(ticker)
+            results.append({
+                "symbol": ticker, "regularMarketPrice": q["price"], "regularMarketOpen": q["open"],
+                "regularMarketDayHigh": q["high"], "regularMarketDayLow": q["low"],
+                "regularMarketVolume": q["volume"], "regularMarketPreviousClose": q["previous_close"],
+                "regularMarketTime": int(time.time()), "longName": market.universe[ticker]["company_name"],
+            })
+        return JSONResponse({"quoteResponse": {"result": results, "error": None}})
+
+    async def chart(request: Request):
+        await market.delay()
+        ticker = request.path_params["ticker"]
+        if ticker not in market.universe:
+            return JSONResponse({"chart": {"result": None, "error": {"code": "Not Found"}}}, status_code=404)
+        q = market.quote(ticker)
+        now = int(time.time())
+        return JSONResponse({"chart": {"result": [{
+            "meta": {"symbol": ticker, "regularMarketPrice": q["price"], "chartPreviousClose": q["previous_close"],
+                     "regularMarketTime": now, "currency": "USD"},
+            "timestamp": [now],
+            "indicators": {"quote": [{"open": [q["open"]], "high": [q["high"]], "low": [q["low"]],
+                                      "close": [q["price"]], "volume": [q["volume"]]}]},
+        }], "error": None}})
+
+    async def quote_summary(request: Request):
+        await market.delay()
+        ticker = request.path_params["ticker"]
+        security = market.universe.get(ticker)
+        if not security:
+            return JSONResponse({"quoteSummary": {"result": None, "error": {"code": "Not Found"}}}, status_code=404)
+        q = market.quote(ticker)
+        raw = lambda value: {"raw": value, "fmt": str(value)}
+        return JSONResponse({"quoteSummary": {"result": [{
+            "price": {"regularMarketPrice": raw(q["price"]), "longName": security["company_name"],
+                      "marketCap": raw(security["market_cap"])},
+            "summaryProfile": {"sector": security["sector"], "industry": security["industry"]},
+            "assetProfile": {"sector": security["sector"], "industry": security["industry"]},
+            "summaryDetail": {"trailingPE": raw(security["pe_ratio"]), "dividendYield": raw(security["dividend_yield"]),
+                              "volume": raw(q["volume"]), "previousClose": raw(q["previous_close"])},
+            "defaultKeyStatistics": {"beta": raw(1.0)},
+        }], "error": None}})
+
+    return Starlette(routes=[
+        Route("/v7/finance/quote", quote),
+        Route("/v8/finance/chart/{ticker}", chart),
+        Route("/v10/finance/quoteSummary/{ticker}", quote_summary),
+    ])
+
+
+def alphavantage_app(market: StubMarket) -> Starlette:
+    async def query(request: Request):
+        await market.delay()
+        function = request.query_params.get("function", "").upper()
+
+        if function == "REALTIME_BULK_QUOTES":
+            rows = []
+            for ticker in request.query_params.get("symbol", "").split(","):
+                if ticker in market.universe:
+                    q = market.quote(ticker)
+                    rows.append({"symbol": ticker, "price": q["price"], "previous_close": q["previous_close"],
+                                 "volume": q["volume"], "timestamp": datetime.now(timezone.utc).isoformat()})
+            return JSONResponse({"endpoint": "Realtime Bulk Quotes", "data": rows, "Realtime Bulk Quotes": rows})
+
+        if function == "GLOBAL_QUOTE":
+            ticker = request.query_params.get("symbol", "")
+            if ticker not in market.universe:
+                return JSONResponse({"Global Quote": {}})
+            q = market.quote(ticker)
+            return JSONResponse({"Global Quote": {"01. symbol": ticker, "05. price": str(q["price"]),
+                                                  "06. volume": str(q["volume"]),
+                                                  "07. latest trading day": date.today().isoformat(),
+                                                  "08. previous close": str(q["previous_close"])}})
+
+        if function == "OVERVIEW":
+            security = market.universe.get(request.query_params.get("symbol", ""))
+            if not security:
+                return JSONResponse({})
+            return JSONResponse({"Symbol": security["ticker"], "Name": security["company_name"],
+                                 "Sector": security["sector"], "Industry": security["industry"],
+                                 "MarketCapitalization": str(int(security["market_cap"])),
+                                 "PERatio": str(security["pe_ratio"]),
+                                 "DividendYield": str(security["dividend_yield"]), "Beta": "1.0"})
+
+        if function == "LISTING_STATUS":
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(["symbol", "name", "exchange", "assetType", "ipoDate", "delistingDate", "status"])
+            for ticker, security in market.universe.items():
+                writer.writerow([ticker, security["company_name"], "NYSE",
+                                 "ETF" if security["asset_type"] == "etf" else "Stock", "2000-01-03", "null", "Active"])
+            return PlainTextResponse(out.getvalue(), media_type="text/csv")
+
+        return JSONResponse({"Error Message": f"Unsupported function {function}"})
+
+    return Starlette(routes=[Route("/query", query)])
+
+
+async def serve(tickers: int, seed: int, host: str, port: int, latency_ms: float):
+    """Run the three stubs on port, port + 1 and port + 2 until cancelled"""
+    market = StubMarket(tickers, seed, latency_ms)
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port + offset, log_level="warning", access_log=False))
+        for offset, app in enumerate((polygon_app(market), yahoo_app(market), alphavantage_app(market)))
+    ]
+    # uvicorn lets each server claim SIGTERM for itself; one handler has to stop all three
+    for server in servers:
+        server.install_signal_handlers = lambda: None
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: [setattr(server, "should_exit", True) for server in servers])
+
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    while not all(server.started for server in servers):
+        if any(task.done() for task in tasks):
+            for server in servers:
+                server.should_exit = True
+            raise SystemExit("Stub servers failed to start (port in use?)")
+        await asyncio.sleep(0.05)
+    # The runner waits for this line before it starts measuring
+    print(json.dumps({"ready": True, "environment": stub_environment(host, port)}), flush=True)
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Polygon / Yahoo / Alpha Vantage servers")
+    parser.add_argument("--tickers", type=int, default=2000, help="Universe size (match synthetic_data)")
+    parser.add_argument("--seed", type=int, default=42, help="Universe seed (match synthetic_data)")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100, help="Polygon port; Yahoo and Alpha Vantage use the next two")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response")
+
+    args = parser.parse_args()
+    asyncio.run(serve(args.tickers, args.seed, args.host, args.port, args.latency_ms))
@@ -0,0 +1,593 @@
+"""
+Synthetic dataset for the benchmark suite.
+
+Fills a local Postgres with users, accounts, positions, crypto and cash
+positions, securities, daily price history and per-position daily portfolio
+snapshots at a configurable scale. Everything is derived from `--seed`, so two
+runs at the same scale produce the same data and benchmark results can be
+compared across commits.
+
+Rows are tagged so they can be removed again without touching real data:
+users have a `bench-` id and an `@benchmark.nestegg.invalid` email, securities
+carry `ticker_source='benchmark'` and price history `source='benchmark'`.
+`reset` only deletes rows carrying those marks (and what hangs off them).
+Bulk rows go in with COPY; securities and price history are staged in a
+temporary table first so tickers already present in the database are skipped.
+
+Generating and resetting write to whatever DATABASE_URL points at, so both
+refuse a host that isn't local (or named like a test/bench database) unless
+`--allow-remote` is passed or BENCHMARK_ALLOW_REMOTE=true is set.
+
+    python -m backend.benchmarks.synthetic_data --users 1000
+    python -m backend.benchmarks.synthetic_data --users 100000 --tickers 5000 --reset
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import string
+import asyncio
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.core_db import database_lifespan
+
+USER_PREFIX = "bench-"
+USER_EMAIL_DOMAIN = "@benchmark.nestegg.invalid"
+TICKER_SOURCE = "benchmark"
+LOCAL_HOSTS = ("", "localhost", "127.0.0.1", "::1", "host.docker.internal")
+TEST_HOST_MARKERS = ("test", "bench")
+USER_BATCH_SIZE = 1000
+
+SECTORS = {
+    "Technology": ["Software", "Semiconductors", "IT Services"],
+    "Healthcare": ["Biotechnology", "Medical Devices", "Pharmaceuticals"],
+    "Financial Services": ["Banks", "Asset Management", "Insurance"],
+    "Consumer Cyclical": ["Retail", "Autos", "Restaurants"],
+    "Industrials": ["Aerospace", "Machinery", "Transportation"],
+    "Energy": ["Oil & Gas", "Renewables"],
+    "Utilities": ["Electric", "Water"],
+    "Real Estate": ["REIT - Residential", "REIT - Office"],
+}
+COINS = [("BTC", "Bitcoin", 65000.0), ("ETH", "Ethereum", 3200.0), ("SOL", "Solana", 150.0),
+         ("ADA", "Cardano", 0.45), ("DOGE", "Dogecoin", 0.12), ("LINK", "Chainlink", 14.0)]
+INSTITUTIONS = ["Vanguard", "Fidelity", "Schwab", "E*TRADE", "Robinhood", "Chase", "Ally", "Coinbase"]
+INVESTMENT_TYPES = ["Brokerage", "IRA", "Roth IRA", "401(k)"]
+CASH_TYPES = [("Checking", 0.0005), ("Savings", 0.042), ("CD", 0.048), ("Money Market", 0.051)]
+
+# Tables created only if missing; on a database restored from a production
+# schema dump every statement is a no-op.
+BOOTSTRAP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        is_admin BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        subscription_plan TEXT DEFAULT 'basic'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS accounts (
+        id SERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL REFERENCES users(id),
+        account_name TEXT NOT NULL,
+        institution TEXT,
+        type TEXT,
+        account_category TEXT,
+        balance DOUBLE PRECISION DEFAULT 0,
+        cost_basis DOUBLE PRECISION,
+        gain_loss DOUBLE PRECISION,
+        gain_loss_pct DOUBLE PRECISION,
+        positions_count INTEGER,
+        created_at TIMESTAMP DEFAULT NOW(),
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS positions (
+        id SERIAL PRIMARY KEY,
+        account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+        ticker TEXT NOT NULL,
+        shares DOUBLE PRECISION NOT NULL,
+        price DOUBLE PRECISION NOT NULL,
+        cost_basis DOUBLE PRECISION,
+        purchase_date DATE,
+        date TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS crypto_positions (
+        id SERIAL PRIMARY KEY,
+        account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+        coin_type TEXT,
+        coin_symbol TEXT,
+        quantity DOUBLE PRECISION,
+        purchase_price DOUBLE PRECISION,
+        current_price DOUBLE PRECISION,
+        purchase_date DATE,
+        storage_type TEXT,
+        notes TEXT,
+        tags TEXT[],
+        is_favorite BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT NOW(),
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cash_positions (
+        id SERIAL PRIMARY KEY,
+        account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+        cash_type TEXT,
+        name TEXT,
+        amount DOUBLE PRECISION,
+        interest_rate DOUBLE PRECISION,
+        interest_period TEXT,
+        maturity_date DATE,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT NOW(),
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS securities (
+        ticker TEXT PRIMARY KEY,
+        company_name TEXT,
+        asset_type TEXT,
+        sector TEXT,
+        industry TEXT,
+        active BOOLEAN DEFAULT TRUE,
+        on_polygon BOOLEAN,
+        on_yfinance BOOLEAN,
+        on_alphavantage BOOLEAN,
+        current_price DOUBLE PRECISION,
+        price_timestamp TIMESTAMP,
+        last_updated TIMESTAMP,
+        price_polygon NUMERIC,
+        price_polygon_timestamp TIMESTAMPTZ,
+        day_open DOUBLE PRECISION,
+        day_high DOUBLE PRECISION,
+        day_low DOUBLE PRECISION,
+        previous_close DOUBLE PRECISION,
+        volume BIGINT,
+        average_volume BIGINT,
+        market_cap DOUBLE PRECISION,
+        pe_ratio DOUBLE PRECISION,
+        forward_pe DOUBLE PRECISION,
+        eps DOUBLE PRECISION,
+        forward_eps DOUBLE PRECISION,
+        beta DOUBLE PRECISION,
+        dividend_rate DOUBLE PRECISION,
+        dividend_yield DOUBLE PRECISION,
+        fifty_two_week_high DOUBLE PRECISION,
+        fifty_two_week_low DOUBLE PRECISION,
+        fifty_two_week_range TEXT,
+        target_high_price DOUBLE PRECISION,
+        target_low_price DOUBLE PRECISION,
+        target_mean_price DOUBLE PRECISION,
+        target_median_price DOUBLE PRECISION,
+        bid_price DOUBLE PRECISION,
+        ask_price DOUBLE PRECISION,
+        data_source TEXT,
+        source TEXT,
+        metrics_source TEXT,
+        last_metrics_update TIMESTAMP,
+        last_backfilled TIMESTAMP,
+        ticker_source TEXT,
+        ticker_add_date TIMESTAMPTZ,
+        created_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS price_history (
+        id BIGSERIAL PRIMARY KEY,
+        ticker TEXT NOT NULL,
+        date DATE NOT NULL,
+        day_open DOUBLE PRECISION,
+        day_high DOUBLE PRECISION,
+        day_low DOUBLE PRECISION,
+        close_price DOUBLE PRECISION,
+        volume BIGINT,
+        "timestamp" TIMESTAMP,
+        price_timestamp TIMESTAMP,
+        source TEXT,
+        UNIQUE (ticker, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS portfolio_daily_snapshots (
+        id BIGSERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        snapshot_date DATE NOT NULL,
+        account_id INTEGER,
+        asset_type TEXT,
+        identifier TEXT,
+        name TEXT,
+        sector TEXT,
+        quantity DOUBLE PRECISION,
+        current_price DOUBLE PRECISION,
+        current_value DOUBLE PRECISION,
+        total_cost_basis DOUBLE PRECISION,
+        unrealized_gain DOUBLE PRECISION,
+        position_income DOUBLE PRECISION
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_portfolio_daily_snapshots_user_date ON portfolio_daily_snapshots (user_id, snapshot_date)",
+    """
+    CREATE TABLE IF NOT EXISTS portfolio_calculations (
+        id SERIAL PRIMARY KEY,
+        "timestamp" TIMESTAMP,
+        accounts_updated INTEGER,
+        total_value DOUBLE PRECISION,
+        duration_ms INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS system_events (
+        id SERIAL PRIMARY KEY,
+        event_type TEXT,
+        status TEXT,
+        started_at TIMESTAMP,
+        completed_at TIMESTAMP,
+        details JSONB,
+        error_message TEXT
+    )
+    """,
+]
+
+
+def _trading_days(end: date, count: int) -> List[date]:
+    """The last `count` weekdays up to and including `end`, oldest first"""
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days[::-1]
+
+
+def build_universe(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Deterministic securities universe shared by the generator and the stub servers
+
+    Returns:
+        One dict per ticker with a name, sector, latest price, volume and market cap
+    """
+    rng = random.Random(seed)
+    tickers, seen = [], set()
+    while len(tickers) < count:
+        length = rng.choice((2, 3, 3, 4, 4, 4))
+        ticker = "".join(rng.choice(string.ascii_uppercase) for _ in range(length))
+        if ticker not in seen:
+            seen.add(ticker)
+            tickers.append(ticker)
+
+    universe = []
+    for rank, ticker in enumerate(tickers):
+        sector = rng.choice(list(SECTORS))
+        price = round(math.exp(rng.gauss(3.8, 1.0)), 2)
+        shares_outstanding = int(rng.lognormvariate(19, 1.3))
+        universe.append({
+            "ticker": ticker,
+            "company_name": f"{ticker.title()} {rng.choice(['Holdings', 'Corp', 'Inc', 'Group', 'Technologies'])}",
+            "sector": sector,
+            "industry": rng.choice(SECTORS[sector]),
+            "asset_type": "etf" if rank % 25 == 0 else "security",
+            "price": max(price, 1.0),
+            "volume": int(rng.lognormvariate(13, 1.5)),
+            "market_cap": float(max(price, 1.0) * shares_outstanding),
+            "pe_ratio": round(rng.uniform(5, 60), 2),
+            "dividend_yield": round(rng.choice([0, 0, 0.8, 1.5, 2.5, 4.0]) / 100, 4),
+            # Most names are on Polygon; the rest fall through to Yahoo
+            "on_polygon": rng.random() < 0.85,
+            "on_yfinance": True,
+        })
+    return universe
+
+
+def price_paths(universe: List[Dict[str, Any]], days: int, seed: int) -> np.ndarray:
+    """Geometric random walks [ticker, day] that end at each ticker's latest price"""
+    rng = np.random.default_rng(seed)
+    daily_vol = rng.uniform(0.008, 0.035, size=(len(universe), 1))
+    shocks = rng.normal(0.0003, 1.0, size=(len(universe), days)) * daily_vol
+    walk = np.exp(np.cumsum(shocks, axis=1))
+    latest = np.array([s["price"] for s in universe])[:, None]
+    return walk / walk[:, -1:] * latest
+
+
+async def _copy(connection, table: str, columns: List[str], records: List[tuple]):
+    if records:
+        await connection.raw_connection.copy_records_to_table(table, records=records, columns=columns)
+
+
+async def _copy_staged(connection, table: str, columns: List[str], records: List[tuple], conflict: str) -> int:
+    """COPY into a temp copy of `table`, then insert rows whose key is not taken yet"""
+    if not records:
+        return 0
+    stage = f"bench_stage_{table}"
+    raw = connection.raw_connection
+    await raw.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table} INCLUDING DEFAULTS)")
+    await raw.execute(f"TRUNCATE {stage}")
+    await raw.copy_records_to_table(stage, records=records, columns=columns)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    status = await raw.execute(
+        f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {stage} ON CONFLICT {conflict} DO NOTHING"
+    )
+    return int(status.split()[-1])
+
+
+def ensure_benchmark_database(allow_remote: bool = False):
+    """
+    Refuse to write to a database that doesn't look like a benchmark target
+
+    Local hosts (or a unix socket) are accepted, as are hosts or database
+    names containing "test"/"bench". Anything else needs allow_remote or
+    BENCHMARK_ALLOW_REMOTE=true.
+    """
+    if allow_remote or os.getenv("BENCHMARK_ALLOW_REMOTE", "false").lower() == "true":
+        return
+    url = urlsplit(os.getenv("DATABASE_URL") or "")
+    host = (url.hostname or "").lower()
+    name = url.path.lstrip("/").lower()
+    if host in LOCAL_HOSTS or any(marker in host or marker in name for marker in TEST_HOST_MARKERS):
+        return
+    raise SystemExit(
+        f"Refusing to write benchmark data to {host or 'an unknown host'}/{name}: "
+        "pass --allow-remote (or set BENCHMARK_ALLOW_REMOTE=true) if this really is a benchmark database"
+    )
+
+
+async def reset(database, allow_remote: bool = False) -> Dict[str, int]:
+    """Delete the rows a previous run generated, and nothing else"""
+    ensure_benchmark_database(allow_remote)
+    removed = {}
+    bench_users = "SELECT id FROM users WHERE id LIKE :prefix AND email LIKE :email"
+    bench_accounts = f"SELECT id FROM accounts WHERE user_id IN ({bench_users})"
+    values = {"prefix": f"{USER_PREFIX}%", "email": f"%{USER_EMAIL_DOMAIN}"}
+    for table in ("positions", "crypto_positions", "cash_positions"):
+        rows = await database.fetch_all(
+            f"DELETE FROM {table} WHERE account_id IN ({bench_accounts}) RETURNING 1", values)
+        removed[table] = len(rows)
+    for table in ("portfolio_daily_snapshots", "accounts"):
+        rows = await database.fetch_all(
+            f"DELETE FROM {table} WHERE user_id IN ({bench_users}) RETURNING 1", values)
+        removed[table] = len(rows)
+    rows = await database.fetch_all(
+        "DELETE FROM users WHERE id LIKE :prefix AND email LIKE :email RETURNING 1", values)
+    removed["users"] = len(rows)
+    # Our own history rows, plus any the price jobs wrote for tickers only we created;
+    # history of real tickers from other sources stays
+    bench_tickers = "SELECT ticker FROM securities WHERE ticker_source = :source"
+    rows = await database.fetch_all(
+        f"DELETE FROM price_history WHERE source = :source OR ticker IN ({bench_tickers}) RETURNING 1",
+        {"source": TICKER_SOURCE})
+    removed["price_history"] = len(rows)
+    rows = await database.fetch_all(
+        "DELETE FROM securities WHERE ticker_source = :source RETURNING 1", {"source": TICKER_SOURCE})
+    removed["securities"] = len(rows)
+    return removed
+
+
+async def generate(users: int, tickers: int = 2000, history_days: int = 260, snapshot_days: int = 30,
+                   seed: int = 42, reset_first: bool = False, allow_remote: bool = False) -> Dict[str, Any]:
+    """
+    Generate the dataset
+
+    Args:
+        users: Number of synthetic users (1k to 100k is the intended range)
+        tickers: Size of the securities universe
+        history_days: Trading days of price history per ticker
+        snapshot_days: Trading days of portfolio_daily_snapshots per position
+        seed: Seed for every random choice
+        reset_first: Remove a previous benchmark dataset first
+        allow_remote: Write even when DATABASE_URL isn't a local/test database
+
+    Returns:
+        Row counts and timings
+    """
+    ensure_benchmark_database(allow_remote)
+    started = time.perf_counter()
+    counts = {"users": 0, "accounts": 0, "positions": 0, "crypto_positions": 0, "cash_positions": 0,
+              "securities": 0, "price_history": 0, "portfolio_daily_snapshots": 0}
+    timings = {}
+
+    async with database_lifespan() as database:
+        for statement in BOOTSTRAP_SCHEMA:
+            await database.execute(statement)
+        if reset_first:
+            timings["reset_removed"] = await reset(database, allow_remote)
+
+        universe = build_universe(tickers, seed)
+        history_dates = _trading_days(date.today(), max(history_days, snapshot_days))
+        paths = price_paths(universe, len(history_dates), seed)
+        now = datetime.utcnow()
+
+        # ----- securities + price history -----
+        phase = time.perf_counter()
+        async with database.connection() as connection:
+            security_columns = ["ticker", "company_name", "asset_type", "sector", "industry", "active",
+                                "on_polygon", "on_yfinance", "current_price", "price_timestamp", "last_updated",
+                                "volume", "market_cap", "pe_ratio", "dividend_yield", "ticker_source",
+                                "ticker_add_date", "created_at"]
+            counts["securities"] = await _copy_staged(connection, "securities", security_columns, [
+                (s["ticker"], s["company_name"], s["asset_type"], s["sector"], s["industry"], True,
+                 s["on_polygon"], s["on_yfinance"], s["price"], now, now, s["volume"], s["market_cap"],
+                 s["pe_ratio"], s["dividend_yield"], TICKER_SOURCE, now, now)
+                for s in universe
+            ], "(ticker)")
+
+            history_columns = ["ticker", "date", "day_open", "day_high", "day_low", "close_price",
+                               "volume", "timestamp", "source"]
+            rng = np.random.default_rng(seed + 1)
+            for i, security in enumerate(universe):
+                closes = paths[i, -history_days:]
+                spread = rng.uniform(0.002, 0.02, size=len(closes))
+                volumes = rng.lognormal(np.log(security["volume"] + 1), 0.4, size=len(closes)).astype(np.int64)
+                records = [
+                    (security["ticker"], day, float(close * (1 - spread[j] / 2)), float(close * (1 + spread[j])),
+                     float(close * (1 - spread[j])), float(close), int(volumes[j]),
+                     datetime.combine(day, datetime.min.time()) + timedelta(hours=21), TICKER_SOURCE)
+                    for j, (day, close) in enumerate(zip(history_dates[-history_days:], closes))
+                ]
+                counts["price_history"] += await _copy_staged(
+                    connection, "price_history", history_columns, records, "(ticker, date)")
+        timings["securities_and_history_seconds"] = time.perf_counter() - phase
+
+        # ----- users, accounts, positions, snapshots (in batches of users) -----
+        phase = time.perf_counter()
+        rng = random.Random(seed)
+        np_rng = np.random.default_rng(seed + 2)
+        # Zipf-like popularity: a few tickers appear in most portfolios
+        popularity = 1.0 / np.arange(1, len(universe) + 1) ** 1.1
+        popularity /= popularity.sum()
+        snapshot_dates = history_dates[-snapshot_days:] if snapshot_days else []
+        snapshot_offset = len(history_dates) - len(snapshot_dates)
+
+        for batch_start in range(0, users, USER_BATCH_SIZE):
+            batch_ids = [f"{USER_PREFIX}{n:07d}" for n in range(batch_start, min(users, batch_start + USER_BATCH_SIZE))]
+            user_rows, account_rows = [], []
+            for user_id in batch_ids:
+                user_rows.append((user_id, f"{user_id}{USER_EMAIL_DOMAIN}", f"Bench{user_id[-4:]}",
+                                  "User", False, rng.choice(["basic", "basic", "premium"])))
+                for n in range(rng.choice((1, 2, 2, 3, 3, 4))):
+                    account_rows.append((user_id, f"{rng.choice(INVESTMENT_TYPES)} {n + 1}",
+                                         rng.choice(INSTITUTIONS[:5]), "Brokerage", "brokerage"))
+                if rng.random() < 0.9:
+                    account_rows.append((user_id, "Cash", rng.choice(INSTITUTIONS[5:7]), "Checking", "cash"))
+                if rng.random() < 0.3:
+                    account_rows.append((user_id, "Crypto Wallet", "Coinbase", "Exchange", "cryptocurrency"))
+
+            async with database.connection() as connection:
+                await _copy(connection, "users",
+                            ["id", "email", "first_name", "last_name", "is_admin", "subscription_plan"], user_rows)
+                await _copy(connection, "accounts",
+                            ["user_id", "account_name", "institution", "type", "account_category"], account_rows)
+            counts["users"] += len(user_rows)
+            counts["accounts"] += len(account_rows)
+
+            account_ids = await database.fetch_all(
+                "SELECT id, user_id, account_category FROM accounts WHERE user_id = ANY(:ids) ORDER BY id",
+                {"ids": batch_ids}
+            )
+
+            position_rows, crypto_rows, cash_rows, snapshot_rows = [], [], [], []
+            for account in account_ids:
+                account_id, user_id, category = account["id"], account["user_id"], account["account_category"]
+                if category == "brokerage":
+                    picks = np_rng.choice(len(universe), size=rng.randint(3, 25), replace=False, p=popularity)
+                    for index in picks:
+                        security = universe[index]
+                        bought = rng.randint(0, len(history_dates) - 1)
+                        cost = float(paths[index, bought])
+                        shares = round(rng.lognormvariate(3, 1.2), 3)
+                        position_rows.append((account_id, security["ticker"], shares, security["price"], cost,
+                                              history_dates[bought], now))
+                        for offset, day in enumerate(snapshot_dates):
+                            price = float(paths[index, snapshot_offset + offset])
+                            snapshot_rows.append((user_id, day, account_id, "security", security["ticker"],
+                                                  security["company_name"], security["sector"], shares, price,
+                                                  shares * price, shares * cost, shares * (price - cost),
+                                                  shares * price * security["dividend_yield"]))
+                elif category == "cash":
+                    for cash_type, rate in rng.sample(CASH_TYPES, rng.randint(1, 2)):
+                        amount = round(rng.lognormvariate(9, 1.1), 2)
+                        cash_rows.append((account_id, cash_type, f"{cash_type} Account", amount, rate, "annually",
+                                          None, None, now, now))
+                        for day in snapshot_dates:
+                            snapshot_rows.append((user_id, day, account_id, "cash", cash_type, f"{cash_type} Account",
+                                                  None, amount, 1.0, amount, amount, 0.0, amount * rate))
+                else:
+                    for symbol, name, price in rng.sample(COINS, rng.randint(1, 3)):
+                        quantity = round(rng.lognormvariate(0, 1.5) * (1000 / price), 6)
+                        purchase_price = round(price * rng.uniform(0.4, 1.3), 4)
+                        crypto_rows.append((account_id, name, symbol, quantity, purchase_price, price,
+                                            history_dates[rng.randint(0, len(history_dates) - 1)],
+                                            rng.choice(["Exchange", "Hardware Wallet"]), None, [], False, now, now))
+                        for day in snapshot_dates:
+                            snapshot_rows.append((user_id, day, account_id, "crypto", symbol, name, None, quantity,
+                                                  price, quantity * price, quantity * purchase_price,
+                                                  quantity * (price - purchase_price), 0.0))
+
+            async with database.connection() as connection:
+                await _copy(connection, "positions",
+                            ["account_id", "ticker", "shares", "price", "cost_basis", "purchase_date", "date"],
+                            position_rows)
+                await _copy(connection, "crypto_positions",
+                            ["account_id", "coin_type", "coin_symbol", "quantity", "purchase_price", "current_price",
+                             "purchase_date", "storage_type", "notes", "tags", "is_favorite", "created_at",
+                             "updated_at"], crypto_rows)
+                await _copy(connection, "cash_positions",
+                            ["account_id", "cash_type", "name", "amount", "interest_rate", "interest_period",
+                             "maturity_date", "notes", "created_at", "updated_at"], cash_rows)
+                await _copy(connection, "portfolio_daily_snapshots",
+                            ["user_id", "snapshot_date", "account_id", "asset_type", "identifier", "name", "sector",
+                             "quantity", "current_price", "current_value", "total_cost_basis", "unrealized_gain",
+                             "position_income"], snapshot_rows)
+            counts["positions"] += len(position_rows)
+            counts["crypto_positions"] += len(crypto_rows)
+            counts["cash_positions"] += len(cash_rows)
+            counts["portfolio_daily_snapshots"] += len(snapshot_rows)
+
+        timings["portfolios_seconds"] = time.perf_counter() - phase
+        await database.execute("ANALYZE")
+
+    return {
+        "benchmark": "synthetic_data",
+        "config": {"users": users, "tickers": tickers, "history_days": history_days,
+                   "snapshot_days": snapshot_days, "seed": seed},
+        "rows": counts,
+        "timings": timings,
+        "duration_seconds": time.perf_counter() - started,
+    }
+
+
+async def dataset_summary(database) -> Dict[str, Optional[int]]:
+    """Row counts of the benchmark dataset, recorded alongside scenario results"""
+    values = {"prefix": f"{USER_PREFIX}%"}
+    return {
+        "users": await database.fetch_val("SELECT COUNT(*) FROM users WHERE id LIKE :prefix", values),
+        "accounts": await database.fetch_val("SELECT COUNT(*) FROM accounts WHERE user_id LIKE :prefix", values),
+        "positions": await database.fetch_val(
+            "SELECT COUNT(*) FROM positions WHERE account_id IN "
+            "(SELECT id FROM accounts WHERE user_id LIKE :prefix)", values),
+        "securities": await database.fetch_val(
+            "SELECT COUNT(*) FROM securities WHERE ticker_source = :source", {"source": TICKER_SOURCE}),
+        "portfolio_daily_snapshots": await database.fetch_val(
+            "SELECT COUNT(*) FROM portfolio_daily_snapshots WHERE user_id LIKE :prefix", values),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a local Postgres with a synthetic NestEgg dataset")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users (1k to 100k)")
+    parser.add_argument("--tickers", type=int, default=2000, help="Size of the securities universe")
+    parser.add_argument("--history-days", type=int, default=260, help="Trading days of price history")
+    parser.add_argument("--snapshot-days", type=int, default=30, help="Trading days of daily snapshots")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--reset", action="store_true", help="Remove the previous benchmark dataset first")
+    parser.add_argument("--reset-only", action="store_true", help="Remove the benchmark dataset and exit")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="Allow a DATABASE_URL that isn't a local or test database")
+
+    args = parser.parse_args()
+    if args.reset_only:
+        async def _reset_only():
+            async with database_lifespan() as database:
+                return await reset(database, args.allow_remote)
+        print(json.dumps(asyncio.run(_reset_only()), indent=2))
+    else:
+        result = asyncio.run(generate(args.users, args.tickers, args.history_days, args.snapshot_days,
+                                      args.seed, args.reset, args.allow_remote))
+        print(json.dumps(result, indent=2, default=str))
@@ -1,12 +1,255 @@
 # backend/core_db.py
+"""
+Shared database pool for the whole process.
+
+Every module (API routes, scheduler jobs, services) uses the one `database`
+pool defined here. Connect and disconnect are owned by `database_lifespan()`,
+which the FastAPI app and the scheduler wrap around their run; job code never
+opens or closes the pool itself.
+
+Modules get a named handle with `get_database("<consumer>")` so pool
+acquisition wait and query time can be broken down per consumer.
+"""
 import os
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
 import databases
 import sqlalchemy
+from dotenv import load_dotenv
+
+from backend.utils.query_stats import record_query
+
+load_dotenv()
+
+logger = logging.getLogger("core_db")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-database = databases.Database(DATABASE_URL, statement_cache_size=0)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_HEALTH_CHECK_SECONDS = int(os.getenv("DB_HEALTH_CHECK_SECONDS", "60"))
+
+database = databases.Database(
+    DATABASE_URL,
+    statement_cache_size=0,  # Disable statement caching for PgBouncer compatibility
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+)
 metadata = sqlalchemy.MetaData()
 
+
+def run_on_own_connection(coro) -> asyncio.Task:
+    """
+    Schedule a coroutine in an empty context.
+
+    `databases` binds its connection to the current context, so tasks spawned
+    from a context that already used the database would share (and serialize
+    on) that one connection. Starting from an empty context gives each task
+    its own pooled connection.
+    """
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+class DatabaseConsumer:
+    """
+    Named handle on the shared pool.
+
+    Query methods acquire a connection from `database` exactly as
+    `databases.Database` does, timing the acquisition and the query
+    separately, and report each statement to utils.query_stats. Everything
+    else (transaction(), connection(), is_connected, ...) is delegated to the
+    shared pool.
+    """
+
+    def __init__(self, name: str, pool: databases.Database):
+        self.name = name
+        self._database = pool
+        self.stats: Dict[str, Any] = {
+            "calls": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "acquire_seconds": 0.0,
+            "max_acquire_seconds": 0.0,
+            "query_seconds": 0.0,
+        }
+
+    def __getattr__(self, item):
+        return getattr(self._database, item)
+
+    async def connect(self):
+        """Connect the shared pool if nothing has yet (standalone scripts)"""
+        await connect_database()
+
+    async def _run(self, method: str, query, values=None, **kwargs):
+        stats = self.stats
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        started = time.perf_counter()
+        acquired = None
+        result = None
+        failed = False
+        try:
+            async with self._database.connection() as connection:
+                acquired = time.perf_counter()
+                wait = acquired - started
+                stats["acquire_seconds"] += wait
+                stats["max_acquire_seconds"] = max(stats["max_acquire_seconds"], wait)
+                result = await getattr(connection, method)(query, values, **kwargs)
+                return result
+        except Exception:
+            stats["errors"] += 1
+            failed = True
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            stats["calls"] += 1
+            if acquired is not None:
+                elapsed = time.perf_counter() - acquired
+                stats["query_seconds"] += elapsed
+                record_query(query, values, elapsed * 1000, _row_count(method, result, values), self.name, failed)
+
+    async def fetch_all(self, query, values: Optional[dict] = None):
+        return await self._run("fetch_all", query, values)
+
+    async def fetch_one(self, query, values: Optional[dict] = None):
+        return await self._run("fetch_one", query, values)
+
+    async def fetch_val(self, query, values: Optional[dict] = None, column: Any = 0):
+        return await self._run("fetch_val", query, values, column=column)
+
+    async def execute(self, query, values: Optional[dict] = None):
+        return await self._run("execute", query, values)
+
+    async def execute_many(self, query, values: list):
+        return await self._run("execute_many", query, values)
+
+    async def iterate(self, query, values: Optional[dict] = None):
+        self.stats["calls"] += 1
+        started = time.perf_counter()
+        rows = 0
+        try:
+            async with self._database.connection() as connection:
+                async for record in connection.iterate(query, values):
+                    rows += 1
+                    yield record
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats["query_seconds"] += elapsed
+            record_query(query, values, elapsed * 1000, rows, self.name)
+
+
+def _row_count(method: str, result: Any, values: Any) -> Optional[int]:
+    """Rows returned (fetch_*) or parameter sets executed (execute_many)"""
+    if method == "fetch_all":
+        return len(result) if result is not None else 0
+    if method in ("fetch_one", "fetch_val"):
+        return 0 if result is None else 1
+    if method == "execute_many":
+        return len(values) if values else 0
+    return None
+
+
+_consumers: Dict[str, DatabaseConsumer] = {}
+
+
+def get_database(consumer: str) -> DatabaseConsumer:
+    """Handle on the shared pool whose usage is reported under `consumer`"""
+    if consumer not in _consumers:
+        _consumers[consumer] = DatabaseConsumer(consumer, database)
+    return _consumers[consumer]
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Current size of the underlying asyncpg pool"""
+    pool = getattr(database._backend, "_pool", None)
+    if not database.is_connected or pool is None:
+        return {"connected": False, "min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE}
+    return {
+        "connected": True,
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "in_use": pool.get_size() - pool.get_idle_size(),
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+    }
+
+
+def consumer_stats() -> Dict[str, Dict[str, Any]]:
+    """Acquisition and query timings per consumer"""
+    return {name: dict(consumer.stats) for name, consumer in _consumers.items()}
+
+
+_last_health: Dict[str, Any] = {}
+
+
+async def check_database_health(timeout: float = 5.0) -> Dict[str, Any]:
+    """
+    Round-trip a trivial query through the pool
+
+    Returns:
+        Status, latency, pool size and per-consumer metrics
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        if not database.is_connected:
+            raise RuntimeError("database pool is not connected")
+        await asyncio.wait_for(database.fetch_val("SELECT 1"), timeout)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+
+    _last_health.update({
+        "status": "error" if error else "ok",
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "checked_at": time.time(),
+    })
+    return {**_last_health, "pool": pool_stats(), "consumers": consumer_stats()}
+
+
+async def _health_check_loop():
+    while True:
+        await asyncio.sleep(DB_HEALTH_CHECK_SECONDS)
+        result = await check_database_health()
+        if result["status"] != "ok":
+            logger.warning(f"Database health check failed: {result['error']}")
+
+
+async def connect_database():
+    """Open the shared pool (idempotent)"""
+    if not database.is_connected:
+        await database.connect()
+        logger.info(f"Database pool connected (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+
+
+async def disconnect_database():
+    """Flush queued system events, then close the shared pool"""
+    from backend.utils.common import flush_system_events
+
+    await flush_system_events()
+    if database.is_connected:
+        await database.disconnect()
+        logger.info("Database pool disconnected")
+
+
+@asynccontextmanager
+async def database_lifespan():
+    """Own the shared pool for the lifetime of the app or scheduler process"""
+    await connect_database()
+    health_task = run_on_own_connection(_health_check_loop()) if DB_HEALTH_CHECK_SECONDS > 0 else None
+    try:
+        yield database
+    finally:
+        if health_task:
+            health_task.cancel()
+        await disconnect_database()
+
+
 users = sqlalchemy.Table(
     "users", metadata,
     sqlalchemy.Column("id", sqlalchemy.String, primary_key=True),
@@ -9,6 +9,7 @@ import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from contextlib import asynccontextmanager
 from typing import Optional, List, Any
 from datetime import date
 from typing import Dict, Optional
@@ -27,7 +28,7 @@ import statistics
 import sqlalchemy
 from decimal import Decimal
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, APIRouter, status, Query, File, UploadFile, Form, Response, BackgroundTasks, Request, Body
+from fastapi import FastAPI, Depends, HTTPException, APIRouter, status, Query, File, UploadFile, Form, Response, BackgroundTasks, Request, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
@@ -38,8 +39,6 @@ from sqlalchemy import func, case, literal_column
 from sqlalchemy.sql import select, join, text # Ensure text is imported
 from sqlalchemy import Table, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, MetaData, select, Date, Text, and_, or_, desc, asc, update, delete
 
-# excel
-from backend.services.excel_templates import ExcelTemplateService
 from backend.utils.constants import (
     INSTITUTION_LIST, 
     ACCOUNT_TYPES, 
@@ -51,7 +50,6 @@ from backend.utils.constants import (
     PROPERTY_TYPES
 )
 from fastapi.responses import StreamingResponse
-import io
 
 # Load environment variables first
 env_path = Path(__file__).resolve().parent / ".env"
@@ -69,28 +67,52 @@ if str(BASE_DIR) not in sys.path:
 
 
 # Local application imports
-from backend.services.price_updater_v2 import PriceUpdaterV2
-from backend.services.data_consistency_monitor import DataConsistencyMonitor
-from backend.services.portfolio_calculator import PortfolioCalculator
-from backend.utils.common import record_system_event, update_system_event
-from backend.api_clients.market_data_manager import MarketDataManager
-from backend.api_clients.yahoo_data import Yahoo_Data
-from backend.api_clients.yahoo_finance_client import YahooFinanceClient
-from backend.api_clients.yahooquery_client import YahooQueryClient
-from backend.api_clients.direct_yahoo_client import DirectYahooFinanceClient
-from backend.api_clients.polygon_client import PolygonClient
+from backend.utils.common import record_system_event, update_system_event, lazy_import, json_serializer
 from backend.auth_clerk import router as auth_router
-from backend.core_db import database, users
-from backend.webhooks_clerk import router as clerk_webhook_router
-from backend.api_clients.alphavantage_client import AlphaVantageClient
+from backend.core_db import get_database, database_lifespan, check_database_health, users, run_on_own_connection
+from backend.utils.query_stats import QueryStats, RequestScopeMiddleware, SLOW_QUERY_MS
+from backend.utils.metrics import MetricsMiddleware, render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_TOKEN
+from backend.utils.request_coalescing import RequestCoalescingMiddleware
+from backend.services.security_search import SecuritySearchIndex
+from backend.services.metrics_ingest import MetricsIngestPipeline, UPDATE, DISABLE
+from backend.services.refresh_planner import RefreshPlanner
+from backend.services.security_statistics import get_security_statistics as load_security_statistics, invalidate_security_statistics
+from backend.services.ticker_refresh import TickerRefreshPipeline, normalize_tickers, TICKER_REFRESH_MAX_TICKERS
+from backend.utils.market_calendar import MarketCalendar
+from backend.services.live_updates import LiveUpdateHub, LIVE_UPDATES_ENABLED, notify_price_changes
+from backend.services.price_map import PriceMap, metal_ticker, metal_price_per_unit
+from backend.services.bulk_reconciliation import reconcile_account_positions
+from backend.services.datastore_projection import build_projection, ProjectionError, COLUMNAR_FORMAT
+from backend.webhooks_clerk import router as clerk_webhook_router, ClerkWebhookQueue
+
+# Heavy services and market-data clients (pandas, yfinance, yahooquery, openpyxl,
+# aiohttp, ...) are imported on first use to keep cold starts fast.
+# Profile with: python -m backend.benchmarks.startup_profile
+ExcelTemplateService = lazy_import("backend.services.excel_templates", "ExcelTemplateService")
+iter_workbook_chunks = lazy_import("backend.services.excel_templates", "iter_workbook_chunks")
+BulkImporter = lazy_import("backend.services.bulk_importer", "BulkImporter")
+PriceUpdaterV2 = lazy_import("backend.services.price_updater_v2", "PriceUpdaterV2")
+DataConsistencyMonitor = lazy_import("backend.services.data_consistency_monitor", "DataConsistencyMonitor")
+PortfolioCalculator = lazy_import("backend.services.portfolio_calculator", "PortfolioCalculator")
+PerformanceEngine = lazy_import("backend.services.performance_engine", "PerformanceEngine")
+MarketDataManager = lazy_import("backend.api_clients.market_data_manager", "MarketDataManager")
+Yahoo_Data = lazy_import("backend.api_clients.yahoo_data", "Yahoo_Data")
+YahooFinanceClient = lazy_import("backend.api_clients.yahoo_finance_client", "YahooFinanceClient")
+YahooQueryClient = lazy_import("backend.api_clients.yahooquery_client", "YahooQueryClient")
+DirectYahooFinanceClient = lazy_import("backend.api_clients.direct_yahoo_client", "DirectYahooFinanceClient")
+PolygonClient = lazy_import("backend.api_clients.polygon_client", "PolygonClient")
+AlphaVantageClient = lazy_import("backend.api_clients.alphavantage_client", "AlphaVantageClient")
+
+LAZY_MODULES = [
+    ExcelTemplateService, BulkImporter, PriceUpdaterV2, DataConsistencyMonitor, PortfolioCalculator,
+    PerformanceEngine, MarketDataManager, Yahoo_Data, YahooFinanceClient, YahooQueryClient, DirectYahooFinanceClient,
+    PolygonClient, AlphaVantageClient,
+]
 
 
 
-# Initialize Database Connection
-# database = databases.Database(
-#    DATABASE_URL,
-#    statement_cache_size=0  # Disable statement caching for PgBouncer compatibility
-# )
+# Shared database pool (see backend/core_db.py); connected by the app lifespan
+database = get_database("api")
 
 metadata = sqlalchemy.MetaData()
 
@@ -265,13 +287,32 @@ position_reconciliations = Table(
     Column("created_at", DateTime, default=datetime.utcnow),
 )
 
-# Create Database Engine
-engine = sqlalchemy.create_engine(DATABASE_URL)
-metadata.create_all(engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Own the shared database pool for the lifetime of the app, and the Clerk
+    webhook worker that drains the durable event queue while it is open.
+    The price map is loaded here and kept current by the live update listener.
+    Schema creation is not done here: run `python -m backend.migrations.create_tables`.
+    """
+    async with database_lifespan():
+        webhook_queue = ClerkWebhookQueue.get_instance()
+        webhook_queue.start()
+        try:
+            await PriceMap.get_instance().load(database)
+        except Exception as e:
+            # Valuation helpers retry the load on first use
+            logger.error(f"Initial price map load failed: {str(e)}")
+        LiveUpdateHub.get_instance().start()
+        try:
+            yield
+        finally:
+            await LiveUpdateHub.get_instance().stop()
+            await webhook_queue.stop()
 
 
 # Initialize FastAPI App
-app = FastAPI(title="NestEgg API", description="Investment portfolio tracking API")
+app = FastAPI(title="NestEgg API", description="Investment portfolio tracking API", lifespan=lifespan)
 
 
 
@@ -283,6 +324,16 @@ allowed_origins = [
     "http://127.0.0.1:3000",            # Alternative localhost address
 ]
 
+# Identical concurrent reporting GETs share one run (see utils/request_coalescing.py).
+# Innermost, so metrics and CORS still see every request individually.
+app.add_middleware(RequestCoalescingMiddleware)
+
+# Attribute database queries to the route that issued them (see utils/query_stats.py)
+app.add_middleware(RequestScopeMiddleware)
+
+# Per-route latency histograms and in-flight gauge for GET /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Enable CORS (Allow Frontend to Connect)
 app.add_middleware(
     CORSMiddleware,
@@ -543,6 +594,9 @@ class SecurityUpdate(BaseModel):
     update_type: str  # Can be 'metrics', 'current_price', or 'history'
     days: Optional[int] = None
 
+class TickerRefreshRequest(BaseModel):
+    tickers: List[str]
+
 class UserProfileResponse(BaseModel):
     id: str
     email: str
@@ -963,16 +1017,19 @@ async def _get_detailed_securities(user_id: str) -> List[PositionDetail]:
         ).where(accounts.c.user_id == user_id)
 
         results = await database.fetch_all(query)
+        price_map = PriceMap.get_instance()
+        await price_map.ensure_loaded(database)
         positions_list = []
         for row in results:
             row_dict = dict(row)
-            value = float(row_dict.get("shares", 0)) * float(row_dict.get("price", 0))
+            price = price_map.price(row_dict["ticker"], float(row_dict.get("price") or 0))
+            value = float(row_dict.get("shares") or 0) * price
             cost_basis_val = row_dict.get("cost_basis")
             if cost_basis_val is None: cost_basis_val = row_dict.get("price")
 
             positions_list.append(PositionDetail(
                 id=row_dict["id"], account_id=row_dict["account_id"], ticker=row_dict["ticker"],
-                shares=float(row_dict.get("shares") or 0), price=float(row_dict.get("price") or 0),
+                shares=float(row_dict.get("shares") or 0), price=price,
                 cost_basis=float(cost_basis_val or 0), purchase_date=row_dict.get("purchase_date"),
                 date=row_dict.get("date"), account_name=row_dict["account_name"], value=float(value or 0)
             ))
@@ -988,12 +1045,14 @@ async def _get_detailed_crypto(user_id: str) -> List[CryptoPositionDetail]:
         JOIN accounts a ON cp.account_id = a.id WHERE a.user_id = :user_id
         """
         results = await database.fetch_all(query=query, values={"user_id": user_id})
+        price_map = PriceMap.get_instance()
+        await price_map.ensure_loaded(database)
         crypto_list = []
         for row in results:
             row_dict = dict(row)
-            quantity = float(row_dict.get("quantity", 0))
-            current_price = float(row_dict.get("current_price", 0))
-            purchase_price = float(row_dict.get("purchase_price", 0))
+            quantity = float(row_dict.get("quantity") or 0)
+            current_price = price_map.price(row_dict.get("coin_symbol"), float(row_dict.get("current_price") or 0))
+            purchase_price = float(row_dict.get("purchase_price") or 0)
             total_value = quantity * current_price
             gain_loss = total_value - (quantity * purchase_price)
             gain_loss_percent = ((current_price / purchase_price) - 1) * 100 if purchase_price > 0 else 0
@@ -1024,14 +1083,19 @@ async def _get_detailed_metals(user_id: str) -> List[MetalPositionDetail]:
         JOIN accounts a ON mp.account_id = a.id WHERE a.user_id = :user_id
         """
         results = await database.fetch_all(query=query, values={"user_id": user_id})
+        price_map = PriceMap.get_instance()
+        await price_map.ensure_loaded(database)
         metals_list = []
         for row in results:
             row_dict = dict(row)
-            quantity = float(row_dict.get("quantity", 0))
-            purchase_price = float(row_dict.get("purchase_price", 0))
-            cost_basis_per_unit = float(row_dict.get("cost_basis", purchase_price))
-            # TODO: Fetch actual current price per unit for metals
-            current_price_per_unit = purchase_price # Placeholder
+            quantity = float(row_dict.get("quantity") or 0)
+            purchase_price = float(row_dict.get("purchase_price") or 0)
+            cost_basis_per_unit = float(row_dict.get("cost_basis") or purchase_price)
+            # Futures quote converted to the position's unit; purchase price when it can't be priced
+            ticker = metal_ticker(row_dict.get("metal_type"), row_dict.get("coin_symbol"))
+            current_price_per_unit = metal_price_per_unit(price_map.price(ticker), ticker, row_dict.get("unit")) if ticker else None
+            if current_price_per_unit is None:
+                current_price_per_unit = purchase_price
             total_value = quantity * current_price_per_unit
             total_cost = quantity * cost_basis_per_unit
             gain_loss = total_value - total_cost
@@ -1129,14 +1193,6 @@ async def _get_detailed_cash(user_id: str) -> List[CashPositionDetail]:
 async def read_root():
     return {"message": "Welcome to NestEgg API!", "version": "1.0.0"}
 
-@app.on_event("startup")
-async def startup():
-    await database.connect()
-
-@app.on_event("shutdown")
-async def shutdown():
-    await database.disconnect()
-
 # ----- USER MANAGEMENT  -----
 # User Management
 @app.get("/users")
@@ -2069,11 +2125,15 @@ async def get_unified_positions(
 
 # -- SCHEDULED AUTO RUNS 
 @app.post("/market/update-all-securities-prices")
-async def update_all_securities_prices():
+async def update_all_securities_prices(full: bool = False):
     """
-    Update current price data for all active tickers in the securities table
+    Update current price data for active tickers in the securities table
     using DirectYahooFinanceClient.
     
+    By default only the tickers the RefreshPlanner routes to Yahoo this cycle
+    are refreshed (held tickers every run, others hourly/daily); full=true
+    refreshes every active ticker whose price requires updating.
+    
     This endpoint returns immediately with the count of securities to be updated,
     while the actual update process continues in the background.
     """
@@ -2086,11 +2146,14 @@ async def update_all_securities_prices():
             {"description": "Starting price update for active securities"}
         )
         
-        # Fetch all tickers from the securities table
-        logger.info("Fetching active securities from the database")
-        query = "SELECT ticker FROM security_usage WHERE status = 'Active' AND price_status = 'Requires Updating' AND on_yfinance IS DISTINCT FROM FALSE ORDER BY last_updated ASC"
-
-        results = await database.fetch_all(query)
+        if full:
+            # Fetch all tickers from the securities table
+            logger.info("Fetching active securities from the database")
+            query = "SELECT ticker FROM security_usage WHERE status = 'Active' AND price_status = 'Requires Updating' AND on_yfinance IS DISTINCT FROM FALSE ORDER BY last_updated ASC"
+            results = [row['ticker'] for row in await database.fetch_all(query)]
+        else:
+            plan = await RefreshPlanner.get_instance().plan(database)
+            results = plan["work"].get("yahoo", [])
         
         if not results:
             message = "No active securities found in the database"
@@ -2110,8 +2173,7 @@ async def update_all_securities_prices():
                 "updated_count": 0
             }
         
-        # Extract tickers from results
-        ticker_list = [row['ticker'] for row in results]
+        ticker_list = results
         ticker_count = len(ticker_list)
         logger.info(f"Found {ticker_count} active securities to update")
         
@@ -2295,6 +2357,8 @@ async def process_price_updates(ticker_list: list, event_id):
             },
         )
 
+        invalidate_security_statistics()
+        await notify_price_changes(database, success_tickers)
         logger.info(
             f"Background price update completed: {updated_count}/{ticker_count} tickers updated "
             f"({len(failed_tickers)} disabled: on_yfinance=FALSE)"
@@ -2370,7 +2434,8 @@ async def update_all_securities_metrics():
         logger.info(f"Found {ticker_count} active securities to update metrics")
         
         # Create the background task to handle the actual metrics updates
-        asyncio.create_task(process_metrics_updates(ticker_list, event_id))
+        # Own connection: the request's connection is released when it returns
+        run_on_own_connection(process_metrics_updates(ticker_list, event_id))
         
         # Return immediately with the initial response
         return {
@@ -2405,145 +2470,135 @@ async def update_all_securities_metrics():
 
 # Define the background task function for metrics updates
 async def process_metrics_updates(ticker_list: list, event_id):
-    """Process company metrics updates for the given tickers in the background."""
+    """
+    Process company metrics updates for the given tickers in the background.
+
+    Fetches run concurrently through MetricsIngestPipeline; updates and
+    on_yfinance disables are written in chunks.
+    """
     ticker_count = len(ticker_list)
-    success_count = 0
-    failed_count = 0
 
-    # Helper: mark a ticker so we don't re-fetch from yfinance again
-    async def _disable_yf(ticker: str, reason: str):
-        try:
-            await database.execute(
-                """
-                UPDATE securities
-                   SET on_yfinance = FALSE,
-                       last_updated = (NOW() AT TIME ZONE 'UTC')
-                 WHERE ticker = :ticker
-                """,
-                {"ticker": ticker},
+    metric_keys = (
+        "company_name", "current_price", "sector", "industry",
+        "market_cap", "pe_ratio", "forward_pe", "dividend_rate",
+        "dividend_yield", "beta", "fifty_two_week_low",
+        "fifty_two_week_high", "eps", "forward_eps"
+    )
+
+    def _nn(v):
+        if v is None: return None
+        if isinstance(v, str) and v.strip() == "": return None
+        if isinstance(v, float) and v != v: return None  # NaN is not valid JSON for Postgres
+        return v
+
+    def _parse(ticker: str, metrics):
+        # Hard-shape guard: non-dict or explicit not_found → disable
+        if isinstance(metrics, str):
+            return DISABLE, "metrics is string (invalid payload)"
+        if not isinstance(metrics, dict):
+            return DISABLE, f"metrics type={type(metrics).__name__} not dict"
+        if metrics.get("not_found"):
+            return DISABLE, "not_found flag from client"
+
+        # Soft guard: no usable fields -> disable (prevents infinite retries)
+        if not any(metrics.get(k) is not None for k in metric_keys):
+            return DISABLE, "no usable metrics fields present"
+
+        # --- Build update payload ---
+        fifty_two_week_range = None
+        if metrics.get("fifty_two_week_low") is not None and metrics.get("fifty_two_week_high") is not None:
+            fifty_two_week_range = f"{metrics['fifty_two_week_low']}-{metrics['fifty_two_week_high']}"
+
+        row = {k: _nn(metrics.get(k)) for k in metric_keys}
+        row.update({
+            "ticker": ticker,
+            "fifty_two_week_range": fifty_two_week_range,
+            # Prefer vendor time if present (else leave None and SQL will handle)
+            "price_timestamp": metrics.get("price_timestamp"),
+        })
+        return UPDATE, row
+
+    async def _write_updates(rows):
+        await database.execute(
+            """
+            UPDATE securities s
+            SET company_name         = COALESCE(r.company_name, s.company_name),
+                current_price        = COALESCE(r.current_price, s.current_price),
+                sector               = COALESCE(r.sector, s.sector),
+                industry             = COALESCE(r.industry, s.industry),
+                market_cap           = COALESCE(r.market_cap, s.market_cap),
+                pe_ratio             = COALESCE(r.pe_ratio, s.pe_ratio),
+                forward_pe           = COALESCE(r.forward_pe, s.forward_pe),
+                dividend_rate        = COALESCE(r.dividend_rate, s.dividend_rate),
+                dividend_yield       = COALESCE(r.dividend_yield, s.dividend_yield),
+                beta                 = COALESCE(r.beta, s.beta),
+                fifty_two_week_low   = COALESCE(r.fifty_two_week_low, s.fifty_two_week_low),
+                fifty_two_week_high  = COALESCE(r.fifty_two_week_high, s.fifty_two_week_high),
+                fifty_two_week_range = COALESCE(r.fifty_two_week_range, s.fifty_two_week_range),
+                eps                  = COALESCE(r.eps, s.eps),
+                forward_eps          = COALESCE(r.forward_eps, s.forward_eps),
+
+                -- lineage and freshness
+                metrics_source       = 'yahoo_query',
+
+                -- Only bump price_timestamp when we actually have a price in this payload.
+                -- Prefer vendor timestamp; else use NOW(); otherwise keep existing.
+                price_timestamp = COALESCE(
+                    r.price_timestamp,
+                    CASE WHEN r.current_price IS NOT NULL THEN (NOW() AT TIME ZONE 'UTC') ELSE s.price_timestamp END
+                ),
+
+                last_metrics_update  = (NOW() AT TIME ZONE 'UTC'),
+                last_updated         = (NOW() AT TIME ZONE 'UTC'),
+                on_yfinance          = TRUE
+            FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+                ticker text,
+                company_name text,
+                current_price numeric,
+                sector text,
+                industry text,
+                market_cap numeric,
+                pe_ratio numeric,
+                forward_pe numeric,
+                dividend_rate numeric,
+                dividend_yield numeric,
+                beta numeric,
+                fifty_two_week_low numeric,
+                fifty_two_week_high numeric,
+                fifty_two_week_range text,
+                eps numeric,
+                forward_eps numeric,
+                price_timestamp timestamp
             )
+            WHERE s.ticker = r.ticker
+            """,
+            {"rows": json.dumps(rows, default=json_serializer)},
+        )
+
+    # Mark tickers so we don't re-fetch them from yfinance again
+    async def _write_disables(items):
+        await database.execute(
+            """
+            UPDATE securities
+               SET on_yfinance = FALSE,
+                   last_updated = (NOW() AT TIME ZONE 'UTC')
+             WHERE ticker = ANY(:tickers)
+            """,
+            {"tickers": [ticker for ticker, _ in items]},
+        )
+        for ticker, reason in items:
             logger.warning(f"[yq] Disabled on_yfinance for {ticker}: {reason}")
-        except Exception as e:
-            logger.error(f"[yq] Failed to disable on_yfinance for {ticker}: {e}")
 
     try:
         # Initialize YahooQueryClient
         client = YahooQueryClient()
 
-        # Process each ticker
-        for ticker in ticker_list:
-            try:
-                logger.info(f"Fetching company metrics for {ticker}")
-                metrics = await client.get_company_metrics(ticker)
-
-                # Hard-shape guard: non-dict or explicit not_found → disable
-                if isinstance(metrics, str):
-                    failed_count += 1
-                    await _disable_yf(ticker, "metrics is string (invalid payload)")
-                    continue
-
-                if not isinstance(metrics, dict):
-                    failed_count += 1
-                    await _disable_yf(ticker, f"metrics type={type(metrics).__name__} not dict")
-                    continue
-
-                if metrics.get("not_found"):
-                    failed_count += 1
-                    await _disable_yf(ticker, "not_found flag from client")
-                    continue
-
-                # Soft guard: no usable fields -> disable (prevents infinite retries)
-                has_any_value = any(
-                    metrics.get(k) is not None
-                    for k in (
-                        "company_name", "current_price", "sector", "industry",
-                        "market_cap", "pe_ratio", "forward_pe", "dividend_rate",
-                        "dividend_yield", "beta", "fifty_two_week_low",
-                        "fifty_two_week_high", "eps", "forward_eps"
-                    )
-                )
-                if not has_any_value:
-                    failed_count += 1
-                    await _disable_yf(ticker, "no usable metrics fields present")
-                    continue
-
-                # --- Build update payload ---
-                fifty_two_week_range = None
-                if metrics.get("fifty_two_week_low") is not None and metrics.get("fifty_two_week_high") is not None:
-                    fifty_two_week_range = f"{metrics['fifty_two_week_low']}-{metrics['fifty_two_week_high']}"
-
-                def _nn(v):
-                    if v is None: return None
-                    if isinstance(v, str) and v.strip() == "": return None
-                    return v
-
-                # Prefer vendor time if present (else leave None and SQL will handle)
-                price_ts = metrics.get("price_timestamp")  # set this in get_company_metrics from regularMarketTime if available
-
-                update_values = {
-                    "ticker": ticker,
-                    "company_name": _nn(metrics.get("company_name")),
-                    "current_price": metrics.get("current_price"),
-                    "sector": _nn(metrics.get("sector")),
-                    "industry": _nn(metrics.get("industry")),
-                    "market_cap": metrics.get("market_cap"),
-                    "pe_ratio": metrics.get("pe_ratio"),
-                    "forward_pe": metrics.get("forward_pe"),
-                    "dividend_rate": metrics.get("dividend_rate"),
-                    "dividend_yield": metrics.get("dividend_yield"),
-                    "beta": metrics.get("beta"),
-                    "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                    "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                    "fifty_two_week_range": fifty_two_week_range,
-                    "eps": metrics.get("eps"),
-                    "forward_eps": metrics.get("forward_eps"),
-
-                    "metrics_source": "yahoo_query",
-                    "price_timestamp": price_ts,  # may be None
-                }
-
-                update_query = """
-                UPDATE securities
-                SET company_name         = COALESCE(NULLIF(:company_name, ''), company_name),
-                    current_price        = COALESCE(:current_price, current_price),
-                    sector               = COALESCE(NULLIF(:sector, ''), sector),
-                    industry             = COALESCE(NULLIF(:industry, ''), industry),
-                    market_cap           = COALESCE(:market_cap, market_cap),
-                    pe_ratio             = COALESCE(:pe_ratio, pe_ratio),
-                    forward_pe           = COALESCE(:forward_pe, forward_pe),
-                    dividend_rate        = COALESCE(:dividend_rate, dividend_rate),
-                    dividend_yield       = COALESCE(:dividend_yield, dividend_yield),
-                    beta                 = COALESCE(:beta, beta),
-                    fifty_two_week_low   = COALESCE(:fifty_two_week_low, fifty_two_week_low),
-                    fifty_two_week_high  = COALESCE(:fifty_two_week_high, fifty_two_week_high),
-                    fifty_two_week_range = COALESCE(NULLIF(:fifty_two_week_range, ''), fifty_two_week_range),
-                    eps                  = COALESCE(:eps, eps),
-                    forward_eps          = COALESCE(:forward_eps, forward_eps),
-
-                    -- lineage and freshness
-                    metrics_source       = :metrics_source,
-
-                    -- Only bump price_timestamp when we actually have a price in this payload.
-                    -- Prefer vendor timestamp; else use NOW(); otherwise keep existing.
-                    price_timestamp = COALESCE(
-                        :price_timestamp,
-                        CASE WHEN :current_price IS NOT NULL THEN (NOW() AT TIME ZONE 'UTC') ELSE price_timestamp END
-                    ),
-
-                    last_metrics_update  = (NOW() AT TIME ZONE 'UTC'),
-                    last_updated         = (NOW() AT TIME ZONE 'UTC'),
-                    on_yfinance          = TRUE
-                WHERE ticker = :ticker
-                """
-                await database.execute(update_query, update_values)
-                success_count += 1
-
-            except Exception as e:
-                logger.error(f"Error updating metrics for {ticker}: {e}")
-                failed_count += 1
-                # Be conservative: only disable on clear parsing/no-data cases above.
-                # If you want ALL exceptions to disable, uncomment the next line:
-                # await _disable_yf(ticker, f"exception during update: {e}")
+        pipeline = MetricsIngestPipeline(client.get_company_metrics, _parse, _write_updates, _write_disables)
+        stats = await pipeline.run(ticker_list)
+        invalidate_security_statistics()
+        await notify_price_changes(database, pipeline.updated)
+        success_count = stats["updated_count"]
+        failed_count = stats["failed_count"] + stats["disabled_count"]
 
         # Update event as completed
         await update_system_event(
@@ -2553,10 +2608,14 @@ async def process_metrics_updates(ticker_list: list, event_id):
             {
                 "tickers_count": ticker_count,
                 "success_count": success_count,
-                "failed_count": failed_count
+                "failed_count": failed_count,
+                "pipeline": stats
             }
         )
-        logger.info(f"Background metrics update completed: {success_count}/{ticker_count} tickers updated")
+        logger.info(
+            f"Background metrics update completed: {success_count}/{ticker_count} tickers updated "
+            f"({stats['tickers_per_second']} tickers/s)"
+        )
 
     except Exception as e:
         error_message = f"Error in batch metrics update: {str(e)}"
@@ -2565,22 +2624,34 @@ async def process_metrics_updates(ticker_list: list, event_id):
         import traceback; logger.error(traceback.format_exc())
 
 @app.get("/system/warmup")
-async def warmup_system():
+async def warmup_system(preload: bool = True):
     """
     Endpoint to wake up the Render service before scheduled tasks.
     This ensures the service is fully initialized when cron jobs run.
+    
+    With preload (default) the lazily imported services and clients are
+    loaded too, so the jobs that follow don't pay their import cost.
     """
     try:
         # Perform minimal database operation to ensure connections are ready
         query = "SELECT 1 as health_check"
         result = await database.fetch_one(query)
         
+        preload_seconds = None
+        if preload:
+            preload_start = time.perf_counter()
+            for module in LAZY_MODULES:
+                module.load()
+            await SecuritySearchIndex.get_instance().ensure_loaded(database)
+            preload_seconds = time.perf_counter() - preload_start
+        
         # Return success response
         return {
             "success": True,
             "message": "System warmed up successfully",
             "timestamp": datetime.now().isoformat(),
-            "health_check": result["health_check"] if result else None
+            "health_check": result["health_check"] if result else None,
+            "preload_seconds": preload_seconds
         }
     except Exception as e:
         logger.error(f"Error during system warmup: {str(e)}")
@@ -2590,7 +2661,7 @@ async def warmup_system():
         )
 
 @app.post("/market/polygon-sync-prices")
-async def polygon_sync_prices():
+async def polygon_sync_prices(full: bool = False, force: bool = False):
     """
     Pull Polygon snapshots for our tickers and update:
       - securities.price_polygon
@@ -2600,6 +2671,13 @@ async def polygon_sync_prices():
       - securities.price_timestamp (timestamp, stored as UTC-naive)
 
     NOTE: Zero-price fallback (use prevDay.c) is implemented in PolygonClient.get_snapshots_for().
+
+    By default only the tickers the RefreshPlanner routes to Polygon this cycle
+    are requested; full=true requests every eligible security.
+
+    While the market is closed, snapshots can't change once a sync has run
+    after the last close, so further calls are skipped until the next open
+    unless force=true.
     """
     try:
         event_id = await record_system_event(
@@ -2609,19 +2687,48 @@ async def polygon_sync_prices():
             {"description": "Polygon price sync for securities"}
         )
 
-        rows = await database.fetch_all("""
-            SELECT ticker
-            FROM securities
-            WHERE asset_type = 'security'
-              AND (on_polygon IS DISTINCT FROM FALSE)
-        """)
-        if not rows:
+        market_calendar = MarketCalendar.get_instance()
+        if not force and not market_calendar.is_session_open():
+            last_close = market_calendar.last_close()
+            synced_since_close = await database.fetch_val(
+                """
+                SELECT EXISTS (
+                    SELECT 1
+                    FROM system_events
+                    WHERE event_type = 'polygon_full_market_price_sync'
+                      AND status = 'completed'
+                      AND started_at >= :last_close
+                )
+                """,
+                {"last_close": last_close.astimezone(timezone.utc).replace(tzinfo=None)}
+            )
+            if synced_since_close:
+                next_open = market_calendar.next_open().isoformat()
+                msg = f"Market closed; prices already synced after the {last_close.isoformat()} close"
+                await update_system_event(
+                    database, event_id, "completed",
+                    {"message": msg, "skipped": True, "last_close": last_close.isoformat(), "next_open": next_open}
+                )
+                return {"success": True, "message": msg, "updated_count": 0, "skipped": True, "next_open": next_open}
+
+        tiers = None
+        if full:
+            rows = await database.fetch_all("""
+                SELECT ticker
+                FROM securities
+                WHERE asset_type = 'security'
+                  AND (on_polygon IS DISTINCT FROM FALSE)
+            """)
+            tickers = [(r["ticker"] or "").strip().upper() for r in rows if r["ticker"]]
+        else:
+            plan = await RefreshPlanner.get_instance().plan(database)
+            tickers, tiers = plan["work"].get("polygon", []), plan["tiers"]
+
+        if not tickers:
             msg = "No eligible securities for Polygon sync"
-            await update_system_event(database, event_id, "completed", {"message": msg, "tickers_count": 0})
+            await update_system_event(database, event_id, "completed", {"message": msg, "tickers_count": 0, "tiers": tiers})
             return {"success": True, "message": msg, "updated_count": 0}
 
-        tickers = [(r["ticker"] or "").strip().upper() for r in rows if r["ticker"]]
-
         client = PolygonClient()
         snaps = await client.get_snapshots_for(tickers)  # {ticker: {price: float, timestamp: datetime UTC}}
 
@@ -2688,9 +2795,11 @@ async def polygon_sync_prices():
                 "tickers_count": len(tickers),
                 "updated_count": len(found),
                 "missing_count": len(missing),
-                "source": "polygon"
+                "source": "polygon",
+                "tiers": tiers
             }
         )
+        await notify_price_changes(database, found)
 
         return {
             "success": True,
@@ -2908,6 +3017,11 @@ async def polygon_sync_prices_full(
             }
         )
 
+        invalidate_security_statistics()
+        await notify_price_changes(database, [t for t in to_update if snaps.get(t, {}).get("price") is not None])
+        if inserted_count:
+            SecuritySearchIndex.get_instance().invalidate()
+
         return {
             "success": True,
             "message": f"Processed {len(snapshot_tickers)} snapshot tickers: updated {updated_count}, inserted {inserted_count}" + (f", marked {absent_count} absent" if mark_absent_false else ""),
@@ -2964,6 +3078,8 @@ async def polygon_sync_list(
             """,
             [{"ticker": t} for t in missing]
         )
+        SecuritySearchIndex.get_instance().invalidate()
+        invalidate_security_statistics()
 
         return {
             "success": True,
@@ -2989,6 +3105,8 @@ async def av_sync_universe():
         client = AlphaVantageClient()
         result = await client.sync_universe_into_db(database)
         await client.aclose()
+        SecuritySearchIndex.get_instance().invalidate()
+        invalidate_security_statistics()
         await update_system_event(database, event_id, "completed", result)
         return {"success": True, **result, "event_id": str(event_id)}
     except Exception as e:
@@ -5488,163 +5606,93 @@ async def reconcile_account(
             detail=f"Error reconciling account: {str(e)}"
         )
 
+# Bulk reconciliation endpoint
+@app.post("/api/reconciliation/bulk", status_code=status.HTTP_201_CREATED)
+async def reconcile_account_bulk(
+    reconciliation: ReconciliationRequest,
+    current_user = Depends(get_current_user)
+):
+    """
+    Reconcile every position of an account, plus its balance, in one request.
+
+    Variances are computed and every position_reconciliations row written by a
+    single statement in one transaction (see services/bulk_reconciliation.py).
+    The account reconciliation is closed when all of the account's positions
+    are reconciled, as with /api/reconciliation/account.
+    """
+    try:
+        summary = await reconcile_account_positions(
+            database,
+            user_id=current_user["id"],
+            account_id=reconciliation.account_id,
+            positions=[position.dict() for position in reconciliation.positions],
+            app_balance=reconciliation.account_level.app_balance,
+            actual_balance=reconciliation.account_level.actual_balance,
+            reconciliation_date=reconciliation.reconciliation_date,
+        )
+        if summary is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Account not found or access denied"
+            )
+
+        return {
+            "status": "success",
+            "message": (
+                "Account reconciled successfully" if summary["account_reconciled"]
+                else f"{summary['positions']} positions reconciled; "
+                     f"{summary['positions_remaining']} positions are not yet reconciled"
+            ),
+            "account_reconciliation_id": summary["account_reconciliation_id"],
+            "summary": summary
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in bulk reconciliation: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error in bulk reconciliation: {str(e)}"
+        )
+
 
 @app.get("/market/security-statistics")
 async def get_security_statistics():
     """
     Get statistics about securities in the database, including price update information,
     asset counts, and metrics age information.
+
+    Aggregated in SQL and cached (see services/security_statistics.py); the
+    price and metrics jobs invalidate the cache when they write.
     """
     try:
-        # Create event record
-        event_id = await record_system_event(
-            database,
-            "security_statistics_generation",
-            "started",
-            {"description": "Generating security statistics"}
-        )
+        result = await load_security_statistics(database)
+        statistics = result["statistics"]
 
-        # Query for all securities from security_usage table
-        query = "SELECT * FROM security_usage"
-        results = await database.fetch_all(query)
-        
-        if not results:
-            message = "No securities found in the database"
-            logger.info(message)
-            
-            # Update event as completed with no securities
-            await update_system_event(
-                database,
-                event_id,
-                "completed",
-                {"message": message, "securities_count": 0}
-            )
-            
+        if not statistics.get("total_securities"):
             return {
                 "success": True,
-                "message": message,
+                "message": "No securities found in the database",
                 "statistics": {}
             }
 
-        # Convert to list of dictionaries
-        securities = [dict(row) for row in results]
-        
-        # Calculate statistics
-        total_count = len(securities)
-        
-        # Count by asset type
-        asset_type_counts = {}
-        for security in securities:
-            asset_type = security.get('asset_type')
-            if asset_type:
-                asset_type_counts[asset_type] = asset_type_counts.get(asset_type, 0) + 1
-                
-        # Active securities
-        active_securities = [s for s in securities if s.get('status') == 'Active']
-        active_count = len(active_securities)
-        
-        # Price update information
-        all_last_updated = [s.get('last_updated') for s in securities if s.get('last_updated')]
-        most_recent_update = max(all_last_updated) if all_last_updated else None
-        
-        # Active securities price range
-        active_last_updated = [s.get('last_updated') for s in active_securities if s.get('last_updated')]
-        active_price_min = min(active_last_updated) if active_last_updated else None
-        active_price_max = max(active_last_updated) if active_last_updated else None
-        
-        # Active price age information
-        active_price_age_minutes = [s.get('price_age_minutes') for s in active_securities if s.get('price_age_minutes') is not None]
-        min_active_price_age = min(active_price_age_minutes) if active_price_age_minutes else None
-        max_active_price_age = max(active_price_age_minutes) if active_price_age_minutes else None
-        avg_active_price_age = sum(active_price_age_minutes) / len(active_price_age_minutes) if active_price_age_minutes else None
-        
-        # Metrics age information for active securities
-        active_metrics_age = [s.get('metrics_age_minutes') for s in active_securities if s.get('metrics_age_minutes') is not None]
-        min_metrics_age = min(active_metrics_age) if active_metrics_age else None
-        max_metrics_age = max(active_metrics_age) if active_metrics_age else None
-        avg_metrics_age = sum(active_metrics_age) / len(active_metrics_age) if active_metrics_age else None
-        
-        # Status counts
-        price_status_counts = {}
-        metrics_status_counts = {}
-        for security in securities:
-            price_status = security.get('price_status')
-            if price_status:
-                price_status_counts[price_status] = price_status_counts.get(price_status, 0) + 1
-                
-            metrics_status = security.get('metrics_status')
-            if metrics_status:
-                metrics_status_counts[metrics_status] = metrics_status_counts.get(metrics_status, 0) + 1
-        
-        # Position counts
-        securities_with_positions = sum(1 for s in securities if s.get('total_positions', 0) > 0)
-        active_with_positions = sum(1 for s in active_securities if s.get('total_positions', 0) > 0)
-        
-        # Format timestamps for readability
-        formatted_most_recent = most_recent_update.strftime("%Y-%m-%d %H:%M:%S") if most_recent_update else None
-        formatted_active_min = active_price_min.strftime("%Y-%m-%d %H:%M:%S") if active_price_min else None
-        formatted_active_max = active_price_max.strftime("%Y-%m-%d %H:%M:%S") if active_price_max else None
-        
-        # Construct statistics response
-        statistics = {
-            "total_securities": total_count,
-            "by_asset_type": asset_type_counts,
-            "active_securities": active_count,
-            "prices_last_updated": formatted_most_recent,
-            "active_price_update_range": {
-                "min": formatted_active_min,
-                "max": formatted_active_max,
-            },
-            "active_price_age_minutes": {
-                "min": round(min_active_price_age, 2) if min_active_price_age is not None else None,
-                "max": round(max_active_price_age, 2) if max_active_price_age is not None else None,
-                "avg": round(avg_active_price_age, 2) if avg_active_price_age is not None else None
-            },
-            "active_metrics_age_minutes": {
-                "min": round(min_metrics_age, 2) if min_metrics_age is not None else None,
-                "max": round(max_metrics_age, 2) if max_metrics_age is not None else None,
-                "avg": round(avg_metrics_age, 2) if avg_metrics_age is not None else None
-            },
-            "price_status_counts": price_status_counts,
-            "metrics_status_counts": metrics_status_counts,
-            "securities_with_positions": securities_with_positions,
-            "active_with_positions": active_with_positions,
-            "price_needs_update": price_status_counts.get("Requires Updating", 0),
-            "metrics_needs_update": metrics_status_counts.get("Requires Updating", 0)
-        }
-        
-        # Update event as completed
-        await update_system_event(
-            database,
-            event_id,
-            "completed",
-            {"message": "Successfully generated security statistics", "securities_count": total_count}
-        )
-        
         return {
             "success": True,
             "message": "Security statistics generated successfully",
             "statistics": statistics,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": result["generated_at"],
+            "cached": result["cached"]
         }
-            
+
     except Exception as e:
         error_message = f"Error generating security statistics: {str(e)}"
         logger.error(error_message)
-        
-        # Update event status if we have an event_id
-        if 'event_id' in locals():
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
+
         # Log detailed error for debugging
         import traceback
         logger.error(traceback.format_exc())
-        
+
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate security statistics: {str(e)}"
@@ -6186,13 +6234,35 @@ async def get_portfolio_snapshots_raw(
         logger.error(f"Error fetching raw snapshots: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/portfolio/performance")
+async def get_portfolio_performance(
+    periods: Optional[str] = Query(None, description="Comma-separated periods: 1w, 1m, 3m, 6m, ytd, 1y, max"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Time-weighted and money-weighted returns, volatility, max drawdown and
+    asset-class attribution for every requested period, computed in one pass
+    over the user's daily snapshots.
+    """
+    try:
+        requested = [p.strip() for p in periods.split(",")] if periods else None
+        result = await PerformanceEngine(database).compute(current_user["id"], requested)
+        if result is None:
+            return {"user_id": current_user["id"], "as_of": None, "periods": {}}
+        return result
+    except Exception as e:
+        logger.error(f"Error calculating portfolio performance: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # PRIMARY NEW REPORTING --> INCLUDES LIVE VIEW, OTHER ASSETS, AND LIABILITIES
 @app.get("/portfolio/net_worth_summary")
 async def get_net_worth_summary(
     date: Optional[str] = Query(None, description="Specific date (YYYY-MM-DD) or 'latest' for most recent"),
     date_from: Optional[str] = Query(None, description="Start date for range (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date for range (YYYY-MM-DD)"),
-    include_json_details: bool = Query(True, description="Include detailed JSON columns"),
+    include_json_details: bool = Query(True, description="Include detailed JSON columns (ignored when fields is given)"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    response_format: Optional[str] = Query(None, alias="format", description="'columnar' for {columns, rows} instead of one object per row"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -6201,9 +6271,21 @@ async def get_net_worth_summary(
     try:
         user_id = current_user["id"]
         
+        # Columns pushed down into the SELECT (fields=, or all but the JSON details)
+        json_columns = [
+            'top_liquid_positions', 'top_performers_amount', 'top_performers_percent',
+            'account_diversification', 'asset_performance_detail', 'sector_allocation',
+            'risk_metrics', 'institution_allocation', 'concentration_metrics',
+            'dividend_metrics', 'tax_efficiency_metrics', 'net_cash_basis_metrics'
+        ]
+        projection = await build_projection(
+            database, "rept_net_worth_trend_summary", fields,
+            exclude=() if include_json_details else json_columns
+        )
+        
         # Build base query
-        base_query = """
-        SELECT * FROM rept_net_worth_trend_summary 
+        base_query = f"""
+        SELECT {projection.select_sql} FROM rept_net_worth_trend_summary 
         WHERE user_id = :user_id
         """
         
@@ -6257,14 +6339,8 @@ async def get_net_worth_summary(
             if summary.get('snapshot_date'):
                 summary['snapshot_date'] = summary['snapshot_date'].strftime('%Y-%m-%d')
             
-            # Optionally exclude JSON columns for lighter responses
-            if not include_json_details:
-                json_columns = [
-                    'top_liquid_positions', 'top_performers_amount', 'top_performers_percent',
-                    'account_diversification', 'asset_performance_detail', 'sector_allocation',
-                    'risk_metrics', 'institution_allocation', 'concentration_metrics',
-                    'dividend_metrics', 'tax_efficiency_metrics', 'net_cash_basis_metrics'
-                ]
+            # Optionally exclude JSON columns (already left out of the SELECT when the view's columns are known)
+            if not include_json_details and not projection.requested:
                 for col in json_columns:
                     summary.pop(col, None)
             
@@ -6272,10 +6348,15 @@ async def get_net_worth_summary(
         
         # Return single summary if only one result, otherwise array
         if len(summaries) == 1:
-            return {"summary": summaries[0]}
+            # Columnar keeps its {"columns", "rows"} shape, with the one row
+            if response_format == COLUMNAR_FORMAT:
+                return {"summary": projection.rows(summaries, response_format)}
+            return {"summary": projection.rows(summaries)[0]}
         else:
-            return {"summaries": summaries, "count": len(summaries)}
+            return {"summaries": projection.rows(summaries, response_format), "count": len(summaries)}
         
+    except ProjectionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching net worth summary: {str(e)}")
         import traceback
@@ -6604,6 +6685,8 @@ async def get_datastore_grouped_positions(
     min_value: Optional[float] = Query(None, description="Minimum position value"),
     sort_by: Optional[str] = Query("value", description="Sort field: value, quantity, gain_pct, allocation"),
     sort_order: Optional[str] = Query("desc", description="Sort order: asc or desc"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    response_format: Optional[str] = Query(None, alias="format", description="'columnar' for {columns, rows} instead of one object per row"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -6613,9 +6696,18 @@ async def get_datastore_grouped_positions(
     try:
         user_id = current_user["id"]
         
+        # Summary figures below need these whatever fields= asks for
+        projection = await build_projection(
+            database, "rept_summary_grouped_positions", fields,
+            required=[
+                'snapshot_date', 'asset_type', 'total_current_value', 'total_cost_basis',
+                'total_gain_loss_amt', 'total_annual_income', 'long_term_value', 'short_term_value'
+            ]
+        )
+        
         # Build base query
-        base_query = """
-        SELECT * FROM rept_summary_grouped_positions 
+        base_query = f"""
+        SELECT {projection.select_sql} FROM rept_summary_grouped_positions 
         WHERE user_id = :user_id
         """
         
@@ -6783,10 +6875,12 @@ async def get_datastore_grouped_positions(
         summary["asset_type_breakdown"] = asset_types
         
         return {
-            "positions": positions,
+            "positions": projection.rows(positions, response_format),
             "summary": summary
         }
         
+    except ProjectionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching grouped positions: {str(e)}")
         import traceback
@@ -6998,6 +7092,8 @@ async def get_datastore_accounts_summary_positions(
     min_value: Optional[float] = Query(None, description="Minimum position value"),
     sort_by: Optional[str] = Query("value", description="Sort field: value, gain_pct, allocation, income"),
     sort_order: Optional[str] = Query("desc", description="Sort order: asc or desc"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    response_format: Optional[str] = Query(None, alias="format", description="'columnar' for {columns, rows} instead of one object per row"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -7007,9 +7103,19 @@ async def get_datastore_accounts_summary_positions(
     try:
         user_id = current_user["id"]
 
+        # Summary figures below need these whatever fields= asks for
+        projection = await build_projection(
+            database, "rept_summary_accounts_positions", fields,
+            required=[
+                'snapshot_date', 'asset_type', 'total_current_value', 'total_cost_basis',
+                'total_gain_loss_amt', 'total_annual_income', 'long_term_value', 'short_term_value',
+                'inv_account_id', 'inv_account_name', 'inv_account_type', 'institution'
+            ]
+        )
+
         # Build base query
-        base_query = """
-        SELECT * FROM rept_summary_accounts_positions
+        base_query = f"""
+        SELECT {projection.select_sql} FROM rept_summary_accounts_positions
         WHERE user_id = :user_id
         """
 
@@ -7209,10 +7315,12 @@ async def get_datastore_accounts_summary_positions(
         summary["account_breakdown"] = accounts
 
         return {
-            "data": data,
+            "data": projection.rows(data, response_format),
             "summary": summary
         }
 
+    except ProjectionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching accounts summary positions: {str(e)}")
         import traceback
@@ -7226,6 +7334,8 @@ async def get_datastore_accounts_summary_positions(
 @app.get("/datastore/liabilities/grouped")
 async def get_grouped_liabilities(
     snapshot_date: str = Query("latest", description="Snapshot date (YYYY-MM-DD) or 'latest'"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    response_format: Optional[str] = Query(None, alias="format", description="'columnar' for {columns, rows} instead of one object per row"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -7234,48 +7344,33 @@ async def get_grouped_liabilities(
     try:
         user_id = current_user["id"]  # Note: using "id" not "user_id" based on your example
         
+        # Summary figures below need these whatever fields= asks for
+        projection = await build_projection(
+            database, "rept_summary_grouped_liabilities", fields,
+            default=[
+                'user_id', 'snapshot_date', 'liability_type', 'identifier', 'name', 'institution',
+                'data_source', 'liability_count', 'institution_count', 'total_current_balance',
+                'total_original_amount', 'total_paid_down', 'weighted_avg_interest_rate',
+                'max_interest_rate', 'min_interest_rate', 'total_credit_card_balance',
+                'total_credit_limit', 'estimated_annual_interest', 'liability_details', 'last_updated',
+                'balance_last_updated', 'debt_allocation_pct', 'paydown_percentage',
+                'credit_utilization_pct', 'balance_1d_change', 'balance_1d_change_pct',
+                'balance_1w_change', 'balance_1w_change_pct', 'balance_1m_change',
+                'balance_1m_change_pct', 'balance_3m_change', 'balance_3m_change_pct',
+                'balance_ytd_change', 'balance_ytd_change_pct', 'balance_1y_change',
+                'balance_1y_change_pct', 'balance_max_change', 'balance_max_change_pct',
+                'earliest_snapshot_date'
+            ],
+            required=[
+                'snapshot_date', 'identifier', 'liability_type', 'total_current_balance',
+                'total_original_amount', 'total_paid_down', 'estimated_annual_interest',
+                'weighted_avg_interest_rate'
+            ]
+        )
+        
         # Build base query
-        base_query = """
-        SELECT 
-            user_id,
-            snapshot_date,
-            liability_type,
-            identifier,
-            name,
-            institution,
-            data_source,
-            liability_count,
-            institution_count,
-            total_current_balance,
-            total_original_amount,
-            total_paid_down,
-            weighted_avg_interest_rate,
-            max_interest_rate,
-            min_interest_rate,
-            total_credit_card_balance,
-            total_credit_limit,
-            estimated_annual_interest,
-            liability_details,
-            last_updated,
-            balance_last_updated,
-            debt_allocation_pct,
-            paydown_percentage,
-            credit_utilization_pct,
-            balance_1d_change,
-            balance_1d_change_pct,
-            balance_1w_change,
-            balance_1w_change_pct,
-            balance_1m_change,
-            balance_1m_change_pct,
-            balance_3m_change,
-            balance_3m_change_pct,
-            balance_ytd_change,
-            balance_ytd_change_pct,
-            balance_1y_change,
-            balance_1y_change_pct,
-            balance_max_change,
-            balance_max_change_pct,
-            earliest_snapshot_date
+        base_query = f"""
+        SELECT {projection.select_sql}
         FROM rept_summary_grouped_liabilities 
         WHERE user_id = :user_id
         """
@@ -7396,11 +7491,13 @@ async def get_grouped_liabilities(
                 )
         
         return {
-            "liabilities": liabilities,
+            "liabilities": projection.rows(liabilities, response_format),
             "summary": summary,
             "snapshot_date": liabilities[0]['snapshot_date'] if liabilities else None
         }
         
+    except ProjectionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching grouped liabilities: {str(e)}")
         import traceback
@@ -7554,6 +7651,30 @@ async def get_sidebar_stats(
             detail=f"Failed to fetch sidebar statistics: {str(e)}"
         )
 
+@app.get("/portfolio/live")
+async def portfolio_live_updates(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Server-Sent Events stream of the current user's portfolio.
+
+    Sends a "snapshot" event (securities, crypto, metal, cash and real estate
+    positions, account totals, other assets, liabilities and net worth) on
+    connect and whenever any of them change, and a "delta" event with only
+    the repriced positions and the new totals after each price cycle.
+    Replaces polling /portfolio/sidebar-stats and /positions/unified for
+    live values; see services/live_updates.py.
+    """
+    if not LIVE_UPDATES_ENABLED:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Live updates are disabled")
+
+    return StreamingResponse(
+        LiveUpdateHub.get_instance().stream(current_user["id"], request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ----- Potentially Delete -----
 # ----- EXCEL TEMPLATE ENDPOINTS -----
 @app.get("/api/templates/accounts/download")
@@ -7574,10 +7695,11 @@ async def download_accounts_template(current_user: dict = Depends(get_current_us
         
         # Create response with proper headers
         return StreamingResponse(
-            io.BytesIO(excel_file.getvalue()),
+            iter_workbook_chunks(excel_file),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={
-                "Content-Disposition": f"attachment; filename=NestEgg_Accounts_Template_{datetime.now().strftime('%Y%m%d')}.xlsx"
+                "Content-Disposition": f"attachment; filename=NestEgg_Accounts_Template_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                "Content-Length": str(excel_file.getbuffer().nbytes),
             }
         )
     except Exception as e:
@@ -7618,10 +7740,11 @@ async def download_positions_template(current_user: dict = Depends(get_current_u
         
         # Create response with proper headers
         return StreamingResponse(
-            io.BytesIO(excel_file.getvalue()),
+            iter_workbook_chunks(excel_file),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={
-                "Content-Disposition": f"attachment; filename=NestEgg_Positions_Template_{datetime.now().strftime('%Y%m%d')}.xlsx"
+                "Content-Disposition": f"attachment; filename=NestEgg_Positions_Template_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                "Content-Length": str(excel_file.getbuffer().nbytes),
             }
         )
     except HTTPException:
@@ -7634,42 +7757,34 @@ async def download_positions_template(current_user: dict = Depends(get_current_u
             detail=f"Failed to generate positions template: {str(e)}"
         )
 
-# Bulk Import Endpoints (placeholder for future implementation)
+# Bulk Import Endpoints
 @app.post("/api/bulk-import/accounts")
 async def bulk_import_accounts(
     file: UploadFile = File(...),
+    validate_only: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Import multiple accounts from an Excel template.
-    Validates the data and creates accounts in bulk.
+    Import multiple accounts from the Excel accounts template.
+    Valid rows are created in bulk; invalid rows are skipped and reported
+    with their row number. With validate_only nothing is written.
     """
     try:
         # Validate file type
-        if not file.filename.endswith(('.xlsx', '.xls')):
+        if not file.filename.endswith('.xlsx'):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File must be an Excel file (.xlsx or .xls)"
+                detail="File must be an Excel workbook (.xlsx)"
             )
         
-        # Read file content
-        contents = await file.read()
-        
-        # TODO: Implement the actual import logic
-        # 1. Parse Excel file
-        # 2. Validate data
-        # 3. Check for duplicates
-        # 4. Create accounts in database
-        # 5. Return results
-        
-        return {
-            "success": True,
-            "message": "Bulk import functionality coming soon",
-            "filename": file.filename
-        }
+        importer = BulkImporter(database, current_user["id"], validate_only=validate_only)
+        result = await importer.import_accounts(file.file)
+        return {**result, "filename": file.filename}
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error in bulk account import: {str(e)}")
         raise HTTPException(
@@ -7680,38 +7795,31 @@ async def bulk_import_accounts(
 @app.post("/api/bulk-import/positions")
 async def bulk_import_positions(
     file: UploadFile = File(...),
+    validate_only: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Import positions from an Excel template.
-    Validates the data and creates positions across multiple asset types.
+    Import positions from the Excel positions template.
+    Reads the securities, cash, crypto and metals sheets, maps account names
+    to the user's accounts and creates positions in the matching tables.
+    Invalid rows are skipped and reported with their sheet and row number.
     """
     try:
         # Validate file type
-        if not file.filename.endswith(('.xlsx', '.xls')):
+        if not file.filename.endswith('.xlsx'):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File must be an Excel file (.xlsx or .xls)"
+                detail="File must be an Excel workbook (.xlsx)"
             )
         
-        # Read file content
-        contents = await file.read()
-        
-        # TODO: Implement the actual import logic
-        # 1. Parse Excel file with multiple sheets
-        # 2. Validate each position type
-        # 3. Map account names to account IDs
-        # 4. Create positions in appropriate tables
-        # 5. Return detailed results
-        
-        return {
-            "success": True,
-            "message": "Bulk import functionality coming soon",
-            "filename": file.filename
-        }
+        importer = BulkImporter(database, current_user["id"], validate_only=validate_only)
+        result = await importer.import_positions(file.file)
+        return {**result, "filename": file.filename}
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error in bulk position import: {str(e)}")
         raise HTTPException(
@@ -7721,6 +7829,39 @@ async def bulk_import_positions(
 
 # old
 
+@app.get("/system/database-pool")
+async def get_database_pool_status(current_user: dict = Depends(get_current_user)):
+    """Shared pool health check, size and per-consumer acquisition metrics"""
+    return await check_database_health()
+
+@app.get("/admin/query-stats")
+async def get_query_stats(
+    limit: int = Query(20, ge=1, le=500),
+    sort_by: str = Query("total_ms", regex="^(total_ms|p95_ms|p99_ms|max_ms|mean_ms|count|rows|errors)$"),
+    reset: bool = False,
+    current_user: dict = Depends(get_current_user_admin)
+):
+    """Top-N query fingerprints by total time, tail latency, calls or rows"""
+    stats = QueryStats.get_instance()
+    result = {
+        "since": datetime.fromtimestamp(stats.started_at).isoformat(),
+        "fingerprints": len(stats.stats),
+        "slow_query_threshold_ms": SLOW_QUERY_MS,
+        "slow_queries": stats.slow_queries,
+        "sort_by": sort_by,
+        "queries": stats.top(limit, sort_by)
+    }
+    if reset:
+        stats.reset()
+    return result
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition (bearer token required when METRICS_TOKEN is set)"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/system/database-status")
 async def get_database_status(current_user: dict = Depends(get_current_user)):
     """Get database health and statistics"""
@@ -7858,8 +7999,7 @@ async def update_specific_security(
     """Update a specific security based on the update type"""
     try:
         # Check if security exists
-        query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-        existing = await database.fetch_one(query, {"ticker": ticker.upper()})
+        existing = await TickerRefreshPipeline(database).find_existing([ticker.upper()])
         
         if not existing:
             raise HTTPException(
@@ -7941,179 +8081,93 @@ async def update_specific_security(
         )
         
 # --- NEW SIMPLIFIED PRICE UPDATER LOGIC
-# - YAHOO QUERY CLIENT
-# Update Company Metrics for use of single ticker
-@app.post("/market/update-ticker-metrics/{ticker}")
-async def update_ticker_metrics(
-    ticker: str,
-    current_user: dict = Depends(get_current_user)
-):
+# All eight endpoints below run through services/ticker_refresh.TickerRefreshPipeline:
+# one existence query, one insert of missing tickers, concurrent provider fetches
+# and one bulk UPDATE, whatever the number of tickers.
+
+async def _refresh_single_ticker(ticker: str, client, kind: str, event_type: str) -> dict:
     """
-    Update company metrics for a single ticker using YahooQuery client.
-    
-    This endpoint:
-    1. Validates the ticker
-    2. Creates a YahooQueryClient
-    3. Fetches the company metrics data
-    4. Updates the securities database table
-    5. Returns results and status
+    Shared body of the single-ticker price/metrics endpoints
+
+    Args:
+        ticker: Ticker from the URL
+        client: Provider client (YahooQueryClient or DirectYahooFinanceClient)
+        kind: "prices" or "metrics"
+        event_type: System event name to record
     """
     try:
-        # Validate request
+        # Validate request and standardize ticker (uppercase)
+        ticker = (ticker or "").strip().upper()
         if not ticker:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Ticker must be provided"
             )
-            
-        # Standardize ticker (uppercase)
-        ticker = ticker.strip().upper()
-        
-        # Check if ticker exists in database
-        check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-        existing = await database.fetch_one(check_query, {"ticker": ticker})
-        
-        if not existing:
-            # Ticker doesn't exist, insert it first
-            insert_query = """
-            INSERT INTO securities (ticker, active, on_yfinance, created_at) 
-            VALUES (:ticker, true, true, :now)
-            """
-            await database.execute(
-                insert_query, 
-                {
-                    "ticker": ticker,
-                    "now": datetime.utcnow()
-                }
-            )
-            logger.info(f"Created new security record for ticker: {ticker}")
-            
+
+        pipeline = TickerRefreshPipeline(database, client)
+        await pipeline.ensure_securities([ticker])
+
         # Create event record for tracking
         event_id = await record_system_event(
             database,
-            "yahoo_ticker_metrics_update",
+            event_type,
             "started",
             {"ticker": ticker}
         )
-        
-        # Initialize YahooQueryClient
-        client = YahooQueryClient()
-        
-        try:
-            # Get company metrics data
-            logger.info(f"Fetching company metrics for {ticker}")
-            metrics = await client.get_company_metrics(ticker)
-            
-            if not metrics or metrics.get("not_found"):
-                error_msg = f"No metrics data returned for {ticker}"
-                logger.error(error_msg)
-                
-                # Update event as failed
-                await update_system_event(
-                    database,
-                    event_id,
-                    "failed",
-                    {"error": error_msg}
-                )
-                
-                return {
-                    "success": False,
-                    "message": error_msg,
-                    "ticker": ticker
-                }
-            
-            # Update securities table with company metrics
-            update_query = """
-            UPDATE securities
-            SET 
-                company_name = :company_name,
-                current_price = :current_price,
-                sector = :sector,
-                industry = :industry,
-                market_cap = :market_cap,
-                pe_ratio = :pe_ratio,
-                forward_pe = :forward_pe,
-                dividend_rate = :dividend_rate,
-                dividend_yield = :dividend_yield,
-                beta = :beta,
-                fifty_two_week_low = :fifty_two_week_low,
-                fifty_two_week_high = :fifty_two_week_high,
-                fifty_two_week_range = :fifty_two_week_range,
-                eps = :eps,
-                forward_eps = :forward_eps,
-                last_metrics_update = :updated_at,
-                last_updated = :updated_at
-            WHERE ticker = :ticker
-            """
-            
-            # Prepare values for update
-            fifty_two_week_range = None
-            if metrics.get("fifty_two_week_low") is not None and metrics.get("fifty_two_week_high") is not None:
-                fifty_two_week_range = f"{metrics['fifty_two_week_low']}-{metrics['fifty_two_week_high']}"
-            
-            update_values = {
-                "ticker": ticker,
-                "company_name": metrics.get("company_name"),
-                "current_price": metrics.get("current_price"),
-                "sector": metrics.get("sector"),
-                "industry": metrics.get("industry"),
-                "market_cap": metrics.get("market_cap"),
-                "pe_ratio": metrics.get("pe_ratio"),
-                "forward_pe": metrics.get("forward_pe"),
-                "dividend_rate": metrics.get("dividend_rate"),
-                "dividend_yield": metrics.get("dividend_yield"),
-                "beta": metrics.get("beta"),
-                "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                "fifty_two_week_range": fifty_two_week_range,
-                "eps": metrics.get("eps"),
-                "forward_eps": metrics.get("forward_eps"),
-                "updated_at": datetime.now()
-            }
-            
-            await database.execute(update_query, update_values)
-            
-            # Filter out empty values for response
-            filtered_metrics = {k: v for k, v in metrics.items() if v is not None}
-            
-            # Update event as completed
-            await update_system_event(
-                database,
-                event_id,
-                "completed",
-                {"ticker": ticker, "fields_updated": len(filtered_metrics)}
-            )
-            
-            return {
-                "success": True,
-                "message": f"Successfully updated metrics for {ticker}",
-                "ticker": ticker,
-                "fields_updated": len(filtered_metrics),
-                "metrics": filtered_metrics
-            }
-            
-        except Exception as e:
-            error_message = f"Error updating metrics for {ticker}: {str(e)}"
-            logger.error(error_message)
-            
-            # Update event as failed
+
+        if kind == "metrics":
+            result = (await pipeline.refresh_metrics([ticker], create_missing=False))[0]
+        else:
+            result = (await pipeline.refresh_prices([ticker], create_missing=False))[0]
+
+        if not result["success"]:
             await update_system_event(
                 database,
                 event_id,
                 "failed",
-                {"error": error_message}
+                {"error": result["message"]}
             )
-            
             return {
                 "success": False,
-                "message": error_message,
+                "message": result["message"],
                 "ticker": ticker
             }
-            
+
+        if kind == "metrics":
+            fields_updated = result["fields_updated"]
+            response = {
+                "success": True,
+                "message": result["message"],
+                "ticker": ticker,
+                "fields_updated": fields_updated,
+                "metrics": result["metrics"]
+            }
+        else:
+            fields_updated = len(result["data"])
+            response = {
+                "success": True,
+                "message": result["message"],
+                "ticker": ticker,
+                "current_price": result["current_price"],
+                "updated_at": result["updated_at"],
+                "data": result["data"]
+            }
+
+        # Update event as completed
+        await update_system_event(
+            database,
+            event_id,
+            "completed",
+            {"ticker": ticker, "fields_updated": fields_updated}
+        )
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
-        error_message = f"Error in ticker metrics update: {str(e)}"
+        error_message = f"Error in ticker {kind} update: {str(e)}"
         logger.error(error_message)
-        
+
         # Update event status if we have an event_id
         if 'event_id' in locals():
             await update_system_event(
@@ -8122,1080 +8176,149 @@ async def update_ticker_metrics(
                 "failed",
                 {"error": error_message}
             )
-            
+
         # Log detailed error for debugging
         import traceback
         logger.error(traceback.format_exc())
-        
+
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update ticker metrics: {str(e)}"
+            detail=f"Failed to update ticker {'metrics' if kind == 'metrics' else 'price'}: {str(e)}"
         )
 
-@app.post("/market/update-tickers-metrics/{tickers}")
-async def update_multiple_ticker_metrics(
-    tickers: str,
-    current_user: dict = Depends(get_current_user)
-):
+
+async def _refresh_ticker_batch(tickers: List[str], client, kind: str, event_type: str) -> dict:
     """
-    Update company metrics for multiple tickers using YahooQuery client.
-    
-    Tickers should be comma-separated in the URL, e.g.:
-    /market/update-tickers-metrics/AAPL,MSFT,GOOG,AMZN
+    Shared body of the multi-ticker price/metrics endpoints (path and JSON body variants)
+
+    Args:
+        tickers: Raw tickers; blanks and duplicates are dropped
+        client: Provider client (YahooQueryClient or DirectYahooFinanceClient)
+        kind: "prices" or "metrics"
+        event_type: System event name to record
     """
-    # Parse tickers from the URL path parameter
-    ticker_list = [ticker.strip().upper() for ticker in tickers.split(',') if ticker.strip()]
-    
+    ticker_list = normalize_tickers(tickers)
+
     if not ticker_list:
         return {
             "success": False,
             "message": "No valid tickers provided",
             "results": []
         }
-    
-    # Create event record for the batch
-    event_id = await record_system_event(
-        database,
-        "yahoo_tickers_metrics_batch_update",
-        "started",
-        {"tickers_count": len(ticker_list), "first_ticker": ticker_list[0]}
-    )
-    
-    # Initialize results
-    results = []
-    success_count = 0
-    failed_count = 0
-    
-    # Initialize YahooQueryClient
-    client = YahooQueryClient()
-    
-    # Process each ticker
-    for ticker in ticker_list:
-        try:
-            # Check if ticker exists in database
-            check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-            existing = await database.fetch_one(check_query, {"ticker": ticker})
-            
-            if not existing:
-                # Ticker doesn't exist, insert it first
-                insert_query = """
-                INSERT INTO securities (ticker, active, on_yfinance) 
-                VALUES (:ticker, true, true)
-                """
-                await database.execute(
-                    insert_query, 
-                    {
-                        "ticker": ticker
-                    }
-                )
-                logger.info(f"Created new security record for ticker: {ticker}")
-            
-            # Get company metrics data
-            logger.info(f"Fetching company metrics for {ticker}")
-            metrics = await client.get_company_metrics(ticker)
-            
-            if isinstance(metrics, str):
-                error_msg = f"Invalid metrics format (received string): {metrics}"
-                logger.error(error_msg)
-                
-                results.append({
-                    "ticker": ticker,
-                    "success": False,
-                    "message": error_msg
-                })
-                failed_count += 1
-                continue
-            
-            if not metrics or metrics.get("not_found"):
-                error_msg = f"No metrics data returned for {ticker}"
-                logger.error(error_msg)
-                
-                results.append({
-                    "ticker": ticker,
-                    "success": False,
-                    "message": error_msg
-                })
-                failed_count += 1
-                continue
-            
-            # Update securities table with company metrics
-            update_query = """
-            UPDATE securities
-            SET 
-                company_name = :company_name,
-                current_price = :current_price,
-                sector = :sector,
-                industry = :industry,
-                market_cap = :market_cap,
-                pe_ratio = :pe_ratio,
-                forward_pe = :forward_pe,
-                dividend_rate = :dividend_rate,
-                dividend_yield = :dividend_yield,
-                beta = :beta,
-                fifty_two_week_low = :fifty_two_week_low,
-                fifty_two_week_high = :fifty_two_week_high,
-                fifty_two_week_range = :fifty_two_week_range,
-                eps = :eps,
-                forward_eps = :forward_eps,
-                last_metrics_update = :updated_at,
-                last_updated = :updated_at
-            WHERE ticker = :ticker
-            """
-            
-            # Prepare values for update
-            fifty_two_week_range = None
-            if metrics.get("fifty_two_week_low") is not None and metrics.get("fifty_two_week_high") is not None:
-                fifty_two_week_range = f"{metrics['fifty_two_week_low']}-{metrics['fifty_two_week_high']}"
-            
-            update_values = {
-                "ticker": ticker,
-                "company_name": metrics.get("company_name"),
-                "current_price": metrics.get("current_price"),
-                "sector": metrics.get("sector"),
-                "industry": metrics.get("industry"),
-                "market_cap": metrics.get("market_cap"),
-                "pe_ratio": metrics.get("pe_ratio"),
-                "forward_pe": metrics.get("forward_pe"),
-                "dividend_rate": metrics.get("dividend_rate"),
-                "dividend_yield": metrics.get("dividend_yield"),
-                "beta": metrics.get("beta"),
-                "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                "fifty_two_week_range": fifty_two_week_range,
-                "eps": metrics.get("eps"),
-                "forward_eps": metrics.get("forward_eps"),
-                "updated_at": datetime.now()
-            }
-            
-            await database.execute(update_query, update_values)
-            
-            # Filter out empty values for response
-            filtered_metrics = {k: v for k, v in metrics.items() if v is not None}
-            
-            results.append({
-                "ticker": ticker,
-                "success": True,
-                "message": f"Successfully updated metrics for {ticker}",
-                "fields_updated": len(filtered_metrics)
-            })
-            success_count += 1
-            
-        except Exception as e:
-            error_message = f"Error updating metrics for {ticker}: {str(e)}"
-            logger.error(error_message)
-            
-            results.append({
-                "ticker": ticker,
-                "success": False,
-                "message": error_message
-            })
-            failed_count += 1
-    
-    # Update event as completed
-    await update_system_event(
-        database,
-        event_id,
-        "completed",
-        {
-            "tickers_count": len(ticker_list),
-            "success_count": success_count,
-            "failed_count": failed_count
-        }
-    )
-    
-    return {
-        "success": success_count > 0,
-        "message": f"Updated metrics for {success_count}/{len(ticker_list)} tickers ({failed_count} failed)",
-        "total_tickers": len(ticker_list),
-        "success_count": success_count,
-        "failed_count": failed_count,
-        "results": results
-    }
 
-# Update just price for a single ticker
-@app.post("/market/update-ticker-price/{ticker}")
-async def update_ticker_price(
-    ticker: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Update current price data for a single ticker using YahooQuery client.
-    """
-    try:
-        # Standardize ticker (uppercase)
-        ticker = ticker.strip().upper()
-        
-        # Check if ticker exists in database
-        check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-        existing = await database.fetch_one(check_query, {"ticker": ticker})
-        
-        if not existing:
-            # Ticker doesn't exist, insert it first
-            insert_query = """
-            INSERT INTO securities (ticker, active, on_yfinance, created_at) 
-            VALUES (:ticker, true, true, :now)
-            """
-            await database.execute(
-                insert_query, 
-                {
-                    "ticker": ticker,
-                    "now": datetime.utcnow()
-                }
-            )
-            logger.info(f"Created new security record for ticker: {ticker}")
-            
-        # Create event record for tracking
-        event_id = await record_system_event(
-            database,
-            "yahoo_ticker_price_update",
-            "started",
-            {"ticker": ticker}
-        )
-        
-        # Initialize YahooQueryClient
-        client = YahooQueryClient()
-        
-        try:
-            # Get current price data
-            logger.info(f"Fetching current price for {ticker}")
-            price_data = await client.get_current_price(ticker)
-            
-            if not price_data:
-                error_msg = f"No price data returned for {ticker}"
-                logger.error(error_msg)
-                
-                # Update event as failed
-                await update_system_event(
-                    database,
-                    event_id,
-                    "failed",
-                    {"error": error_msg}
-                )
-                
-                return {
-                    "success": False,
-                    "message": error_msg,
-                    "ticker": ticker
-                }
-            
-            # Update securities table with price data
-            update_query = """
-            UPDATE securities
-            SET 
-                current_price = :price,
-                day_open = :day_open,
-                day_high = :day_high,
-                day_low = :day_low,
-                volume = :volume,
-                last_updated = :updated_at,
-                price_timestamp = :price_timestamp
-            WHERE ticker = :ticker
-            """
-            
-            update_values = {
-                "ticker": ticker,
-                "price": price_data.get("price"),
-                "day_open": price_data.get("day_open"),
-                "day_high": price_data.get("day_high"),
-                "day_low": price_data.get("day_low"),
-                "volume": price_data.get("volume"),
-                "updated_at": datetime.now(),
-                "price_timestamp": price_data.get("price_timestamp")
-            }
-            
-            await database.execute(update_query, update_values)
-            
-            # Filter out empty values for response
-            filtered_price_data = {k: v for k, v in price_data.items() if v is not None}
-            
-            # Update event as completed
-            await update_system_event(
-                database,
-                event_id,
-                "completed",
-                {"ticker": ticker, "fields_updated": len(filtered_price_data)}
-            )
-            
-            return {
-                "success": True,
-                "message": f"Successfully updated price for {ticker}",
-                "ticker": ticker,
-                "current_price": price_data.get("price"),
-                "updated_at": datetime.now().isoformat(),
-                "data": filtered_price_data
-            }
-            
-        except Exception as e:
-            error_message = f"Error updating price for {ticker}: {str(e)}"
-            logger.error(error_message)
-            
-            # Update event as failed
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-            return {
-                "success": False,
-                "message": error_message,
-                "ticker": ticker
-            }
-            
-    except Exception as e:
-        error_message = f"Error in ticker price update: {str(e)}"
-        logger.error(error_message)
-        
-        # Update event status if we have an event_id
-        if 'event_id' in locals():
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-        # Log detailed error for debugging
-        import traceback
-        logger.error(traceback.format_exc())
-        
+    if len(ticker_list) > TICKER_REFRESH_MAX_TICKERS:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update ticker price: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {TICKER_REFRESH_MAX_TICKERS} tickers can be refreshed per request"
         )
 
-@app.post("/market/update-tickers-price/{tickers}")
-async def update_multiple_ticker_prices(
-    tickers: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Update current price data for multiple tickers using YahooQuery client.
-    
-    Tickers should be comma-separated in the URL, e.g.:
-    /market/update-tickers-price/AAPL,MSFT,GOOG,AMZN
-    """
-    try:
-        # Parse tickers from the URL path parameter
-        ticker_list = [ticker.strip().upper() for ticker in tickers.split(',') if ticker.strip()]
-        
-        if not ticker_list:
-            return {
-                "success": False,
-                "message": "No valid tickers provided",
-                "results": []
-            }
-        
-        # Create event record for the batch update
-        event_id = await record_system_event(
-            database,
-            "yahoo_tickers_batch_price_update",
-            "started",
-            {"tickers_count": len(ticker_list), "first_ticker": ticker_list[0]}
-        )
-        
-        # Check for missing tickers and add them to the database
-        for ticker in ticker_list:
-            check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-            existing = await database.fetch_one(check_query, {"ticker": ticker})
-            
-            if not existing:
-                # Ticker doesn't exist, insert it first
-                insert_query = """
-                INSERT INTO securities (ticker, active, on_yfinance, created_at) 
-                VALUES (:ticker, true, true, :now)
-                """
-                await database.execute(
-                    insert_query, 
-                    {
-                        "ticker": ticker,
-                        "now": datetime.utcnow()
-                    }
-                )
-                logger.info(f"Created new security record for ticker: {ticker}")
-        
-        # Initialize YahooQueryClient
-        client = YahooQueryClient()
-        
-        try:
-            # Get batch price data
-            logger.info(f"Fetching prices for batch of {len(ticker_list)} tickers")
-            batch_price_data = await client.get_batch_prices(ticker_list)
-            
-            if not batch_price_data:
-                error_msg = "No price data returned for any tickers"
-                logger.error(error_msg)
-                
-                # Update event as failed
-                await update_system_event(
-                    database,
-                    event_id,
-                    "failed",
-                    {"error": error_msg}
-                )
-                
-                return {
-                    "success": False,
-                    "message": error_msg,
-                    "tickers": ticker_list
-                }
-            
-            # Process results for each ticker
-            results = []
-            updated_count = 0
-            failed_tickers = []
-            
-            for ticker in ticker_list:
-                if ticker not in batch_price_data:
-                    # No data returned for this ticker
-                    failed_tickers.append(ticker)
-                    results.append({
-                        "ticker": ticker,
-                        "success": False,
-                        "message": "No price data returned"
-                    })
-                    continue
-                    
-                price_data = batch_price_data[ticker]
-                
-                try:
-                    # Update securities table with price data
-                    update_query = """
-                    UPDATE securities
-                    SET 
-                        current_price = :price,
-                        day_open = :day_open,
-                        day_high = :day_high,
-                        day_low = :day_low,
-                        volume = :volume,
-                        last_updated = :updated_at,
-                        price_timestamp = :price_timestamp
-                    WHERE ticker = :ticker
-                    """
-                    
-                    update_values = {
-                        "ticker": ticker,
-                        "price": price_data.get("price"),
-                        "day_open": price_data.get("day_open"),
-                        "day_high": price_data.get("day_high"),
-                        "day_low": price_data.get("day_low"),
-                        "volume": price_data.get("volume"),
-                        "updated_at": datetime.now(),
-                        "price_timestamp": price_data.get("price_timestamp")
-                    }
-                    
-                    await database.execute(update_query, update_values)
-                    updated_count += 1
-                    
-                    # Filter out empty values for response
-                    filtered_price_data = {k: v for k, v in price_data.items() if v is not None}
-                    
-                    results.append({
-                        "ticker": ticker,
-                        "success": True,
-                        "message": f"Successfully updated price",
-                        "current_price": price_data.get("price"),
-                        "fields_updated": len(filtered_price_data)
-                    })
-                    
-                except Exception as ticker_error:
-                    error_message = f"Error updating price for {ticker}: {str(ticker_error)}"
-                    logger.error(error_message)
-                    failed_tickers.append(ticker)
-                    
-                    results.append({
-                        "ticker": ticker,
-                        "success": False,
-                        "message": error_message
-                    })
-            
-            # Update event as completed
-            await update_system_event(
-                database,
-                event_id,
-                "completed",
-                {
-                    "tickers_count": len(ticker_list),
-                    "updated_count": updated_count,
-                    "failed_count": len(failed_tickers)
-                }
-            )
-            
-            return {
-                "success": updated_count > 0,
-                "message": f"Updated prices for {updated_count}/{len(ticker_list)} tickers",
-                "total_tickers": len(ticker_list),
-                "updated_count": updated_count,
-                "failed_count": len(failed_tickers),
-                "failed_tickers": failed_tickers if failed_tickers else None,
-                "results": results
-            }
-            
-        except Exception as e:
-            error_message = f"Error in batch price update: {str(e)}"
-            logger.error(error_message)
-            
-            # Update event as failed
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-            return {
-                "success": False,
-                "message": error_message,
-                "tickers": ticker_list
-            }
-            
-    except Exception as e:
-        error_message = f"Error in batch ticker price update: {str(e)}"
-        logger.error(error_message)
-        
-        # Update event status if we have an event_id
-        if 'event_id' in locals():
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-        # Log detailed error for debugging
-        import traceback
-        logger.error(traceback.format_exc())
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update ticker prices: {str(e)}"
-        )
-
-# - DIRECT YAHOO CLIENT
-@app.post("/market/direct-update-ticker-price/{ticker}")
-async def direct_update_ticker_price(
-    ticker: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Update current price data for a single ticker using DirectYahooFinanceClient.
-    """
-    try:
-        # Standardize ticker (uppercase)
-        ticker = ticker.strip().upper()
-        
-        # Check if ticker exists in database
-        check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-        existing = await database.fetch_one(check_query, {"ticker": ticker})
-        
-        if not existing:
-            # Ticker doesn't exist, insert it first
-            insert_query = """
-            INSERT INTO securities (ticker, active, on_yfinance, created_at) 
-            VALUES (:ticker, true, true, :now)
-            """
-            await database.execute(
-                insert_query, 
-                {
-                    "ticker": ticker,
-                    "now": datetime.utcnow()
-                }
-            )
-            logger.info(f"Created new security record for ticker: {ticker}")
-            
-        # Create event record for tracking
-        event_id = await record_system_event(
-            database,
-            "direct_yahoo_ticker_price_update",
-            "started",
-            {"ticker": ticker}
-        )
-        
-        # Initialize DirectYahooFinanceClient
-        client = DirectYahooFinanceClient()
-        
-        try:
-            # Get current price data
-            logger.info(f"Fetching current price for {ticker} using DirectYahooFinanceClient")
-            price_data = await client.get_current_price(ticker)
-            
-            if not price_data:
-                error_msg = f"No price data returned for {ticker}"
-                logger.error(error_msg)
-                
-                # Update event as failed
-                await update_system_event(
-                    database,
-                    event_id,
-                    "failed",
-                    {"error": error_msg}
-                )
-                
-                return {
-                    "success": False,
-                    "message": error_msg,
-                    "ticker": ticker
-                }
-            
-            # Update securities table with price data
-            update_query = """
-            UPDATE securities
-            SET 
-                current_price = :price,
-                day_open = :day_open,
-                day_high = :day_high,
-                day_low = :day_low,
-                volume = :volume,
-                last_updated = :updated_at,
-                price_timestamp = :price_timestamp
-            WHERE ticker = :ticker
-            """
-            
-            update_values = {
-                "ticker": ticker,
-                "price": price_data.get("price"),
-                "day_open": price_data.get("day_open"),
-                "day_high": price_data.get("day_high"),
-                "day_low": price_data.get("day_low"),
-                "volume": price_data.get("volume"),
-                "updated_at": datetime.now(),
-                "price_timestamp": price_data.get("price_timestamp")
-            }
-            
-            await database.execute(update_query, update_values)
-            
-            # Filter out empty values for response
-            filtered_price_data = {k: v for k, v in price_data.items() if v is not None}
-            
-            # Update event as completed
-            await update_system_event(
-                database,
-                event_id,
-                "completed",
-                {"ticker": ticker, "fields_updated": len(filtered_price_data)}
-            )
-            
-            return {
-                "success": True,
-                "message": f"Successfully updated price for {ticker}",
-                "ticker": ticker,
-                "current_price": price_data.get("price"),
-                "updated_at": datetime.now().isoformat(),
-                "data": filtered_price_data
-            }
-            
-        except Exception as e:
-            error_message = f"Error updating price for {ticker}: {str(e)}"
-            logger.error(error_message)
-            
-            # Update event as failed
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-            return {
-                "success": False,
-                "message": error_message,
-                "ticker": ticker
-            }
-            
-    except Exception as e:
-        error_message = f"Error in direct ticker price update: {str(e)}"
-        logger.error(error_message)
-        
-        # Update event status if we have an event_id
-        if 'event_id' in locals():
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-        # Log detailed error for debugging
-        import traceback
-        logger.error(traceback.format_exc())
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update ticker price: {str(e)}"
-        )
-
-@app.post("/market/direct-update-tickers-price/{tickers}")
-async def direct_update_multiple_ticker_prices(
-    tickers: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Update current price data for multiple tickers using DirectYahooFinanceClient.
-    
-    Tickers should be comma-separated in the URL, e.g.:
-    /market/direct-update-tickers-price/AAPL,MSFT,GOOG,AMZN
-    """
-    try:
-        # Parse tickers from the URL path parameter
-        ticker_list = [ticker.strip().upper() for ticker in tickers.split(',') if ticker.strip()]
-        
-        if not ticker_list:
-            return {
-                "success": False,
-                "message": "No valid tickers provided",
-                "results": []
-            }
-        
-        # Create event record for the batch update
-        event_id = await record_system_event(
-            database,
-            "direct_yahoo_tickers_batch_price_update",
-            "started",
-            {"tickers_count": len(ticker_list), "first_ticker": ticker_list[0]}
-        )
-        
-        # Check for missing tickers and add them to the database
-        for ticker in ticker_list:
-            check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-            existing = await database.fetch_one(check_query, {"ticker": ticker})
-            
-            if not existing:
-                # Ticker doesn't exist, insert it first
-                insert_query = """
-                INSERT INTO securities (ticker, active, on_yfinance, created_at) 
-                VALUES (:ticker, true, true, :now)
-                """
-                await database.execute(
-                    insert_query, 
-                    {
-                        "ticker": ticker,
-                        "now": datetime.utcnow()
-                    }
-                )
-                logger.info(f"Created new security record for ticker: {ticker}")
-        
-        # Initialize DirectYahooFinanceClient
-        client = DirectYahooFinanceClient()
-        
-        try:
-            # Get batch price data
-            logger.info(f"Fetching prices for batch of {len(ticker_list)} tickers using DirectYahooFinanceClient")
-            batch_price_data = await client.get_batch_prices(ticker_list)
-            
-            if not batch_price_data:
-                error_msg = "No price data returned for any tickers"
-                logger.error(error_msg)
-                
-                # Update event as failed
-                await update_system_event(
-                    database,
-                    event_id,
-                    "failed",
-                    {"error": error_msg}
-                )
-                
-                return {
-                    "success": False,
-                    "message": error_msg,
-                    "tickers": ticker_list
-                }
-            
-            # Process results for each ticker
-            results = []
-            updated_count = 0
-            failed_tickers = []
-            
-            for ticker in ticker_list:
-                if ticker not in batch_price_data:
-                    # No data returned for this ticker
-                    failed_tickers.append(ticker)
-                    results.append({
-                        "ticker": ticker,
-                        "success": False,
-                        "message": "No price data returned"
-                    })
-                    continue
-                    
-                price_data = batch_price_data[ticker]
-                
-                try:
-                    # Update securities table with price data
-                    update_query = """
-                    UPDATE securities
-                    SET 
-                        current_price = :price,
-                        day_open = :day_open,
-                        day_high = :day_high,
-                        day_low = :day_low,
-                        volume = :volume,
-                        last_updated = :updated_at,
-                        price_timestamp = :price_timestamp
-                    WHERE ticker = :ticker
-                    """
-                    
-                    update_values = {
-                        "ticker": ticker,
-                        "price": price_data.get("price"),
-                        "day_open": price_data.get("day_open"),
-                        "day_high": price_data.get("day_high"),
-                        "day_low": price_data.get("day_low"),
-                        "volume": price_data.get("volume"),
-                        "updated_at": datetime.now(),
-                        "price_timestamp": price_data.get("price_timestamp")
-                    }
-                    
-                    await database.execute(update_query, update_values)
-                    updated_count += 1
-                    
-                    # Filter out empty values for response
-                    filtered_price_data = {k: v for k, v in price_data.items() if v is not None}
-                    
-                    results.append({
-                        "ticker": ticker,
-                        "success": True,
-                        "message": f"Successfully updated price",
-                        "current_price": price_data.get("price"),
-                        "fields_updated": len(filtered_price_data)
-                    })
-                    
-                except Exception as ticker_error:
-                    error_message = f"Error updating price for {ticker}: {str(ticker_error)}"
-                    logger.error(error_message)
-                    failed_tickers.append(ticker)
-                    
-                    results.append({
-                        "ticker": ticker,
-                        "success": False,
-                        "message": error_message
-                    })
-            
-            # Update event as completed
-            await update_system_event(
-                database,
-                event_id,
-                "completed",
-                {
-                    "tickers_count": len(ticker_list),
-                    "updated_count": updated_count,
-                    "failed_count": len(failed_tickers)
-                }
-            )
-            
-            return {
-                "success": updated_count > 0,
-                "message": f"Updated prices for {updated_count}/{len(ticker_list)} tickers",
-                "total_tickers": len(ticker_list),
-                "updated_count": updated_count,
-                "failed_count": len(failed_tickers),
-                "failed_tickers": failed_tickers if failed_tickers else None,
-                "results": results
-            }
-            
-        except Exception as e:
-            error_message = f"Error in batch price update: {str(e)}"
-            logger.error(error_message)
-            
-            # Update event as failed
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-            return {
-                "success": False,
-                "message": error_message,
-                "tickers": ticker_list
-            }
-            
-    except Exception as e:
-        error_message = f"Error in batch ticker price update: {str(e)}"
-        logger.error(error_message)
-        
-        # Update event status if we have an event_id
-        if 'event_id' in locals():
-            await update_system_event(
-                database,
-                event_id,
-                "failed",
-                {"error": error_message}
-            )
-            
-        # Log detailed error for debugging
-        import traceback
-        logger.error(traceback.format_exc())
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update ticker prices: {str(e)}"
-        )
-
-@app.post("/market/direct-update-ticker-metrics/{ticker}")
-async def direct_update_ticker_metrics(
-    ticker: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Update company metrics for a single ticker using DirectYahooFinanceClient.
-    """
-    try:
-        # Validate request
-        if not ticker:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ticker must be provided"
-            )
-            
-        # Standardize ticker (uppercase)
-        ticker = ticker.strip().upper()
-        
-        # Check if ticker exists in database
-        check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-        existing = await database.fetch_one(check_query, {"ticker": ticker})
-        
-        if not existing:
-            # Ticker doesn't exist, insert it first
-            insert_query = """
-            INSERT INTO securities (ticker, active, on_yfinance, created_at) 
-            VALUES (:ticker, true, true, :now)
-            """
-            await database.execute(
-                insert_query, 
-                {
-                    "ticker": ticker,
-                    "now": datetime.utcnow()
-                }
-            )
-            logger.info(f"Created new security record for ticker: {ticker}")
-            
-        # Create event record for tracking
+    try:
+        # Create event record for the batch update
         event_id = await record_system_event(
             database,
-            "direct_yahoo_ticker_metrics_update",
+            event_type,
             "started",
-            {"ticker": ticker}
+            {"tickers_count": len(ticker_list), "first_ticker": ticker_list[0]}
         )
-        
-        # Initialize DirectYahooFinanceClient
-        client = DirectYahooFinanceClient()
-        
-        try:
-            # Get company metrics data
-            logger.info(f"Fetching company metrics for {ticker} using DirectYahooFinanceClient")
-            metrics = await client.get_company_metrics(ticker)
-            
-            if not metrics or metrics.get("not_found"):
-                error_msg = f"No metrics data returned for {ticker}"
-                logger.error(error_msg)
-                
-                # Update event as failed
-                await update_system_event(
-                    database,
-                    event_id,
-                    "failed",
-                    {"error": error_msg}
-                )
-                
-                return {
-                    "success": False,
-                    "message": error_msg,
-                    "ticker": ticker
+
+        pipeline = TickerRefreshPipeline(database, client)
+
+        if kind == "metrics":
+            pipeline_results = await pipeline.refresh_metrics(ticker_list)
+            results = [
+                {
+                    "ticker": r["ticker"],
+                    "success": r["success"],
+                    "message": r["message"],
+                    **({"fields_updated": r["fields_updated"]} if r["success"] else {})
                 }
-            
-            # Update securities table with company metrics
-            update_query = """
-            UPDATE securities
-            SET 
-                company_name = :company_name,
-                current_price = :current_price,
-                sector = :sector,
-                industry = :industry,
-                market_cap = :market_cap,
-                pe_ratio = :pe_ratio,
-                forward_pe = :forward_pe,
-                dividend_rate = :dividend_rate,
-                dividend_yield = :dividend_yield,
-                beta = :beta,
-                fifty_two_week_low = :fifty_two_week_low,
-                fifty_two_week_high = :fifty_two_week_high,
-                fifty_two_week_range = :fifty_two_week_range,
-                eps = :eps,
-                forward_eps = :forward_eps,
-                last_metrics_update = :updated_at,
-                last_updated = :updated_at
-            WHERE ticker = :ticker
-            """
-            
-            # Prepare values for update
-            fifty_two_week_range = None
-            if metrics.get("fifty_two_week_low") is not None and metrics.get("fifty_two_week_high") is not None:
-                fifty_two_week_range = f"{metrics['fifty_two_week_low']}-{metrics['fifty_two_week_high']}"
-            
-            update_values = {
-                "ticker": ticker,
-                "company_name": metrics.get("company_name"),
-                "current_price": metrics.get("current_price"),
-                "sector": metrics.get("sector"),
-                "industry": metrics.get("industry"),
-                "market_cap": metrics.get("market_cap"),
-                "pe_ratio": metrics.get("pe_ratio"),
-                "forward_pe": metrics.get("forward_pe"),
-                "dividend_rate": metrics.get("dividend_rate"),
-                "dividend_yield": metrics.get("dividend_yield"),
-                "beta": metrics.get("beta"),
-                "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                "fifty_two_week_range": fifty_two_week_range,
-                "eps": metrics.get("eps"),
-                "forward_eps": metrics.get("forward_eps"),
-                "updated_at": datetime.now()
-            }
-            
-            await database.execute(update_query, update_values)
-            
-            # Filter out empty values for response
-            filtered_metrics = {k: v for k, v in metrics.items() if v is not None}
-            
+                for r in pipeline_results
+            ]
+            success_count = sum(1 for r in results if r["success"])
+            failed_count = len(results) - success_count
+
             # Update event as completed
             await update_system_event(
                 database,
                 event_id,
                 "completed",
-                {"ticker": ticker, "fields_updated": len(filtered_metrics)}
+                {
+                    "tickers_count": len(ticker_list),
+                    "success_count": success_count,
+                    "failed_count": failed_count
+                }
             )
-            
+
             return {
-                "success": True,
-                "message": f"Successfully updated metrics for {ticker}",
-                "ticker": ticker,
-                "fields_updated": len(filtered_metrics),
-                "metrics": filtered_metrics
+                "success": success_count > 0,
+                "message": f"Updated metrics for {success_count}/{len(ticker_list)} tickers ({failed_count} failed)",
+                "total_tickers": len(ticker_list),
+                "success_count": success_count,
+                "failed_count": failed_count,
+                "results": results
             }
-            
-        except Exception as e:
-            error_message = f"Error updating metrics for {ticker}: {str(e)}"
-            logger.error(error_message)
-            
+
+        pipeline_results = await pipeline.refresh_prices(ticker_list)
+        results = []
+        failed_tickers = []
+        for r in pipeline_results:
+            if r["success"]:
+                results.append({
+                    "ticker": r["ticker"],
+                    "success": True,
+                    "message": "Successfully updated price",
+                    "current_price": r["current_price"],
+                    "fields_updated": len(r["data"])
+                })
+            else:
+                failed_tickers.append(r["ticker"])
+                results.append({"ticker": r["ticker"], "success": False, "message": r["message"]})
+        updated_count = len(ticker_list) - len(failed_tickers)
+
+        if not updated_count:
+            error_msg = "No price data returned for any tickers"
+            logger.error(error_msg)
+
             # Update event as failed
             await update_system_event(
                 database,
                 event_id,
                 "failed",
-                {"error": error_message}
+                {"error": error_msg}
             )
-            
+
             return {
                 "success": False,
-                "message": error_message,
-                "ticker": ticker
+                "message": error_msg,
+                "tickers": ticker_list
             }
-            
+
+        # Update event as completed
+        await update_system_event(
+            database,
+            event_id,
+            "completed",
+            {
+                "tickers_count": len(ticker_list),
+                "updated_count": updated_count,
+                "failed_count": len(failed_tickers)
+            }
+        )
+
+        return {
+            "success": updated_count > 0,
+            "message": f"Updated prices for {updated_count}/{len(ticker_list)} tickers",
+            "total_tickers": len(ticker_list),
+            "updated_count": updated_count,
+            "failed_count": len(failed_tickers),
+            "failed_tickers": failed_tickers if failed_tickers else None,
+            "results": results
+        }
+
     except Exception as e:
-        error_message = f"Error in direct ticker metrics update: {str(e)}"
+        error_message = f"Error in batch ticker {kind} update: {str(e)}"
         logger.error(error_message)
-        
+
         # Update event status if we have an event_id
         if 'event_id' in locals():
             await update_system_event(
@@ -9204,16 +8327,154 @@ async def direct_update_ticker_metrics(
                 "failed",
                 {"error": error_message}
             )
-            
+
         # Log detailed error for debugging
         import traceback
         logger.error(traceback.format_exc())
-        
+
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update ticker metrics: {str(e)}"
+            detail=f"Failed to update ticker {'metrics' if kind == 'metrics' else 'prices'}: {str(e)}"
         )
 
+
+# - YAHOO QUERY CLIENT
+# Update Company Metrics for use of single ticker
+@app.post("/market/update-ticker-metrics/{ticker}")
+async def update_ticker_metrics(
+    ticker: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update company metrics for a single ticker using YahooQuery client.
+
+    This endpoint:
+    1. Validates the ticker (creating the securities row if needed)
+    2. Fetches the company metrics data
+    3. Updates the securities database table
+    4. Returns results and status
+    """
+    return await _refresh_single_ticker(ticker, YahooQueryClient(), "metrics", "yahoo_ticker_metrics_update")
+
+@app.post("/market/update-tickers-metrics")
+async def update_ticker_metrics_bulk(
+    request: TickerRefreshRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update company metrics for a list of tickers using YahooQuery client.
+
+    Takes {"tickers": [...]} in the body, for lists too long for a URL.
+    """
+    return await _refresh_ticker_batch(request.tickers, YahooQueryClient(), "metrics", "yahoo_tickers_metrics_batch_update")
+
+@app.post("/market/update-tickers-metrics/{tickers}")
+async def update_multiple_ticker_metrics(
+    tickers: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update company metrics for multiple tickers using YahooQuery client.
+
+    Tickers should be comma-separated in the URL, e.g.:
+    /market/update-tickers-metrics/AAPL,MSFT,GOOG,AMZN
+    """
+    return await _refresh_ticker_batch(tickers.split(','), YahooQueryClient(), "metrics", "yahoo_tickers_metrics_batch_update")
+
+# Update just price for a single ticker
+@app.post("/market/update-ticker-price/{ticker}")
+async def update_ticker_price(
+    ticker: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update current price data for a single ticker using YahooQuery client.
+    """
+    return await _refresh_single_ticker(ticker, YahooQueryClient(), "prices", "yahoo_ticker_price_update")
+
+@app.post("/market/update-tickers-price")
+async def update_ticker_prices_bulk(
+    request: TickerRefreshRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update current price data for a list of tickers using YahooQuery client.
+
+    Takes {"tickers": [...]} in the body, for lists too long for a URL.
+    """
+    return await _refresh_ticker_batch(request.tickers, YahooQueryClient(), "prices", "yahoo_tickers_batch_price_update")
+
+@app.post("/market/update-tickers-price/{tickers}")
+async def update_multiple_ticker_prices(
+    tickers: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update current price data for multiple tickers using YahooQuery client.
+
+    Tickers should be comma-separated in the URL, e.g.:
+    /market/update-tickers-price/AAPL,MSFT,GOOG,AMZN
+    """
+    return await _refresh_ticker_batch(tickers.split(','), YahooQueryClient(), "prices", "yahoo_tickers_batch_price_update")
+
+# - DIRECT YAHOO CLIENT
+@app.post("/market/direct-update-ticker-price/{ticker}")
+async def direct_update_ticker_price(
+    ticker: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update current price data for a single ticker using DirectYahooFinanceClient.
+    """
+    return await _refresh_single_ticker(ticker, DirectYahooFinanceClient(), "prices", "direct_yahoo_ticker_price_update")
+
+@app.post("/market/direct-update-tickers-price")
+async def direct_update_ticker_prices_bulk(
+    request: TickerRefreshRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update current price data for a list of tickers using DirectYahooFinanceClient.
+
+    Takes {"tickers": [...]} in the body, for lists too long for a URL.
+    """
+    return await _refresh_ticker_batch(request.tickers, DirectYahooFinanceClient(), "prices", "direct_yahoo_tickers_batch_price_update")
+
+@app.post("/market/direct-update-tickers-price/{tickers}")
+async def direct_update_multiple_ticker_prices(
+    tickers: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update current price data for multiple tickers using DirectYahooFinanceClient.
+
+    Tickers should be comma-separated in the URL, e.g.:
+    /market/direct-update-tickers-price/AAPL,MSFT,GOOG,AMZN
+    """
+    return await _refresh_ticker_batch(tickers.split(','), DirectYahooFinanceClient(), "prices", "direct_yahoo_tickers_batch_price_update")
+
+@app.post("/market/direct-update-ticker-metrics/{ticker}")
+async def direct_update_ticker_metrics(
+    ticker: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update company metrics for a single ticker using DirectYahooFinanceClient.
+    """
+    return await _refresh_single_ticker(ticker, DirectYahooFinanceClient(), "metrics", "direct_yahoo_ticker_metrics_update")
+
+@app.post("/market/direct-update-tickers-metrics")
+async def direct_update_ticker_metrics_bulk(
+    request: TickerRefreshRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update company metrics for a list of tickers using DirectYahooFinanceClient.
+
+    Takes {"tickers": [...]} in the body, for lists too long for a URL.
+    """
+    return await _refresh_ticker_batch(request.tickers, DirectYahooFinanceClient(), "metrics", "direct_yahoo_tickers_metrics_batch_update")
+
 @app.post("/market/direct-update-tickers-metrics/{tickers}")
 async def direct_update_multiple_ticker_metrics(
     tickers: str,
@@ -9221,178 +8482,12 @@ async def direct_update_multiple_ticker_metrics(
 ):
     """
     Update company metrics for multiple tickers using DirectYahooFinanceClient.
-    
+
     Tickers should be comma-separated in the URL, e.g.:
     /market/direct-update-tickers-metrics/AAPL,MSFT,GOOG,AMZN
     """
-    # Parse tickers from the URL path parameter
-    ticker_list = [ticker.strip().upper() for ticker in tickers.split(',') if ticker.strip()]
-    
-    if not ticker_list:
-        return {
-            "success": False,
-            "message": "No valid tickers provided",
-            "results": []
-        }
-    
-    # Create event record for the batch
-    event_id = await record_system_event(
-        database,
-        "direct_yahoo_tickers_metrics_batch_update",
-        "started",
-        {"tickers_count": len(ticker_list), "first_ticker": ticker_list[0]}
-    )
-    
-    # Initialize results
-    results = []
-    success_count = 0
-    failed_count = 0
-    
-    # Initialize DirectYahooFinanceClient
-    client = DirectYahooFinanceClient()
-    
-    # Process each ticker
-    for ticker in ticker_list:
-        try:
-            # Check if ticker exists in database
-            check_query = "SELECT ticker FROM securities WHERE ticker = :ticker"
-            existing = await database.fetch_one(check_query, {"ticker": ticker})
-            
-            if not existing:
-                # Ticker doesn't exist, insert it first
-                insert_query = """
-                INSERT INTO securities (ticker, active, on_yfinance) 
-                VALUES (:ticker, true, true)
-                """
-                await database.execute(
-                    insert_query, 
-                    {
-                        "ticker": ticker
-                    }
-                )
-                logger.info(f"Created new security record for ticker: {ticker}")
-            
-            # Get company metrics data
-            logger.info(f"Fetching company metrics for {ticker} using DirectYahooFinanceClient")
-            metrics = await client.get_company_metrics(ticker)
-            
-            if isinstance(metrics, str):
-                error_msg = f"Invalid metrics format (received string): {metrics}"
-                logger.error(error_msg)
-                
-                results.append({
-                    "ticker": ticker,
-                    "success": False,
-                    "message": error_msg
-                })
-                failed_count += 1
-                continue
-            
-            if not metrics or metrics.get("not_found"):
-                error_msg = f"No metrics data returned for {ticker}"
-                logger.error(error_msg)
-                
-                results.append({
-                    "ticker": ticker,
-                    "success": False,
-                    "message": error_msg
-                })
-                failed_count += 1
-                continue
-            
-            # Update securities table with company metrics
-            update_query = """
-            UPDATE securities
-            SET 
-                company_name = :company_name,
-                current_price = :current_price,
-                sector = :sector,
-                industry = :industry,
-                market_cap = :market_cap,
-                pe_ratio = :pe_ratio,
-                forward_pe = :forward_pe,
-                dividend_rate = :dividend_rate,
-                dividend_yield = :dividend_yield,
-                beta = :beta,
-                fifty_two_week_low = :fifty_two_week_low,
-                fifty_two_week_high = :fifty_two_week_high,
-                fifty_two_week_range = :fifty_two_week_range,
-                eps = :eps,
-                forward_eps = :forward_eps,
-                last_metrics_update = :updated_at,
-                last_updated = :updated_at
-            WHERE ticker = :ticker
-            """
-            
-            # Prepare values for update
-            fifty_two_week_range = None
-            if metrics.get("fifty_two_week_low") is not None and metrics.get("fifty_two_week_high") is not None:
-                fifty_two_week_range = f"{metrics['fifty_two_week_low']}-{metrics['fifty_two_week_high']}"
-            
-            update_values = {
-                "ticker": ticker,
-                "company_name": metrics.get("company_name"),
-                "current_price": metrics.get("current_price"),
-                "sector": metrics.get("sector"),
-                "industry": metrics.get("industry"),
-                "market_cap": metrics.get("market_cap"),
-                "pe_ratio": metrics.get("pe_ratio"),
-                "forward_pe": metrics.get("forward_pe"),
-                "dividend_rate": metrics.get("dividend_rate"),
-                "dividend_yield": metrics.get("dividend_yield"),
-                "beta": metrics.get("beta"),
-                "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                "fifty_two_week_range": fifty_two_week_range,
-                "eps": metrics.get("eps"),
-                "forward_eps": metrics.get("forward_eps"),
-                "updated_at": datetime.now()
-            }
-            
-            await database.execute(update_query, update_values)
-            
-            # Filter out empty values for response
-            filtered_metrics = {k: v for k, v in metrics.items() if v is not None}
-            
-            results.append({
-                "ticker": ticker,
-                "success": True,
-                "message": f"Successfully updated metrics for {ticker}",
-                "fields_updated": len(filtered_metrics)
-            })
-            success_count += 1
-            
-        except Exception as e:
-            error_message = f"Error updating metrics for {ticker}: {str(e)}"
-            logger.error(error_message)
-            
-            results.append({
-                "ticker": ticker,
-                "success": False,
-                "message": error_message
-            })
-            failed_count += 1
-    
-    # Update event as completed
-    await update_system_event(
-        database,
-        event_id,
-        "completed",
-        {
-            "tickers_count": len(ticker_list),
-            "success_count": success_count,
-            "failed_count": failed_count
-        }
-    )
-    
-    return {
-        "success": success_count > 0,
-        "message": f"Updated metrics for {success_count}/{len(ticker_list)} tickers ({failed_count} failed)",
-        "total_tickers": len(ticker_list),
-        "success_count": success_count,
-        "failed_count": failed_count,
-        "results": results
-    }
+    return await _refresh_ticker_batch(tickers.split(','), DirectYahooFinanceClient(), "metrics", "direct_yahoo_tickers_metrics_batch_update")
+
 # ----- PRICING MANAGEMENT  -----
 # INCLUDES UPDATES OF SECURITIES AND EXCHANGE RATES - RELATES TO SECURITIES TABLE AND FX_PRICES
 # Get full list of securities / fx for price update or specific info from securities table or FX prices
@@ -9527,6 +8622,7 @@ async def get_security_details(ticker: str, current_user: dict = Depends(get_cur
         
         # Format security details
         result = dict(security)
+        RefreshPlanner.get_instance().note_activity([result["ticker"]])
         
         # Get price statistics
         stats_query = """
@@ -9567,89 +8663,26 @@ async def get_security_details(ticker: str, current_user: dict = Depends(get_cur
 # Search methods for adding positions for drop down
 @app.get("/securities/search")
 async def search_securities(query: str, current_user: dict = Depends(get_current_user)):
-    """Search securities from the database with exact/prefix ticker priority."""
+    """
+    Search securities with exact/prefix ticker priority.
+
+    Served from the in-memory SecuritySearchIndex (see services/security_search.py
+    for the ranking tiers); the index is loaded on the first search and
+    refreshed in the background.
+    """
     try:
         raw = (query or "").strip()
-        logger.info(f"Securities search request received: query='{raw}'")
         if not raw:
             return {"results": []}
 
-        q = raw.lower()
-        # Patterns
-        # NOTE: Using LOWER(...) + LIKE keeps it provider-agnostic; on Postgres you can switch LIKE -> ILIKE.
-        prefix_pattern = f"{q}%"
-        search_pattern = f"%{q}%"
-
-        # For super-short queries (1 char), avoid noisy sector/industry matches.
-        include_sector_industry = len(q) >= 3
-
-        params = {
-            "q": q,
-            "prefix_pattern": prefix_pattern,
-            "search_pattern": search_pattern,
-            "include_sector_industry": include_sector_industry,
-        }
-        logger.info(f"Executing prioritized search with params: {{ q: '{q}', include_sector_industry: {include_sector_industry} }}")
-
-        # Rank results by relevance:
-        # 0: exact ticker
-        # 1: ticker prefix
-        # 2: exact company name
-        # 3: company name prefix
-        # 4: ticker contains
-        # 5: company contains
-        # 6: sector/industry contains (only if len(q) >= 3)
-        search_query = """
-        WITH base AS (
-            SELECT 
-                ticker,
-                asset_type,
-                company_name AS name,
-                COALESCE(current_price, 0) AS price,
-                sector,
-                industry,
-                market_cap,
-                CASE
-                    WHEN LOWER(TRIM(ticker)) = :q THEN 0
-                    WHEN LOWER(TRIM(ticker)) LIKE :prefix_pattern THEN 1
-                    WHEN LOWER(TRIM(company_name)) = :q THEN 2
-                    WHEN LOWER(TRIM(company_name)) LIKE :prefix_pattern THEN 3
-                    WHEN LOWER(TRIM(ticker)) LIKE :search_pattern THEN 4
-                    WHEN LOWER(TRIM(company_name)) LIKE :search_pattern THEN 5
-                    WHEN :include_sector_industry
-                         AND (LOWER(TRIM(COALESCE(sector,'')))   LIKE :search_pattern
-                          OR  LOWER(TRIM(COALESCE(industry,''))) LIKE :search_pattern) THEN 6
-                    ELSE 7
-                END AS rank_key
-            FROM securities
-            WHERE
-                -- Keep the WHERE broad so the rank_key decides the order,
-                -- but gate sector/industry by include flag to reduce noise on tiny queries.
-                LOWER(TRIM(ticker)) = :q
-             OR LOWER(TRIM(ticker)) LIKE :prefix_pattern
-             OR LOWER(TRIM(company_name)) = :q
-             OR LOWER(TRIM(company_name)) LIKE :prefix_pattern
-             OR LOWER(TRIM(ticker)) LIKE :search_pattern
-             OR LOWER(TRIM(company_name)) LIKE :search_pattern
-             OR (:include_sector_industry AND (
-                    LOWER(TRIM(COALESCE(sector,'')))   LIKE :search_pattern OR
-                    LOWER(TRIM(COALESCE(industry,''))) LIKE :search_pattern
-                ))
-        )
-        SELECT
-            ticker, asset_type, name, price, sector, industry, market_cap
-        FROM base
-        WHERE rank_key < 7
-        ORDER BY rank_key ASC, market_cap DESC NULLS LAST, ticker ASC
-        LIMIT 20;
-        """
-
-        results = await database.fetch_all(search_query, params)
-        result_count = len(results) if results else 0
-        logger.info(f"Prioritized search for '{raw}' found {result_count} results")
+        index = SecuritySearchIndex.get_instance()
+        await index.ensure_loaded(database)
+        results = index.search(raw)
+        logger.info(f"Securities search for '{raw}' found {len(results)} results")
+        if results:
+            RefreshPlanner.get_instance().note_activity([results[0]["ticker"]])
 
-        formatted_results = [dict(row) for row in results]
-        return {"results": formatted_results}
+        return {"results": results}
 
     except Exception as e:
         logger.error(f"Error in securities search: {str(e)}")
@@ -9716,17 +8749,20 @@ async def add_security(security: SecurityCreate, current_user: dict = Depends(ge
                     "day_high": price_data.get("day_high"),
                     "day_low": price_data.get("day_low"),
                     "volume": price_data.get("volume"),
-                    "last_updated": datetime.now(),
+                    "updated_at": datetime.now(),
                     "price_timestamp": price_data.get("price_timestamp")
                 }
                 
                 await database.execute(update_query, update_values)
+                await notify_price_changes(database, [security.ticker.upper()])
                 logger.info(f"Updated price data for {security.ticker.upper()}")
         
         except Exception as e:
             # Log the error but don't fail the entire operation
             logger.error(f"Error fetching initial price data for {security.ticker.upper()}: {str(e)}")
         
+        SecuritySearchIndex.get_instance().invalidate()
+        invalidate_security_statistics()
         return {"message": f"Security {security.ticker.upper()} added successfully"}
     
     except Exception as e:
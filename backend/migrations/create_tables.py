@@ -0,0 +1,76 @@
+"""
+Create any missing application tables.
+
+This is an explicit deploy step (Render runs it as the web service's
+preDeployCommand). It replaces the `metadata.create_all(engine)` that used to
+run against Postgres every time main.py was imported.
+
+    python -m backend.migrations.create_tables
+
+It also (re)installs the position-change NOTIFY triggers used by
+services/live_updates.py, the written-at tracking the incremental
+consistency checks filter on (services/data_consistency_monitor.py), the
+securities.last_viewed_at column the refresh planner reads
+(services/refresh_planner.py), and the per-user ordering column of
+clerk_webhook_events (webhooks_clerk.py).
+"""
+import asyncio
+import logging
+from typing import List
+
+import sqlalchemy
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from backend.core_db import database, database_lifespan, metadata as core_metadata
+from backend.services.live_updates import install_live_update_triggers
+from backend.services.data_consistency_monitor import install_consistency_tracking
+from backend.services.refresh_planner import install_refresh_activity
+from backend.webhooks_clerk import install_clerk_webhook_ordering
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("migrations.create_tables")
+
+
+async def create_tables(table_metadata: sqlalchemy.MetaData) -> List[str]:
+    """
+    Create the tables of `table_metadata` that do not exist yet
+
+    Existing tables are left untouched (same as create_all's checkfirst);
+    new tables get their declared indexes.
+
+    Returns:
+        Names of the tables that were created
+    """
+    rows = await database.fetch_all(
+        "SELECT tablename FROM pg_tables WHERE schemaname = current_schema()"
+    )
+    existing = {row["tablename"] for row in rows}
+
+    created = []
+    for table in table_metadata.tables.values():
+        if table.name not in existing:
+            await database.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                await database.execute(CreateIndex(index, if_not_exists=True))
+            logger.info(f"Created table {table.name}")
+            created.append(table.name)
+    return created
+
+
+async def main():
+    # Table definitions live in main.py, plus shared ones on core_db's metadata
+    # (users, and module-owned tables such as clerk_webhook_events)
+    from backend.main import metadata
+
+    async with database_lifespan():
+        created = await create_tables(core_metadata) + await create_tables(metadata)
+        await install_live_update_triggers(database)
+        await install_consistency_tracking(database)
+        await install_refresh_activity(database)
+        await install_clerk_webhook_ordering(database)
+    logger.info(f"Schema up to date ({len(created)} tables created)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
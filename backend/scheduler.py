@@ -2,18 +2,23 @@ import asyncio
 import schedule
 import time
 import logging
-from datetime import datetime, time as dt_time, timedelta
+from datetime import datetime, timedelta
 import sys
 import os
-import pytz
 
 # Add the project directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import your services
 from backend.services.price_updater_v2 import PriceUpdaterV2
+from backend.core_db import get_database, database_lifespan
 from backend.utils.common import record_system_event, update_system_event
 from backend.services.portfolio_calculator import PortfolioCalculator
+from backend.services.price_history_store import PriceHistoryStore, PRICE_STORE_ENABLED
+from backend.services.data_consistency_monitor import DataConsistencyMonitor
+from backend.utils.metrics import start_metrics_server
+from backend.utils.market_calendar import MarketCalendar, eastern
+from backend.services.price_map import PriceMap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -34,52 +39,38 @@ PRICE_UPDATE_FREQUENCY = int(os.getenv("PRICE_UPDATE_FREQUENCY", "15"))  # In mi
 METRICS_UPDATE_TIME = os.getenv("METRICS_UPDATE_TIME", "02:00")  # Time in HH:MM format, default 2 AM
 HISTORY_UPDATE_TIME = os.getenv("HISTORY_UPDATE_TIME", "03:00")  # Time in HH:MM format, default 3 AM
 PORTFOLIO_SNAPSHOT_TIME = os.getenv("PORTFOLIO_SNAPSHOT_TIME", "04:00")  # Time in HH:MM format, default 4 AM
+CONSISTENCY_CHECK_TIME = os.getenv("CONSISTENCY_CHECK_TIME", "05:00")  # Time in HH:MM format, default 5 AM
+SCHEDULER_METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "0"))  # Prometheus exposition port, 0 = off
+PRICE_UPDATE_GRACE_MINUTES = int(os.getenv("PRICE_UPDATE_GRACE_MINUTES", "30"))  # Keep updating this long after the close
 
 # Log frequency settings
 logger.info(f"Price updates configured for every {PRICE_UPDATE_FREQUENCY} minutes")
 logger.info(f"Company metrics updates configured for daily at {METRICS_UPDATE_TIME}")
 logger.info(f"Historical price updates configured for daily at {HISTORY_UPDATE_TIME}")
 logger.info(f"Portfolio snapshots configured for daily at {PORTFOLIO_SNAPSHOT_TIME}")
+logger.info(f"Incremental consistency checks configured for daily at {CONSISTENCY_CHECK_TIME}")
 
-# Create a database connection
-import databases
-database = databases.Database(
-    DATABASE_URL,
-    statement_cache_size=0  # Disable statement caching for PgBouncer compatibility
-)
+# Shared database pool (connected/disconnected by database_lifespan in main)
+database = get_database("scheduler")
 
-# Define US market hours (Eastern Time)
-eastern = pytz.timezone('US/Eastern')
-MARKET_OPEN = dt_time(9, 30)  # 9:30 AM ET
-MARKET_CLOSE = dt_time(16, 0)  # 4:00 PM ET
+# NYSE sessions (Eastern Time), including holidays and early closes
+market_calendar = MarketCalendar.get_instance()
 
 def is_market_open():
     """Check if the US stock market is currently open"""
-    now = datetime.now(eastern)
-    
-    # Check for weekends
-    if now.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-        return False
-    
-    # Check time
-    current_time = now.time()
-    if current_time < MARKET_OPEN or current_time > MARKET_CLOSE:
-        return False
-    
-    # TODO: Add holiday check if needed
-    
-    return True
+    return market_calendar.is_session_open()
 
 async def update_current_prices():
     """Update current prices for all active securities"""
     try:
-        # Only update during market hours or within 30 minutes after close
+        # Only update during a session or within the grace period after its (possibly early) close
         now = datetime.now(eastern)
-        after_hours = now.time() > MARKET_CLOSE and now.time() < dt_time(16, 30)  # Within 30 min after close
+        after_hours = now - market_calendar.last_close(now) <= timedelta(minutes=PRICE_UPDATE_GRACE_MINUTES)
         
-        if not is_market_open() and not after_hours:
-            logger.info("Skipping price update - market is closed")
-            return {"status": "skipped", "reason": "market_closed"}
+        if not market_calendar.is_session_open(now) and not after_hours:
+            next_open = market_calendar.next_open(now)
+            logger.info(f"Skipping price update - market is closed until {next_open.isoformat()}")
+            return {"status": "skipped", "reason": "market_closed", "next_open": next_open.isoformat()}
         
         event_id = await record_system_event(
             database,
@@ -151,6 +142,18 @@ async def update_company_metrics():
 async def update_historical_prices():
     """Update historical prices for all securities"""
     try:
+        # Nothing new to backfill unless a session closed since the previous nightly run
+        now = datetime.now(eastern)
+        last_close = market_calendar.last_close(now)
+        if now - last_close > timedelta(days=1):
+            logger.info(f"Skipping historical price update - no session closed since {last_close.isoformat()}")
+            return {
+                "status": "skipped",
+                "reason": "no_new_session",
+                "last_close": last_close.isoformat(),
+                "next_open": market_calendar.next_open(now).isoformat()
+            }
+        
         event_id = await record_system_event(
             database,
             "scheduled_history_update",
@@ -162,11 +165,20 @@ async def update_historical_prices():
         # Update last 30 days by default
         result = await updater.update_historical_prices(days=30)
         
+        # Refresh the local columnar copy used by analytics
+        store_result = None
+        if PRICE_STORE_ENABLED:
+            try:
+                store_result = await PriceHistoryStore.get_instance().refresh(database)
+            except Exception as store_error:
+                logger.error(f"Error refreshing price history store: {str(store_error)}")
+                store_result = {"error": str(store_error)}
+        
         await update_system_event(
             database,
             event_id,
             "completed",
-            {"result": result}
+            {"result": result, "price_store": store_result}
         )
         
         logger.info(f"Scheduled historical price update completed at {datetime.now()} with {len(result.get('updated', []))} securities updated")
@@ -202,7 +214,10 @@ async def snapshot_portfolio_values():
             {"result": result}
         )
         
-        logger.info(f"Scheduled portfolio snapshot completed at {datetime.now()} with {len(result.get('portfolios', []))} portfolios processed")
+        logger.info(
+            f"Scheduled portfolio snapshot {result.get('status')} at {datetime.now()} with "
+            f"{result.get('users_processed', 0)} portfolios processed ({result.get('rows_per_second')} rows/s)"
+        )
         return result
     except Exception as e:
         logger.error(f"Error in scheduled portfolio snapshot: {str(e)}")
@@ -215,6 +230,21 @@ async def snapshot_portfolio_values():
             )
         return {"status": "error", "error": str(e)}
 
+async def check_data_consistency():
+    """Nightly incremental consistency check (only rows written since the last run)"""
+    try:
+        monitor = DataConsistencyMonitor()
+        result = await monitor.check_data_consistency(incremental=True)
+        
+        logger.info(
+            f"Scheduled {result['mode']} consistency check completed at {datetime.now()} "
+            f"with {result['issues_count']} issues in {result['duration_seconds']:.2f}s"
+        )
+        return {"status": "completed", "issues_count": result["issues_count"], "mode": result["mode"]}
+    except Exception as e:
+        logger.error(f"Error in scheduled consistency check: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
 # Run an async task in the sync scheduler
 def run_async_task(coroutine):
     try:
@@ -250,42 +280,47 @@ def setup_schedules():
         lambda: run_async_task(snapshot_portfolio_values())
     )
     
+    # Incremental data consistency check at configured time
+    schedule.every().day.at(CONSISTENCY_CHECK_TIME).do(
+        lambda: run_async_task(check_data_consistency())
+    )
+    
     logger.info("All scheduled tasks have been set up successfully")
 
 async def main():
     """Main entry point for the scheduler"""
-    # Connect to the database
     try:
-        await database.connect()
-        logger.info("Scheduler started, connected to database")
-    except Exception as e:
-        logger.error(f"Failed to connect to database: {str(e)}")
-        return
-    
-    try:
-        # Set up schedules
-        setup_schedules()
-        
-        if SCHEDULER_ENABLED:
-            # Also run initial updates when the scheduler starts
-            logger.info("Running initial price update...")
-            await update_current_prices()
-        
-        # Run the scheduler loop
-        while True:
-            schedule.run_pending()
-            await asyncio.sleep(1)
+        # The lifespan owns the shared pool: jobs reuse it and never disconnect
+        async with database_lifespan():
+            logger.info("Scheduler started, connected to database")
+            
+            # Valuation in this process reads prices from the map; price jobs refresh it
+            try:
+                await PriceMap.get_instance().load(database)
+            except Exception as e:
+                logger.error(f"Initial price map load failed: {str(e)}")
+            
+            # Job durations/rows live in this process, so expose them from here
+            if SCHEDULER_METRICS_PORT:
+                await start_metrics_server(SCHEDULER_METRICS_PORT)
+            
+            # Set up schedules
+            setup_schedules()
+            
+            if SCHEDULER_ENABLED:
+                # Also run initial updates when the scheduler starts
+                logger.info("Running initial price update...")
+                await update_current_prices()
+            
+            # Run the scheduler loop
+            while True:
+                schedule.run_pending()
+                await asyncio.sleep(1)
     except KeyboardInterrupt:
         logger.info("Scheduler shutdown requested (KeyboardInterrupt)")
     except Exception as e:
         logger.error(f"Unexpected error in scheduler: {str(e)}")
-    finally:
-        # Disconnect from the database when exiting
-        try:
-            await database.disconnect()
-            logger.info("Scheduler stopped, disconnected from database")
-        except Exception as e:
-            logger.error(f"Error disconnecting from database: {str(e)}")
+    logger.info("Scheduler stopped, disconnected from database")
 
 if __name__ == "__main__":
     # Run the async main function
@@ -3,15 +3,27 @@ Data Consistency Monitor Service
 
 This module periodically checks for inconsistencies between securities, positions,
 and price history data. It helps ensure data integrity across the application.
+
+Checks run concurrently. In incremental mode only rows written since the last
+successful check are examined; the high-water mark is stored in the details of
+the completed `data_consistency_check` system event.
+
+"Written" is tracked by trigger-maintained, indexed columns (installed by
+install_consistency_tracking, run from the create_tables deploy step):
+
+    price_history.written_at     set on every insert/update, so backfilled
+                                 bars with old timestamps are still re-checked
+    securities.price_changed_at  set only when current_price actually changes,
+                                 not on every refresh that bumps last_updated
 """
-import os
 import logging
 import asyncio
-import databases
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Set
 from dotenv import load_dotenv
-from backend.utils.common import record_system_event, update_system_event
+from backend.core_db import get_database, run_on_own_connection
+from backend.utils.common import record_system_event, update_system_event, flush_system_events
+from backend.services.live_updates import notify_price_changes
 
 
 # Set up logging
@@ -21,9 +33,47 @@ logger = logging.getLogger("data_consistency_monitor")
 # Load environment variables
 load_dotenv()
 
-# Initialize Database Connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-database = databases.Database(DATABASE_URL)
+# Shared database pool
+database = get_database("data_consistency_monitor")
+
+CONSISTENCY_TRACKING_SQL = [
+    "ALTER TABLE price_history ADD COLUMN IF NOT EXISTS written_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_price_history_written_at ON price_history (written_at)",
+    "ALTER TABLE securities ADD COLUMN IF NOT EXISTS price_changed_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_securities_price_changed_at ON securities (price_changed_at)",
+    """
+    CREATE OR REPLACE FUNCTION touch_price_history_written_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.written_at := NOW() AT TIME ZONE 'UTC';
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS price_history_written_at ON price_history",
+    "CREATE TRIGGER price_history_written_at BEFORE INSERT OR UPDATE ON price_history "
+    "FOR EACH ROW EXECUTE FUNCTION touch_price_history_written_at()",
+    """
+    CREATE OR REPLACE FUNCTION touch_securities_price_changed_at() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' OR NEW.current_price IS DISTINCT FROM OLD.current_price THEN
+            NEW.price_changed_at := NOW() AT TIME ZONE 'UTC';
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS securities_price_changed_at ON securities",
+    "CREATE TRIGGER securities_price_changed_at BEFORE INSERT OR UPDATE ON securities "
+    "FOR EACH ROW EXECUTE FUNCTION touch_securities_price_changed_at()",
+]
+
+
+async def install_consistency_tracking(database):
+    """Add the written-at columns, indexes and triggers incremental checks filter on"""
+    for statement in CONSISTENCY_TRACKING_SQL:
+        await database.execute(statement)
+    logger.info("Consistency tracking columns and triggers installed")
+
 
 class DataConsistencyMonitor:
     """
@@ -36,18 +86,43 @@ class DataConsistencyMonitor:
         self.database = database
     
     async def connect(self):
-        """Connect to the database"""
+        """Make sure the shared pool is connected (only needed outside the lifespan)"""
         if not self.database.is_connected:
             await self.database.connect()
     
     async def disconnect(self):
-        """Disconnect from the database"""
-        if self.database.is_connected:
-            await self.database.disconnect()
+        """No-op: the shared pool is closed by the app/scheduler lifespan, not by jobs"""
+        return None
     
-    async def check_data_consistency(self) -> Dict[str, Any]:
+    async def get_high_water_mark(self) -> Optional[datetime]:
         """
-        Perform a full data consistency check across the system.
+        Get the high-water mark of the last successful consistency check.
+        
+        Returns:
+            UTC timestamp the last completed check started at, or None
+        """
+        row = await self.database.fetch_one(
+            """
+            SELECT CAST(details AS jsonb) ->> 'high_water_mark' AS high_water_mark
+            FROM system_events
+            WHERE event_type = 'data_consistency_check'
+              AND status = 'completed'
+              AND (CAST(details AS jsonb) ->> 'high_water_mark') IS NOT NULL
+            ORDER BY started_at DESC
+            LIMIT 1
+            """
+        )
+        if not row or not row["high_water_mark"]:
+            return None
+        return datetime.fromisoformat(row["high_water_mark"])
+    
+    async def check_data_consistency(self, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Perform a data consistency check across the system.
+        
+        Args:
+            incremental: Only examine rows written since the last successful
+                check (falls back to a full check if there is none)
         
         Returns:
             Dictionary containing inconsistency reports
@@ -56,14 +131,20 @@ class DataConsistencyMonitor:
             await self.connect()
             
             start_time = datetime.now()
-            logger.info("Starting data consistency check")
+            
+            # Taken before any check runs, so rows written during this run are
+            # picked up again by the next incremental check
+            high_water_mark = await self.database.fetch_val("SELECT NOW() AT TIME ZONE 'UTC'")
+            since = await self.get_high_water_mark() if incremental else None
+            mode = "incremental" if since else "full"
+            logger.info(f"Starting {mode} data consistency check" + (f" (since {since})" if since else ""))
             
             # Record the start of this operation in system_events
             event_id = await record_system_event(
                 self.database,  # Pass the database connection
                 "data_consistency_check", 
                 "started", 
-                {}
+                {"mode": mode, "since": since.isoformat() if since else None}
             )
             
             # Initialize results dictionary
@@ -74,17 +155,24 @@ class DataConsistencyMonitor:
                 "orphaned_positions": [],
                 "securities_without_prices": [],
                 "issues_count": 0,
+                "mode": mode,
+                "since": since.isoformat() if since else None,
                 "start_time": start_time.isoformat(),
                 "end_time": None,
                 "duration_seconds": None
             }
             
-            # Run all consistency checks
-            await self._check_securities_consistency(results)
-            await self._check_positions_consistency(results)
-            await self._check_price_history_consistency(results)
-            await self._check_orphaned_positions(results)
-            await self._check_securities_without_prices(results)
+            # Run all consistency checks concurrently, each on its own connection
+            await asyncio.gather(*[
+                run_on_own_connection(check(results, since))
+                for check in (
+                    self._check_securities_consistency,
+                    self._check_positions_consistency,
+                    self._check_price_history_consistency,
+                    self._check_orphaned_positions,
+                    self._check_securities_without_prices,
+                )
+            ])
             
             # Calculate total issues
             results["issues_count"] = (
@@ -108,6 +196,9 @@ class DataConsistencyMonitor:
                 {
                     "issues_count": results["issues_count"],
                     "checks_performed": 5,
+                    "mode": mode,
+                    "since": results["since"],
+                    "high_water_mark": high_water_mark.isoformat(),
                     "duration_seconds": results["duration_seconds"]
                 }
             )
@@ -132,7 +223,7 @@ class DataConsistencyMonitor:
         finally:
             await self.disconnect()
     
-    async def _check_securities_consistency(self, results: Dict[str, Any]):
+    async def _check_securities_consistency(self, results: Dict[str, Any], since: Optional[datetime] = None):
         """
         Check for inconsistencies in the securities table.
         
@@ -142,7 +233,7 @@ class DataConsistencyMonitor:
         - Conflicting data sources
         """
         # Check for securities with NULL or invalid prices
-        query = """
+        query = f"""
         SELECT 
             ticker, 
             current_price,
@@ -150,12 +241,13 @@ class DataConsistencyMonitor:
         FROM 
             securities
         WHERE 
-            current_price IS NULL OR 
+            (current_price IS NULL OR 
             current_price = 'NaN' OR 
             current_price <= 0 OR
-            current_price > 1000000
+            current_price > 1000000)
+            {"AND price_changed_at >= :since" if since else ""}
         """
-        invalid_prices = await self.database.fetch_all(query)
+        invalid_prices = await self.database.fetch_all(query, {"since": since} if since else None)
         
         for security in invalid_prices:
             results["securities_issues"].append({
@@ -185,7 +277,7 @@ class DataConsistencyMonitor:
                 "timestamp": datetime.now().isoformat()
             })
     
-    async def _check_positions_consistency(self, results: Dict[str, Any]):
+    async def _check_positions_consistency(self, results: Dict[str, Any], since: Optional[datetime] = None):
         """
         Check for inconsistencies in the positions table.
         
@@ -194,8 +286,11 @@ class DataConsistencyMonitor:
         - Positions with zero or negative prices
         - Positions with invalid dates
         """
+        since_filter = "AND date >= :since" if since else ""
+        values = {"since": since} if since else None
+        
         # Check for positions with zero or negative shares
-        query = """
+        query = f"""
         SELECT 
             id, 
             account_id, 
@@ -204,9 +299,9 @@ class DataConsistencyMonitor:
         FROM 
             positions 
         WHERE 
-            shares <= 0
+            shares <= 0 {since_filter}
         """
-        invalid_shares = await self.database.fetch_all(query)
+        invalid_shares = await self.database.fetch_all(query, values)
         
         for position in invalid_shares:
             results["positions_issues"].append({
@@ -219,7 +314,7 @@ class DataConsistencyMonitor:
             })
         
         # Check for positions with zero or negative prices
-        query = """
+        query = f"""
         SELECT 
             id, 
             account_id, 
@@ -228,9 +323,9 @@ class DataConsistencyMonitor:
         FROM 
             positions 
         WHERE 
-            price <= 0
+            price <= 0 {since_filter}
         """
-        invalid_prices = await self.database.fetch_all(query)
+        invalid_prices = await self.database.fetch_all(query, values)
         
         for position in invalid_prices:
             results["positions_issues"].append({
@@ -266,7 +361,7 @@ class DataConsistencyMonitor:
                 "timestamp": datetime.now().isoformat()
             })
     
-    async def _check_price_history_consistency(self, results: Dict[str, Any]):
+    async def _check_price_history_consistency(self, results: Dict[str, Any], since: Optional[datetime] = None):
         """
         Check for inconsistencies in the price_history table.
         
@@ -274,9 +369,15 @@ class DataConsistencyMonitor:
         - Price entries with zero or negative prices
         - Duplicate date entries for the same ticker
         - Future dates in price history
+        
+        With `since`, only rows written after it (and the (ticker, date) keys
+        they touch) are examined.
         """
+        since_filter = "AND written_at >= :since" if since else ""
+        values = {"since": since} if since else None
+        
         # Check for price history with zero or negative prices
-        query = """
+        query = f"""
         SELECT 
             id, 
             ticker, 
@@ -288,10 +389,11 @@ class DataConsistencyMonitor:
         FROM 
             price_history 
         WHERE 
-            close_price <= 0 OR day_open <= 0 OR day_high <= 0 OR day_low <= 0
+            (close_price <= 0 OR day_open <= 0 OR day_high <= 0 OR day_low <= 0)
+            {since_filter}
         LIMIT 100
         """
-        invalid_prices = await self.database.fetch_all(query)
+        invalid_prices = await self.database.fetch_all(query, values)
         
         for price in invalid_prices:
             results["price_history_issues"].append({
@@ -304,20 +406,21 @@ class DataConsistencyMonitor:
             })
         
         # Check for duplicate date entries for the same ticker
-        query = """
+        query = f"""
         SELECT 
             ticker, 
             date, 
             COUNT(*) as count 
         FROM 
             price_history 
+        {self._touched_keys_filter(since)}
         GROUP BY 
             ticker, date 
         HAVING 
             COUNT(*) > 1
         LIMIT 100
         """
-        duplicates = await self.database.fetch_all(query)
+        duplicates = await self.database.fetch_all(query, values)
         
         for dup in duplicates:
             results["price_history_issues"].append({
@@ -329,7 +432,7 @@ class DataConsistencyMonitor:
             })
         
         # Check for future dates in price history
-        query = """
+        query = f"""
         SELECT 
             id, 
             ticker, 
@@ -337,10 +440,10 @@ class DataConsistencyMonitor:
         FROM 
             price_history 
         WHERE 
-            date > CURRENT_DATE
+            date > CURRENT_DATE {since_filter}
         LIMIT 100
         """
-        future_dates = await self.database.fetch_all(query)
+        future_dates = await self.database.fetch_all(query, values)
         
         for price in future_dates:
             results["price_history_issues"].append({
@@ -352,11 +455,11 @@ class DataConsistencyMonitor:
                 "timestamp": datetime.now().isoformat()
             })
     
-    async def _check_orphaned_positions(self, results: Dict[str, Any]):
+    async def _check_orphaned_positions(self, results: Dict[str, Any], since: Optional[datetime] = None):
         """
         Check for orphaned positions (positions with tickers that don't exist in securities table).
         """
-        query = """
+        query = f"""
         SELECT 
             p.id, 
             p.account_id, 
@@ -367,9 +470,10 @@ class DataConsistencyMonitor:
             securities s ON p.ticker = s.ticker 
         WHERE 
             s.ticker IS NULL
+            {"AND p.date >= :since" if since else ""}
         LIMIT 100
         """
-        orphaned = await self.database.fetch_all(query)
+        orphaned = await self.database.fetch_all(query, {"since": since} if since else None)
         
         for position in orphaned:
             results["orphaned_positions"].append({
@@ -381,24 +485,24 @@ class DataConsistencyMonitor:
                 "timestamp": datetime.now().isoformat()
             })
     
-    async def _check_securities_without_prices(self, results: Dict[str, Any]):
+    async def _check_securities_without_prices(self, results: Dict[str, Any], since: Optional[datetime] = None):
         """
         Check for securities that don't have any price history entries.
         """
-        query = """
+        # NOT EXISTS probes the (ticker, date) index instead of scanning
+        # DISTINCT ticker over all of price_history
+        query = f"""
         SELECT 
             s.ticker, 
             s.company_name
         FROM 
             securities s 
-        LEFT JOIN (
-            SELECT DISTINCT ticker FROM price_history
-        ) ph ON s.ticker = ph.ticker 
         WHERE 
-            ph.ticker IS NULL AND
-            s.active = true
+            s.active = true AND
+            NOT EXISTS (SELECT 1 FROM price_history ph WHERE ph.ticker = s.ticker)
+            {"AND s.created_at >= :since" if since else ""}
         """
-        no_history = await self.database.fetch_all(query)
+        no_history = await self.database.fetch_all(query, {"since": since} if since else None)
         
         for security in no_history:
             results["securities_without_prices"].append({
@@ -409,10 +513,14 @@ class DataConsistencyMonitor:
                 "timestamp": datetime.now().isoformat()
             })
     
-    async def fix_common_issues(self) -> Dict[str, Any]:
+    async def fix_common_issues(self, incremental: bool = False) -> Dict[str, Any]:
         """
         Attempt to automatically fix common data consistency issues.
         
+        Args:
+            incremental: Only de-duplicate price history touched since the
+                last successful consistency check
+        
         Returns:
             Dictionary with results of fix operations
         """
@@ -420,13 +528,14 @@ class DataConsistencyMonitor:
             await self.connect()
             
             start_time = datetime.now()
+            since = await self.get_high_water_mark() if incremental else None
             logger.info("Starting automatic fix of common data issues")
             
             event_id = await record_system_event(
                 self.database,
                 "data_consistency_fix", 
                 "started", 
-                {}
+                {"since": since.isoformat() if since else None}
             )
             
             # Initialize results
@@ -446,7 +555,7 @@ class DataConsistencyMonitor:
             await self._fix_future_timestamps(results)
             
             # Fix duplicate price history entries
-            await self._fix_duplicate_price_history(results)
+            await self._fix_duplicate_price_history(results, since)
             
             # Calculate end time and duration
             end_time = datetime.now()
@@ -502,6 +611,7 @@ class DataConsistencyMonitor:
             current_price > 1000000
         """
         invalid_securities = await self.database.fetch_all(query)
+        repriced = []
         
         # Try to get the most recent price from price_history
         for security in invalid_securities:
@@ -541,6 +651,7 @@ class DataConsistencyMonitor:
                             "price": recent_price["close_price"]
                         }
                     )
+                    repriced.append(ticker)
                     
                     results["fixed_issues"].append({
                         "ticker": ticker,
@@ -567,6 +678,9 @@ class DataConsistencyMonitor:
                     "reason": f"Error: {str(e)}",
                     "timestamp": datetime.now().isoformat()
                 })
+        
+        if repriced:
+            await notify_price_changes(self.database, repriced)
     
     async def _fix_future_timestamps(self, results: Dict[str, Any]):
         """
@@ -615,89 +729,72 @@ class DataConsistencyMonitor:
                     "timestamp": datetime.now().isoformat()
                 })
     
-    async def _fix_duplicate_price_history(self, results: Dict[str, Any]):
+    @staticmethod
+    def _touched_keys_filter(since: Optional[datetime]) -> str:
+        """WHERE clause limiting price_history to (ticker, date) keys written since `since`"""
+        if not since:
+            return ""
+        return """
+        WHERE (ticker, date) IN (
+            SELECT ticker, date FROM price_history WHERE written_at >= :since
+        )
         """
-        Fix duplicate price history entries by keeping the most recent record
+    
+    async def _fix_duplicate_price_history(self, results: Dict[str, Any], since: Optional[datetime] = None):
         """
-        # Get duplicates in price_history
-        query = """
-        SELECT 
-            ticker, 
-            date, 
-            COUNT(*) as count 
-        FROM 
-            price_history 
-        GROUP BY 
-            ticker, date 
-        HAVING 
-            COUNT(*) > 1
+        Fix duplicate price history entries by keeping the most recent record
+        
+        One window-function DELETE ranks the rows of every (ticker, date) by
+        timestamp and removes all but the newest.
+        """
+        query = f"""
+        DELETE FROM 
+            price_history ph
+        USING (
+            SELECT 
+                id,
+                ROW_NUMBER() OVER (
+                    PARTITION BY ticker, date
+                    ORDER BY "timestamp" DESC NULLS LAST, id DESC
+                ) AS rn
+            FROM 
+                price_history
+            {self._touched_keys_filter(since)}
+        ) ranked
+        WHERE 
+            ph.id = ranked.id AND
+            ranked.rn > 1
+        RETURNING 
+            ph.ticker, 
+            ph.date
         """
-        duplicates = await self.database.fetch_all(query)
+        try:
+            deleted = await self.database.fetch_all(query, {"since": since} if since else None)
+        except Exception as e:
+            logger.error(f"Error fixing duplicate price history: {str(e)}")
+            results["unfixable_issues"].append({
+                "issue_type": "duplicate_price_history",
+                "reason": f"Error: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            })
+            return
         
-        for dup in duplicates:
-            ticker = dup["ticker"]
-            date = dup["date"]
-            count = dup["count"]
-            
-            try:
-                # Get all duplicate entries
-                query = """
-                SELECT 
-                    id, 
-                    close_price, 
-                    timestamp
-                FROM 
-                    price_history
-                WHERE 
-                    ticker = :ticker AND
-                    date = :date
-                ORDER BY 
-                    timestamp DESC
-                """
-                entries = await self.database.fetch_all(
-                    query, 
-                    {
-                        "ticker": ticker, 
-                        "date": date
-                    }
-                )
-                
-                if len(entries) > 1:
-                    # Keep the first one (most recent by timestamp) and delete others
-                    keep_id = entries[0]["id"]
-                    
-                    # Collect IDs to delete (all except the one to keep)
-                    delete_ids = [entry["id"] for entry in entries[1:]]
-                    
-                    # Delete duplicates
-                    if delete_ids:
-                        placeholders = ', '.join([str(id) for id in delete_ids])
-                        delete_query = f"""
-                        DELETE FROM 
-                            price_history
-                        WHERE 
-                            id IN ({placeholders})
-                        """
-                        await self.database.execute(delete_query)
-                        
-                        results["fixed_issues"].append({
-                            "ticker": ticker,
-                            "date": date.isoformat() if date else None,
-                            "issue_type": "duplicate_price_history",
-                            "solution": f"Kept most recent entry (ID: {keep_id}) and deleted {len(delete_ids)} duplicates",
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        
-                        results["total_fixed"] += 1
-            except Exception as e:
-                logger.error(f"Error fixing duplicate price history for {ticker} on {date}: {str(e)}")
-                results["unfixable_issues"].append({
-                    "ticker": ticker,
-                    "date": date.isoformat() if date else None,
-                    "issue_type": "duplicate_price_history",
-                    "reason": f"Error: {str(e)}",
-                    "timestamp": datetime.now().isoformat()
-                })
+        # Report one fixed issue per (ticker, date)
+        deleted_counts: Dict[tuple, int] = {}
+        for row in deleted:
+            key = (row["ticker"], row["date"])
+            deleted_counts[key] = deleted_counts.get(key, 0) + 1
+        
+        for (ticker, date), count in deleted_counts.items():
+            results["fixed_issues"].append({
+                "ticker": ticker,
+                "date": date.isoformat() if date else None,
+                "issue_type": "duplicate_price_history",
+                "solution": f"Kept most recent entry and deleted {count} duplicates",
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        results["total_fixed"] += len(deleted_counts)
     
     async def _record_system_event(self, event_type: str, status: str, details: Dict[str, Any]) -> int:
         """Record a system event"""
@@ -769,19 +866,20 @@ class DataConsistencyMonitor:
 
 
 # Function to run the consistency check as a standalone script
-async def run_consistency_check(fix_issues: bool = False):
+async def run_consistency_check(fix_issues: bool = False, incremental: bool = False):
     """
     Run data consistency check as a standalone script
     
     Args:
         fix_issues: Whether to automatically fix common issues
+        incremental: Only check rows written since the last successful check
     """
     monitor = DataConsistencyMonitor()
     
     try:
         # Run consistency check
-        print("Running data consistency check...")
-        results = await monitor.check_data_consistency()
+        print(f"Running {'incremental' if incremental else 'full'} data consistency check...")
+        results = await monitor.check_data_consistency(incremental=incremental)
         
         print(f"Check completed in {results['duration_seconds']:.2f} seconds")
         print(f"Found {results['issues_count']} issues:")
@@ -794,20 +892,23 @@ async def run_consistency_check(fix_issues: bool = False):
         # Fix issues if requested
         if fix_issues and results['issues_count'] > 0:
             print("\nAttempting to fix common issues...")
-            fix_results = await monitor.fix_common_issues()
+            fix_results = await monitor.fix_common_issues(incremental=incremental)
             
             print(f"Fix completed in {fix_results['duration_seconds']:.2f} seconds")
             print(f"Fixed {fix_results['total_fixed']} issues")
             print(f"Unable to fix {len(fix_results['unfixable_issues'])} issues")
     except Exception as e:
         print(f"Error during consistency check: {str(e)}")
+    finally:
+        await flush_system_events()
 
 if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="NestEgg Data Consistency Monitor")
     parser.add_argument("--fix", action="store_true", help="Automatically fix common issues")
+    parser.add_argument("--incremental", action="store_true", help="Only check rows written since the last successful check")
     
     args = parser.parse_args()
     
-    asyncio.run(run_consistency_check(fix_issues=args.fix))
\ No newline at end of file
+    asyncio.run(run_consistency_check(fix_issues=args.fix, incremental=args.incremental))
\ No newline at end of file
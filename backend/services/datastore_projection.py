@@ -0,0 +1,157 @@
+"""
+Field projection and columnar responses for the datastore endpoints.
+
+The rept_* views behind the datastore endpoints are wide (every position
+carries 1d/1w/1m/3m/ytd/1y/max change columns and JSON details), while most
+table views show a handful of them. Endpoints take:
+
+    fields=a,b,c     only these columns are selected in SQL and returned
+    format=columnar  lists come back as {"columns": [...], "rows": [[...], ...]}
+                     instead of repeating every key in every row
+
+Requested fields are checked against the view's own columns (read once from
+information_schema and cached for DATASTORE_COLUMNS_TTL_SECONDS), and only
+those identifiers are interpolated into SQL, quoted. Columns an endpoint needs
+for its own summary figures are always selected, then dropped from the rows
+unless they were asked for.
+"""
+import os
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("datastore_projection")
+
+DATASTORE_COLUMNS_TTL_SECONDS = int(os.getenv("DATASTORE_COLUMNS_TTL_SECONDS", "3600"))
+COLUMNAR_FORMAT = "columnar"
+
+VIEW_COLUMNS_QUERY = """
+SELECT column_name
+FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = :view
+ORDER BY ordinal_position
+"""
+
+
+class ProjectionError(ValueError):
+    """A fields= request the view can't satisfy (reported as a 400)"""
+
+
+class Projection:
+    """SELECT list for one request, and the columns its rows should keep"""
+
+    def __init__(self, select_columns: Optional[List[str]], output: Optional[List[str]], requested: bool):
+        self.select_columns = select_columns
+        self.output = output
+        self.requested = requested
+
+    @property
+    def select_sql(self) -> str:
+        if self.select_columns is None:
+            return "*"
+        return ", ".join(f'"{column}"' for column in self.select_columns)
+
+    def rows(self, rows: List[Dict[str, Any]], response_format: Optional[str] = None):
+        """Project processed rows, optionally into the columnar shape"""
+        if self.requested:
+            rows = [{column: row.get(column) for column in self.output} for row in rows]
+        if response_format != COLUMNAR_FORMAT:
+            return rows
+        columns = self.output if self.output is not None else (list(rows[0]) if rows else [])
+        return to_columnar(rows, columns)
+
+
+class ViewColumns:
+    """Cached column lists of the reporting views"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every endpoint shares the cache"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._columns: Dict[str, Tuple[float, List[str]]] = {}
+
+    async def get(self, database, view: str) -> List[str]:
+        cached = self._columns.get(view)
+        if cached and time.time() - cached[0] < DATASTORE_COLUMNS_TTL_SECONDS:
+            return cached[1]
+        rows = await database.fetch_all(VIEW_COLUMNS_QUERY, {"view": view})
+        columns = [row["column_name"] for row in rows]
+        if columns:
+            self._columns[view] = (time.time(), columns)
+        else:
+            logger.warning(f"No columns found for {view}; field projection disabled for it")
+        return columns
+
+    def invalidate(self):
+        self._columns.clear()
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """'a, b,,a' -> ['a', 'b']"""
+    seen = {}
+    for field in (fields or "").split(","):
+        field = field.strip()
+        if field:
+            seen.setdefault(field, None)
+    return list(seen)
+
+
+async def build_projection(
+    database,
+    view: str,
+    fields: Optional[str] = None,
+    required: Iterable[str] = (),
+    default: Optional[Sequence[str]] = None,
+    exclude: Iterable[str] = (),
+) -> Projection:
+    """
+    Work out what to select from `view` for a request
+
+    Args:
+        database: Database handle
+        view: Reporting view being read
+        fields: The request's fields= value
+        required: Columns the endpoint itself reads (always selected)
+        default: Output columns when no fields are requested (default: all)
+        exclude: Columns left out of the default output
+
+    Raises:
+        ProjectionError: A requested field isn't a column of the view
+    """
+    requested = parse_fields(fields)
+    exclude = set(exclude)
+    if not requested and not exclude:
+        # The endpoint's usual SELECT; no need for the catalog
+        default = list(default) if default is not None else None
+        return Projection(default, default, False)
+
+    columns = await ViewColumns.get_instance().get(database, view)
+    if not columns:
+        if requested:
+            raise ProjectionError(f"Field selection is not available for {view}")
+        return Projection(list(default) if default is not None else None, None, False)
+
+    available = set(columns)
+    if requested:
+        unknown = [field for field in requested if field not in available]
+        if unknown:
+            raise ProjectionError(f"Unknown fields: {', '.join(unknown)}")
+        output = requested
+    else:
+        output = [column for column in (default if default is not None else columns) if column not in exclude]
+
+    select_columns = output + [column for column in required if column not in output and column in available]
+    return Projection(select_columns, output, bool(requested))
+
+
+def to_columnar(rows: List[Dict[str, Any]], columns: List[str]) -> Dict[str, Any]:
+    """{"columns": [...], "rows": [[...]]} for a list of row dicts"""
+    return {"columns": columns, "rows": [[row.get(column) for column in columns] for row in rows]}
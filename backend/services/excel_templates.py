@@ -1,8 +1,16 @@
 import io
+import os
+import time
+import asyncio
+import logging
+import zipfile
+from copy import copy
 from datetime import datetime
-from typing import List, Dict, Any
+from itertools import zip_longest
+from typing import List, Dict, Any, Iterator, Optional
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
@@ -17,6 +25,31 @@ from backend.utils.constants import (
     ACCOUNT_TYPES_BY_CATEGORY, # dict[str, list[str]]
 )
 
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("excel_templates")
+
+TEMPLATE_CHUNK_BYTES = int(os.getenv("TEMPLATE_CHUNK_BYTES", str(64 * 1024)))
+CASH_TYPES = ["Savings", "Checking", "Money Market", "CD"]
+
+# One pass over the rows the Lookups sheet is built from; any insert, delete,
+# rename or on_yfinance flip changes it and forces a rebuild of the cached part
+LOOKUPS_FINGERPRINT_QUERY = """
+    SELECT
+        COUNT(*) AS row_count,
+        COALESCE(SUM(hashtext(
+            ticker || '|' || COALESCE(asset_type, '') || '|' || COALESCE(company_name, '')
+        )), 0) AS checksum
+    FROM securities
+    WHERE (asset_type IN ('security', 'index') AND on_yfinance = true)
+       OR asset_type = 'crypto'
+       OR ticker IN ('GC=F', 'SI=F', 'PL=F', 'PA=F', 'HG=F')
+"""
+
+# Prebuilt Lookups worksheet part shared by every positions template
+_lookups_cache: Dict[str, Any] = {"part": None}
+_lookups_lock = asyncio.Lock()
+
 class ExcelTemplateService:
     """Service for generating Excel import templates (Accounts + Positions)."""
 
@@ -362,8 +395,13 @@ class ExcelTemplateService:
 
     # ==========================
     # PUBLIC: POSITIONS TEMPLATE
-    # (simple scaffold; Step 2)
     # ==========================
+    # The workbook is written with openpyxl's write_only mode, so rows stream to
+    # disk instead of living as styled Cell objects. The hidden "Lookups" sheet
+    # (securities, crypto, metals and cash types) is the same for every user; it is
+    # built once as a worksheet XML part and spliced into each download until the
+    # securities list changes. Per-user data (the account list) lives on its own
+    # hidden "UserLookups" sheet.
 
     async def create_positions_template(self, user_id: Any, database) -> io.BytesIO:
         # Get user's accounts
@@ -376,83 +414,140 @@ class ExcelTemplateService:
         accounts = await database.fetch_all(query=accounts_query, values={"user_id": user_id})
         if not accounts:
             raise ValueError("No accounts found. Please create accounts before downloading positions template.")
-        
-        # Get securities (stocks/ETFs only)
-        securities_query = """
-            SELECT ticker, company_name
-            FROM securities
-            WHERE asset_type IN ('security', 'index')
-            AND on_yfinance = true
-            ORDER BY ticker
-        """
-        securities = await database.fetch_all(query=securities_query)
-        
-        # Get crypto assets
-        crypto_query = """
-            SELECT ticker, company_name
-            FROM securities
-            WHERE asset_type = 'crypto'
-            ORDER BY ticker
-            LIMIT 500
-        """
-        cryptos = await database.fetch_all(query=crypto_query)
-        
-        # Get metal futures
-        metals_query = """
-            SELECT 
-                CASE 
-                    WHEN ticker = 'GC=F' THEN 'Gold'
-                    WHEN ticker = 'SI=F' THEN 'Silver'
-                    WHEN ticker = 'PL=F' THEN 'Platinum'
-                    WHEN ticker = 'PA=F' THEN 'Palladium'
-                    WHEN ticker = 'HG=F' THEN 'Copper'
-                END as metal_type,
-                ticker,
-                company_name,
-                current_price
-            FROM securities
-            WHERE ticker IN ('GC=F', 'SI=F', 'PL=F', 'PA=F', 'HG=F')
-            ORDER BY metal_type
-        """
-        metals = await database.fetch_all(query=metals_query)
 
-        wb = Workbook()
-        wb.remove(wb.active)
-        
+        lookups = await self._get_lookups_part(database)
+        account_names = [acc["account_name"] for acc in accounts]
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._build_positions_workbook, account_names, lookups)
+
+    async def _get_lookups_part(self, database) -> Dict[str, Any]:
+        """The cached Lookups sheet, rebuilt only when the securities fingerprint changes"""
+        row = await database.fetch_one(query=LOOKUPS_FINGERPRINT_QUERY)
+        fingerprint = (row["row_count"], row["checksum"])
+
+        part = _lookups_cache["part"]
+        if part is not None and part["fingerprint"] == fingerprint:
+            return part
+
+        async with _lookups_lock:
+            part = _lookups_cache["part"]
+            if part is not None and part["fingerprint"] == fingerprint:
+                return part
+
+            started = time.perf_counter()
+
+            # Get securities (stocks/ETFs only)
+            securities_query = """
+                SELECT ticker, company_name
+                FROM securities
+                WHERE asset_type IN ('security', 'index')
+                AND on_yfinance = true
+                ORDER BY ticker
+            """
+            securities = await database.fetch_all(query=securities_query)
+
+            # Get crypto assets
+            crypto_query = """
+                SELECT ticker, company_name
+                FROM securities
+                WHERE asset_type = 'crypto'
+                ORDER BY ticker
+                LIMIT 500
+            """
+            cryptos = await database.fetch_all(query=crypto_query)
+
+            # Get metal futures
+            metals_query = """
+                SELECT
+                    CASE
+                        WHEN ticker = 'GC=F' THEN 'Gold'
+                        WHEN ticker = 'SI=F' THEN 'Silver'
+                        WHEN ticker = 'PL=F' THEN 'Platinum'
+                        WHEN ticker = 'PA=F' THEN 'Palladium'
+                        WHEN ticker = 'HG=F' THEN 'Copper'
+                    END as metal_type,
+                    ticker
+                FROM securities
+                WHERE ticker IN ('GC=F', 'SI=F', 'PL=F', 'PA=F', 'HG=F')
+                ORDER BY metal_type
+            """
+            metals = await database.fetch_all(query=metals_query)
+
+            columns = (
+                [(sec["ticker"], sec["company_name"]) for sec in securities],
+                [(crypto["ticker"], crypto["company_name"]) for crypto in cryptos],
+                [(metal["metal_type"], metal["ticker"]) for metal in metals],
+            )
+            loop = asyncio.get_running_loop()
+            xml = await loop.run_in_executor(None, _build_lookups_part, *columns)
+
+            part = {
+                "fingerprint": fingerprint,
+                "xml": xml,
+                "securities": len(securities),
+                "built_at": time.time(),
+            }
+            _lookups_cache["part"] = part
+            logger.info(
+                f"Built positions template lookups ({len(securities)} securities, {len(xml) / 1e6:.1f} MB) "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+            return part
+
+    def _build_positions_workbook(self, account_names: List[str], lookups: Dict[str, Any]) -> io.BytesIO:
+        wb = Workbook(write_only=True)
+
         # Create comprehensive instructions
         self._create_master_instructions_sheet(wb)
-        
-        # Create hidden lookups sheet
-        lookups = self._create_lookups_sheet(wb, accounts, securities, cryptos, metals)
-        
-        # Create position entry sheets with clear labeling
-        self._create_securities_positions_sheet(wb, accounts, securities)
-        self._create_cash_positions_sheet(wb, accounts)
-        self._create_crypto_positions_sheet(wb, accounts, cryptos)
-        self._create_metal_positions_sheet(wb, accounts, metals)
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
 
-    def _create_master_instructions_sheet(self, wb: Workbook) -> Worksheet:
-        ws = wb.create_sheet("📋 START HERE - Instructions", 0)
+        # Hidden lookup sheets: the shared one is a placeholder until the cached part is spliced in
+        lookups_ws = wb.create_sheet("Lookups")
+        lookups_ws.sheet_state = "hidden"
+        self._create_user_lookups_sheet(wb, account_names)
+
+        # Create position entry sheets with clear labeling
+        self._create_securities_positions_sheet(wb, account_names, lookups["securities"])
+        self._create_cash_positions_sheet(wb, account_names)
+        self._create_crypto_positions_sheet(wb, account_names)
+        self._create_metal_positions_sheet(wb, account_names)
+
+        for name, column in (("SecuritiesList", "C"), ("CryptoList", "F"), ("MetalsList", "I"), ("CashTypesList", "L")):
+            attr_text = f"OFFSET(Lookups!${column}$2,0,0,COUNTA(Lookups!${column}:${column})-1,1)"
+            wb.defined_names.add(DefinedName(name=name, attr_text=attr_text))
+
+        skeleton = io.BytesIO()
+        wb.save(skeleton)
+        # Sheet paths are assigned during save
+        return _replace_part(skeleton, lookups_ws.path[1:], lookups["xml"])
+
+    @staticmethod
+    def _cell(ws, value: Any = None, **styles) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=value)
+        for name, style in styles.items():
+            setattr(cell, name, style)
+        return cell
+
+    def _create_master_instructions_sheet(self, wb: Workbook):
+        ws = wb.create_sheet("📋 START HERE - Instructions")
         ws.sheet_properties.tabColor = "FF0000"  # Red to draw attention
-        
+        ws.column_dimensions["A"].width = 100
+
         # Title
-        ws.merge_cells("A1:H1")
-        ws["A1"] = "NestEgg Position Import Template"
-        ws["A1"].font = Font(bold=True, size=18, color="2C3E50")
-        ws["A1"].alignment = Alignment(horizontal="center")
-        
+        ws.merged_cells.add("A1:H1")
+        ws.append([self._cell(ws, "NestEgg Position Import Template",
+                              font=Font(bold=True, size=18, color="2C3E50"),
+                              alignment=Alignment(horizontal="center"))])
+        ws.append([])
+
         # Overview
-        ws.merge_cells("A3:H3")
-        ws["A3"] = "HOW TO USE THIS TEMPLATE"
-        ws["A3"].font = Font(bold=True, size=14, color="FFFFFF")
-        ws["A3"].fill = PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid")
-        ws["A3"].alignment = Alignment(horizontal="center")
-        
+        ws.merged_cells.add("A3:H3")
+        ws.append([self._cell(ws, "HOW TO USE THIS TEMPLATE",
+                              font=Font(bold=True, size=14, color="FFFFFF"),
+                              fill=PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid"),
+                              alignment=Alignment(horizontal="center"))])
+        ws.append([])
+
         # Tab descriptions
         instructions = [
             "",
@@ -496,120 +591,120 @@ class ExcelTemplateService:
             "• Import errors? Check that all required fields are filled",
             "• Account missing? Create it in NestEgg first, then re-download template"
         ]
-        
-        row = 5
-        for line in instructions:
-            ws[f"A{row}"] = line
+
+        for row, line in enumerate(instructions, start=5):
             if line.startswith("📈") or line.startswith("💵") or line.startswith("🪙") or line.startswith("🥇"):
-                ws[f"A{row}"].font = Font(bold=True, size=12, color="2C3E50")
-                ws.merge_cells(f"A{row}:H{row}")
+                font = Font(bold=True, size=12, color="2C3E50")
             elif line.startswith("⚠️") or line.startswith("❌") or line.startswith("📧"):
-                ws[f"A{row}"].font = Font(bold=True, size=12, color="C00000")
-                ws.merge_cells(f"A{row}:H{row}")
+                font = Font(bold=True, size=12, color="C00000")
             elif line.startswith("   •"):
-                ws[f"A{row}"].font = Font(size=10, color="666666")
-                ws.merge_cells(f"A{row}:H{row}")
+                font = Font(size=10, color="666666")
             else:
-                ws[f"A{row}"].font = Font(size=11)
-                ws.merge_cells(f"A{row}:H{row}")
-            row += 1
-        
-        ws.column_dimensions["A"].width = 100
+                font = Font(size=11)
+            ws.merged_cells.add(f"A{row}:H{row}")
+            ws.append([self._cell(ws, line, font=font)])
+
         return ws
 
-    def _create_lookups_sheet(self, wb: Workbook, accounts: list, securities: list, cryptos: list, metals: list) -> Worksheet:
-        ws = wb.create_sheet("Lookups", 1)
-        ws.sheet_state = 'hidden'
-        
+    def _create_user_lookups_sheet(self, wb: Workbook, account_names: List[str]):
+        ws = wb.create_sheet("UserLookups")
+        ws.sheet_state = "hidden"
+
         # Accounts column
-        ws["A1"] = "Accounts"
-        ws["A1"].font = self.header_font
-        for i, acc in enumerate(accounts, start=2):
-            ws.cell(row=i, column=1, value=acc["account_name"]).border = self.border
-        
-        # Create named range for accounts
+        ws.append([self._cell(ws, "Accounts", font=self.header_font)])
+        for name in account_names:
+            ws.append([self._cell(ws, name, border=self.border)])
+
         # Create dynamic named range for accounts (auto-expands with data)
-        acc_range = 'OFFSET(Lookups!$A$2,0,0,COUNTA(Lookups!$A:$A)-1,1)'
+        acc_range = 'OFFSET(UserLookups!$A$2,0,0,COUNTA(UserLookups!$A:$A)-1,1)'
         wb.defined_names.add(DefinedName(name="AccountsList", attr_text=acc_range))
-            
-        # Securities column (ticker and company name)
-        ws["C1"] = "Ticker"
-        ws["D1"] = "Company"
-        ws["C1"].font = self.header_font
-        ws["D1"].font = self.header_font
-        for i, sec in enumerate(securities, start=2):
-            ws.cell(row=i, column=3, value=sec["ticker"]).border = self.border
-            ws.cell(row=i, column=4, value=sec["company_name"]).border = self.border
-        
-        # Dynamic named range for securities (Ticker)
-        sec_range = 'OFFSET(Lookups!$C$2,0,0,COUNTA(Lookups!$C:$C)-1,1)'
-        wb.defined_names.add(DefinedName(name="SecuritiesList", attr_text=sec_range))
-        
-        # Crypto column
-        ws["F1"] = "Crypto Symbol"
-        ws["G1"] = "Crypto Name"
-        ws["F1"].font = self.header_font
-        ws["G1"].font = self.header_font
-        for i, crypto in enumerate(cryptos, start=2):
-            ws.cell(row=i, column=6, value=crypto["ticker"]).border = self.border
-            ws.cell(row=i, column=7, value=crypto["company_name"]).border = self.border
-        
-        # Dynamic named range for cryptos (Symbol)
-        crypto_range = 'OFFSET(Lookups!$F$2,0,0,COUNTA(Lookups!$F:$F)-1,1)'
-        wb.defined_names.add(DefinedName(name="CryptoList", attr_text=crypto_range))
-        
-        # Metals column
-        ws["I1"] = "Metal Type"
-        ws["J1"] = "Metal Ticker"
-        ws["I1"].font = self.header_font
-        ws["J1"].font = self.header_font
-        if metals:
-            for i, metal in enumerate(metals, start=2):
-                ws.cell(row=i, column=9, value=metal["metal_type"]).border = self.border
-                ws.cell(row=i, column=10, value=metal["ticker"]).border = self.border
-        
-        # Dynamic named range for metals (Type)
-        metal_range = 'OFFSET(Lookups!$I$2,0,0,COUNTA(Lookups!$I:$I)-1,1)'
-        wb.defined_names.add(DefinedName(name="MetalsList", attr_text=metal_range))
-        
-        # Cash types
-        ws["L1"] = "Cash Types"
-        ws["L1"].font = self.header_font
-        cash_types = ["Savings", "Checking", "Money Market", "CD"]
-        for i, cash_type in enumerate(cash_types, start=2):
-            ws.cell(row=i, column=12, value=cash_type).border = self.border
-        
-        # Create named range for cash types
-        cash_range = 'OFFSET(Lookups!$L$2,0,0,COUNTA(Lookups!$L:$L)-1,1)'
-        wb.defined_names.add(DefinedName(name="CashTypesList", attr_text=cash_range))
-        
         return ws
 
-    def _create_securities_positions_sheet(self, wb: Workbook, accounts: list, securities: list) -> Worksheet:
-        ws = wb.create_sheet("📈 SECURITIES", 2)
-        ws.sheet_properties.tabColor = "0066CC"
-        
-        # Add a header banner
-        ws.merge_cells("A1:F1")
-        ws["A1"] = "SECURITIES POSITIONS - Stocks, ETFs, Mutual Funds"
-        ws["A1"].font = Font(bold=True, size=12, color="FFFFFF")
-        ws["A1"].fill = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
-        ws["A1"].alignment = Alignment(horizontal="center")
-        
-        # Column headers (row 2)
-        headers = ["Account", "Ticker", "Company Name", "Shares", "Cost Basis", "Purchase Date"]
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=2, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
-            cell.border = self.border
-        
-        # Set column widths
-        widths = {"A": 25, "B": 15, "C": 35, "D": 15, "E": 15, "F": 15, "G": 30}
+    def _start_positions_sheet(self, wb: Workbook, title: str, color: str, banner: str,
+                               headers: List[str], widths: Dict[str, int], date_column: str):
+        """Create an entry sheet and write its banner (row 1) and headers (row 2)"""
+        ws = wb.create_sheet(title)
+        ws.sheet_properties.tabColor = color
+
+        # Column widths and formats have to be set before the first row is written
         for col, width in widths.items():
             ws.column_dimensions[col].width = width
-        
+        ws.column_dimensions[date_column].number_format = "yyyy-mm-dd"
+
+        # Header banner
+        ws.merged_cells.add("A1:F1")
+        ws.append([self._cell(ws, banner,
+                              font=Font(bold=True, size=12, color="FFFFFF"),
+                              fill=PatternFill(start_color=color, end_color=color, fill_type="solid"),
+                              alignment=Alignment(horizontal="center"))])
+
+        # Headers
+        ws.append([
+            self._cell(ws, header, font=self.header_font, fill=self.header_fill,
+                       alignment=self.header_alignment, border=self.border)
+            for header in headers
+        ])
+        return ws
+
+    def _write_entry_rows(self, ws, examples: List[list], required_columns: List[int],
+                          date_column: int, lookup_formula: Optional[str] = None) -> None:
+        """
+        Write rows 3 onwards of an entry sheet.
+
+        Args:
+            ws: The write-only worksheet (banner and headers already written)
+            examples: Sample rows for rows 3-4
+            required_columns: 1-based columns highlighted as required in rows 5-49
+            date_column: 1-based column that keeps the yyyy-mm-dd format when highlighted
+            lookup_formula: Name lookup for column C, formatted with the row number (rows 3-1000)
+        """
+        # Example rows
+        for row_data in examples:
+            ws.append([self._cell(ws, value, border=self.border, fill=self.sample_fill) for value in row_data])
+
+        # Styles are resolved once per sheet and copied; assigning fonts/fills per cell re-hashes them
+        bordered = self._cell(ws, border=self.border)
+        required = self._cell(ws, fill=self.required_fill)
+        required_bordered = self._cell(ws, border=self.border, fill=self.required_fill)
+        required_date = self._cell(ws, fill=self.required_fill, number_format="yyyy-mm-dd")
+
+        def styled(prototype: WriteOnlyCell, value: Any = None) -> WriteOnlyCell:
+            cell = WriteOnlyCell(ws, value=value)
+            cell._style = copy(prototype._style)
+            return cell
+
+        last_row = 1000 if lookup_formula else 49
+        for r in range(5, last_row + 1):
+            row = [None] * 6
+            highlighted = r < 50  # Required fields highlighting
+            if highlighted:
+                for col in required_columns:
+                    row[col - 1] = styled(required_date if col == date_column else required)
+            if lookup_formula:
+                prototype = required_bordered if highlighted and 3 in required_columns else bordered
+                row[2] = styled(prototype, lookup_formula.format(row=r))
+            if r == 5:
+                # Add instruction row — put directly under examples on row 5, and remove '*' language
+                ws.merged_cells.add("A5:F5")
+                row[0] = self._cell(ws, "⚠️ Delete example rows (3–4) before importing.",
+                                    fill=self.required_fill,
+                                    font=Font(bold=True, italic=True, color="FF0000", size=10),
+                                    alignment=Alignment(horizontal="center"))
+            ws.append(row)
+
+    @staticmethod
+    def _add_validation(ws, validation: DataValidation, cell_range: str) -> None:
+        ws.data_validations.append(validation)
+        validation.add(cell_range)
+
+    def _create_securities_positions_sheet(self, wb: Workbook, accounts: list, securities_count: int):
+        ws = self._start_positions_sheet(
+            wb, "📈 SECURITIES", "0066CC", "SECURITIES POSITIONS - Stocks, ETFs, Mutual Funds",
+            ["Account", "Ticker", "Company Name", "Shares", "Cost Basis", "Purchase Date"],
+            {"A": 25, "B": 15, "C": 35, "D": 15, "E": 15, "F": 15, "G": 30},
+            date_column="F",
+        )
+
         # Add account dropdown validation
         if accounts:
             dv_acc = DataValidation(
@@ -618,24 +713,18 @@ class ExcelTemplateService:
                 allow_blank=False
             )
             dv_acc.showDropDown = False  # Force dropdown arrow to appear
-            ws.add_data_validation(dv_acc)
-            dv_acc.add("A3:A1000")
+            self._add_validation(ws, dv_acc, "A3:A1000")
 
-        # Add ticker dropdown validation  
-        if securities:
+        # Add ticker dropdown validation
+        if securities_count:
             dv_ticker = DataValidation(
                 type="list",
                 formula1="=SecuritiesList",
                 allow_blank=False
             )
             dv_ticker.showDropDown = False  # Force dropdown arrow to appear
-            ws.add_data_validation(dv_ticker)
-            dv_ticker.add("B3:B1048576")
-            # Auto-fill Company Name for ALL editable rows with a VLOOKUP on the ticker
-            for r in range(3, 1001):
-                ws.cell(row=r, column=3, value=f'=IFERROR(VLOOKUP(B{r},Lookups!$C:$D,2,FALSE),"")').border = self.border
+            self._add_validation(ws, dv_ticker, "B3:B1048576")
 
-        
         # Add numeric validation for shares
         dv_shares = DataValidation(
             type="decimal",
@@ -643,9 +732,8 @@ class ExcelTemplateService:
             formula1=0,
             allow_blank=False
         )
-        ws.add_data_validation(dv_shares)
-        dv_shares.add("D3:D1048576")
-        
+        self._add_validation(ws, dv_shares, "D3:D1048576")
+
         # Add numeric validation for cost basis
         dv_cost = DataValidation(
             type="decimal",
@@ -653,9 +741,8 @@ class ExcelTemplateService:
             formula1=0,
             allow_blank=False
         )
-        ws.add_data_validation(dv_cost)
-        dv_cost.add("E3:E1048576")
-        
+        self._add_validation(ws, dv_cost, "E3:E1048576")
+
         # Add date validation
         dv_date = DataValidation(
             type="date",
@@ -664,85 +751,43 @@ class ExcelTemplateService:
             formula2="TODAY()",
             allow_blank=False
         )
-        ws.add_data_validation(dv_date)
-        dv_date.add("F3:F1048576")
-        for r in range(3, 10003):  # pre-format first 10k rows for user convenience
-            ws.cell(row=r, column=6).number_format = "yyyy-mm-dd"
-        
-        # Add example rows
+        self._add_validation(ws, dv_date, "F3:F1048576")
+
+        # Add example rows; Company Name auto-fills for all editable rows with a VLOOKUP on the ticker
         examples = [
             ["Select Account", "AAPL", "=IFERROR(VLOOKUP(B3,Lookups!$C:$D,2,FALSE),\"\")", "100", "150.00", "2024-01-15"],
             ["Select Account", "VOO", "=IFERROR(VLOOKUP(B4,Lookups!$C:$D,2,FALSE),\"\")", "50", "425.00", "2024-02-01"]
         ]
-        
-        for r_idx, row_data in enumerate(examples, start=3):
-            for c_idx, value in enumerate(row_data, start=1):
-                cell = ws.cell(row=r_idx, column=c_idx, value=value)
-                cell.border = self.border
-                cell.fill = self.sample_fill
-        
-        # Required field highlighting for empty rows
-        # Required field highlighting for empty rows
-        for row in range(5, 50):
-            for col in [1, 2, 4, 5, 6]:  # Required columns
-                ws.cell(row=row, column=col).fill = self.required_fill
-
-
-        
-        # Add instruction row — put directly under examples on row 5, and remove '*' language
-        ws.merge_cells("A5:F5")
-        ws["A5"] = "⚠️ Delete example rows (3–4) before importing."
-        ws["A5"].font = Font(bold=True, italic=True, color="FF0000", size=10)
-        ws["A5"].alignment = Alignment(horizontal="center")
-        
+        lookup_formula = '=IFERROR(VLOOKUP(B{row},Lookups!$C:$D,2,FALSE),"")' if securities_count else None
+        self._write_entry_rows(ws, examples, [1, 2, 4, 5, 6], date_column=6, lookup_formula=lookup_formula)
         return ws
 
-    def _create_cash_positions_sheet(self, wb: Workbook, accounts: list) -> Worksheet:
-        ws = wb.create_sheet("💵 CASH", 3)
-        ws.sheet_properties.tabColor = "663399"
-        
-        # Header banner
-        ws.merge_cells("A1:F1")
-        ws["A1"] = "CASH POSITIONS - Savings, Checking, Money Market, CDs"
-        ws["A1"].font = Font(bold=True, size=12, color="FFFFFF")
-        ws["A1"].fill = PatternFill(start_color="663399", end_color="663399", fill_type="solid")
-        ws["A1"].alignment = Alignment(horizontal="center")
-        
-        # Headers
-        headers = ["Account", "Cash Type", "Amount", "Interest Rate (%)", "Maturity Date", "Notes"]
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=2, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
-            cell.border = self.border
-        
-        # Column widths
-        widths = {"A": 25, "B": 20, "C": 15, "D": 15, "E": 15, "F": 30}
-        for col, width in widths.items():
-            ws.column_dimensions[col].width = width
-        
-        # Account validation
+    def _create_cash_positions_sheet(self, wb: Workbook, accounts: list):
+        ws = self._start_positions_sheet(
+            wb, "💵 CASH", "663399", "CASH POSITIONS - Savings, Checking, Money Market, CDs",
+            ["Account", "Cash Type", "Amount", "Interest Rate (%)", "Maturity Date", "Notes"],
+            {"A": 25, "B": 20, "C": 15, "D": 15, "E": 15, "F": 30},
+            date_column="E",
+        )
+
         # Account validation
         if accounts:
             dv_acc = DataValidation(
-                type="list", 
+                type="list",
                 formula1="=AccountsList",  # Use named range
                 allow_blank=False
             )
             dv_acc.showDropDown = False
-            ws.add_data_validation(dv_acc)
-            dv_acc.add("A3:A1048576")
+            self._add_validation(ws, dv_acc, "A3:A1048576")
 
         # Cash type validation
         dv_type = DataValidation(
-            type="list", 
+            type="list",
             formula1="=CashTypesList",  # Use named range
             allow_blank=False
         )
         dv_type.showDropDown = False  # ensure in-cell dropdown shows
-        ws.add_data_validation(dv_type)
-        dv_type.add("B3:B1048576")
+        self._add_validation(ws, dv_type, "B3:B1048576")
 
         # Amount validation
         dv_amount = DataValidation(
@@ -751,8 +796,7 @@ class ExcelTemplateService:
             formula1=0,
             allow_blank=False
         )
-        ws.add_data_validation(dv_amount)
-        dv_amount.add("C3:C1048576")
+        self._add_validation(ws, dv_amount, "C3:C1048576")
 
         # Interest rate optional: keep as-is; add date DV on Maturity Date (E)
         dv_maturity = DataValidation(
@@ -762,82 +806,38 @@ class ExcelTemplateService:
             formula2="TODAY()",
             allow_blank=True
         )
-        ws.add_data_validation(dv_maturity)
-        dv_maturity.add("E3:E1048576")
-        for r in range(3, 10003):
-            ws.cell(row=r, column=5).number_format = "yyyy-mm-dd"
+        self._add_validation(ws, dv_maturity, "E3:E1048576")
 
         # Example rows
         examples = [
             ["Select Account", "Savings", "10000", "4.5", "", "Emergency fund"],
             ["Select Account", "CD", "25000", "5.0", "2025-06-30", "6-month CD"]
         ]
-        
-        for r_idx, row_data in enumerate(examples, start=3):
-            for c_idx, value in enumerate(row_data, start=1):
-                cell = ws.cell(row=r_idx, column=c_idx, value=value)
-                cell.border = self.border
-                cell.fill = self.sample_fill
-        
-        # Required fields highlighting
-        for row in range(5, 50):
-            for col in [1, 2, 3]:  # Required columns
-                ws.cell(row=row, column=col).fill = self.required_fill
-
-        # Add instruction row — put directly under examples on row 5, and remove '*' language
-        ws.merge_cells("A5:F5")
-        ws["A5"] = "⚠️ Delete example rows (3–4) before importing."
-        ws["A5"].font = Font(bold=True, italic=True, color="FF0000", size=10)
-        ws["A5"].alignment = Alignment(horizontal="center")
-        
+        self._write_entry_rows(ws, examples, [1, 2, 3], date_column=5)
         return ws
 
-    def _create_crypto_positions_sheet(self, wb: Workbook, accounts: list, cryptos: list) -> Worksheet:
-        ws = wb.create_sheet("🪙 CRYPTO", 4)
-        ws.sheet_properties.tabColor = "FF9900"
-        
-        # Header banner
-        ws.merge_cells("A1:F1")
-        ws["A1"] = "CRYPTOCURRENCY POSITIONS"
-        ws["A1"].font = Font(bold=True, size=12, color="FFFFFF")
-        ws["A1"].fill = PatternFill(start_color="FF9900", end_color="FF9900", fill_type="solid")
-        ws["A1"].alignment = Alignment(horizontal="center")
-        
-        # Headers
-        headers = ["Account", "Symbol", "Name", "Quantity", "Purchase Price", "Purchase Date"]
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=2, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
-            cell.border = self.border
-        
-        # Column widths
-        widths = {"A": 25, "B": 15, "C": 35, "D": 20, "E": 20, "F": 15, "G": 20}
-        for col, width in widths.items():
-            ws.column_dimensions[col].width = width
-        
+    def _create_crypto_positions_sheet(self, wb: Workbook, accounts: list):
+        ws = self._start_positions_sheet(
+            wb, "🪙 CRYPTO", "FF9900", "CRYPTOCURRENCY POSITIONS",
+            ["Account", "Symbol", "Name", "Quantity", "Purchase Price", "Purchase Date"],
+            {"A": 25, "B": 15, "C": 35, "D": 20, "E": 20, "F": 15, "G": 20},
+            date_column="F",
+        )
+
         # Account validation (use named range for consistency)
         if accounts:
             dv_acc = DataValidation(type="list", formula1="=AccountsList", allow_blank=False)
             dv_acc.showDropDown = False
-            ws.add_data_validation(dv_acc)
-            dv_acc.add("A3:A1048576")
+            self._add_validation(ws, dv_acc, "A3:A1048576")
 
         # Crypto symbol validation (always add; named range exists even if empty)
         dv_crypto = DataValidation(
-            type="list", 
+            type="list",
             formula1="=CryptoList",
             allow_blank=False
         )
         dv_crypto.showDropDown = False
-        ws.add_data_validation(dv_crypto)
-        dv_crypto.add("B3:B1048576")
-        for r in range(3, 1001):
-            ws.cell(row=r, column=3, value=f'=IFERROR(VLOOKUP(B{r},Lookups!$F:$G,2,FALSE),"")').border = self.border
-
-
-
+        self._add_validation(ws, dv_crypto, "B3:B1048576")
 
         # Quantity validation
         dv_qty = DataValidation(
@@ -846,9 +846,8 @@ class ExcelTemplateService:
             formula1=0,
             allow_blank=False
         )
-        ws.add_data_validation(dv_qty)
-        dv_qty.add("D3:D1048576")
-        
+        self._add_validation(ws, dv_qty, "D3:D1048576")
+
         # Price validation
         dv_price = DataValidation(
             type="decimal",
@@ -856,9 +855,8 @@ class ExcelTemplateService:
             formula1=0,
             allow_blank=False
         )
-        ws.add_data_validation(dv_price)
-        dv_price.add("E3:E1048576")
-        
+        self._add_validation(ws, dv_price, "E3:E1048576")
+
         dv_date = DataValidation(
             type="date",
             operator="between",
@@ -866,125 +864,106 @@ class ExcelTemplateService:
             formula2="TODAY()",
             allow_blank=False
         )
-        ws.add_data_validation(dv_date)
-        dv_date.add("F3:F1048576")
-        for r in range(3, 10003):
-            ws.cell(row=r, column=6).number_format = "yyyy-mm-dd"
-        
+        self._add_validation(ws, dv_date, "F3:F1048576")
+
         # Example rows
         examples = [
             ["Select Account", "BTC", "=IFERROR(VLOOKUP(B3,Lookups!$F:$G,2,FALSE),\"\")", "0.5", "45000", "2024-01-15"],
             ["Select Account", "ETH", "=IFERROR(VLOOKUP(B4,Lookups!$F:$G,2,FALSE),\"\")", "2.0", "2500", "2024-02-01"]
         ]
-        
-        for r_idx, row_data in enumerate(examples, start=3):
-            for c_idx, value in enumerate(row_data, start=1):
-                cell = ws.cell(row=r_idx, column=c_idx, value=value)
-                cell.border = self.border
-                cell.fill = self.sample_fill
-        
-        # Required fields highlighting
-        for row in range(5, 50):
-            for col in [1, 2, 4, 5, 6]:
-                ws.cell(row=row, column=col).fill = self.required_fill
-
-        # Add instruction row — put directly under examples on row 5, and remove '*' language
-        ws.merge_cells("A5:F5")
-        ws["A5"] = "⚠️ Delete example rows (3–4) before importing."
-        ws["A5"].font = Font(bold=True, italic=True, color="FF0000", size=10)
-        ws["A5"].alignment = Alignment(horizontal="center")
-        
+        self._write_entry_rows(ws, examples, [1, 2, 4, 5, 6], date_column=6,
+                               lookup_formula='=IFERROR(VLOOKUP(B{row},Lookups!$F:$G,2,FALSE),"")')
         return ws
 
-    def _create_metal_positions_sheet(self, wb: Workbook, accounts: list, metals: list) -> Worksheet:
-        ws = wb.create_sheet("🥇 METALS", 5)
-        ws.sheet_properties.tabColor = "FFD700"
-        
-        # Header banner
-        ws.merge_cells("A1:F1")
-        ws["A1"] = "PRECIOUS METALS POSITIONS"
-        ws["A1"].font = Font(bold=True, size=12, color="FFFFFF")
-        ws["A1"].fill = PatternFill(start_color="FFD700", end_color="FFD700", fill_type="solid")
-        ws["A1"].alignment = Alignment(horizontal="center")
-        
-        # Headers
-        headers = ["Account", "Metal Type", "Metal Code", "Quantity (oz)", "Purchase Price/oz", "Purchase Date"]
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=2, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
-            cell.border = self.border
-        
-        # Column widths
-        widths = {"A": 25, "B": 15, "C": 18, "D": 20, "E": 15, "F": 25, "G": 30}
-        for col, width in widths.items():
-            ws.column_dimensions[col].width = width
-        
+    def _create_metal_positions_sheet(self, wb: Workbook, accounts: list):
+        ws = self._start_positions_sheet(
+            wb, "🥇 METALS", "FFD700", "PRECIOUS METALS POSITIONS",
+            ["Account", "Metal Type", "Metal Code", "Quantity (oz)", "Purchase Price/oz", "Purchase Date"],
+            {"A": 25, "B": 15, "C": 18, "D": 20, "E": 15, "F": 25, "G": 30},
+            date_column="F",
+        )
+
         # Account validation (named range)
         if accounts:
             dv_acc = DataValidation(
-                type="list", 
+                type="list",
                 formula1="=AccountsList",
                 allow_blank=False
             )
             dv_acc.showDropDown = False
-            ws.add_data_validation(dv_acc)
-            dv_acc.add("A3:A1048576")
+            self._add_validation(ws, dv_acc, "A3:A1048576")
 
         # Metal type validation (always add; named range exists even if empty)
         dv_metal = DataValidation(
-            type="list", 
+            type="list",
             formula1="=MetalsList",
             allow_blank=False
         )
-        dv_metal.showDropDown = False 
-        ws.add_data_validation(dv_metal)
-        dv_metal.add("B3:B1000")
-        for r in range(3, 1001):
-            ws.cell(row=r, column=3, value=f'=IFERROR(VLOOKUP(B{r},Lookups!$I:$J,2,FALSE),"")').border = self.border
-        
+        dv_metal.showDropDown = False
+        self._add_validation(ws, dv_metal, "B3:B1000")
+
         # Quantity validation
         dv_qty = DataValidation(type="decimal", operator="greaterThan", formula1=0, allow_blank=False)
-        ws.add_data_validation(dv_qty)
-        dv_qty.add("D3:D1048576")
+        self._add_validation(ws, dv_qty, "D3:D1048576")
 
-        
-        # Price validation       
+        # Price validation
         dv_price = DataValidation(type="decimal", operator="greaterThanOrEqual", formula1=0, allow_blank=False)
-        ws.add_data_validation(dv_price)
-        dv_price.add("E3:E1048576")
+        self._add_validation(ws, dv_price, "E3:E1048576")
 
-
-        # Date validation      
+        # Date validation
         dv_date = DataValidation(type="date", operator="between", formula1="DATE(1900,1,1)", formula2="TODAY()", allow_blank=False)
-        ws.add_data_validation(dv_date)
-        dv_date.add("F3:F1048576")
-        for r in range(3, 10003):
-            ws.cell(row=r, column=6).number_format = "yyyy-mm-dd"
+        self._add_validation(ws, dv_date, "F3:F1048576")
 
         # Example rows
         examples = [
             ["Select Account", "Gold",  '=IFERROR(VLOOKUP(B3,Lookups!$I:$J,2,FALSE),"")',  "10",  "1800", "2024-01-15"],
             ["Select Account", "Silver",'=IFERROR(VLOOKUP(B4,Lookups!$I:$J,2,FALSE),"")', "100",  "25",   "2024-02-01"]
         ]
+        # Include Purchase Date as required (yellow)
+        self._write_entry_rows(ws, examples, [1, 2, 3, 4, 5, 6], date_column=6,
+                               lookup_formula='=IFERROR(VLOOKUP(B{row},Lookups!$I:$J,2,FALSE),"")')
+        return ws
 
-        
-        for r_idx, row_data in enumerate(examples, start=3):
-            for c_idx, value in enumerate(row_data, start=1):
-                cell = ws.cell(row=r_idx, column=c_idx, value=value)
-                cell.border = self.border
-                cell.fill = self.sample_fill
-        
-        # Required fields highlighting
-        for row in range(5, 50):
-            for col in [1, 2, 3, 4, 5, 6]:  # Include Purchase Date as required (yellow)
-                ws.cell(row=row, column=col).fill = self.required_fill
-
-        # Add instruction row — put directly under examples on row 5, and remove '*' language
-        ws.merge_cells("A5:F5")
-        ws["A5"] = "⚠️ Delete example rows (3–4) before importing."
-        ws["A5"].font = Font(bold=True, italic=True, color="FF0000", size=10)
-        ws["A5"].alignment = Alignment(horizontal="center")
-        
-        return ws    
\ No newline at end of file
+
+def _build_lookups_part(securities: List[tuple], cryptos: List[tuple], metals: List[tuple]) -> bytes:
+    """
+    Worksheet XML for the shared "Lookups" sheet.
+
+    Tickers/companies in C:D, crypto in F:G, metals in I:J and cash types in L.
+    Cells are unstyled and write_only stores strings inline, so the part does not
+    reference the styles or shared strings of the workbook it was built in and
+    can be copied into any positions template unchanged.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Lookups")
+    ws.append([None, None, "Ticker", "Company", None, "Crypto Symbol", "Crypto Name",
+               None, "Metal Type", "Metal Ticker", None, "Cash Types"])
+
+    cash_types = [(cash_type,) for cash_type in CASH_TYPES]
+    for sec, crypto, metal, cash in zip_longest(securities, cryptos, metals, cash_types, fillvalue=(None, None)):
+        ws.append([None, None, sec[0], sec[1], None, crypto[0], crypto[1], None, metal[0], metal[1], None, cash[0]])
+
+    output = io.BytesIO()
+    wb.save(output)
+    with zipfile.ZipFile(output) as archive:
+        return archive.read(ws.path[1:])
+
+
+def _replace_part(workbook: io.BytesIO, part_name: str, data: bytes) -> io.BytesIO:
+    """Copy a saved workbook with one of its parts replaced"""
+    output = io.BytesIO()
+    with zipfile.ZipFile(workbook) as source, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            target.writestr(item, data if item.filename == part_name else source.read(item.filename))
+    output.seek(0)
+    return output
+
+
+def iter_workbook_chunks(workbook: io.BytesIO, chunk_size: int = TEMPLATE_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield a generated workbook in chunks for a StreamingResponse"""
+    view = workbook.getbuffer()
+    try:
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start:start + chunk_size])
+    finally:
+        view.release()
@@ -0,0 +1,568 @@
+"""
+Server-push portfolio updates over Postgres LISTEN/NOTIFY and Server-Sent Events.
+
+Producers:
+    - price jobs call notify_price_changes(database, tickers) after writing
+      securities prices; the tickers go out on PRICE_CHANNEL as comma-separated
+      payloads under Postgres' 8000 byte NOTIFY limit
+    - position mutations are picked up by the row triggers installed by
+      install_live_update_triggers() (run from the create_tables migration),
+      which send the owning user id on POSITION_CHANNEL. Postgres delivers
+      identical payloads once per transaction, so a bulk insert is one
+      notification
+
+Consumer: one LiveUpdateHub per API worker (started by the app lifespan)
+holds a dedicated LISTEN connection (LIVE_UPDATES_DATABASE_URL, since a
+transaction-pooling PgBouncer can't hold one), collects notifications for
+LIVE_UPDATES_DEBOUNCE_SECONDS, refreshes those tickers in the PriceMap and
+then runs one holdings query for every connected user at once. Each SSE client of
+GET /portfolio/live receives a "snapshot" event on connect and after a
+change to any table the triggers cover, and a "delta" event with only the
+positions whose price moved (plus the new account and portfolio totals) after
+a price cycle. Between cycles a connected client costs nothing but a
+keepalive comment.
+
+State covers everything the triggers fire on, valued like the detailed
+account views:
+
+    security     shares * PriceMap price (positions.price when unpriced),
+                 cost shares * COALESCE(cost_basis, price)
+    crypto       quantity * PriceMap price of coin_symbol, cost at purchase_price
+    metal        quantity * the metal future converted to the position's unit,
+                 cost at COALESCE(cost_basis, purchase_price)
+    cash         amount
+    real_estate  estimated_value (purchase_price when unset)
+    other assets and liabilities (not in an account) as user-level totals
+
+Position ids are only unique per asset_type.
+"""
+import os
+import json
+import asyncio
+import logging
+import contextvars
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import asyncpg
+
+from backend.core_db import get_database
+from backend.utils.common import json_serializer
+from backend.services.price_map import PriceMap, metal_price_per_unit, metal_ticker
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("live_updates")
+
+database = get_database("live_updates")
+
+LIVE_UPDATES_ENABLED = os.getenv("LIVE_UPDATES_ENABLED", "true").lower() == "true"
+LIVE_UPDATES_DATABASE_URL = os.getenv("LIVE_UPDATES_DATABASE_URL") or os.getenv("DATABASE_URL")
+LIVE_UPDATES_DEBOUNCE_SECONDS = float(os.getenv("LIVE_UPDATES_DEBOUNCE_SECONDS", "1"))
+LIVE_UPDATES_HEARTBEAT_SECONDS = float(os.getenv("LIVE_UPDATES_HEARTBEAT_SECONDS", "25"))
+LIVE_UPDATES_QUEUE_SIZE = int(os.getenv("LIVE_UPDATES_QUEUE_SIZE", "50"))
+LIVE_UPDATES_MAX_RECONNECT_SECONDS = 60
+
+PRICE_CHANNEL = "security_price_changes"
+POSITION_CHANNEL = "user_position_changes"
+NOTIFY_PAYLOAD_LIMIT = 7900  # bytes; Postgres rejects payloads of 8000 or more
+
+# Tables whose rows belong to a user, and how the trigger finds that user
+POSITION_TABLES = (
+    "positions", "cash_positions", "crypto_positions", "metal_positions", "real_estate_positions",
+)
+USER_TABLES = ("other_assets", "liabilities")
+
+TRIGGER_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_user_position_change() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+    owner TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    IF TG_ARGV[0] = 'user' THEN
+        owner := changed.user_id;
+    ELSE
+        -- NULL when the account itself is being deleted; its own trigger covers that
+        SELECT user_id INTO owner FROM accounts WHERE id = changed.account_id;
+    END IF;
+    IF owner IS NOT NULL THEN
+        PERFORM pg_notify('{POSITION_CHANNEL}', owner);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# One row per holding; to_jsonb reads columns not every deployment has
+HOLDINGS_QUERY = """
+SELECT a.user_id, 'security' AS asset_type, p.id AS position_id, p.account_id,
+       p.ticker AS symbol, NULL::text AS metal_type, NULL::text AS unit,
+       p.shares::float8 AS quantity, p.price::float8 AS price,
+       COALESCE(p.cost_basis, p.price)::float8 AS cost_basis
+FROM positions p
+JOIN accounts a ON a.id = p.account_id
+WHERE a.user_id = ANY(:users)
+UNION ALL
+SELECT a.user_id, 'crypto', cp.id, cp.account_id, cp.coin_symbol, NULL, NULL,
+       cp.quantity::float8, COALESCE((to_jsonb(cp) ->> 'current_price')::float8, cp.purchase_price::float8),
+       cp.purchase_price::float8
+FROM crypto_positions cp
+JOIN accounts a ON a.id = cp.account_id
+WHERE a.user_id = ANY(:users)
+UNION ALL
+SELECT a.user_id, 'metal', mp.id, mp.account_id, mp.coin_symbol, mp.metal_type, mp.unit,
+       mp.quantity::float8, mp.purchase_price::float8, COALESCE(mp.cost_basis, mp.purchase_price)::float8
+FROM metal_positions mp
+JOIN accounts a ON a.id = mp.account_id
+WHERE a.user_id = ANY(:users)
+UNION ALL
+SELECT a.user_id, 'cash', c.id, c.account_id, NULL, NULL, NULL,
+       1, c.amount::float8, c.amount::float8
+FROM cash_positions c
+JOIN accounts a ON a.id = c.account_id
+WHERE a.user_id = ANY(:users)
+UNION ALL
+SELECT a.user_id, 'real_estate', re.id, re.account_id, NULL, NULL, NULL,
+       1, COALESCE((to_jsonb(re) ->> 'estimated_value')::float8, re.purchase_price::float8),
+       re.purchase_price::float8
+FROM real_estate_positions re
+JOIN accounts a ON a.id = re.account_id
+WHERE a.user_id = ANY(:users)
+UNION ALL
+SELECT o.user_id, 'other_asset', o.id, NULL, NULL, NULL, NULL,
+       1, o.current_value::float8, COALESCE(o.cost, o.current_value)::float8
+FROM other_assets o
+WHERE o.user_id = ANY(:users) AND o.is_active IS NOT FALSE
+UNION ALL
+SELECT l.user_id, 'liability', l.id, NULL, NULL, NULL, NULL,
+       1, l.current_balance::float8, l.current_balance::float8
+FROM liabilities l
+WHERE l.user_id = ANY(:users) AND l.is_active IS NOT FALSE
+"""
+
+USER_LEVEL_TYPES = {"other_asset": "other_assets", "liability": "liabilities"}
+
+
+# ----- producers -----
+
+def _payloads(tickers: Iterable[str]) -> List[str]:
+    """Comma-joined ticker lists, each under the NOTIFY size limit"""
+    payloads, current, size = [], [], 0
+    for ticker in sorted({t.strip().upper() for t in tickers if t}):
+        if current and size + len(ticker) + 1 > NOTIFY_PAYLOAD_LIMIT:
+            payloads.append(",".join(current))
+            current, size = [], 0
+        current.append(ticker)
+        size += len(ticker) + 1
+    if current:
+        payloads.append(",".join(current))
+    return payloads
+
+
+async def notify_price_changes(database, tickers: Iterable[str]) -> int:
+    """
+    Tell every API worker's hub that these tickers have new prices
+
+    Never raises: a failed notification only delays clients until the next one.
+    Outside API workers (no listener running here) this process' PriceMap is
+    refreshed directly.
+
+    Returns:
+        Number of NOTIFY payloads sent
+    """
+    tickers = list(tickers)
+    if not LiveUpdateHub.get_instance().listening:
+        try:
+            await PriceMap.get_instance().refresh(database, tickers)
+        except Exception as e:
+            logger.error(f"Failed to refresh price map: {str(e)}")
+    if not LIVE_UPDATES_ENABLED:
+        return 0
+    payloads = _payloads(tickers)
+    if not payloads:
+        return 0
+    try:
+        await database.execute(
+            f"SELECT pg_notify('{PRICE_CHANNEL}', payload) FROM unnest(CAST(:payloads AS text[])) AS payload",
+            {"payloads": payloads}
+        )
+    except Exception as e:
+        logger.error(f"Failed to notify price changes for {len(payloads)} payloads: {str(e)}")
+        return 0
+    return len(payloads)
+
+
+async def install_live_update_triggers(database) -> List[str]:
+    """
+    Create (or replace) the position-change triggers
+
+    Returns:
+        Names of the tables that got a trigger
+    """
+    rows = await database.fetch_all(
+        "SELECT tablename FROM pg_tables WHERE schemaname = current_schema()"
+    )
+    existing = {row["tablename"] for row in rows}
+
+    await database.execute(TRIGGER_FUNCTION_SQL)
+    targets = [(table, "account", "INSERT OR UPDATE OR DELETE") for table in POSITION_TABLES]
+    targets += [(table, "user", "INSERT OR UPDATE OR DELETE") for table in USER_TABLES]
+    # Balance recalculations update accounts on every price cycle; those go out as price deltas
+    targets.append(("accounts", "user", "INSERT OR DELETE"))
+
+    installed = []
+    for table, owner, events in targets:
+        if table not in existing:
+            continue
+        trigger = f"{table}_notify_position_change"
+        await database.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        await database.execute(
+            f"CREATE TRIGGER {trigger} AFTER {events} ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION notify_user_position_change('{owner}')"
+        )
+        installed.append(table)
+    logger.info(f"Live update triggers installed on {', '.join(installed) or 'no tables'}")
+    return installed
+
+
+# ----- portfolio state -----
+
+def _num(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _gain(value: float, cost: float) -> Dict[str, float]:
+    gain_loss = value - cost
+    return {
+        "gain_loss": round(gain_loss, 2),
+        "gain_loss_pct": round(gain_loss / cost * 100, 2) if cost > 0 else 0,
+    }
+
+
+def _price(price_map: PriceMap, row) -> Tuple[Optional[str], float, Optional[datetime]]:
+    """(ticker it is priced from, unit price, price timestamp) of one holding"""
+    fallback = _num(row["price"]) or 0.0
+    asset_type = row["asset_type"]
+    if asset_type in ("security", "crypto"):
+        quote = price_map.quote(row["symbol"])
+        return (row["symbol"],) + (quote if quote else (fallback, None))
+    if asset_type == "metal":
+        ticker = metal_ticker(row["metal_type"], row["symbol"])
+        quote = price_map.quote(ticker) if ticker else None
+        per_unit = metal_price_per_unit(quote[0], ticker, row["unit"]) if quote else None
+        if per_unit is None:
+            return ticker, fallback, None
+        return ticker, per_unit, quote[1]
+    return None, fallback, None
+
+
+async def load_portfolio_state(user_ids: List[str], tickers: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Holdings and totals for several users in one query, priced from the PriceMap
+
+    Args:
+        user_ids: Users to load
+        tickers: Only return positions priced from these tickers (and only
+            users holding one of them); None returns every position
+
+    Returns:
+        {user_id: {"positions": [...], "accounts": [...], "other_assets": {...},
+                   "liabilities": {...}, "totals": {...}}}
+    """
+    if not user_ids:
+        return {}
+
+    price_map = PriceMap.get_instance()
+    await price_map.ensure_loaded(database)
+    rows = await database.fetch_all(HOLDINGS_QUERY, {"users": list(user_ids)})
+    wanted = {t.upper() for t in tickers} if tickers is not None else None
+
+    state: Dict[str, Dict[str, Any]] = {}
+    accounts: Dict[str, Dict[int, Dict[str, float]]] = {user_id: {} for user_id in user_ids}
+    user_level: Dict[str, Dict[str, Dict[str, float]]] = {
+        user_id: {key: {"value": 0.0, "cost_basis": 0.0, "count": 0} for key in USER_LEVEL_TYPES.values()}
+        for user_id in user_ids
+    }
+    for row in rows:
+        user_id, account_id = row["user_id"], row["account_id"]
+        quantity = _num(row["quantity"]) or 0.0
+        ticker, price, price_timestamp = _price(price_map, row)
+        cost = quantity * (_num(row["cost_basis"]) or 0.0)
+        value = quantity * price
+
+        if row["asset_type"] in USER_LEVEL_TYPES:
+            totals = user_level[user_id][USER_LEVEL_TYPES[row["asset_type"]]]
+            totals["value"] += value
+            totals["cost_basis"] += cost
+            totals["count"] += 1
+            continue
+
+        account = accounts[user_id].setdefault(account_id, {"balance": 0.0, "cost_basis": 0.0, "positions_count": 0, "touched": False})
+        account["balance"] += value
+        account["cost_basis"] += cost
+        account["positions_count"] += 1
+
+        if wanted is not None and (ticker or "").upper() not in wanted:
+            continue
+        account["touched"] = True
+        state.setdefault(user_id, {"positions": []})["positions"].append({
+            "position_id": row["position_id"],
+            "asset_type": row["asset_type"],
+            "account_id": account_id,
+            "ticker": ticker,
+            "shares": quantity,
+            "current_price": price,
+            "current_value": round(value, 2),
+            "total_cost_basis": round(cost, 2),
+            **_gain(value, cost),
+            "price_timestamp": price_timestamp,
+        })
+
+    if wanted is None:
+        for user_id in user_ids:
+            state.setdefault(user_id, {"positions": []})
+
+    for user_id, user_state in state.items():
+        total_value = total_cost = 0.0
+        positions_count = 0
+        user_state["accounts"] = []
+        for account_id, account in accounts[user_id].items():
+            total_value += account["balance"]
+            total_cost += account["cost_basis"]
+            positions_count += account["positions_count"]
+            if wanted is None or account["touched"]:
+                user_state["accounts"].append({
+                    "account_id": account_id,
+                    "balance": round(account["balance"], 2),
+                    "cost_basis": round(account["cost_basis"], 2),
+                    **_gain(account["balance"], account["cost_basis"]),
+                    "positions_count": account["positions_count"],
+                })
+        other_assets = user_level[user_id]["other_assets"]
+        liabilities = user_level[user_id]["liabilities"]
+        user_state["other_assets"] = {
+            "total_value": round(other_assets["value"], 2),
+            "cost_basis": round(other_assets["cost_basis"], 2),
+            "count": other_assets["count"],
+        }
+        user_state["liabilities"] = {
+            "total_balance": round(liabilities["value"], 2),
+            "count": liabilities["count"],
+        }
+        total_value += other_assets["value"]
+        total_cost += other_assets["cost_basis"]
+        user_state["totals"] = {
+            "total_value": round(total_value, 2),
+            "cost_basis": round(total_cost, 2),
+            **_gain(total_value, total_cost),
+            "liabilities": round(liabilities["value"], 2),
+            "net_worth": round(total_value - liabilities["value"], 2),
+            "positions_count": positions_count,
+        }
+    return state
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=json_serializer)}\n\n"
+
+
+# ----- consumer -----
+
+class LiveUpdateHub:
+    """
+    Per-worker LISTEN connection and SSE fan-out
+
+    start()/stop() are owned by the app lifespan (subscribe() also starts the
+    listener, for processes without one). Besides feeding SSE clients, the
+    listener keeps this worker's PriceMap current.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every stream shares one listener"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pending_tickers: Set[str] = set()
+        self._pending_users: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.listening = False
+        self.stats = {
+            "notifications": 0, "dispatches": 0, "snapshots_sent": 0, "deltas_sent": 0,
+            "overflows": 0, "reconnects": 0,
+        }
+
+    # ----- subscriptions -----
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_UPDATES_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        self.start()
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def connected_users(self) -> int:
+        return len(self._subscribers)
+
+    async def stream(self, user_id: str, is_disconnected) -> AsyncIterator[str]:
+        """
+        SSE body for one client: a snapshot, then queued events and keepalives
+
+        Args:
+            user_id: Authenticated user
+            is_disconnected: Request.is_disconnected, polled between events
+        """
+        queue = self.subscribe(user_id)
+        try:
+            state = (await load_portfolio_state([user_id])).get(user_id)
+            self.stats["snapshots_sent"] += 1
+            yield _sse("snapshot", {"reason": "connected", **state, "sent_at": datetime.utcnow()})
+            while not await is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), LIVE_UPDATES_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(user_id, queue)
+
+    def _publish(self, user_id: str, message: str):
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A client this far behind can't apply deltas; resend everything instead
+                while not queue.empty():
+                    queue.get_nowait()
+                self.stats["overflows"] += 1
+                self._pending_users.add(user_id)
+                self._wakeup.set()
+
+    # ----- listener lifecycle -----
+
+    def start(self):
+        """Start the listener on the running loop (idempotent)"""
+        if not LIVE_UPDATES_ENABLED:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            # Empty context so dispatch queries get their own pooled connection
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+        return self._task
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        except Exception:
+            logger.exception("Live update listener stop error")
+        self._task = None
+
+    def _on_notification(self, connection, pid, channel, payload):
+        self.stats["notifications"] += 1
+        if channel == PRICE_CHANNEL:
+            self._pending_tickers.update(t for t in payload.split(",") if t)
+        elif channel == POSITION_CHANNEL and payload in self._subscribers:
+            self._pending_users.add(payload)
+        else:
+            return
+        self._wakeup.set()
+
+    def _on_termination(self, connection):
+        logger.warning("Live update listener connection lost")
+        self._wakeup.set()
+
+    async def _run(self):
+        dsn = (LIVE_UPDATES_DATABASE_URL or "").replace("postgresql+asyncpg://", "postgresql://")
+        backoff = 1.0
+        while not self._stopping:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn, statement_cache_size=0)
+                await connection.add_listener(PRICE_CHANNEL, self._on_notification)
+                await connection.add_listener(POSITION_CHANNEL, self._on_notification)
+                connection.add_termination_listener(self._on_termination)
+                logger.info(f"Live update listener connected ({self.connected_users()} users subscribed)")
+                backoff = 1.0
+                price_map = PriceMap.get_instance()
+                if price_map.is_loaded and self.stats["reconnects"]:
+                    # Price notifications were missed while disconnected
+                    await price_map.load(database)
+                self.listening = True
+                # Anything sent while we weren't listening is lost; resync everyone
+                self._pending_users.update(self._subscribers)
+                self._wakeup.set()
+                await self._dispatch_loop(connection)
+            except Exception as e:
+                logger.error(f"Live update listener error: {str(e)}")
+            finally:
+                self.listening = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            if not self._stopping:
+                self.stats["reconnects"] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, LIVE_UPDATES_MAX_RECONNECT_SECONDS)
+
+    async def _dispatch_loop(self, connection):
+        while not self._stopping and not connection.is_closed():
+            await self._wakeup.wait()
+            if self._stopping or connection.is_closed():
+                return
+            # Let a price job's remaining chunks arrive before querying
+            await asyncio.sleep(LIVE_UPDATES_DEBOUNCE_SECONDS)
+            self._wakeup.clear()
+            tickers, self._pending_tickers = self._pending_tickers, set()
+            users, self._pending_users = self._pending_users, set()
+            try:
+                await self._dispatch(tickers, users)
+            except Exception as e:
+                logger.error(f"Live update dispatch failed: {str(e)}")
+                # Retry as full snapshots on the next wakeup
+                self._pending_users.update(users | (set(self._subscribers) if tickers else set()))
+
+    async def _dispatch(self, tickers: Set[str], users: Set[str]):
+        if tickers:
+            await PriceMap.get_instance().refresh(database, tickers)
+        subscribed = set(self._subscribers)
+        snapshot_users = users & subscribed
+        delta_users = subscribed - snapshot_users if tickers else set()
+        if not snapshot_users and not delta_users:
+            return
+        self.stats["dispatches"] += 1
+        sent_at = datetime.utcnow()
+
+        if snapshot_users:
+            for user_id, state in (await load_portfolio_state(list(snapshot_users))).items():
+                self._publish(user_id, _sse("snapshot", {"reason": "positions_changed", **state, "sent_at": sent_at}))
+                self.stats["snapshots_sent"] += 1
+
+        if delta_users:
+            states = await load_portfolio_state(list(delta_users), sorted(tickers))
+            for user_id, state in states.items():
+                self._publish(user_id, _sse("delta", {"reason": "prices_changed", **state, "sent_at": sent_at}))
+                self.stats["deltas_sent"] += 1
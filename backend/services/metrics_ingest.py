@@ -0,0 +1,186 @@
+"""
+Producer/consumer pipeline for company-metrics jobs.
+
+The metrics jobs used to fetch one ticker, write one row, fetch the next. Here
+a bounded pool of fetch workers feeds parsed results into an asyncio.Queue
+and a single writer drains it in chunks:
+
+    tickers -> [fetch workers x METRICS_FETCH_WORKERS] -> queue -> [writer]
+                                                                  |-> write_updates(rows)
+                                                                  '-> write_disables(items)
+
+Callers supply the fetch, the parse (which decides whether a payload becomes
+an update row, a disable, or a failure) and the two chunk writers, so the same
+pipeline serves process_metrics_updates in main.py and
+PriceUpdaterV2.update_company_metrics. Only the writer touches the database,
+so the job still uses a single connection.
+
+run() returns throughput, queue depth and per-stage latency for the job's
+system event.
+"""
+import os
+import time
+import asyncio
+import logging
+import statistics
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("metrics_ingest")
+
+METRICS_FETCH_WORKERS = int(os.getenv("METRICS_FETCH_WORKERS", "8"))
+METRICS_WRITE_CHUNK = int(os.getenv("METRICS_WRITE_CHUNK", "100"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "2"))
+
+# parse() outcomes
+UPDATE = "update"
+DISABLE = "disable"
+FAILED = "failed"
+
+_DONE = object()
+
+
+def latency_summary(durations: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/max in milliseconds"""
+    if not durations:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    ordered = sorted(d * 1000 for d in durations)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 1),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+
+class MetricsIngestPipeline:
+    """
+    Concurrent fetch, chunked write
+
+    Args:
+        fetch: async ticker -> raw payload
+        parse: (ticker, payload) -> (UPDATE, row) | (DISABLE, reason) | (FAILED, reason)
+        write_updates: async list of rows -> None
+        write_disables: async list of (ticker, reason) -> None
+        workers: Concurrent fetches
+        chunk_size: Rows per write
+        flush_seconds: Longest a partial chunk waits for more rows
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Any]],
+        parse: Callable[[str, Any], Tuple[str, Any]],
+        write_updates: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        write_disables: Callable[[List[Tuple[str, str]]], Awaitable[None]],
+        workers: int = METRICS_FETCH_WORKERS,
+        chunk_size: int = METRICS_WRITE_CHUNK,
+        flush_seconds: float = METRICS_FLUSH_SECONDS,
+    ):
+        self.fetch = fetch
+        self.parse = parse
+        self.write_updates = write_updates
+        self.write_disables = write_disables
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.flush_seconds = flush_seconds
+
+        self.updated: List[str] = []
+        self.disabled: List[str] = []
+        self.failed: List[str] = []
+        self.rows: List[Dict[str, Any]] = []
+
+    async def run(self, tickers: List[str]) -> Dict[str, Any]:
+        """Push every ticker through the pipeline; returns the stats for the job event"""
+        started = time.perf_counter()
+        # Bounded so fetchers wait for the writer instead of piling up results
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.chunk_size * 2)
+        pending = iter(tickers)
+        fetch_seconds: List[float] = []
+        write_seconds: List[float] = []
+        depth_samples: List[int] = []
+
+        async def worker():
+            for ticker in pending:
+                fetch_started = time.perf_counter()
+                try:
+                    payload = await self.fetch(ticker)
+                    outcome = self.parse(ticker, payload)
+                except Exception as e:
+                    logger.error(f"Error fetching metrics for {ticker}: {str(e)}")
+                    outcome = (FAILED, str(e))
+                fetch_seconds.append(time.perf_counter() - fetch_started)
+                await queue.put((ticker, outcome))
+
+        async def flush(updates: List[Tuple[str, Dict[str, Any]]], disables: List[Tuple[str, str]]):
+            if updates:
+                write_started = time.perf_counter()
+                try:
+                    await self.write_updates([row for _, row in updates])
+                    self.updated.extend(ticker for ticker, _ in updates)
+                    self.rows.extend(row for _, row in updates)
+                except Exception as e:
+                    logger.error(f"Error writing metrics for {len(updates)} tickers: {str(e)}")
+                    self.failed.extend(ticker for ticker, _ in updates)
+                write_seconds.append(time.perf_counter() - write_started)
+            if disables:
+                write_started = time.perf_counter()
+                try:
+                    await self.write_disables(disables)
+                    self.disabled.extend(ticker for ticker, _ in disables)
+                except Exception as e:
+                    logger.error(f"Error disabling {len(disables)} tickers: {str(e)}")
+                    self.failed.extend(ticker for ticker, _ in disables)
+                write_seconds.append(time.perf_counter() - write_started)
+            updates.clear()
+            disables.clear()
+
+        async def writer():
+            updates: List[Tuple[str, Dict[str, Any]]] = []
+            disables: List[Tuple[str, str]] = []
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    await flush(updates, disables)
+                    continue
+                depth_samples.append(queue.qsize())
+                if item is _DONE:
+                    await flush(updates, disables)
+                    return
+                ticker, (kind, value) = item
+                if kind == UPDATE:
+                    updates.append((ticker, value))
+                elif kind == DISABLE:
+                    disables.append((ticker, value))
+                else:
+                    self.failed.append(ticker)
+                if len(updates) >= self.chunk_size or len(disables) >= self.chunk_size:
+                    await flush(updates, disables)
+
+        writer_task = asyncio.ensure_future(writer())
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.workers, len(tickers)) or 1)))
+            await queue.put(_DONE)
+            await writer_task
+        finally:
+            if not writer_task.done():
+                writer_task.cancel()
+
+        duration = time.perf_counter() - started
+        return {
+            "tickers_count": len(tickers),
+            "updated_count": len(self.updated),
+            "disabled_count": len(self.disabled),
+            "failed_count": len(self.failed),
+            "duration_seconds": round(duration, 2),
+            "tickers_per_second": round(len(tickers) / duration, 2) if duration else None,
+            "workers": self.workers,
+            "chunk_size": self.chunk_size,
+            "queue_depth_max": max(depth_samples, default=0),
+            "queue_depth_avg": round(statistics.mean(depth_samples), 1) if depth_samples else 0,
+            "fetch_latency": latency_summary(fetch_seconds),
+            "write_latency": latency_summary(write_seconds),
+            "writes": len(write_seconds),
+        }
@@ -0,0 +1,327 @@
+"""
+Vectorized portfolio performance analytics.
+
+Loads a user's daily snapshot series from `portfolio_daily_snapshots` once and
+computes every requested period from the same NumPy arrays:
+
+    - time-weighted return (TWR), adjusted for external flows
+    - money-weighted return (IRR) via a vectorized Newton solver
+    - annualised and rolling volatility
+    - maximum drawdown
+    - per-asset-class attribution
+
+There is no transaction ledger, so the external flow on a day is taken as the
+day-over-day change in total cost basis (new money in raises cost basis,
+withdrawals lower it).
+"""
+import hashlib
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Any, Optional, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from backend.utils.redis_cache import FastCache
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("performance_engine")
+
+PERIODS = ("1w", "1m", "3m", "6m", "ytd", "1y", "max")
+TRADING_DAYS_PER_YEAR = 252
+ROLLING_WINDOW = 21
+CACHE_SECONDS = 6 * 60 * 60
+
+
+def period_start(period: str, end_date: date, first_date: date) -> date:
+    """Start date for a period label, clamped to the first available snapshot"""
+    if period == "1w":
+        start = end_date - timedelta(days=7)
+    elif period == "1m":
+        start = end_date - timedelta(days=30)
+    elif period == "3m":
+        start = end_date - timedelta(days=90)
+    elif period == "6m":
+        start = end_date - timedelta(days=180)
+    elif period == "1y":
+        start = end_date - timedelta(days=365)
+    elif period == "ytd":
+        start = date(end_date.year, 1, 1)
+    else:  # max
+        start = first_date
+    return max(start, first_date)
+
+
+class SnapshotSeries:
+    """Daily portfolio values and cost basis, split by asset class"""
+
+    def __init__(self, dates: np.ndarray, asset_types: List[str], values: np.ndarray, costs: np.ndarray):
+        self.dates = dates                  # datetime64[D], shape [n]
+        self.asset_types = asset_types      # length k
+        self.values = values                # shape [n, k]
+        self.costs = costs                  # shape [n, k]
+        self.total_values = values.sum(axis=1)
+        self.total_costs = costs.sum(axis=1)
+        # External flow on day t is the change in cost basis since day t-1
+        self.flows = np.concatenate(([0.0], np.diff(self.total_costs)))
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Any]) -> Optional["SnapshotSeries"]:
+        """Pivot (snapshot_date, asset_type, value, cost_basis) rows into arrays"""
+        if not rows:
+            return None
+
+        dates = sorted({row["snapshot_date"] for row in rows})
+        asset_types = sorted({row["asset_type"] or "other" for row in rows})
+        date_index = {d: i for i, d in enumerate(dates)}
+        type_index = {t: i for i, t in enumerate(asset_types)}
+
+        values = np.zeros((len(dates), len(asset_types)))
+        costs = np.zeros((len(dates), len(asset_types)))
+        for row in rows:
+            i = date_index[row["snapshot_date"]]
+            j = type_index[row["asset_type"] or "other"]
+            values[i, j] += float(row["value"] or 0)
+            costs[i, j] += float(row["cost_basis"] or 0)
+
+        return cls(np.array(dates, dtype="datetime64[D]"), asset_types, values, costs)
+
+    def daily_returns(self) -> np.ndarray:
+        """Flow-adjusted daily returns; r[0] is 0 by definition"""
+        previous = self.total_values[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = (self.total_values[1:] - self.flows[1:] - previous) / previous
+        returns = np.where(np.isfinite(returns) & (previous > 0), returns, 0.0)
+        return np.concatenate(([0.0], returns))
+
+    def rolling_volatility(self, window: int = ROLLING_WINDOW) -> np.ndarray:
+        """Annualised rolling volatility, NaN until the window is full"""
+        returns = self.daily_returns()
+        rolling = np.full(len(returns), np.nan)
+        if len(returns) > window:
+            windows = sliding_window_view(returns[1:], window)
+            rolling[window:] = windows.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+        return rolling
+
+
+def _irr_newton(amounts: np.ndarray, years: np.ndarray, mask: np.ndarray,
+                max_iterations: int = 50, tolerance: float = 1e-10) -> np.ndarray:
+    """
+    Solve NPV(r) = 0 for every row at once
+
+    Args:
+        amounts: Cash flows [periods, days] (investor perspective: outflows negative)
+        years: Time of each flow from the period start, in years
+        mask: Which cells belong to each period
+
+    Returns:
+        Annualised IRR per period (NaN where the solver did not converge, or
+        where the flows never change sign and so have no IRR)
+    """
+    rate = np.full(amounts.shape[0], 0.05)
+    amounts = np.where(mask, amounts, 0.0)
+    converged = np.zeros(amounts.shape[0], dtype=bool)
+    solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+
+    for _ in range(max_iterations):
+        growth = (1.0 + rate)[:, None]
+        discount = growth ** (-years)
+        npv = (amounts * discount).sum(axis=1)
+        derivative = (-years * amounts * discount / growth).sum(axis=1)
+        flat = derivative == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(flat, 0.0, npv / np.where(flat, 1.0, derivative))
+        rate = np.clip(rate - step, -0.9999, 1e6)
+        # A zero derivative stops the solver without finding a root
+        converged = (np.abs(step) < tolerance) & ~flat
+        if (converged | flat | ~solvable).all():
+            break
+
+    return np.where(converged & solvable & np.isfinite(rate), rate, np.nan)
+
+
+def compute_metrics(series: SnapshotSeries, periods: Sequence[str] = PERIODS) -> Dict[str, Any]:
+    """
+    Compute performance for every period from a single series
+
+    Returns:
+        {"as_of": ..., "periods": {label: metrics}, "rolling_volatility": latest}
+    """
+    dates = series.dates
+    n = len(dates)
+    end_date = dates[-1].astype(date)
+    first_date = dates[0].astype(date)
+
+    returns = series.daily_returns()
+    growth = np.cumprod(1.0 + returns)
+
+    starts = np.array([np.datetime64(period_start(p, end_date, first_date), "D") for p in periods])
+    start_idx = np.searchsorted(dates, starts, side="left")
+    start_idx = np.minimum(start_idx, n - 1)
+
+    # --- TWR: ratio of the growth index at the ends of each window ---
+    twr = growth[-1] / growth[start_idx] - 1.0
+
+    # --- MWR: one Newton solve for all periods ---
+    day_numbers = dates.astype(np.int64)
+    years = (day_numbers[None, :] - day_numbers[start_idx][:, None]) / 365.25
+    mask = np.arange(n)[None, :] >= start_idx[:, None]
+    amounts = np.tile(-series.flows, (len(periods), 1))
+    amounts[np.arange(len(periods)), start_idx] = -series.total_values[start_idx]
+    amounts[:, -1] += series.total_values[-1]
+    irr = _irr_newton(amounts, np.where(mask, years, 0.0), mask)
+    span_years = years[:, -1]
+    with np.errstate(invalid="ignore"):
+        mwr = np.where(np.isfinite(irr), (1.0 + irr) ** span_years - 1.0, np.nan)
+
+    rolling = series.rolling_volatility()
+
+    results = {}
+    for p, label in enumerate(periods):
+        s = int(start_idx[p])
+        window_returns = returns[s + 1:]
+        volatility = (
+            float(window_returns.std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR))
+            if len(window_returns) > 1 else 0.0
+        )
+
+        window_growth = growth[s:]
+        drawdowns = window_growth / np.maximum.accumulate(window_growth) - 1.0
+        trough = int(np.argmin(drawdowns))
+
+        start_value = float(series.total_values[s])
+        period_flows = series.costs[-1] - series.costs[s]
+        class_change = series.values[-1] - series.values[s] - period_flows
+        with np.errstate(divide="ignore", invalid="ignore"):
+            class_returns = np.where(
+                series.values[s] + np.maximum(period_flows, 0) > 0,
+                class_change / (series.values[s] + np.maximum(period_flows, 0)),
+                0.0,
+            )
+        contributions = class_change / start_value if start_value > 0 else np.zeros_like(class_change)
+
+        results[label] = {
+            "start_date": dates[s].astype(date).isoformat(),
+            "end_date": end_date.isoformat(),
+            "start_value": start_value,
+            "end_value": float(series.total_values[-1]),
+            "net_flows": float(series.total_costs[-1] - series.total_costs[s]),
+            "twr": float(twr[p]),
+            "mwr": None if np.isnan(mwr[p]) else float(mwr[p]),
+            "irr_annualized": None if np.isnan(irr[p]) else float(irr[p]),
+            "volatility": volatility,
+            "max_drawdown": float(drawdowns[trough]),
+            "max_drawdown_date": dates[s + trough].astype(date).isoformat(),
+            "attribution": {
+                asset_type: {
+                    "start_value": float(series.values[s, k]),
+                    "end_value": float(series.values[-1, k]),
+                    "net_flows": float(period_flows[k]),
+                    "return": float(class_returns[k]),
+                    "contribution": float(contributions[k]),
+                }
+                for k, asset_type in enumerate(series.asset_types)
+            },
+        }
+
+    latest_rolling = rolling[-1]
+    return {
+        "as_of": end_date.isoformat(),
+        "periods": results,
+        "rolling_volatility": None if np.isnan(latest_rolling) else float(latest_rolling),
+        "rolling_window": ROLLING_WINDOW,
+    }
+
+
+class PerformanceEngine:
+    """
+    Loads snapshot arrays for a user and computes performance for all periods.
+    Results are cached per user per snapshot version.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    async def snapshot_version(self, user_id: str) -> Optional[str]:
+        """
+        Cheap fingerprint that changes whenever the user's snapshots change
+
+        Intraday runs rewrite today's rows in place (same date, same count),
+        so the value and cost basis sums are part of the fingerprint too.
+        """
+        row = await self.database.fetch_one(
+            """
+            SELECT MAX(snapshot_date) AS max_date, COUNT(*) AS row_count,
+                   SUM(current_value) AS value_sum, SUM(total_cost_basis) AS cost_sum
+            FROM portfolio_daily_snapshots
+            WHERE user_id = :user_id
+            """,
+            {"user_id": user_id}
+        )
+        if not row or not row["max_date"]:
+            return None
+        checksum = hashlib.md5(f"{row['value_sum']}:{row['cost_sum']}".encode()).hexdigest()[:12]
+        return f"{row['max_date'].isoformat()}:{row['row_count']}:{checksum}"
+
+    async def load_series(self, user_id: str) -> Optional[SnapshotSeries]:
+        """One query for the user's full daily series, grouped by asset class"""
+        rows = await self.database.fetch_all(
+            """
+            SELECT
+                snapshot_date,
+                asset_type,
+                SUM(current_value) AS value,
+                SUM(total_cost_basis) AS cost_basis
+            FROM portfolio_daily_snapshots
+            WHERE user_id = :user_id
+              AND current_value IS NOT NULL
+            GROUP BY snapshot_date, asset_type
+            ORDER BY snapshot_date
+            """,
+            {"user_id": user_id}
+        )
+        return SnapshotSeries.from_rows(rows)
+
+    async def compute(self, user_id: str, periods: Optional[Sequence[str]] = None,
+                      include_history: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Performance for all requested periods
+
+        Args:
+            user_id: User to compute performance for
+            periods: Period labels (defaults to all of PERIODS)
+            include_history: Also return the daily total value series
+
+        Returns:
+            Metrics keyed by period, or None if the user has no snapshots
+        """
+        periods = tuple(p for p in (periods or PERIODS) if p in PERIODS) or PERIODS
+
+        version = await self.snapshot_version(user_id)
+        if version is None:
+            return None
+
+        cache_key = f"performance:{user_id}:{version}:{','.join(periods)}:{int(include_history)}"
+        if FastCache.is_available():
+            cached = FastCache.get(cache_key)
+            if cached:
+                return cached
+
+        series = await self.load_series(user_id)
+        if series is None:
+            return None
+
+        result = compute_metrics(series, periods)
+        result["user_id"] = user_id
+        result["snapshot_version"] = version
+        if include_history:
+            result["history"] = [
+                {"date": d.astype(date).isoformat(), "value": float(v), "cost_basis": float(c)}
+                for d, v, c in zip(series.dates, series.total_values, series.total_costs)
+            ]
+
+        if FastCache.is_available():
+            FastCache.set(cache_key, result, expire_seconds=CACHE_SECONDS)
+
+        return result
@@ -3,17 +3,19 @@ Portfolio calculator module with caching.
 Handles calculation of portfolio values based on current security prices.
 This is decoupled from the price updating process.
 """
-import os
 import logging
 import asyncio
-import databases
 import sqlalchemy
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
+from backend.core_db import get_database
 from backend.utils.common import record_system_event, update_system_event
-from backend.utils.redis_cache import cache_result, FastCache
+from backend.utils.redis_cache import FastCache
+from backend.utils.metrics import track_job
+from backend.services.performance_engine import PerformanceEngine, PERIODS
+from backend.services.price_map import PriceMap
 
 # Load environment variables
 load_dotenv()
@@ -22,9 +24,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("portfolio_calculator")
 
-# Initialize database connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-database = databases.Database(DATABASE_URL)
+# Shared database pool
+database = get_database("portfolio_calculator")
 
 class PortfolioCalculator:
     """
@@ -36,15 +37,15 @@ class PortfolioCalculator:
         self.database = database
     
     async def connect(self):
-        """Connect to the database"""
+        """Make sure the shared pool is connected (only needed outside the lifespan)"""
         if not self.database.is_connected:
             await self.database.connect()
     
     async def disconnect(self):
-        """Disconnect from the database"""
-        if self.database.is_connected:
-            await self.database.disconnect()
+        """No-op: the shared pool is closed by the app/scheduler lifespan, not by jobs"""
+        return None
     
+    @track_job("portfolio_calculator.calculate_all_portfolios", rows_key="accounts_updated")
     async def calculate_all_portfolios(self) -> Dict[str, Any]:
         """
         Calculate values for all user portfolios based on current security prices.
@@ -75,12 +76,14 @@ class PortfolioCalculator:
                     p.ticker, 
                     p.shares, 
                     COALESCE(p.cost_basis, p.price) as cost_basis,
-                    COALESCE(s.current_price, p.price) as price
+                    p.price
                 FROM positions p
-                LEFT JOIN securities s ON p.ticker = s.ticker
             """
             
             positions_data = await self.database.fetch_all(positions_query)
+            # Current prices come from the in-process map rather than a securities join
+            price_map = PriceMap.get_instance()
+            await price_map.ensure_loaded(self.database)
             logger.info(f"Found {len(positions_data)} positions to calculate")
             
             # 2. Group positions by account for efficient updates
@@ -99,7 +102,7 @@ class PortfolioCalculator:
                 
                 # Calculate position value
                 shares = float(position['shares'])
-                current_price = float(position['price'])
+                current_price = price_map.price(position['ticker'], float(position['price'] or 0))
                 cost_basis = float(position['cost_basis'])
                 
                 position_value = shares * current_price
@@ -280,9 +283,8 @@ class PortfolioCalculator:
                     p.ticker, 
                     p.shares, 
                     COALESCE(p.cost_basis, p.price) as cost_basis,
-                    COALESCE(s.current_price, p.price) as price
+                    p.price
                 FROM positions p
-                LEFT JOIN securities s ON p.ticker = s.ticker
                 WHERE p.account_id = ANY(:account_ids)
             """
             
@@ -292,6 +294,8 @@ class PortfolioCalculator:
             )
             
             logger.info(f"Found {len(positions_data)} positions for user {user_id}")
+            price_map = PriceMap.get_instance()
+            await price_map.ensure_loaded(self.database)
             
             # 3. Group positions by account for efficient updates
             account_updates = {}
@@ -309,7 +313,7 @@ class PortfolioCalculator:
                 
                 # Calculate position value
                 shares = float(position['shares'])
-                current_price = float(position['price'])
+                current_price = price_map.price(position['ticker'], float(position['price'] or 0))
                 cost_basis = float(position['cost_basis'])
                 
                 position_value = shares * current_price
@@ -397,106 +401,104 @@ class PortfolioCalculator:
         finally:
             await self.disconnect()
     
-    @cache_result(key_prefix="portfolio", expire_seconds=3600)  # Cache for 1 hour
-    async def snapshot_portfolio_values(self) -> Dict[str, Any]:
+    @track_job("portfolio_calculator.snapshot_portfolio_values", rows_key="users_processed")
+    async def snapshot_portfolio_values(self, snapshot_date=None, force: bool = False) -> Dict[str, Any]:
         """
         Take a snapshot of all portfolio values for historical tracking
         
+        Totals for every user are computed and upserted into portfolio_history
+        by one grouped INSERT ... SELECT. The run is idempotent per snapshot
+        date: if the date is already snapshotted it is skipped (and reported as
+        such) unless force=True, in which case the rows are overwritten.
+        
+        Args:
+            snapshot_date: Date to record (defaults to today)
+            force: Re-snapshot a date that already has rows
+            
         Returns:
             Summary of snapshot operation
         """
+        event_id = None
         try:
             await self.connect()
             
+            current_date = snapshot_date or datetime.now().date()
+            
+            # Idempotency: one snapshot per date unless explicitly forced
+            existing_rows = await self.database.fetch_val(
+                "SELECT COUNT(*) FROM portfolio_history WHERE date = :date",
+                {"date": current_date}
+            )
+            if existing_rows and not force:
+                logger.info(f"Portfolio snapshot for {current_date} already exists ({existing_rows} rows), skipping")
+                return {
+                    "status": "skipped",
+                    "reason": "already_snapshotted",
+                    "snapshot_date": current_date.isoformat(),
+                    "existing_rows": existing_rows
+                }
+            
             # Record the start of this operation
             event_id = await record_system_event(
                 self.database, 
                 "portfolio_snapshot", 
                 "started", 
-                {}
+                {"snapshot_date": current_date.isoformat(), "force": force}
             )
             
             # Start timing
             start_time = datetime.now()
-            current_date = datetime.now().date()
             logger.info(f"Taking portfolio snapshot for {current_date}")
             
-            # 1. Get all user account balances
-            accounts_query = """
-                SELECT 
-                    a.id,
-                    a.user_id,
-                    a.balance, 
-                    a.cost_basis
-                FROM accounts a
-            """
-            
-            accounts_data = await self.database.fetch_all(accounts_query)
-            
-            # 2. Group by user to calculate portfolio totals
-            user_portfolios = {}
-            
-            for account in accounts_data:
-                user_id = account['user_id']
-                
-                # Initialize user data if needed
-                if user_id not in user_portfolios:
-                    user_portfolios[user_id] = {
-                        "total_value": 0,
-                        "total_cost": 0,
-                        "accounts": 0
-                    }
-                
-                # Add account data to user totals
-                user_portfolios[user_id]["total_value"] += account['balance']
-                user_portfolios[user_id]["total_cost"] += account['cost_basis'] if account['cost_basis'] else 0
-                user_portfolios[user_id]["accounts"] += 1
-            
-            # 3. Insert portfolio history records
-            inserted_count = 0
-            
-            for user_id, portfolio in user_portfolios.items():
-                # Calculate gain/loss
-                total_cost = portfolio["total_cost"]
-                total_value = portfolio["total_value"]
-                gain_loss = total_value - total_cost
-                gain_loss_pct = (gain_loss / total_cost * 100) if total_cost > 0 else 0
-                
-                # Insert history record
-                await self.database.execute(
-                    """
-                    INSERT INTO portfolio_history
-                    (user_id, date, value, cost_basis, gain_loss, gain_loss_pct, accounts_count)
-                    VALUES (:user_id, :date, :value, :cost_basis, :gain_loss, :gain_loss_pct, :accounts_count)
-                    ON CONFLICT (user_id, date) DO UPDATE
-                    SET 
-                        value = :value,
-                        cost_basis = :cost_basis,
-                        gain_loss = :gain_loss,
-                        gain_loss_pct = :gain_loss_pct,
-                        accounts_count = :accounts_count
-                    """,
-                    {
-                        "user_id": user_id,
-                        "date": current_date,
-                        "value": total_value,
-                        "cost_basis": total_cost,
-                        "gain_loss": gain_loss,
-                        "gain_loss_pct": gain_loss_pct,
-                        "accounts_count": portfolio["accounts"]
-                    }
+            # Group account balances per user and upsert every user in one statement
+            rows = await self.database.fetch_all(
+                """
+                WITH totals AS (
+                    SELECT
+                        a.user_id,
+                        COALESCE(SUM(a.balance), 0) AS value,
+                        COALESCE(SUM(a.cost_basis), 0) AS cost_basis,
+                        COUNT(*) AS accounts_count
+                    FROM accounts a
+                    GROUP BY a.user_id
                 )
-                
-                inserted_count += 1
+                INSERT INTO portfolio_history
+                (user_id, date, value, cost_basis, gain_loss, gain_loss_pct, accounts_count)
+                SELECT
+                    t.user_id,
+                    :date,
+                    t.value,
+                    t.cost_basis,
+                    t.value - t.cost_basis,
+                    CASE WHEN t.cost_basis > 0 THEN (t.value - t.cost_basis) / t.cost_basis * 100 ELSE 0 END,
+                    t.accounts_count
+                FROM totals t
+                ON CONFLICT (user_id, date) DO UPDATE
+                SET 
+                    value = EXCLUDED.value,
+                    cost_basis = EXCLUDED.cost_basis,
+                    gain_loss = EXCLUDED.gain_loss,
+                    gain_loss_pct = EXCLUDED.gain_loss_pct,
+                    accounts_count = EXCLUDED.accounts_count
+                RETURNING accounts_count
+                """,
+                {"date": current_date}
+            )
             
-            # 4. Record completion
+            inserted_count = len(rows)
+            total_accounts = sum(int(row["accounts_count"]) for row in rows)
+            
+            # Record completion
             duration = (datetime.now() - start_time).total_seconds()
             
             result = {
+                "status": "completed",
                 "snapshot_date": current_date.isoformat(),
                 "users_processed": inserted_count,
-                "total_accounts": len(accounts_data),
-                "duration_seconds": duration
+                "total_accounts": total_accounts,
+                "replaced_existing": bool(existing_rows),
+                "duration_seconds": duration,
+                "rows_per_second": (inserted_count / duration) if duration > 0 else None
             }
             
             await update_system_event(
@@ -525,6 +527,32 @@ class PortfolioCalculator:
         finally:
             await self.disconnect()
             
+    async def calculate_performance_summary(self, user_id: str, periods: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Calculate TWR, money-weighted return, volatility, drawdown and
+        asset-class attribution for all requested periods in one pass
+        
+        Args:
+            user_id: User ID to calculate performance for
+            periods: Period labels (1w, 1m, 3m, 6m, ytd, 1y, max); defaults to all
+            
+        Returns:
+            Performance metrics keyed by period
+        """
+        try:
+            await self.connect()
+            
+            result = await PerformanceEngine(self.database).compute(user_id, periods)
+            if result is None:
+                return {"user_id": user_id, "as_of": None, "periods": {}}
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error calculating performance summary for user {user_id}: {str(e)}")
+            raise
+        finally:
+            await self.disconnect()
+    
     async def calculate_portfolio_performance(self, user_id: str, period: str = "1m") -> Dict[str, Any]:
         """
         Calculate portfolio performance over a specific time period
@@ -536,121 +564,65 @@ class PortfolioCalculator:
         Returns:
             Performance metrics
         """
-        # Generate cache key
-        cache_key = f"portfolio:performance:{user_id}:{period}"
+        if period not in PERIODS:
+            period = "max"
         
-        # Check cache first
-        if FastCache.is_available():
-            cached_result = FastCache.get(cache_key)
-            if cached_result:
-                logger.info(f"Using cached performance data for user {user_id}, period {period}")
-                return cached_result
-                
         try:
             await self.connect()
             
-            # Calculate date range based on period
-            end_date = datetime.now().date()
-            
-            if period == "1w":
-                start_date = end_date - timedelta(days=7)
-            elif period == "1m":
-                start_date = end_date - timedelta(days=30)
-            elif period == "3m":
-                start_date = end_date - timedelta(days=90)
-            elif period == "6m":
-                start_date = end_date - timedelta(days=180)
-            elif period == "1y":
-                start_date = end_date - timedelta(days=365)
-            elif period == "ytd":
-                start_date = datetime(end_date.year, 1, 1).date()
-            else:  # max
-                # Get the earliest data point
-                earliest_query = """
-                SELECT MIN(date) as earliest_date
-                FROM portfolio_history
-                WHERE user_id = :user_id
-                """
-                earliest_result = await self.database.fetch_one(earliest_query, {"user_id": user_id})
-                start_date = earliest_result["earliest_date"] if earliest_result and earliest_result["earliest_date"] else end_date - timedelta(days=365)
-            
-            # Get historical portfolio values
-            history_query = """
-            SELECT 
-                date,
-                value,
-                cost_basis,
-                gain_loss,
-                gain_loss_pct
-            FROM portfolio_history
-            WHERE 
-                user_id = :user_id AND 
-                date BETWEEN :start_date AND :end_date
-            ORDER BY date ASC
-            """
+            summary = await PerformanceEngine(self.database).compute(user_id, [period], include_history=True)
             
-            history = await self.database.fetch_all(
-                history_query, 
-                {
+            if summary is None:
+                end_date = datetime.now().date()
+                return {
                     "user_id": user_id,
-                    "start_date": start_date,
-                    "end_date": end_date
+                    "period": period,
+                    "start_date": end_date.isoformat(),
+                    "end_date": end_date.isoformat(),
+                    "start_value": 0,
+                    "current_value": 0,
+                    "change_value": 0,
+                    "change_percentage": 0,
+                    "current_cost_basis": 0,
+                    "current_gain_loss": 0,
+                    "current_gain_loss_pct": 0,
+                    "history": []
                 }
-            )
-            
-            # Get current portfolio value
-            current_value_query = """
-            SELECT 
-                SUM(balance) as current_value,
-                SUM(cost_basis) as current_cost
-            FROM accounts
-            WHERE user_id = :user_id
-            """
-            
-            current_value_result = await self.database.fetch_one(current_value_query, {"user_id": user_id})
-            
-            current_value = float(current_value_result["current_value"]) if current_value_result and current_value_result["current_value"] else 0
-            current_cost = float(current_value_result["current_cost"]) if current_value_result and current_value_result["current_cost"] else 0
             
-            # Calculate performance metrics
-            history_points = []
-            for point in history:
-                history_points.append({
-                    "date": point["date"].isoformat(),
-                    "value": float(point["value"]),
-                    "cost_basis": float(point["cost_basis"]) if point["cost_basis"] else 0,
-                    "gain_loss": float(point["gain_loss"]) if point["gain_loss"] else 0,
-                    "gain_loss_pct": float(point["gain_loss_pct"]) if point["gain_loss_pct"] else 0
-                })
+            metrics = summary["periods"][period]
+            history = [point for point in summary["history"] if point["date"] >= metrics["start_date"]]
             
-            # Calculate period performance
-            start_value = history_points[0]["value"] if history_points else 0
+            start_value = metrics["start_value"]
+            current_value = metrics["end_value"]
+            current_cost = history[-1]["cost_basis"] if history else 0
             change_value = current_value - start_value
-            change_pct = (change_value / start_value * 100) if start_value > 0 else 0
             
-            result = {
+            return {
                 "user_id": user_id,
                 "period": period,
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
+                "start_date": metrics["start_date"],
+                "end_date": metrics["end_date"],
                 "start_value": start_value,
                 "current_value": current_value,
                 "change_value": change_value,
-                "change_percentage": change_pct,
+                "change_percentage": (change_value / start_value * 100) if start_value > 0 else 0,
                 "current_cost_basis": current_cost,
                 "current_gain_loss": current_value - current_cost,
                 "current_gain_loss_pct": ((current_value - current_cost) / current_cost * 100) if current_cost > 0 else 0,
-                "history": history_points
+                "twr": metrics["twr"],
+                "mwr": metrics["mwr"],
+                "irr_annualized": metrics["irr_annualized"],
+                "volatility": metrics["volatility"],
+                "rolling_volatility": summary["rolling_volatility"],
+                "max_drawdown": metrics["max_drawdown"],
+                "max_drawdown_date": metrics["max_drawdown_date"],
+                "net_flows": metrics["net_flows"],
+                "attribution": metrics["attribution"],
+                "history": history
             }
             
-            # Cache the result for 30 minutes
-            if FastCache.is_available():
-                FastCache.set(cache_key, result, expire_seconds=1800)  # 30 minutes
-            
-            return result
-            
         except Exception as e:
             logger.error(f"Error calculating portfolio performance for user {user_id}: {str(e)}")
             raise
         finally:
-            await self.disconnect()
\ No newline at end of file
+            await self.disconnect()
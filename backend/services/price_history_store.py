@@ -0,0 +1,319 @@
+"""
+Columnar, memory-mapped price history store.
+
+Keeps a local copy of daily OHLCV from `price_history` so analytics code can
+take zero-copy slices of whole series per ticker without a database round trip.
+
+Layout on disk (PRICE_STORE_DIR):
+
+    meta.json       ticker -> row offset, number of dates, refresh watermark
+    dates.npy       int32 days since 1970-01-01 for each trading day (sorted)
+    <field>.npy     float64 matrix [ticker capacity, date capacity] per OHLCV field
+
+Rows and columns are pre-allocated with headroom so the nightly refresh
+(one new trading day, a handful of new tickers) writes into the existing
+files in place instead of rebuilding them.
+"""
+import os
+import json
+import time
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("price_history_store")
+
+PRICE_STORE_DIR = os.getenv(
+    "PRICE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "price_store"),
+)
+PRICE_STORE_ENABLED = os.getenv("PRICE_STORE_ENABLED", "true").lower() == "true"
+
+# Store field -> price_history column
+FIELDS = {
+    "open": "day_open",
+    "high": "day_high",
+    "low": "day_low",
+    "close": "close_price",
+    "volume": "volume",
+}
+
+TICKER_HEADROOM = 1024
+DATE_HEADROOM = 256
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_UNUSED_DATE = np.iinfo(np.int32).max
+
+
+def _to_day(value) -> int:
+    """Convert a date/datetime to days since the Unix epoch"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+class PriceHistoryStore:
+    """
+    Memory-mapped OHLCV matrix keyed by a ticker -> row offset index.
+    Reads return NumPy views over the mapped files; NaN marks missing days.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every caller shares the same mappings"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, path: str = PRICE_STORE_DIR):
+        self.path = path
+        self.index: Dict[str, int] = {}
+        self.tickers: List[str] = []
+        self.n_dates = 0
+        self.refreshed_through: Optional[date] = None
+        self._meta_mtime = None
+        self._dates = np.empty(0, dtype=np.int32)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._load()
+
+    # ----- file handling -----
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self, mode: str = "r"):
+        """Map the on-disk files (no-op if the store has never been built)"""
+        meta_path = self._file("meta.json")
+        if not os.path.exists(meta_path):
+            return
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        self.tickers = meta["tickers"]
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.n_dates = meta["n_dates"]
+        self.refreshed_through = date.fromisoformat(meta["refreshed_through"]) if meta.get("refreshed_through") else None
+        self._meta_mtime = os.path.getmtime(meta_path)
+        self._dates = np.load(self._file("dates.npy"), mmap_mode=mode)
+        self._arrays = {field: np.load(self._file(f"{field}.npy"), mmap_mode=mode) for field in FIELDS}
+
+    def _maybe_reload(self):
+        """Pick up a refresh written by another process (e.g. the scheduler)"""
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path) and os.path.getmtime(meta_path) != self._meta_mtime:
+            self._load()
+
+    def _write_meta(self):
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "tickers": self.tickers,
+                "n_dates": self.n_dates,
+                "refreshed_through": self.refreshed_through.isoformat() if self.refreshed_through else None,
+                "updated_at": datetime.utcnow().isoformat(),
+            }, f)
+        os.replace(tmp_path, self._file("meta.json"))
+
+    @property
+    def is_built(self) -> bool:
+        return bool(self._arrays)
+
+    # ----- reads -----
+
+    def _date_slice(self, start=None, end=None) -> slice:
+        dates = self._dates[:self.n_dates]
+        lo = int(np.searchsorted(dates, _to_day(start), side="left")) if start else 0
+        hi = int(np.searchsorted(dates, _to_day(end), side="right")) if end else self.n_dates
+        return slice(lo, hi)
+
+    def dates(self, start=None, end=None) -> np.ndarray:
+        """Trading days in [start, end] as datetime64[D]"""
+        self._maybe_reload()
+        return np.asarray(self._dates[self._date_slice(start, end)]).astype("datetime64[D]")
+
+    def series(self, ticker: str, field: str = "close", start=None, end=None) -> Optional[np.ndarray]:
+        """
+        Zero-copy view of one ticker's series
+
+        Args:
+            ticker: Ticker symbol
+            field: One of open, high, low, close, volume
+            start: Optional first date (inclusive)
+            end: Optional last date (inclusive)
+
+        Returns:
+            1-D array aligned with dates(start, end), or None if the ticker is not stored
+        """
+        self._maybe_reload()
+        row = self.index.get(ticker)
+        if row is None or not self.is_built:
+            return None
+        return self._arrays[field][row, self._date_slice(start, end)]
+
+    def matrix(self, tickers: Optional[Sequence[str]] = None, field: str = "close", start=None, end=None) -> np.ndarray:
+        """
+        2-D [ticker, date] block for many tickers
+
+        Without `tickers` this is a view over every stored ticker in `self.tickers`
+        order; with an explicit list the rows are gathered (unknown tickers are NaN).
+        """
+        self._maybe_reload()
+        if not self.is_built:
+            return np.empty((0, 0))
+
+        columns = self._date_slice(start, end)
+        array = self._arrays[field]
+        if tickers is None:
+            return array[:len(self.tickers), columns]
+
+        rows = np.array([self.index.get(t, -1) for t in tickers], dtype=np.int64)
+        block = array[np.where(rows >= 0, rows, 0), columns]
+        block[rows < 0] = np.nan
+        return block
+
+    # ----- refresh -----
+
+    async def refresh(self, database, lookback_days: int = 30, full: bool = False) -> Dict[str, Any]:
+        """
+        Incrementally refresh the store from price_history
+
+        Re-reads the last `lookback_days` before the previous watermark (to pick
+        up gap backfills and corrections) plus the full history of any ticker
+        the store has not seen yet.
+
+        Args:
+            database: Connected databases.Database instance
+            lookback_days: Overlap window re-read on every refresh
+            full: Ignore the watermark and reload everything
+
+        Returns:
+            Summary of the refresh
+        """
+        start_time = time.perf_counter()
+        os.makedirs(self.path, exist_ok=True)
+
+        query = """
+            SELECT ticker, date, day_open, day_high, day_low, close_price, volume
+            FROM price_history
+        """
+        values = {}
+        if not full and self.is_built and self.refreshed_through:
+            query += " WHERE date >= :since OR NOT (ticker = ANY(:known))"
+            values = {
+                "since": self.refreshed_through - timedelta(days=lookback_days),
+                "known": self.tickers,
+            }
+
+        tickers_col: List[str] = []
+        days_col: List[int] = []
+        values_col: List[tuple] = []
+        columns = list(FIELDS.values())
+
+        async for row in database.iterate(query, values):
+            if row["date"] is None or row["ticker"] is None:
+                continue
+            tickers_col.append(row["ticker"])
+            days_col.append(_to_day(row["date"]))
+            values_col.append(tuple(np.nan if row[c] is None else float(row[c]) for c in columns))
+
+        if not tickers_col:
+            return {"rows_read": 0, "tickers": len(self.tickers), "dates": self.n_dates,
+                    "rebuilt": False, "duration_seconds": time.perf_counter() - start_time}
+
+        days = np.asarray(days_col, dtype=np.int32)
+        data = np.asarray(values_col, dtype=np.float64)
+
+        old_dates = np.asarray(self._dates[:self.n_dates])
+        all_dates = np.union1d(old_dates, days).astype(np.int32)
+
+        new_tickers = sorted(set(tickers_col) - self.index.keys())
+        tickers = self.tickers + new_tickers
+
+        ticker_capacity = self._arrays["close"].shape[0] if self.is_built else 0
+        date_capacity = self._arrays["close"].shape[1] if self.is_built else 0
+        # Appending new trading days at the end keeps existing column offsets valid
+        appended_only = len(old_dates) == 0 or np.array_equal(all_dates[:len(old_dates)], old_dates)
+
+        rebuild = (
+            full
+            or not self.is_built
+            or not appended_only
+            or len(tickers) > ticker_capacity
+            or len(all_dates) > date_capacity
+        )
+
+        if rebuild:
+            self._rebuild(tickers, all_dates, keep_existing=not full)
+        else:
+            self._load(mode="r+")
+            self._dates[:len(all_dates)] = all_dates
+
+        self.tickers = tickers
+        self.index = {ticker: i for i, ticker in enumerate(tickers)}
+        self.n_dates = len(all_dates)
+
+        rows = np.fromiter((self.index[t] for t in tickers_col), dtype=np.int64, count=len(tickers_col))
+        cols = np.searchsorted(all_dates, days)
+        for i, field in enumerate(FIELDS):
+            self._arrays[field][rows, cols] = data[:, i]
+            self._arrays[field].flush()
+        self._dates.flush()
+
+        self.refreshed_through = date.fromordinal(int(all_dates[-1]) + _EPOCH_ORDINAL)
+        self._write_meta()
+        self._load()
+
+        result = {
+            "rows_read": len(tickers_col),
+            "new_tickers": len(new_tickers),
+            "tickers": len(self.tickers),
+            "dates": self.n_dates,
+            "refreshed_through": self.refreshed_through.isoformat(),
+            "rebuilt": rebuild,
+            "duration_seconds": time.perf_counter() - start_time,
+        }
+        logger.info(f"Price history store refreshed: {result}")
+        return result
+
+    def _rebuild(self, tickers: List[str], all_dates: np.ndarray, keep_existing: bool = True):
+        """Allocate larger files, copy existing data across and swap them in"""
+        ticker_capacity = len(tickers) + TICKER_HEADROOM
+        date_capacity = len(all_dates) + DATE_HEADROOM
+
+        dates_tmp = self._file("dates.npy.tmp")
+        new_dates = np.lib.format.open_memmap(dates_tmp, mode="w+", dtype=np.int32, shape=(date_capacity,))
+        new_dates[:] = _UNUSED_DATE
+        new_dates[:len(all_dates)] = all_dates
+        new_dates.flush()
+
+        old_positions = None
+        if keep_existing and self.is_built and self.n_dates:
+            old_positions = np.searchsorted(all_dates, np.asarray(self._dates[:self.n_dates]))
+
+        new_arrays = {}
+        for field in FIELDS:
+            tmp_path = self._file(f"{field}.npy.tmp")
+            array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float64, shape=(ticker_capacity, date_capacity))
+            array[:] = np.nan
+            if old_positions is not None:
+                old = self._arrays[field]
+                array[:len(self.tickers), old_positions] = old[:len(self.tickers), :self.n_dates]
+            array.flush()
+            new_arrays[field] = array
+
+        for field in FIELDS:
+            os.replace(self._file(f"{field}.npy.tmp"), self._file(f"{field}.npy"))
+        os.replace(dates_tmp, self._file("dates.npy"))
+
+        self._dates = new_dates
+        self._arrays = new_arrays
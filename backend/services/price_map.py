@@ -0,0 +1,185 @@
+"""
+In-process map of current prices for position valuation.
+
+Every row of `securities` with a current_price (stocks, ETFs, crypto pairs and
+the metal futures GC=F/SI=F/PL=F/PA=F/HG=F) is held in two parallel arrays:
+
+    _index       ticker -> slot
+    _prices      array('d') of prices
+    _timestamps  array('d') of price_timestamp as epoch seconds (NaN if unknown)
+
+so a lookup is one dict probe and one array read, and the whole universe
+costs a few hundred KB. The map is loaded once at startup (app lifespan and
+scheduler), refreshed per ticker when price jobs publish changes
+(LiveUpdateHub in API workers, notify_price_changes elsewhere), and fully
+reloaded after PRICE_MAP_RELOAD_SECONDS as a backstop for missed
+notifications. Valuation code reads prices from here instead of joining
+`securities`.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from backend.utils.constants import METAL_TICKERS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("price_map")
+
+PRICE_MAP_RELOAD_SECONDS = int(os.getenv("PRICE_MAP_RELOAD_SECONDS", "3600"))
+
+PRICES_QUERY = """
+SELECT ticker, current_price, price_timestamp
+FROM securities
+WHERE current_price IS NOT NULL
+"""
+
+# Metal futures quote units, and the position units they convert to (grams)
+GRAMS_PER_UNIT = {
+    "oz": 31.1034768,  # troy ounce, as precious metals are quoted
+    "g": 1.0,
+    "kg": 1000.0,
+    "lb": 453.59237,
+}
+METAL_QUOTE_UNITS = {"HG=F": "lb"}  # copper trades per pound; the others per troy ounce
+
+
+def metal_ticker(metal_type: Optional[str], symbol: Optional[str] = None) -> Optional[str]:
+    """Futures ticker for a metal position (its coin_symbol, else by metal type)"""
+    if symbol and symbol.strip().upper() in METAL_TICKERS.values():
+        return symbol.strip().upper()
+    for name, ticker in METAL_TICKERS.items():
+        if metal_type and metal_type.strip().lower() == name.lower():
+            return ticker
+    return None
+
+
+def metal_price_per_unit(quote: Optional[float], ticker: str, unit: Optional[str]) -> Optional[float]:
+    """Convert a futures quote to the position's unit; None for units without a weight ('item')"""
+    position_grams = GRAMS_PER_UNIT.get((unit or "oz").strip().lower())
+    if quote is None or position_grams is None:
+        return None
+    return quote * position_grams / GRAMS_PER_UNIT[METAL_QUOTE_UNITS.get(ticker, "oz")]
+
+
+def _epoch(value) -> float:
+    if value is None:
+        return math.nan
+    if isinstance(value, datetime):
+        # price_timestamp is stored as UTC-naive
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    return math.nan
+
+
+class PriceMap:
+    """Array-backed ticker -> (price, timestamp) map"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every valuation path in the process reads the same map"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._prices = array("d")
+        self._timestamps = array("d")
+        self.loaded_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.stats = {"loads": 0, "refreshes": 0, "refreshed_tickers": 0}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at > 0
+
+    # ----- writes -----
+
+    def set(self, ticker: str, price, price_timestamp=None):
+        if price is None:
+            return
+        slot = self._index.get(ticker)
+        if slot is None:
+            self._index[ticker] = len(self._prices)
+            self._prices.append(float(price))
+            self._timestamps.append(_epoch(price_timestamp))
+        else:
+            self._prices[slot] = float(price)
+            self._timestamps[slot] = _epoch(price_timestamp)
+
+    async def load(self, database) -> int:
+        """Replace the map with every priced row of securities"""
+        started = time.perf_counter()
+        rows = await database.fetch_all(PRICES_QUERY)
+        index: Dict[str, int] = {}
+        prices, timestamps = array("d"), array("d")
+        for row in rows:
+            ticker = (row["ticker"] or "").strip().upper()
+            if not ticker:
+                continue
+            slot = index.setdefault(ticker, len(prices))
+            if slot == len(prices):
+                prices.append(float(row["current_price"]))
+                timestamps.append(_epoch(row["price_timestamp"]))
+            else:
+                prices[slot] = float(row["current_price"])
+                timestamps[slot] = _epoch(row["price_timestamp"])
+        self._index, self._prices, self._timestamps = index, prices, timestamps
+        self.loaded_at = time.time()
+        self.stats["loads"] += 1
+        logger.info(f"Price map loaded: {len(index)} tickers in {time.perf_counter() - started:.2f}s")
+        return len(index)
+
+    async def refresh(self, database, tickers: Iterable[str]) -> int:
+        """Re-read just these tickers (called when a price job publishes them)"""
+        tickers = sorted({t.strip().upper() for t in tickers if t})
+        if not tickers or not self.is_loaded:
+            return 0
+        rows = await database.fetch_all(PRICES_QUERY + " AND ticker = ANY(:tickers)", {"tickers": tickers})
+        for row in rows:
+            self.set(row["ticker"].strip().upper(), row["current_price"], row["price_timestamp"])
+        self.stats["refreshes"] += 1
+        self.stats["refreshed_tickers"] += len(rows)
+        return len(rows)
+
+    async def ensure_loaded(self, database):
+        """Load on first use (or when the backstop reload is due); cheap otherwise"""
+        if self.is_loaded and time.time() - self.loaded_at < PRICE_MAP_RELOAD_SECONDS:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.is_loaded and time.time() - self.loaded_at < PRICE_MAP_RELOAD_SECONDS:
+                return
+            await self.load(database)
+
+    # ----- reads -----
+
+    def price(self, ticker: Optional[str], default: Optional[float] = None) -> Optional[float]:
+        slot = self._index.get((ticker or "").strip().upper())
+        return self._prices[slot] if slot is not None else default
+
+    def quote(self, ticker: Optional[str]) -> Optional[Tuple[float, Optional[datetime]]]:
+        """(price, price timestamp in UTC) or None"""
+        slot = self._index.get((ticker or "").strip().upper())
+        if slot is None:
+            return None
+        ts = self._timestamps[slot]
+        return self._prices[slot], (None if math.isnan(ts) else datetime.fromtimestamp(ts, timezone.utc))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "tickers": len(self),
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat() if self.is_loaded else None,
+            **self.stats,
+        }
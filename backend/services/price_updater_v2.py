@@ -2,19 +2,24 @@
 Enhanced price updater that uses multiple data sources and is decoupled from
 portfolio calculations.
 """
-import os
+import json
 import logging
 import asyncio
-import databases
 import sqlalchemy
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional, Set
 from dotenv import load_dotenv
 
 # Import our modules
-from backend.api_clients.market_data_manager import MarketDataManager
-from backend.utils.common import record_system_event, update_system_event
+from backend.core_db import get_database
+from backend.utils.common import record_system_event, update_system_event, json_serializer
 from backend.utils.redis_cache import FastCache
+from backend.utils.metrics import track_job
+from backend.utils.market_calendar import MarketCalendar
+from backend.services.refresh_planner import RefreshPlanner
+from backend.services.security_statistics import invalidate_security_statistics
+from backend.services.metrics_ingest import MetricsIngestPipeline, UPDATE, DISABLE
+from backend.services.live_updates import notify_price_changes
 
 # Load environment variables
 load_dotenv()
@@ -23,9 +28,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("price_updater_v2")
 
-# Initialize Database Connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-database = databases.Database(DATABASE_URL)
+# Shared database pool
+database = get_database("price_updater")
 
 class PriceUpdaterV2:
     """
@@ -36,17 +40,24 @@ class PriceUpdaterV2:
     def __init__(self):
         """Initialize the price updater with necessary clients"""
         self.database = database
-        self.market_data = MarketDataManager()
+        self._market_data = None
+    
+    @property
+    def market_data(self):
+        """Market data sources, created (and their client libraries imported) on first use"""
+        if self._market_data is None:
+            from backend.api_clients.market_data_manager import MarketDataManager
+            self._market_data = MarketDataManager()
+        return self._market_data
     
     async def connect(self):
-        """Connect to the database"""
+        """Make sure the shared pool is connected (only needed outside the lifespan)"""
         if not self.database.is_connected:
             await self.database.connect()
     
     async def disconnect(self):
-        """Disconnect from the database"""
-        if self.database.is_connected:
-            await self.database.disconnect()
+        """No-op: the shared pool is closed by the app/scheduler lifespan, not by jobs"""
+        return None
     
     async def get_active_tickers(self) -> List[str]:
         """
@@ -82,13 +93,16 @@ class PriceUpdaterV2:
     
 # In price_updater_v2.py - update_security_prices method
 
-    async def update_security_prices(self, tickers=None, max_tickers=None) -> Dict[str, Any]:
+    @track_job("price_updater.update_security_prices", rows_key="updated_count")
+    async def update_security_prices(self, tickers=None, max_tickers=None, tiered=True) -> Dict[str, Any]:
             """
             Update current prices for securities using multiple data sources
             
             Args:
                 tickers: Optional list of specific tickers to update
                 max_tickers: Maximum number of tickers to update (for testing)
+                tiered: Without tickers, refresh only what the RefreshPlanner says is
+                    due this cycle instead of every active ticker
                 
             Returns:
                 Summary of updates made
@@ -107,48 +121,56 @@ class PriceUpdaterV2:
                 # Start timing
                 start_time = datetime.now()
                 
-                # Get tickers with source availability info
-                if tickers:
-                    # If specific tickers provided, get their source availability info
-                    placeholders = ', '.join([f"'{ticker}'" for ticker in tickers])
-                    query = f"""
+                if not tickers and tiered:
+                    # Held tickers every cycle, the rest hourly/daily (see services/refresh_planner.py)
+                    plan = await RefreshPlanner.get_instance().plan(self.database)
+                    polygon_tickers = plan["work"].get("polygon", [])
+                    yfinance_tickers = plan["work"].get("yahoo", [])
+                    unavailable_tickers = plan["unroutable"]
+                    logger.info(f"Refresh plan tiers: {plan['tiers']}")
+                else:
+                    # Get tickers with source availability info
+                    if tickers:
+                        # If specific tickers provided, get their source availability info
+                        placeholders = ', '.join([f"'{ticker}'" for ticker in tickers])
+                        query = f"""
+                            SELECT 
+                                ticker, 
+                                on_yfinance, 
+                                on_polygon
+                            FROM securities 
+                            WHERE ticker IN ({placeholders})
+                            AND active = true
+                        """
+                    else:
+                        # Get all active tickers with their source availability info
+                        query = """
                         SELECT 
                             ticker, 
                             on_yfinance, 
                             on_polygon
                         FROM securities 
-                        WHERE ticker IN ({placeholders})
-                        AND active = true
-                    """
-                else:
-                    # Get all active tickers with their source availability info
-                    query = """
-                    SELECT 
-                        ticker, 
-                        on_yfinance, 
-                        on_polygon
-                    FROM securities 
-                    WHERE active = true
-                    """
+                        WHERE active = true
+                        """
                 
-                ticker_data = await self.database.fetch_all(query)
+                    ticker_data = await self.database.fetch_all(query)
                 
-                # Organize tickers by preferred data source
-                polygon_tickers = []
-                yfinance_tickers = []
-                unavailable_tickers = []
+                    # Organize tickers by preferred data source
+                    polygon_tickers = []
+                    yfinance_tickers = []
+                    unavailable_tickers = []
                 
-                for row in ticker_data:
-                    ticker = row["ticker"]
-                    # Check Polygon first (preferred source)
-                    if row["on_polygon"] is None or row["on_polygon"] == True:
-                        polygon_tickers.append(ticker)
-                    # Then check Yahoo Finance
-                    elif row["on_yfinance"] is None or row["on_yfinance"] == True:
-                        yfinance_tickers.append(ticker)
-                    else:
-                        # Ticker isn't available on any source
-                        unavailable_tickers.append(ticker)
+                    for row in ticker_data:
+                        ticker = row["ticker"]
+                        # Check Polygon first (preferred source)
+                        if row["on_polygon"] is None or row["on_polygon"] == True:
+                            polygon_tickers.append(ticker)
+                        # Then check Yahoo Finance
+                        elif row["on_yfinance"] is None or row["on_yfinance"] == True:
+                            yfinance_tickers.append(ticker)
+                        else:
+                            # Ticker isn't available on any source
+                            unavailable_tickers.append(ticker)
                 
                 # Apply max_tickers limit if specified
                 all_available_tickers = polygon_tickers + yfinance_tickers
@@ -365,7 +387,9 @@ class PriceUpdaterV2:
                 logger.info(f"Sources used: {', '.join(sources_used)}")
                 logger.info(f"Polygon: {polygon_success} tickers, Yahoo Finance: {yfinance_success} tickers")
                 
-                # After successful update, invalidate relevant caches
+                # After successful update, invalidate relevant caches and push to live clients
+                invalidate_security_statistics()
+                await notify_price_changes(self.database, price_updates)
                 if FastCache.is_available():
                     # Invalidate cached portfolio calculations
                     FastCache.delete_pattern("portfolio:*")
@@ -399,6 +423,7 @@ class PriceUpdaterV2:
             finally:
                 await self.disconnect()
               
+    @track_job("price_updater.update_company_metrics", rows_key="updated_count")
     async def update_company_metrics(self, tickers=None, max_tickers=None) -> Dict[str, Any]:
         try:
             await self.connect()
@@ -455,212 +480,378 @@ class PriceUpdaterV2:
                 
             logger.info(f"Updating metrics for {len(selected_tickers)} securities")
             
-            # Track statistics
-            update_count = 0
-            unavailable_count = 0
-            not_found_tickers = []  # Track tickers not found on any source
-            sources_used = set()
-            metrics_updates = {}
-            updated_tickers = set()
-            
-            # Process each ticker individually
-            for ticker in selected_tickers:
-                try:
-                    # Get company metrics
-                    metrics = await self.market_data.get_company_metrics(ticker)
-                    
-                    # Check if metrics are completely unavailable
-                    if not metrics or metrics.get("not_found"):
-                        logger.warning(f"No metrics available for {ticker}")
-                        unavailable_count += 1
-                        not_found_tickers.append(ticker)
-                        
-                        # Mark the ticker as unavailable on YFinance
-                        await self.database.execute(
-                            """
-                            UPDATE securities 
-                            SET 
-                                on_yfinance = FALSE,
-                                last_metrics_update = NOW()
-                            WHERE ticker = :ticker
-                            """,
-                            {"ticker": ticker}
-                        )
-                        
-                        continue
-                    
-                    # Prepare update dictionary with type conversion and safe casting
-                    update_data = {
-                        "ticker": ticker,
-                        "company_name": str(metrics.get("company_name", ""))[:255],
-                        "sector": str(metrics.get("sector", ""))[:100],
-                        "industry": str(metrics.get("industry", ""))[:100],
-                        "market_cap": metrics.get("market_cap"),
-                        "current_price": metrics.get("current_price"),
-                        "previous_close": metrics.get("previous_close"),
-                        "day_open": metrics.get("day_open"),
-                        "day_low": metrics.get("day_low"),
-                        "day_high": metrics.get("day_high"),
-                        "volume": metrics.get("volume"),
-                        "average_volume": metrics.get("average_volume"),
-                        "pe_ratio": metrics.get("pe_ratio"),
-                        "forward_pe": metrics.get("forward_pe"),
-                        "beta": metrics.get("beta"),
-                        "fifty_two_week_low": metrics.get("fifty_two_week_low"),
-                        "fifty_two_week_high": metrics.get("fifty_two_week_high"),
-                        "market_cap": metrics.get("market_cap"),
-                        "timestamp": datetime.now(timezone.utc),
-                        "source": metrics.get("source", "unknown"),
-                        "eps": metrics.get("eps"),
-                        "forward_eps": metrics.get("forward_eps"),
-                        "fifty_two_week_range": metrics.get("fifty_two_week_range"),
-                        "target_median_price": metrics.get("target_median_price"),
-                        "bid_price": metrics.get("bid_price"),
-                        "ask_price": metrics.get("ask_price")
-                    }
-                    
-                    # Type-safe column mapping with conversion
-                    column_mapping = {
-                        "current_price": ("current_price", float),
-                        "previous_close": ("previous_close", float),
-                        "day_open": ("day_open", float),
-                        "day_low": ("day_low", float), 
-                        "day_high": ("day_high", float),
-                        "volume": ("volume", int),
-                        "average_volume": ("average_volume", int),
-                        "pe_ratio": ("pe_ratio", float),
-                        "forward_pe": ("forward_pe", float),
-                        "dividend_rate": ("dividend_rate", float),
-                        "dividend_yield": ("dividend_yield", float),
-                        "target_high_price": ("target_high_price", float),
-                        "target_low_price": ("target_low_price", float),
-                        "target_mean_price": ("target_mean_price", float),
-                        "beta": ("beta", float),
-                        "fifty_two_week_low": ("fifty_two_week_low", float),
-                        "fifty_two_week_high": ("fifty_two_week_high", float),
-                        "eps": ("eps", float),
-                        "forward_eps": ("forward_eps", float),
-                        "bid_price": ("bid_price", float),
-                        "ask_price": ("ask_price", float),
-                        "target_median_price": ("target_median_price", float),
-                        "fifty_two_week_range": ("fifty_two_week_range", str)
-                    }
-                    
-                    for key in ['market_cap', 'target_mean_price']:
-                        if key in update_data and update_data[key] is not None:
-                            try:
-                                update_data[key] = float(update_data[key])
-                            except (ValueError, TypeError):
-                                logger.warning(f"Could not convert {key} for {ticker}")
-                                # Set to None if conversion fails
-                                update_data[key] = None
-                    
-                    # Add columns to update with type conversion
-                    for metric_key, (db_column, conversion_func) in column_mapping.items():
-                        if metric_key in metrics and metrics[metric_key] is not None:
-                            try:
-                                update_data[db_column] = conversion_func(metrics[metric_key])
-                            except (ValueError, TypeError):
-                                logger.warning(f"Could not convert {metric_key} for {ticker}")
-                                
-                    # Add this right before executing the database query
-                    if "timestamp" in update_data and update_data["timestamp"] is not None:
-                        if update_data["timestamp"].tzinfo is not None:
-                            # Remove timezone info for PostgreSQL
-                            update_data["timestamp"] = update_data["timestamp"].replace(tzinfo=None)
-                    
-                    # Construct dynamic SQL query
-                    query = """
-                    UPDATE securities 
-                    SET 
-                        company_name = CAST(:company_name AS VARCHAR),
-                        sector = CAST(:sector AS VARCHAR),
-                        industry = CAST(:industry AS VARCHAR),
-                        market_cap = CAST(:market_cap AS NUMERIC),
-                        current_price = CAST(:current_price AS NUMERIC),
-                        previous_close = CAST(:previous_close AS NUMERIC),
-                        day_open = CAST(:day_open AS NUMERIC),
-                        day_low = CAST(:day_low AS NUMERIC),
-                        day_high = CAST(:day_high AS NUMERIC),
-                        volume = CAST(:volume AS BIGINT),
-                        average_volume = CAST(:average_volume AS BIGINT),
-                        pe_ratio = CAST(:pe_ratio AS NUMERIC),
-                        forward_pe = CAST(:forward_pe AS NUMERIC),
-                        dividend_rate = CAST(:dividend_rate AS NUMERIC),
-                        dividend_yield = CAST(:dividend_yield AS NUMERIC),
-                        target_high_price = CAST(:target_high_price AS NUMERIC),
-                        target_low_price = CAST(:target_low_price AS NUMERIC),
-                        target_mean_price = CAST(:target_mean_price AS NUMERIC),
-                        target_median_price = CAST(:target_median_price AS NUMERIC),
-                        beta = CAST(:beta AS NUMERIC),
-                        fifty_two_week_low = CAST(:fifty_two_week_low AS NUMERIC),
-                        fifty_two_week_high = CAST(:fifty_two_week_high AS NUMERIC),
-                        fifty_two_week_range = CAST(:fifty_two_week_range AS TEXT),
-                        eps = CAST(:eps AS NUMERIC),
-                        forward_eps = CAST(:forward_eps AS NUMERIC),
-                        bid_price = CAST(:bid_price AS NUMERIC),
-                        ask_price = CAST(:ask_price AS NUMERIC),
-                        last_metrics_update = CAST(:timestamp AS TIMESTAMP),
-                        metrics_source = CAST(:source AS VARCHAR),
-                        on_yfinance = CASE WHEN :source = 'yahoo_finance' THEN TRUE ELSE on_yfinance END
-                    WHERE ticker = :ticker
-                    """
-                    
-                    # Log the update data for debugging
-                    logger.info(f"Update data for {ticker}: {update_data}")
-                    
-                    # Execute the update
-                    await self.database.execute(query, update_data)
-                    
-                    # Store metrics information for response
-                    metrics_updates[ticker] = {
-                        "company_name": update_data.get("company_name"),
-                        "sector": update_data.get("sector"),
-                        "current_price": update_data.get("current_price"),
-                        "source": update_data.get("source"),
-                        "timestamp": datetime.now().replace(tzinfo=None),
-                    }
-                    
-                    updated_tickers.add(ticker)
-                    update_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error updating metrics for {ticker}: {str(e)}")
-                    logger.error(f"Problematic metrics: {metrics}")
-                    unavailable_count += 1
-                    not_found_tickers.append(ticker)
+            # Fetch concurrently; write updates and unavailable markers in chunks
+            pipeline = MetricsIngestPipeline(
+                self.market_data.get_company_metrics,
+                self._parse_company_metrics,
+                self._write_company_metrics,
+                self._mark_metrics_unavailable,
+            )
+            stats = await pipeline.run(selected_tickers)
+            invalidate_security_statistics()
+            await notify_price_changes(self.database, pipeline.updated)
             
             # Create comprehensive result
             result = {
                 "total_tickers": len(selected_tickers),
-                "updated_count": update_count,
-                "unavailable_count": unavailable_count,
-                "not_found_tickers": not_found_tickers,
-                "updated_tickers": list(updated_tickers),
-                "duration_seconds": (datetime.now(timezone.utc) - start_time).total_seconds()
+                "updated_count": len(pipeline.updated),
+                "unavailable_count": len(pipeline.disabled) + len(pipeline.failed),
+                "not_found_tickers": pipeline.disabled + pipeline.failed,
+                "updated_tickers": pipeline.updated,
+                "duration_seconds": (datetime.now(timezone.utc) - start_time).total_seconds(),
+                "pipeline": stats
             }
             
+            await update_system_event(
+                self.database,
+                event_id,
+                "completed",
+                {key: value for key, value in result.items() if key != "updated_tickers"}
+            )
+            
             return result
             
         except Exception as e:
             logger.error(f"Comprehensive error updating metrics: {str(e)}")
+            if 'event_id' in locals() and event_id:
+                await update_system_event(
+                    self.database,
+                    event_id,
+                    "failed",
+                    {"error": str(e)},
+                    str(e)
+                )
             raise
         finally:
             await self.disconnect()
             
-    async def update_historical_prices(self, tickers=None, max_tickers=None, days=30, batch_size=5) -> Dict[str, Any]:
-        """
-        Update historical prices for securities with batch processing
+    @staticmethod
+    def _parse_company_metrics(ticker: str, metrics: Optional[Dict[str, Any]]):
+        """Turn a metrics payload into an update row (UPDATE) or an unavailable marker (DISABLE)"""
+        # Check if metrics are completely unavailable
+        if not metrics or metrics.get("not_found"):
+            logger.warning(f"No metrics available for {ticker}")
+            return DISABLE, "no metrics available"
+        
+        # Prepare update dictionary with type conversion and safe casting
+        update_data = {
+            "ticker": ticker,
+            "company_name": str(metrics.get("company_name", ""))[:255],
+            "sector": str(metrics.get("sector", ""))[:100],
+            "industry": str(metrics.get("industry", ""))[:100],
+            "market_cap": metrics.get("market_cap"),
+            "current_price": metrics.get("current_price"),
+            "previous_close": metrics.get("previous_close"),
+            "day_open": metrics.get("day_open"),
+            "day_low": metrics.get("day_low"),
+            "day_high": metrics.get("day_high"),
+            "volume": metrics.get("volume"),
+            "average_volume": metrics.get("average_volume"),
+            "pe_ratio": metrics.get("pe_ratio"),
+            "forward_pe": metrics.get("forward_pe"),
+            "beta": metrics.get("beta"),
+            "fifty_two_week_low": metrics.get("fifty_two_week_low"),
+            "fifty_two_week_high": metrics.get("fifty_two_week_high"),
+            "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
+            "source": metrics.get("source", "unknown"),
+            "eps": metrics.get("eps"),
+            "forward_eps": metrics.get("forward_eps"),
+            "fifty_two_week_range": metrics.get("fifty_two_week_range"),
+            "target_median_price": metrics.get("target_median_price"),
+            "bid_price": metrics.get("bid_price"),
+            "ask_price": metrics.get("ask_price")
+        }
         
+        # Type-safe column mapping with conversion
+        column_mapping = {
+            "current_price": float,
+            "previous_close": float,
+            "day_open": float,
+            "day_low": float,
+            "day_high": float,
+            "volume": int,
+            "average_volume": int,
+            "pe_ratio": float,
+            "forward_pe": float,
+            "dividend_rate": float,
+            "dividend_yield": float,
+            "target_high_price": float,
+            "target_low_price": float,
+            "target_mean_price": float,
+            "beta": float,
+            "fifty_two_week_low": float,
+            "fifty_two_week_high": float,
+            "eps": float,
+            "forward_eps": float,
+            "bid_price": float,
+            "ask_price": float,
+            "target_median_price": float,
+            "fifty_two_week_range": str
+        }
+        
+        if update_data["market_cap"] is not None:
+            try:
+                update_data["market_cap"] = float(update_data["market_cap"])
+            except (ValueError, TypeError):
+                logger.warning(f"Could not convert market_cap for {ticker}")
+                update_data["market_cap"] = None
+        
+        # Add columns to update with type conversion
+        for key, conversion_func in column_mapping.items():
+            if metrics.get(key) is not None:
+                try:
+                    update_data[key] = conversion_func(metrics[key])
+                except (ValueError, TypeError):
+                    logger.warning(f"Could not convert {key} for {ticker}")
+        
+        # NaN/inf are not valid JSON for jsonb_to_recordset
+        for key, value in update_data.items():
+            if isinstance(value, float) and (value != value or value in (float("inf"), float("-inf"))):
+                update_data[key] = None
+        
+        return UPDATE, update_data
+    
+    async def _write_company_metrics(self, rows: List[Dict[str, Any]]) -> None:
+        """One UPDATE for a chunk of parsed metrics rows"""
+        await self.database.execute(
+            """
+            UPDATE securities s
+            SET 
+                company_name = r.company_name,
+                sector = r.sector,
+                industry = r.industry,
+                market_cap = r.market_cap,
+                current_price = r.current_price,
+                previous_close = r.previous_close,
+                day_open = r.day_open,
+                day_low = r.day_low,
+                day_high = r.day_high,
+                volume = r.volume,
+                average_volume = r.average_volume,
+                pe_ratio = r.pe_ratio,
+                forward_pe = r.forward_pe,
+                dividend_rate = r.dividend_rate,
+                dividend_yield = r.dividend_yield,
+                target_high_price = r.target_high_price,
+                target_low_price = r.target_low_price,
+                target_mean_price = r.target_mean_price,
+                target_median_price = r.target_median_price,
+                beta = r.beta,
+                fifty_two_week_low = r.fifty_two_week_low,
+                fifty_two_week_high = r.fifty_two_week_high,
+                fifty_two_week_range = r.fifty_two_week_range,
+                eps = r.eps,
+                forward_eps = r.forward_eps,
+                bid_price = r.bid_price,
+                ask_price = r.ask_price,
+                last_metrics_update = r."timestamp",
+                metrics_source = r.source,
+                on_yfinance = CASE WHEN r.source = 'yahoo_finance' THEN TRUE ELSE s.on_yfinance END
+            FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+                ticker text,
+                company_name varchar,
+                sector varchar,
+                industry varchar,
+                market_cap numeric,
+                current_price numeric,
+                previous_close numeric,
+                day_open numeric,
+                day_low numeric,
+                day_high numeric,
+                volume bigint,
+                average_volume bigint,
+                pe_ratio numeric,
+                forward_pe numeric,
+                dividend_rate numeric,
+                dividend_yield numeric,
+                target_high_price numeric,
+                target_low_price numeric,
+                target_mean_price numeric,
+                target_median_price numeric,
+                beta numeric,
+                fifty_two_week_low numeric,
+                fifty_two_week_high numeric,
+                fifty_two_week_range text,
+                eps numeric,
+                forward_eps numeric,
+                bid_price numeric,
+                ask_price numeric,
+                "timestamp" timestamp,
+                source varchar
+            )
+            WHERE s.ticker = r.ticker
+            """,
+            {"rows": json.dumps(rows, default=json_serializer)}
+        )
+    
+    async def _mark_metrics_unavailable(self, items: List[tuple]) -> None:
+        """Mark a chunk of tickers as unavailable on YFinance"""
+        await self.database.execute(
+            """
+            UPDATE securities 
+            SET 
+                on_yfinance = FALSE,
+                last_metrics_update = NOW()
+            WHERE ticker = ANY(:tickers)
+            """,
+            {"tickers": [ticker for ticker, _ in items]}
+        )
+            
+    async def _detect_history_gaps(self, tickers: List[str], trading_days: List[date]) -> Dict[str, Dict[str, Any]]:
+        """
+        Find which trading days in the window are missing from price_history.
+
+        Runs a single query for all tickers: each ticker's latest stored date
+        plus the first/last missing session among `trading_days`. Holidays
+        never get a row, so the days come from the market calendar rather
+        than from a weekday filter. Tickers with no missing days are omitted
+        from the result.
+
+        Args:
+            tickers: Tickers to inspect
+            trading_days: Sessions in the lookback window (MarketCalendar.trading_days)
+
+        Returns:
+            Dictionary mapping ticker to {max_date, first_missing, last_missing, missing_days}
+        """
+        if not tickers or not trading_days:
+            return {}
+
+        query = """
+            WITH t AS (
+                SELECT DISTINCT unnest(CAST(:tickers AS text[])) AS ticker
+            ),
+            d AS (
+                SELECT unnest(CAST(:days AS date[])) AS date
+            ),
+            latest AS (
+                SELECT ticker, MAX(date) AS max_date
+                FROM price_history
+                WHERE ticker = ANY(CAST(:tickers AS text[]))
+                GROUP BY ticker
+            ),
+            missing AS (
+                SELECT
+                    t.ticker,
+                    MIN(d.date) AS first_missing,
+                    MAX(d.date) AS last_missing,
+                    COUNT(*) AS missing_days
+                FROM t
+                CROSS JOIN d
+                LEFT JOIN price_history ph
+                       ON ph.ticker = t.ticker
+                      AND ph.date = d.date
+                WHERE ph.ticker IS NULL
+                GROUP BY t.ticker
+            )
+            SELECT m.ticker, l.max_date, m.first_missing, m.last_missing, m.missing_days
+            FROM missing m
+            LEFT JOIN latest l ON l.ticker = m.ticker
+        """
+
+        rows = await self.database.fetch_all(
+            query,
+            {"tickers": list(tickers), "days": list(trading_days)}
+        )
+
+        return {
+            row["ticker"]: {
+                "max_date": row["max_date"],
+                "first_missing": row["first_missing"],
+                "last_missing": row["last_missing"],
+                "missing_days": int(row["missing_days"]),
+            }
+            for row in rows
+        }
+
+    async def _upsert_price_history(self, points: List[Dict[str, Any]], chunk_size: int = 5000) -> int:
+        """
+        Bulk upsert historical price points into price_history.
+
+        Points are deduplicated on (ticker, date) and written with one
+        jsonb_to_recordset INSERT ... ON CONFLICT per chunk.
+
+        Args:
+            points: Price points with ticker, date, close_price and optional OHLCV fields
+            chunk_size: Maximum rows per statement
+
+        Returns:
+            Number of rows written
+        """
+        deduped = {}
+        for point in points:
+            if point.get("close_price") is None or point.get("date") is None:
+                continue
+            deduped[(point["ticker"], point["date"])] = {
+                "ticker": point["ticker"],
+                "close_price": point.get("close_price"),
+                "day_open": point.get("day_open"),
+                "day_high": point.get("day_high"),
+                "day_low": point.get("day_low"),
+                "volume": point.get("volume"),
+                "timestamp": point.get("timestamp") or datetime.utcnow(),
+                "date": point["date"],
+                "source": point.get("source", "unknown"),
+            }
+
+        rows = list(deduped.values())
+        written = 0
+
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            await self.database.execute(
+                """
+                INSERT INTO price_history
+                (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, source)
+                SELECT r.ticker, r.close_price, r.day_open, r.day_high, r.day_low, r.volume, r."timestamp", r.date, r.source
+                FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+                    ticker text,
+                    close_price numeric,
+                    day_open numeric,
+                    day_high numeric,
+                    day_low numeric,
+                    volume bigint,
+                    "timestamp" timestamp,
+                    date date,
+                    source text
+                )
+                ON CONFLICT (ticker, date) DO UPDATE
+                SET
+                    close_price = EXCLUDED.close_price,
+                    day_open = EXCLUDED.day_open,
+                    day_high = EXCLUDED.day_high,
+                    day_low = EXCLUDED.day_low,
+                    volume = EXCLUDED.volume,
+                    timestamp = EXCLUDED.timestamp,
+                    source = EXCLUDED.source
+                """,
+                {"rows": json.dumps(chunk, default=json_serializer)}
+            )
+            written += len(chunk)
+
+        return written
+
+    @track_job("price_updater.update_historical_prices", rows_key="price_points_added")
+    async def update_historical_prices(self, tickers=None, max_tickers=None, days=30, batch_size=5, full_refresh=False) -> Dict[str, Any]:
+        """
+        Update historical prices for securities with gap-aware batch processing
+
+        The `days` window is the lookback used for gap detection. Only tickers
+        with missing trading days (per MarketCalendar, so holidays don't count)
+        are fetched, and only from their first missing day onward, so a nightly
+        run typically pulls one point per ticker.
+
         Args:
             tickers: Optional list of specific tickers to update
             max_tickers: Maximum number of tickers to update (for testing)
-            days: Number of days of history to fetch
+            days: Number of days of history to check (and fetch on full_refresh)
             batch_size: Size of batches for API calls
+            full_refresh: Re-download the whole window regardless of gaps
             
         Returns:
             Summary of updates made
         """
+        event_id = None
         try:
             await self.connect()
             
@@ -669,7 +860,7 @@ class PriceUpdaterV2:
                 self.database, 
                 "history_update", 
                 "started", 
-                {"days": days, "tickers": tickers, "batch_size": batch_size}
+                {"days": days, "tickers": tickers, "batch_size": batch_size, "full_refresh": full_refresh}
             )
             
             # Start timing
@@ -678,13 +869,10 @@ class PriceUpdaterV2:
             # Get tickers to update
             if tickers:
                 # If specific tickers provided, validate they exist in the database
-                placeholders = ', '.join([f"'{ticker}'" for ticker in tickers])
-                query = f"""
-                    SELECT ticker 
-                    FROM securities 
-                    WHERE ticker IN ({placeholders})
-                """
-                result = await self.database.fetch_all(query)
+                result = await self.database.fetch_all(
+                    "SELECT ticker FROM securities WHERE ticker = ANY(:tickers)",
+                    {"tickers": list(tickers)}
+                )
                 all_tickers = [row['ticker'] for row in result]
                 
                 # Check if any requested tickers don't exist
@@ -700,12 +888,37 @@ class PriceUpdaterV2:
                 selected_tickers = all_tickers[:max_tickers]
             else:
                 selected_tickers = all_tickers
-                
-            logger.info(f"Updating historical prices for {len(selected_tickers)} securities ({days} days)")
             
-            # Calculate date range
+            # Calculate date range; today's session row is owned by the intraday
+            # price job, so the trading days stop at yesterday
             end_date = datetime.now()
             start_date = end_date - timedelta(days=days)
+            trading_days = MarketCalendar.get_instance().trading_days(
+                start_date.date(), (end_date - timedelta(days=1)).date()
+            )
+            
+            # Gap detection: one query for the whole universe, then group tickers
+            # by the first day they need so each group shares a fetch range
+            if full_refresh:
+                fetch_groups = {start_date.date(): list(selected_tickers)} if selected_tickers else {}
+                gaps = {}
+            else:
+                gaps = await self._detect_history_gaps(selected_tickers, trading_days)
+                fetch_groups = {}
+                for ticker in selected_tickers:
+                    gap = gaps.get(ticker)
+                    if gap:
+                        fetch_groups.setdefault(gap["first_missing"], []).append(ticker)
+            
+            tickers_to_fetch = sum(len(group) for group in fetch_groups.values())
+            up_to_date_count = len(selected_tickers) - tickers_to_fetch
+            missing_days_total = sum(gap["missing_days"] for gap in gaps.values())
+                
+            logger.info(
+                f"Updating historical prices for {tickers_to_fetch}/{len(selected_tickers)} securities "
+                f"({days} day window, {len(trading_days)} sessions, {missing_days_total} missing trading days, "
+                f"{up_to_date_count} up to date)"
+            )
             
             # Track statistics
             update_count = 0
@@ -715,176 +928,83 @@ class PriceUpdaterV2:
             history_updates = {}
             updated_tickers = set()
             
-            # Process tickers in batches
-            for i in range(0, len(selected_tickers), batch_size):
-                batch_tickers = selected_tickers[i:i+batch_size]
-                logger.info(f"Processing batch {i//batch_size + 1}/{(len(selected_tickers) + batch_size - 1)//batch_size}: {batch_tickers}")
+            yahoo_client = self.market_data.sources.get("yahoo_finance")
+            use_batch = hasattr(yahoo_client, "get_batch_historical_prices")
+            
+            for group_start, group_tickers in sorted(fetch_groups.items()):
+                range_start = datetime.combine(group_start, datetime.min.time())
                 
-                try:
-                    # Get historical data in batch if Yahoo Finance client supports it
-                    yahoo_client = self.market_data.sources.get("yahoo_finance")
-                    if hasattr(yahoo_client, "get_batch_historical_prices"):
-                        # Use batch method if available
-                        batch_results = await yahoo_client.get_batch_historical_prices(
-                            batch_tickers, start_date, end_date
-                        )
-                        sources_used.add("yahoo_finance")
-                        
-                        # Process each ticker's results from the batch
-                        for ticker, ticker_data in batch_results.items():
-                            if not ticker_data:
-                                logger.warning(f"No historical data available for {ticker} in batch")
-                                unavailable_count += 1
-                                continue
-                                
-                            ticker_points = 0
-                            # Process each data point
-                            for point in ticker_data:
-                                try:
-                                    # Insert or update price history record
-                                    await self.database.execute(
-                                        """
-                                        INSERT INTO price_history 
-                                        (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, source)
-                                        VALUES (:ticker, :close_price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :source)
-                                        ON CONFLICT (ticker, date) DO UPDATE
-                                        SET 
-                                            close_price = :close_price,
-                                            day_open = :day_open,
-                                            day_high = :day_high,
-                                            day_low = :day_low,
-                                            volume = :volume,
-                                            timestamp = :timestamp,
-                                            source = :source
-                                        """,
-                                        {
-                                            "ticker": ticker,
-                                            "close_price": point.get("close_price"),
-                                            "day_open": point.get("day_open"),
-                                            "day_high": point.get("day_high"),
-                                            "day_low": point.get("day_low"),
-                                            "volume": point.get("volume"),
-                                            "timestamp": point.get("timestamp") or datetime.utcnow(),
-                                            "date": point.get("date"),
-                                            "source": point.get("source", "unknown")
-                                        }
-                                    )                        
-                                    price_points_added += 1
-                                    ticker_points += 1
-                                    
-                                except Exception as point_error:
-                                    logger.error(f"Error adding historical price for {ticker} on {point.get('date')}: {str(point_error)}")
-                            
-                            # Store summary for this ticker
-                            history_updates[ticker] = {
-                                "points_added": ticker_points,
-                                "date_range": {
-                                    "start": start_date.isoformat(),
-                                    "end": end_date.isoformat()
-                                }
-                            }
-                            
-                            # Update security's last_backfilled timestamp
-                            await self.database.execute(
-                                """
-                                UPDATE securities 
-                                SET last_backfilled = :timestamp
-                                WHERE ticker = :ticker
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "timestamp": datetime.utcnow()
-                                }
+                # Process tickers in batches
+                for i in range(0, len(group_tickers), batch_size):
+                    batch_tickers = group_tickers[i:i+batch_size]
+                    logger.info(f"Processing batch from {group_start.isoformat()} {i//batch_size + 1}/{(len(group_tickers) + batch_size - 1)//batch_size}: {batch_tickers}")
+                    
+                    try:
+                        if use_batch:
+                            # Use batch method if available
+                            batch_results = await yahoo_client.get_batch_historical_prices(
+                                batch_tickers, range_start, end_date
                             )
-                            
-                            updated_tickers.add(ticker)
-                            update_count += 1
-                    else:
-                        # Fall back to individual processing if batch method not available
+                            sources_used.add("yahoo_finance")
+                        else:
+                            # Fall back to individual processing if batch method not available
+                            batch_results = {}
+                            for ticker in batch_tickers:
+                                batch_results[ticker] = await self.market_data.get_historical_prices(ticker, range_start, end_date)
+                        
+                        batch_points = []
                         for ticker in batch_tickers:
-                            # Process individual ticker (using existing method)
-                            historical_data = await self.market_data.get_historical_prices(ticker, start_date, end_date)
-                            
-                            if not historical_data:
+                            ticker_data = batch_results.get(ticker)
+                            if not ticker_data:
                                 logger.warning(f"No historical data available for {ticker}")
                                 unavailable_count += 1
                                 continue
                             
-                            # Track the source that was used
-                            for point in historical_data:
+                            # Providers can return more than was asked for; keep only the gap
+                            ticker_points = [
+                                dict(point, ticker=ticker)
+                                for point in ticker_data
+                                if point.get("date") is None or point["date"] >= group_start
+                            ]
+                            for point in ticker_points:
                                 if "source" in point:
                                     sources_used.add(point["source"])
                                     break
                             
-                            ticker_points = 0
-                            # Process each data point
-                            for point in historical_data:
-                                try:
-                                    # Insert or update price history record
-                                    await self.database.execute(
-                                        """
-                                        INSERT INTO price_history 
-                                        (ticker, close_price, day_open, day_high, day_low, volume, timestamp, date, source)
-                                        VALUES (:ticker, :close_price, :day_open, :day_high, :day_low, :volume, :timestamp, :date, :source)
-                                        ON CONFLICT (ticker, date) DO UPDATE
-                                        SET 
-                                            close_price = :close_price,
-                                            day_open = :day_open,
-                                            day_high = :day_high,
-                                            day_low = :day_low,
-                                            volume = :volume,
-                                            timestamp = :timestamp,
-                                            source = :source
-                                        """,
-                                        {
-                                            "ticker": ticker,
-                                            "close_price": point.get("close_price"),
-                                            "day_open": point.get("day_open"),
-                                            "day_high": point.get("day_high"),
-                                            "day_low": point.get("day_low"),
-                                            "volume": point.get("volume"),
-                                            "timestamp": point.get("timestamp") or datetime.utcnow(),
-                                            "date": point.get("date"),
-                                            "source": point.get("source", "unknown")
-                                        }
-                                    )                        
-                                    price_points_added += 1
-                                    ticker_points += 1
-                                    
-                                except Exception as point_error:
-                                    logger.error(f"Error adding historical price for {ticker} on {point.get('date')}: {str(point_error)}")
-                            
-                            # Store summary for this ticker
+                            batch_points.extend(ticker_points)
                             history_updates[ticker] = {
-                                "points_added": ticker_points,
+                                "points_added": len(ticker_points),
                                 "date_range": {
-                                    "start": start_date.isoformat(),
+                                    "start": range_start.isoformat(),
                                     "end": end_date.isoformat()
                                 }
                             }
-                            
-                            # Update security's last_backfilled timestamp
-                            await self.database.execute(
-                                """
-                                UPDATE securities 
-                                SET last_backfilled = :timestamp
-                                WHERE ticker = :ticker
-                                """,
-                                {
-                                    "ticker": ticker,
-                                    "timestamp": datetime.utcnow()
-                                }
-                            )
-                            
                             updated_tickers.add(ticker)
                             update_count += 1
-                
-                except Exception as batch_error:
-                    logger.error(f"Error processing batch: {str(batch_error)}")
-                    # Continue with the next batch
-                
-                # Small delay between batches to avoid rate limiting
-                await asyncio.sleep(1)
+                        
+                        price_points_added += await self._upsert_price_history(batch_points)
+                    
+                    except Exception as batch_error:
+                        logger.error(f"Error processing batch: {str(batch_error)}")
+                        # Continue with the next batch
+                    
+                    # Small delay between provider batches to avoid rate limiting
+                    if i + batch_size < len(group_tickers):
+                        await asyncio.sleep(1)
+            
+            # Update last_backfilled for every ticker we touched in one statement
+            if updated_tickers:
+                await self.database.execute(
+                    """
+                    UPDATE securities 
+                    SET last_backfilled = :timestamp
+                    WHERE ticker = ANY(:tickers)
+                    """,
+                    {
+                        "tickers": list(updated_tickers),
+                        "timestamp": datetime.utcnow()
+                    }
+                )
             
             # Calculate duration
             duration = (datetime.now() - start_time).total_seconds()
@@ -892,6 +1012,10 @@ class PriceUpdaterV2:
             # Record completion
             result = {
                 "total_tickers": len(selected_tickers),
+                "tickers_with_gaps": tickers_to_fetch,
+                "up_to_date_count": up_to_date_count,
+                "trading_days_checked": len(trading_days),
+                "missing_days_detected": missing_days_total,
                 "updated_count": update_count,
                 "unavailable_count": unavailable_count,
                 "price_points_added": price_points_added,
@@ -934,6 +1058,7 @@ class PriceUpdaterV2:
         finally:
             await self.disconnect()
 
+    @track_job("price_updater.smart_update")
     async def smart_update(self, update_type="all", max_tickers=None) -> Dict[str, Any]:
             """
             Perform a smart update of security data based on what needs updating most
@@ -1084,6 +1209,7 @@ class PriceUpdaterV2:
             finally:
                 await self.disconnect()
                 
+    @track_job("price_updater.update_stale_securities")
     async def update_stale_securities(self, metrics_days_threshold=7, price_days_threshold=1, max_metrics_tickers=50, max_prices_tickers=100) -> Dict[str, Any]:
         """
         Update securities prioritized by staleness of metrics and prices
@@ -1275,4 +1401,4 @@ if __name__ == "__main__":
             max_prices_tickers=args.max or 100
         ))
     else:
-        asyncio.run(run_price_update(args.type, args.max, tickers_list))
\ No newline at end of file
+        asyncio.run(run_price_update(args.type, args.max, tickers_list))
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Holdings-aware refresh planning for the price jobs.
+
+Instead of refreshing every row of `securities` on every run, each ticker gets
+a tier:
+
+    1  held in at least one position          refreshed every cycle
+    2  searched/viewed in the last             refreshed when older than
+       REFRESH_ACTIVITY_WINDOW_SECONDS         REFRESH_TIER2_SECONDS (hourly)
+    3  everything else                         refreshed when older than
+                                               REFRESH_TIER3_SECONDS (daily)
+
+Tiers 2 and 3 are also capped per cycle (stalest first), so the calls and
+writes of a cycle scale with the number of held tickers rather than with the
+size of the market.
+
+Each due ticker is routed to the first provider in REFRESH_PROVIDER_ORDER
+that can price it. Polygon goes first by default, because one snapshot call
+covers the whole list. Polygon only covers asset_type 'security' rows that
+are not flagged on_polygon = FALSE; Yahoo covers rows not flagged
+on_yfinance = FALSE.
+
+Activity is recorded by note_activity() (called by search and security
+details) in securities.last_viewed_at, so the scheduler process plans with
+what the API processes saw. Views are buffered and written in one UPDATE per
+REFRESH_ACTIVITY_FLUSH_SECONDS; the holdings come from `positions` at
+planning time.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from backend.core_db import get_database, run_on_own_connection
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("refresh_planner")
+
+database = get_database("refresh_planner")
+
+REFRESH_TIER2_SECONDS = int(os.getenv("REFRESH_TIER2_SECONDS", "3600"))
+REFRESH_TIER3_SECONDS = int(os.getenv("REFRESH_TIER3_SECONDS", "86400"))
+REFRESH_TIER2_MAX_PER_CYCLE = int(os.getenv("REFRESH_TIER2_MAX_PER_CYCLE", "500"))
+REFRESH_TIER3_MAX_PER_CYCLE = int(os.getenv("REFRESH_TIER3_MAX_PER_CYCLE", "1000"))
+REFRESH_ACTIVITY_WINDOW_SECONDS = int(os.getenv("REFRESH_ACTIVITY_WINDOW_SECONDS", "86400"))
+REFRESH_ACTIVITY_FLUSH_SECONDS = float(os.getenv("REFRESH_ACTIVITY_FLUSH_SECONDS", "30"))
+# A ticker viewed again within this long keeps its timestamp (saves rewriting hot rows)
+REFRESH_ACTIVITY_RESOLUTION_SECONDS = 300
+REFRESH_PROVIDER_ORDER = [
+    p.strip() for p in os.getenv("REFRESH_PROVIDER_ORDER", "polygon,yahoo").split(",") if p.strip()
+]
+
+# Run by `python -m backend.migrations.create_tables`
+REFRESH_ACTIVITY_SQL = [
+    "ALTER TABLE securities ADD COLUMN IF NOT EXISTS last_viewed_at TIMESTAMP",
+]
+
+RECORD_ACTIVITY_QUERY = """
+UPDATE securities
+SET last_viewed_at = NOW() AT TIME ZONE 'UTC'
+WHERE ticker = ANY(:tickers)
+  AND (last_viewed_at IS NULL
+       OR last_viewed_at < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => :resolution_seconds))
+"""
+
+PLAN_QUERY = """
+WITH held AS (
+    SELECT p.ticker,
+           COUNT(*) AS position_count,
+           SUM(p.shares * COALESCE(s.current_price, p.price)) AS held_value
+    FROM positions p
+    JOIN securities s ON s.ticker = p.ticker
+    GROUP BY p.ticker
+),
+candidates AS (
+    SELECT s.ticker, s.asset_type, s.on_polygon, s.on_yfinance, s.last_updated,
+           COALESCE(h.position_count, 0) AS position_count,
+           COALESCE(h.held_value, 0) AS held_value,
+           CASE WHEN h.ticker IS NOT NULL THEN 1
+                WHEN s.last_viewed_at >= (NOW() AT TIME ZONE 'UTC') - make_interval(secs => :activity_seconds) THEN 2
+                ELSE 3 END AS tier
+    FROM securities s
+    LEFT JOIN held h ON h.ticker = s.ticker
+    WHERE s.active = true
+      AND (s.on_polygon IS DISTINCT FROM FALSE OR s.on_yfinance IS DISTINCT FROM FALSE)
+),
+due AS (
+    SELECT c.*,
+           ROW_NUMBER() OVER (PARTITION BY tier ORDER BY held_value DESC, last_updated ASC NULLS FIRST, ticker) AS rn
+    FROM candidates c
+    WHERE tier = 1
+       OR (tier = 2 AND (last_updated IS NULL
+                         OR last_updated < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => :tier2_seconds)))
+       OR (tier = 3 AND (last_updated IS NULL
+                         OR last_updated < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => :tier3_seconds)))
+)
+SELECT ticker, asset_type, on_polygon, on_yfinance, tier, position_count, held_value
+FROM due
+WHERE tier = 1
+   OR (tier = 2 AND rn <= :tier2_limit)
+   OR (tier = 3 AND rn <= :tier3_limit)
+ORDER BY tier, rn
+"""
+
+
+def _can_price(provider: str, row) -> bool:
+    if provider == "polygon":
+        return row["asset_type"] == "security" and row["on_polygon"] is not False
+    if provider == "yahoo":
+        return row["on_yfinance"] is not False
+    return False
+
+
+async def install_refresh_activity(db):
+    """Add securities.last_viewed_at, which tier 2 is planned from"""
+    for statement in REFRESH_ACTIVITY_SQL:
+        await db.execute(statement)
+
+
+class RefreshPlanner:
+    """Per-cycle, per-provider work lists ordered by tier"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every endpoint shares one activity buffer"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def note_activity(self, tickers: Iterable[str]):
+        """Record that users looked at these tickers (promotes them to tier 2)"""
+        for ticker in tickers:
+            if ticker:
+                self._pending.add(ticker.strip().upper())
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = run_on_own_connection(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(REFRESH_ACTIVITY_FLUSH_SECONDS)
+        await self.flush_activity(database)
+
+    async def flush_activity(self, db) -> int:
+        """Write buffered views to securities.last_viewed_at; returns the number of tickers written"""
+        tickers, self._pending = sorted(self._pending), set()
+        if not tickers:
+            return 0
+        try:
+            await db.execute(
+                RECORD_ACTIVITY_QUERY,
+                {"tickers": tickers, "resolution_seconds": float(REFRESH_ACTIVITY_RESOLUTION_SECONDS)}
+            )
+        except Exception as e:
+            # Keep them for the next flush; losing views only delays tier 2
+            self._pending.update(tickers)
+            logger.warning(f"Could not record activity for {len(tickers)} tickers: {str(e)}")
+            return 0
+        return len(tickers)
+
+    async def plan(self, database, providers: List[str] = None) -> Dict[str, Any]:
+        """
+        Work lists for one refresh cycle
+
+        Args:
+            database: Database handle
+            providers: Provider preference (defaults to REFRESH_PROVIDER_ORDER)
+
+        Returns:
+            {"work": {provider: [tickers]}, "tiers": {"tier1": count, ...}, "unroutable": [tickers]}
+        """
+        providers = providers or REFRESH_PROVIDER_ORDER
+        # Views buffered in this process count for this plan too
+        await self.flush_activity(database)
+        rows = await database.fetch_all(
+            PLAN_QUERY,
+            {
+                "activity_seconds": float(REFRESH_ACTIVITY_WINDOW_SECONDS),
+                "tier2_seconds": float(REFRESH_TIER2_SECONDS),
+                "tier3_seconds": float(REFRESH_TIER3_SECONDS),
+                "tier2_limit": REFRESH_TIER2_MAX_PER_CYCLE,
+                "tier3_limit": REFRESH_TIER3_MAX_PER_CYCLE,
+            }
+        )
+
+        work: Dict[str, List[str]] = {provider: [] for provider in providers}
+        tiers = {"tier1": 0, "tier2": 0, "tier3": 0}
+        unroutable: List[str] = []
+        for row in rows:
+            tiers[f"tier{row['tier']}"] += 1
+            provider = next((p for p in providers if _can_price(p, row)), None)
+            if provider is None:
+                unroutable.append(row["ticker"])
+            else:
+                work[provider].append(row["ticker"])
+
+        logger.info(
+            "Refresh plan: "
+            + " ".join(f"{name}={count}" for name, count in tiers.items()) + " "
+            + " ".join(f"{p}={len(t)}" for p, t in work.items())
+        )
+        return {"work": work, "tiers": tiers, "unroutable": unroutable}
@@ -0,0 +1,253 @@
+"""
+In-memory typeahead index for /securities/search.
+
+The old endpoint ran `LOWER(TRIM(col)) LIKE '%q%'` over ticker, company_name,
+sector and industry on every keystroke, which no B-tree index can serve. This
+module keeps the searchable columns of `securities` in memory instead.
+
+Securities are numbered in tiebreak order (market_cap DESC NULLS LAST, ticker
+ASC), so within a ranking tier "best" is simply "smallest row number":
+
+    0: exact ticker              dict lookup
+    1: ticker prefix             bisect over sorted tickers
+    2: exact company name        dict lookup
+    3: company name prefix       bisect over sorted names
+    4: ticker contains           str.find over all tickers joined in row order
+    5: company contains          str.find over all names joined in row order
+    6: sector/industry contains  substring test over the few distinct values
+                                 (only for queries of 3+ characters)
+
+Each tier stops as soon as the result list is full, so the common case (a
+prefix of a ticker or company) never reaches the substring scans.
+
+The index is loaded on first use and reloaded in the background once it is
+older than SECURITY_SEARCH_REFRESH_SECONDS (or after invalidate()), so only
+the very first search waits on the database. See
+backend/benchmarks/security_search.py for the comparison against the LIKE
+query and a pg_trgm rewrite.
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional
+
+from backend.core_db import run_on_own_connection
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("security_search")
+
+SECURITY_SEARCH_REFRESH_SECONDS = int(os.getenv("SECURITY_SEARCH_REFRESH_SECONDS", "120"))
+SECURITY_SEARCH_LIMIT = 20
+SECTOR_MIN_QUERY_LENGTH = 3  # shorter queries would match half the sectors
+
+RESULT_FIELDS = ("ticker", "asset_type", "name", "price", "sector", "industry", "market_cap")
+_PREFIX_END = "\U0010ffff"
+
+
+def _normalize(value: Any) -> str:
+    """LOWER(TRIM(value)); newlines are blanked so one value is one line"""
+    if value is None:
+        return ""
+    return str(value).strip().lower().replace("\n", " ").replace("\r", " ")
+
+
+def _extend(rows, limit: int, seen: set, out: List[int]):
+    """Append unseen rows (already in rank order) until `out` holds `limit`"""
+    for row in rows:
+        if len(out) >= limit:
+            return
+        if row not in seen:
+            seen.add(row)
+            out.append(row)
+
+
+class _Column:
+    """Exact, prefix and substring lookups over one column of the index"""
+
+    __slots__ = ("exact", "keys", "rows", "text", "starts")
+
+    def __init__(self, values: List[str]):
+        self.exact: Dict[str, List[int]] = {}
+        for row, value in enumerate(values):
+            if value:
+                self.exact.setdefault(value, []).append(row)
+
+        ordered = sorted((value, row) for row, value in enumerate(values) if value)
+        self.keys = [value for value, _ in ordered]
+        self.rows = [row for _, row in ordered]
+
+        # All values in row order, one per line; starts[i] is the "\n" opening row i
+        self.text = "\n" + "\n".join(values) + "\n"
+        self.starts = []
+        offset = 0
+        for value in values:
+            self.starts.append(offset)
+            offset += len(value) + 1
+
+    def equal(self, q: str, limit: int, seen: set, out: List[int]):
+        _extend(self.exact.get(q, ()), limit, seen, out)
+
+    def prefix(self, q: str, limit: int, seen: set, out: List[int]):
+        lo = bisect_left(self.keys, q)
+        hi = bisect_right(self.keys, q + _PREFIX_END, lo)
+        if lo < hi:
+            wanted = limit - len(out) + len(seen)
+            _extend(heapq.nsmallest(wanted, self.rows[lo:hi]), limit, seen, out)
+
+    def contains(self, q: str, limit: int, seen: set, out: List[int]):
+        find, starts = self.text.find, self.starts
+        position = find(q)
+        while position != -1 and len(out) < limit:
+            row = bisect_right(starts, position) - 1
+            if row not in seen:
+                seen.add(row)
+                out.append(row)
+            # Resume at the next line; further hits on this one add nothing
+            if row + 1 >= len(starts):
+                break
+            position = find(q, starts[row + 1])
+
+
+class _Snapshot:
+    """Immutable index over one load of the securities table"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.rows = sorted(
+            records,
+            key=lambda r: (r["market_cap"] is None, -float(r["market_cap"] or 0), r["ticker"]),
+        )
+        self.tickers = _Column([_normalize(r["ticker"]) for r in self.rows])
+        self.names = _Column([_normalize(r["name"]) for r in self.rows])
+
+        # A few dozen sectors and a few hundred industries cover the whole table
+        self.groups: Dict[str, List[int]] = {}
+        for row, record in enumerate(self.rows):
+            for value in {_normalize(record["sector"]), _normalize(record["industry"])}:
+                if value:
+                    self.groups.setdefault(value, []).append(row)
+
+    def search(self, q: str, limit: int) -> List[int]:
+        seen: set = set()
+        hits: List[int] = []
+        tiers = (
+            self.tickers.equal, self.tickers.prefix,
+            self.names.equal, self.names.prefix,
+            self.tickers.contains, self.names.contains,
+        )
+        for tier in tiers:
+            if len(hits) >= limit:
+                return hits
+            tier(q, limit, seen, hits)
+
+        if len(q) >= SECTOR_MIN_QUERY_LENGTH and len(hits) < limit:
+            matched = [rows for value, rows in self.groups.items() if q in value]
+            _extend(heapq.merge(*matched), limit, seen, hits)
+        return hits
+
+
+class SecuritySearchIndex:
+    """Ranked ticker/company/sector search over an in-memory copy of `securities`"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every request searches the same index"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self._refresh_after = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def invalidate(self):
+        """Reload in the background on the next search (e.g. after securities were added)"""
+        self._refresh_after = 0.0
+
+    def build(self, records: List[Dict[str, Any]]):
+        """Replace the index with `records` (dicts with the RESULT_FIELDS keys)"""
+        self._snapshot = _Snapshot(records)
+
+    async def load(self, database) -> int:
+        """Read the searchable columns of every security and rebuild the index"""
+        started = time.perf_counter()
+        records = await database.fetch_all(
+            """
+            SELECT
+                ticker,
+                asset_type,
+                company_name AS name,
+                COALESCE(current_price, 0) AS price,
+                sector,
+                industry,
+                market_cap
+            FROM securities
+            """
+        )
+        # Sorting and joining ~10^5 rows takes a while; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, _Snapshot, [dict(record) for record in records])
+
+        self._snapshot = snapshot
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - started
+        self._refresh_after = self.loaded_at + SECURITY_SEARCH_REFRESH_SECONDS
+        logger.info(f"Security search index loaded {len(snapshot.rows)} securities in {self.load_seconds:.2f}s")
+        return len(snapshot.rows)
+
+    async def _refresh(self, database):
+        try:
+            await self.load(database)
+        except Exception as e:
+            # Keep serving the previous index and try again after another interval
+            self._refresh_after = time.time() + SECURITY_SEARCH_REFRESH_SECONDS
+            logger.error(f"Security search index refresh failed: {str(e)}")
+
+    async def ensure_loaded(self, database):
+        """Load on first use; afterwards refresh in the background when stale"""
+        if not self.is_loaded:
+            async with self._lock:
+                if not self.is_loaded:
+                    await self.load(database)
+            return
+
+        if time.time() >= self._refresh_after and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = run_on_own_connection(self._refresh(database))
+
+    def search(self, query: str, limit: int = SECURITY_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Ranked matches for `query` (case-insensitive, surrounding whitespace ignored)
+
+        Args:
+            query: Raw search text
+            limit: Maximum number of results
+
+        Returns:
+            Result dicts with RESULT_FIELDS, best match first
+        """
+        snapshot = self._snapshot
+        q = _normalize(query)
+        if not q or snapshot is None:
+            return []
+        return [{field: snapshot.rows[row][field] for field in RESULT_FIELDS} for row in snapshot.search(q, limit)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "securities": len(self._snapshot.rows) if self._snapshot else 0,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "refresh_seconds": SECURITY_SEARCH_REFRESH_SECONDS,
+        }
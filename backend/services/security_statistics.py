@@ -0,0 +1,166 @@
+"""
+Aggregate statistics over `security_usage` for /market/security-statistics.
+
+Everything is computed by one SQL statement (COUNT ... FILTER, percentile_cont
+and jsonb_object_agg histograms), so the endpoint transfers a single row
+instead of the whole view. The result is cached in process and, when Redis is
+up, in FastCache for the other workers. The price and metrics jobs call
+invalidate_security_statistics() after writing; SECURITY_STATISTICS_TTL_SECONDS
+bounds how stale the age figures can get in between.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from backend.utils.redis_cache import FastCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("security_statistics")
+
+SECURITY_STATISTICS_TTL_SECONDS = int(os.getenv("SECURITY_STATISTICS_TTL_SECONDS", "300"))
+CACHE_KEY = "security_statistics"
+
+STATISTICS_QUERY = """
+WITH su AS (
+    SELECT asset_type, status, last_updated, price_age_minutes, metrics_age_minutes,
+           price_status, metrics_status, COALESCE(total_positions, 0) AS total_positions,
+           status = 'Active' AS is_active
+    FROM security_usage
+)
+SELECT
+    COUNT(*) AS total_count,
+    COUNT(*) FILTER (WHERE is_active) AS active_count,
+    MAX(last_updated) AS most_recent_update,
+    MIN(last_updated) FILTER (WHERE is_active) AS active_price_min,
+    MAX(last_updated) FILTER (WHERE is_active) AS active_price_max,
+    MIN(price_age_minutes) FILTER (WHERE is_active) AS price_age_min,
+    MAX(price_age_minutes) FILTER (WHERE is_active) AS price_age_max,
+    AVG(price_age_minutes) FILTER (WHERE is_active) AS price_age_avg,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY price_age_minutes) FILTER (WHERE is_active) AS price_age_median,
+    MIN(metrics_age_minutes) FILTER (WHERE is_active) AS metrics_age_min,
+    MAX(metrics_age_minutes) FILTER (WHERE is_active) AS metrics_age_max,
+    AVG(metrics_age_minutes) FILTER (WHERE is_active) AS metrics_age_avg,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY metrics_age_minutes) FILTER (WHERE is_active) AS metrics_age_median,
+    COUNT(*) FILTER (WHERE total_positions > 0) AS securities_with_positions,
+    COUNT(*) FILTER (WHERE is_active AND total_positions > 0) AS active_with_positions,
+    (SELECT jsonb_object_agg(asset_type, n) FROM (
+        SELECT asset_type, COUNT(*) AS n FROM su WHERE asset_type IS NOT NULL GROUP BY asset_type
+    ) t) AS by_asset_type,
+    (SELECT jsonb_object_agg(price_status, n) FROM (
+        SELECT price_status, COUNT(*) AS n FROM su WHERE price_status IS NOT NULL GROUP BY price_status
+    ) t) AS price_status_counts,
+    (SELECT jsonb_object_agg(metrics_status, n) FROM (
+        SELECT metrics_status, COUNT(*) AS n FROM su WHERE metrics_status IS NOT NULL GROUP BY metrics_status
+    ) t) AS metrics_status_counts
+FROM su
+"""
+
+_cache: Dict[str, Any] = {"value": None, "expires_at": 0.0, "generation": 0}
+_lock = asyncio.Lock()
+
+
+def _json(value) -> Dict[str, Any]:
+    if value is None:
+        return {}
+    return json.loads(value) if isinstance(value, str) else dict(value)
+
+
+def _round(value) -> Optional[float]:
+    return round(float(value), 2) if value is not None else None
+
+
+def _timestamp(value) -> Optional[str]:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+
+def _age_stats(row, prefix: str) -> Dict[str, Optional[float]]:
+    return {
+        "min": _round(row[f"{prefix}_min"]),
+        "max": _round(row[f"{prefix}_max"]),
+        "avg": _round(row[f"{prefix}_avg"]),
+        "median": _round(row[f"{prefix}_median"]),
+    }
+
+
+async def compute_security_statistics(database) -> Dict[str, Any]:
+    """
+    Run the aggregate query
+
+    Returns:
+        {"total_securities": 0} for an empty table, otherwise the full statistics dict
+    """
+    row = await database.fetch_one(STATISTICS_QUERY)
+    if not row or not row["total_count"]:
+        return {"total_securities": 0}
+
+    price_status_counts = _json(row["price_status_counts"])
+    metrics_status_counts = _json(row["metrics_status_counts"])
+    return {
+        "total_securities": row["total_count"],
+        "by_asset_type": _json(row["by_asset_type"]),
+        "active_securities": row["active_count"],
+        "prices_last_updated": _timestamp(row["most_recent_update"]),
+        "active_price_update_range": {
+            "min": _timestamp(row["active_price_min"]),
+            "max": _timestamp(row["active_price_max"]),
+        },
+        "active_price_age_minutes": _age_stats(row, "price_age"),
+        "active_metrics_age_minutes": _age_stats(row, "metrics_age"),
+        "price_status_counts": price_status_counts,
+        "metrics_status_counts": metrics_status_counts,
+        "securities_with_positions": row["securities_with_positions"],
+        "active_with_positions": row["active_with_positions"],
+        "price_needs_update": price_status_counts.get("Requires Updating", 0),
+        "metrics_needs_update": metrics_status_counts.get("Requires Updating", 0),
+    }
+
+
+async def get_security_statistics(database) -> Dict[str, Any]:
+    """
+    Cached statistics
+
+    Returns:
+        {"statistics": ..., "generated_at": ISO timestamp, "cached": bool}
+    """
+    now = time.time()
+    if _cache["value"] is not None and now < _cache["expires_at"]:
+        return {**_cache["value"], "cached": True}
+
+    async with _lock:
+        if _cache["value"] is not None and time.time() < _cache["expires_at"]:
+            return {**_cache["value"], "cached": True}
+
+        generation = _cache["generation"]
+        shared = FastCache.get(CACHE_KEY)
+        if isinstance(shared, dict) and "statistics" in shared:
+            value, cached = shared, True
+        else:
+            value = {
+                "statistics": await compute_security_statistics(database),
+                "generated_at": datetime.now().isoformat(),
+                "expires_at": time.time() + SECURITY_STATISTICS_TTL_SECONDS,
+            }
+            cached = False
+            if generation == _cache["generation"]:
+                FastCache.set(CACHE_KEY, value, SECURITY_STATISTICS_TTL_SECONDS)
+
+        # A copy from Redis expires when the shared one does, not a full TTL later
+        expires_at = value.pop("expires_at", time.time() + SECURITY_STATISTICS_TTL_SECONDS)
+        # Don't keep a result that a job invalidated while it was being computed
+        if generation == _cache["generation"]:
+            _cache["value"] = value
+            _cache["expires_at"] = expires_at
+        return {**value, "cached": cached}
+
+
+def invalidate_security_statistics():
+    """Drop the cached statistics; called by jobs that change prices, metrics or securities"""
+    _cache["value"] = None
+    _cache["expires_at"] = 0.0
+    _cache["generation"] += 1
+    FastCache.delete(CACHE_KEY)
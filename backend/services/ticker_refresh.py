@@ -0,0 +1,322 @@
+"""
+Batched ticker refresh for the manual /market/*-ticker(s)-* endpoints.
+
+Every refresh, whether for one ticker or five hundred, runs the same stages:
+
+    1. one `ticker = ANY(:tickers)` query for the tickers already in securities
+    2. one INSERT ... ON CONFLICT DO NOTHING for the missing ones
+    3. provider fetches, TICKER_REFRESH_CONCURRENCY at a time
+    4. one jsonb_to_recordset UPDATE for everything that came back
+
+so the number of database round trips no longer grows with the ticker count.
+The provider client is passed in (YahooQueryClient, DirectYahooFinanceClient
+or anything with get_batch_prices/get_company_metrics). Stage 3 only overlaps
+if the client doesn't block the event loop: both clients run their blocking
+HTTP calls (yahooquery, requests) on the default executor.
+"""
+import os
+import json
+import math
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from backend.utils.common import json_serializer
+from backend.services.security_search import SecuritySearchIndex
+from backend.services.security_statistics import invalidate_security_statistics
+from backend.services.live_updates import notify_price_changes
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ticker_refresh")
+
+TICKER_REFRESH_CONCURRENCY = int(os.getenv("TICKER_REFRESH_CONCURRENCY", "8"))
+TICKER_REFRESH_PRICE_BATCH = int(os.getenv("TICKER_REFRESH_PRICE_BATCH", "10"))
+TICKER_REFRESH_MAX_TICKERS = int(os.getenv("TICKER_REFRESH_MAX_TICKERS", "2000"))
+
+METRIC_FIELDS = (
+    "company_name", "current_price", "sector", "industry", "market_cap",
+    "pe_ratio", "forward_pe", "dividend_rate", "dividend_yield", "beta",
+    "fifty_two_week_low", "fifty_two_week_high", "eps", "forward_eps",
+)
+
+PRICE_UPDATE_QUERY = """
+UPDATE securities s
+SET
+    current_price = r.price,
+    day_open = r.day_open,
+    day_high = r.day_high,
+    day_low = r.day_low,
+    volume = r.volume,
+    last_updated = :updated_at,
+    price_timestamp = r.price_timestamp
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+    ticker text,
+    price numeric,
+    day_open numeric,
+    day_high numeric,
+    day_low numeric,
+    volume bigint,
+    price_timestamp timestamp
+)
+WHERE s.ticker = r.ticker
+"""
+
+METRICS_UPDATE_QUERY = """
+UPDATE securities s
+SET
+    company_name = r.company_name,
+    current_price = r.current_price,
+    sector = r.sector,
+    industry = r.industry,
+    market_cap = r.market_cap,
+    pe_ratio = r.pe_ratio,
+    forward_pe = r.forward_pe,
+    dividend_rate = r.dividend_rate,
+    dividend_yield = r.dividend_yield,
+    beta = r.beta,
+    fifty_two_week_low = r.fifty_two_week_low,
+    fifty_two_week_high = r.fifty_two_week_high,
+    fifty_two_week_range = r.fifty_two_week_range,
+    eps = r.eps,
+    forward_eps = r.forward_eps,
+    last_metrics_update = :updated_at,
+    last_updated = :updated_at
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+    ticker text,
+    company_name text,
+    current_price numeric,
+    sector text,
+    industry text,
+    market_cap numeric,
+    pe_ratio numeric,
+    forward_pe numeric,
+    dividend_rate numeric,
+    dividend_yield numeric,
+    beta numeric,
+    fifty_two_week_low numeric,
+    fifty_two_week_high numeric,
+    fifty_two_week_range text,
+    eps numeric,
+    forward_eps numeric
+)
+WHERE s.ticker = r.ticker
+"""
+
+
+def normalize_tickers(tickers: Iterable[str]) -> List[str]:
+    """Strip, uppercase and de-duplicate, keeping the caller's order"""
+    seen = {}
+    for ticker in tickers:
+        ticker = (ticker or "").strip().upper()
+        if ticker:
+            seen.setdefault(ticker, None)
+    return list(seen)
+
+
+def _finite(value: Any) -> Any:
+    """NaN/inf would make the whole JSON batch unparsable for Postgres"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class TickerRefreshPipeline:
+    """Existence check, insert, concurrent fetch and bulk UPDATE for a list of tickers"""
+
+    def __init__(self, database, client=None, concurrency: int = TICKER_REFRESH_CONCURRENCY):
+        self.database = database
+        self.client = client
+        self.concurrency = max(1, concurrency)
+
+    async def find_existing(self, tickers: List[str]) -> set:
+        """Stage 1: which of `tickers` are already in securities"""
+        if not tickers:
+            return set()
+        rows = await self.database.fetch_all(
+            "SELECT ticker FROM securities WHERE ticker = ANY(:tickers)",
+            {"tickers": tickers}
+        )
+        return {row["ticker"] for row in rows}
+
+    async def ensure_securities(self, tickers: List[str]) -> List[str]:
+        """
+        Stages 1-2: insert whichever tickers are missing
+
+        Returns:
+            The tickers that were inserted by this call
+        """
+        existing = await self.find_existing(tickers)
+        missing = [ticker for ticker in tickers if ticker not in existing]
+        if not missing:
+            return []
+
+        rows = await self.database.fetch_all(
+            """
+            INSERT INTO securities (ticker, active, on_yfinance, created_at)
+            SELECT t.ticker, true, true, :now
+            FROM unnest(CAST(:tickers AS text[])) AS t(ticker)
+            ON CONFLICT (ticker) DO NOTHING
+            RETURNING ticker
+            """,
+            {"tickers": missing, "now": datetime.utcnow()}
+        )
+        created = [row["ticker"] for row in rows]
+        if created:
+            logger.info(f"Created {len(created)} new security records: {', '.join(created[:20])}")
+            SecuritySearchIndex.get_instance().invalidate()
+            invalidate_security_statistics()
+        return created
+
+    # ----- fetch stage -----
+
+    async def _fetch_prices(self, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_chunk(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    # One client batch per chunk, so the client's inter-batch sleep never applies
+                    return await self.client.get_batch_prices(chunk, max_batch_size=len(chunk)) or {}
+                except Exception as e:
+                    logger.error(f"Error fetching prices for {chunk}: {str(e)}")
+                    return {}
+
+        chunks = [tickers[i:i + TICKER_REFRESH_PRICE_BATCH] for i in range(0, len(tickers), TICKER_REFRESH_PRICE_BATCH)]
+        fetched: Dict[str, Dict[str, Any]] = {}
+        for result in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+            fetched.update(result)
+        return fetched
+
+    async def _fetch_metrics(self, tickers: List[str]) -> Dict[str, Any]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(ticker: str) -> Any:
+            async with semaphore:
+                try:
+                    return await self.client.get_company_metrics(ticker)
+                except Exception as e:
+                    return e
+
+        results = await asyncio.gather(*(fetch_one(ticker) for ticker in tickers))
+        return dict(zip(tickers, results))
+
+    # ----- write stage -----
+
+    async def _bulk_update(self, query: str, rows: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> datetime:
+        """Stage 4: one UPDATE for every fetched row; on failure every row is reported failed"""
+        updated_at = datetime.now()
+        if not rows:
+            return updated_at
+        try:
+            await self.database.execute(
+                query,
+                {"rows": json.dumps(rows, default=json_serializer), "updated_at": updated_at}
+            )
+            invalidate_security_statistics()
+            await notify_price_changes(self.database, [row["ticker"] for row in rows])
+        except Exception as e:
+            logger.error(f"Bulk securities update failed for {len(rows)} tickers: {str(e)}")
+            for row in rows:
+                results[row["ticker"]] = {
+                    "ticker": row["ticker"],
+                    "success": False,
+                    "message": f"Error updating {row['ticker']}: {str(e)}",
+                }
+        return updated_at
+
+    # ----- pipelines -----
+
+    async def refresh_prices(self, tickers: List[str], create_missing: bool = True) -> List[Dict[str, Any]]:
+        """
+        Refresh current price data for `tickers`
+
+        Returns:
+            One result per ticker, in input order, with ticker, success, message
+            and (on success) current_price and data (the non-null fetched fields)
+        """
+        tickers = normalize_tickers(tickers)
+        if create_missing:
+            await self.ensure_securities(tickers)
+
+        fetched = await self._fetch_prices(tickers)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        rows = []
+        for ticker in tickers:
+            price_data = fetched.get(ticker)
+            if not price_data:
+                results[ticker] = {"ticker": ticker, "success": False, "message": f"No price data returned for {ticker}"}
+                continue
+            rows.append({
+                "ticker": ticker,
+                "price": _finite(price_data.get("price")),
+                "day_open": _finite(price_data.get("day_open")),
+                "day_high": _finite(price_data.get("day_high")),
+                "day_low": _finite(price_data.get("day_low")),
+                "volume": _finite(price_data.get("volume")),
+                "price_timestamp": price_data.get("price_timestamp"),
+            })
+            results[ticker] = {
+                "ticker": ticker,
+                "success": True,
+                "message": f"Successfully updated price for {ticker}",
+                "current_price": price_data.get("price"),
+                "data": {k: v for k, v in price_data.items() if v is not None},
+            }
+
+        updated_at = await self._bulk_update(PRICE_UPDATE_QUERY, rows, results)
+        for result in results.values():
+            if result["success"]:
+                result["updated_at"] = updated_at.isoformat()
+        return [results[ticker] for ticker in tickers]
+
+    async def refresh_metrics(self, tickers: List[str], create_missing: bool = True) -> List[Dict[str, Any]]:
+        """
+        Refresh company metrics for `tickers`
+
+        Returns:
+            One result per ticker, in input order, with ticker, success, message
+            and (on success) fields_updated and metrics (the non-null fetched fields)
+        """
+        tickers = normalize_tickers(tickers)
+        if create_missing:
+            await self.ensure_securities(tickers)
+
+        fetched = await self._fetch_metrics(tickers)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        rows = []
+        for ticker in tickers:
+            metrics = fetched.get(ticker)
+            if isinstance(metrics, Exception):
+                message = f"Error updating metrics for {ticker}: {str(metrics)}"
+            elif isinstance(metrics, str):
+                message = f"Invalid metrics format (received string): {metrics}"
+            elif not metrics or metrics.get("not_found"):
+                message = f"No metrics data returned for {ticker}"
+            else:
+                message = None
+            if message:
+                logger.error(message)
+                results[ticker] = {"ticker": ticker, "success": False, "message": message}
+                continue
+
+            row = {"ticker": ticker}
+            row.update((field, _finite(metrics.get(field))) for field in METRIC_FIELDS)
+            low, high = metrics.get("fifty_two_week_low"), metrics.get("fifty_two_week_high")
+            row["fifty_two_week_range"] = f"{low}-{high}" if low is not None and high is not None else None
+            rows.append(row)
+
+            filtered_metrics = {k: v for k, v in metrics.items() if v is not None}
+            results[ticker] = {
+                "ticker": ticker,
+                "success": True,
+                "message": f"Successfully updated metrics for {ticker}",
+                "fields_updated": len(filtered_metrics),
+                "metrics": filtered_metrics,
+            }
+
+        await self._bulk_update(METRICS_UPDATE_QUERY, rows, results)
+        return [results[ticker] for ticker in tickers]
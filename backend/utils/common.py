@@ -5,6 +5,8 @@ import os
 import logging
 import time
 import asyncio
+import contextvars
+import importlib
 import json
 from typing import Dict, List, Any, Callable, Coroutine, Optional
 from datetime import datetime
@@ -82,6 +84,42 @@ async def retry_async(
                 logger.error(f"All {retries + 1} attempts failed")
                 raise last_exception
 
+class LazyImport:
+    """
+    Stand-in for a class or function whose module is imported on first use.
+    
+    Calling it (or reading an attribute) imports `module` and resolves `name`,
+    so heavy clients and services stay off the import path of main.py.
+    """
+    
+    def __init__(self, module: str, name: str):
+        self._module = module
+        self._name = name
+        self._target = None
+    
+    def load(self):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module), self._name)
+        return self._target
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._target is not None
+    
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+    
+    def __getattr__(self, item):
+        return getattr(self.load(), item)
+    
+    def __repr__(self):
+        return f"<LazyImport {self._module}.{self._name}{' (loaded)' if self.is_loaded else ''}>"
+
+
+def lazy_import(module: str, name: str) -> LazyImport:
+    """Reference `module.name` without importing the module yet"""
+    return LazyImport(module, name)
+
 def json_serializer(obj):
     """
     JSON serializer for objects not serializable by default json code
@@ -96,6 +134,328 @@ def json_serializer(obj):
         return str(obj)
     raise TypeError(f"Type {type(obj)} not serializable")
 
+# ----- System event recorder -----
+# Events are queued in memory and written by a background task in multi-row
+# batches, so recording/updating an event no longer costs a round trip on the
+# caller's path. IDs are reserved from the system_events sequence in blocks so
+# record_system_event can still return the event id immediately.
+
+SYSTEM_EVENTS_BUFFERED = os.getenv("SYSTEM_EVENTS_BUFFERED", "true").lower() == "true"
+EVENT_FLUSH_INTERVAL_SECONDS = float(os.getenv("EVENT_FLUSH_INTERVAL_SECONDS", "2"))
+EVENT_FLUSH_BATCH_SIZE = 200
+EVENT_ID_BLOCK_SIZE = 32
+EVENT_MAX_DETAILS_BYTES = int(os.getenv("EVENT_MAX_DETAILS_BYTES", str(64 * 1024)))
+EVENT_MAX_FLUSH_ATTEMPTS = 3
+
+
+def cap_event_details(details: Optional[Dict[str, Any]], max_bytes: int = EVENT_MAX_DETAILS_BYTES) -> Optional[Dict[str, Any]]:
+    """
+    Keep an event payload under max_bytes of JSON
+    
+    Oversized values (e.g. a per-ticker dict) are replaced by a short summary
+    of their size; if the payload is still too large only its keys are kept.
+    """
+    if not details:
+        return details
+    
+    encoded = json.dumps(details, default=json_serializer)
+    if len(encoded) <= max_bytes:
+        return details
+    
+    per_value_budget = max(max_bytes // (2 * len(details)), 256)
+    capped = {}
+    for key, value in details.items():
+        value_size = len(json.dumps(value, default=json_serializer))
+        if value_size <= per_value_budget:
+            capped[key] = value
+        elif isinstance(value, (dict, list)):
+            capped[key] = {"truncated": True, "items": len(value), "bytes": value_size}
+        else:
+            capped[key] = str(value)[:per_value_budget] + "...[truncated]"
+    
+    if len(json.dumps(capped, default=json_serializer)) > max_bytes:
+        capped = {"truncated": True, "bytes": len(encoded), "keys": [str(k) for k in list(details)[:100]]}
+    capped["_truncated_from_bytes"] = len(encoded)
+    return capped
+
+
+class SystemEventRecorder:
+    """
+    In-memory queue of system event inserts and updates.
+    
+    Successive updates of the same event_id are coalesced (the latest one wins,
+    and an update of a not-yet-written event is folded into its insert).
+    """
+    
+    _instance = None
+    
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so all callers share one queue"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+    
+    def __init__(self):
+        self._inserts: Dict[int, Dict[str, Any]] = {}
+        self._updates: Dict[int, Dict[str, Any]] = {}
+        self._databases: Dict[int, Any] = {}
+        self._id_pool: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.stats = {"recorded": 0, "updated": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "dropped": 0}
+    
+    # ----- queueing -----
+    
+    async def _next_id(self, database) -> int:
+        """Reserve event ids from the table's sequence a block at a time"""
+        if not self._id_pool:
+            rows = await database.fetch_all(
+                """
+                SELECT nextval(pg_get_serial_sequence('system_events', 'id')) AS id
+                FROM generate_series(1, :count)
+                """,
+                {"count": EVENT_ID_BLOCK_SIZE}
+            )
+            self._id_pool.extend(int(row["id"]) for row in rows)
+        return self._id_pool.pop(0)
+    
+    async def record(self, database, event_type: str, status: str, details: Optional[Dict[str, Any]]) -> int:
+        event_id = await self._next_id(database)
+        self._inserts[event_id] = {
+            "id": event_id,
+            "event_type": event_type,
+            "status": status,
+            "started_at": datetime.utcnow(),
+            "completed_at": None,
+            "details": dict(details) if details else None,
+            "error_message": None,
+            "attempts": 0,
+        }
+        self._databases[event_id] = database
+        self.stats["recorded"] += 1
+        self._schedule_flush()
+        return event_id
+    
+    def update(self, database, event_id: int, status: str, details: Optional[Dict[str, Any]], error_message: Optional[str]):
+        changes = {
+            "status": status,
+            "completed_at": datetime.utcnow() if status in ("completed", "failed") else None,
+            "details": dict(details) if details else None,
+            "error_message": error_message,
+        }
+        self.stats["updated"] += 1
+        
+        if event_id in self._inserts:
+            self._inserts[event_id].update(changes)
+            self.stats["coalesced"] += 1
+        else:
+            if event_id in self._updates:
+                self.stats["coalesced"] += 1
+            self._updates[event_id] = {"id": event_id, "attempts": 0, **changes}
+            self._databases[event_id] = database
+        self._schedule_flush()
+    
+    @property
+    def pending(self) -> int:
+        return len(self._inserts) + len(self._updates)
+    
+    # ----- background flushing -----
+    
+    def _schedule_flush(self):
+        """Start the flusher on the running loop if needed; wake it early for big batches"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            # Empty context: databases binds connections per context, and the
+            # flusher must not share (and serialize on) the caller's connection
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+        if self.pending >= EVENT_FLUSH_BATCH_SIZE:
+            self._wakeup.set()
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), EVENT_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    async def flush(self):
+        """Write everything queued so far: one INSERT and one UPDATE per database"""
+        if not self.pending:
+            return
+        
+        inserts, self._inserts = self._inserts, {}
+        updates, self._updates = self._updates, {}
+        databases_by_key: Dict[int, Any] = {}
+        groups: Dict[int, Dict[str, List[Dict[str, Any]]]] = {}
+        for kind, items in (("inserts", inserts), ("updates", updates)):
+            for event_id, item in items.items():
+                database = self._databases.pop(event_id, None)
+                if database is None:
+                    continue
+                databases_by_key[id(database)] = database
+                groups.setdefault(id(database), {"inserts": [], "updates": []})[kind].append(item)
+        
+        for key, group in groups.items():
+            database = databases_by_key[key]
+            try:
+                await self._write(database, group["inserts"], group["updates"])
+                self.stats["flushes"] += 1
+                self.stats["rows_written"] += len(group["inserts"]) + len(group["updates"])
+            except Exception as e:
+                logger.error(f"Failed to flush {len(group['inserts']) + len(group['updates'])} system events: {str(e)}")
+                self._requeue(database, group["inserts"], self._inserts)
+                self._requeue(database, group["updates"], self._updates)
+    
+    def _requeue(self, database, items: List[Dict[str, Any]], queue: Dict[int, Dict[str, Any]]):
+        for item in items:
+            item["attempts"] += 1
+            if item["attempts"] >= EVENT_MAX_FLUSH_ATTEMPTS:
+                self.stats["dropped"] += 1
+                continue
+            # Never overwrite a newer update queued while the write was failing
+            if item["id"] not in queue:
+                queue[item["id"]] = item
+                self._databases[item["id"]] = database
+    
+    @staticmethod
+    def _rows_json(items: List[Dict[str, Any]]) -> str:
+        rows = [
+            {**{k: v for k, v in item.items() if k != "attempts"}, "details": cap_event_details(item["details"])}
+            for item in items
+        ]
+        return json.dumps(rows, default=json_serializer)
+    
+    async def _write(self, database, inserts: List[Dict[str, Any]], updates: List[Dict[str, Any]]):
+        # Services may have closed their pool since queueing; reopen it just for the flush
+        reconnected = not database.is_connected
+        if reconnected:
+            await database.connect()
+        try:
+            if inserts:
+                await database.execute(
+                    """
+                    INSERT INTO system_events
+                    (id, event_type, status, started_at, completed_at, details, error_message)
+                    SELECT r.id, r.event_type, r.status, r.started_at, r.completed_at, r.details, r.error_message
+                    FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+                        id integer,
+                        event_type text,
+                        status text,
+                        started_at timestamp,
+                        completed_at timestamp,
+                        details jsonb,
+                        error_message text
+                    )
+                    """,
+                    {"rows": self._rows_json(inserts)}
+                )
+            if updates:
+                await database.execute(
+                    """
+                    UPDATE system_events e
+                    SET 
+                        status = r.status,
+                        completed_at = r.completed_at,
+                        details = r.details,
+                        error_message = r.error_message
+                    FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r(
+                        id integer,
+                        status text,
+                        completed_at timestamp,
+                        details jsonb,
+                        error_message text
+                    )
+                    WHERE e.id = r.id
+                    """,
+                    {"rows": self._rows_json(updates)}
+                )
+        finally:
+            if reconnected:
+                await database.disconnect()
+    
+    async def shutdown(self):
+        """Stop the flusher and write out anything still queued"""
+        self._stopping = True
+        task = self._task
+        if task and not task.done():
+            try:
+                if task.get_loop() is asyncio.get_running_loop():
+                    self._wakeup.set()
+                    await task
+                else:
+                    task.cancel()
+            except Exception as e:
+                logger.error(f"Error stopping system event flusher: {str(e)}")
+        self._task = None
+        await self.flush()
+
+
+async def flush_system_events():
+    """Flush-on-shutdown hook: write all queued system events now"""
+    await SystemEventRecorder.get_instance().shutdown()
+
+
+async def _record_system_event_now(database, event_type: str, status: str, details: Optional[Dict[str, Any]]) -> Optional[int]:
+    # Convert details to JSON string if provided
+    json_details = None
+    if details:
+        json_details = json.dumps(cap_event_details(details), default=json_serializer)
+    
+    query = """
+        INSERT INTO system_events
+        (event_type, status, started_at, details)
+        VALUES (:event_type, :status, :started_at, :details)
+        RETURNING id
+    """
+    
+    params = {
+        "event_type": event_type,
+        "status": status,
+        "started_at": datetime.utcnow(),
+        "details": json_details
+    }
+    
+    return await database.fetch_val(query, params)
+
+
+async def _update_system_event_now(database, event_id: int, status: str, details: Optional[Dict[str, Any]], error_message: Optional[str]):
+    if status == "completed" or status == "failed":
+        completed_at = datetime.utcnow()
+    else:
+        completed_at = None
+    
+    # Convert details to JSON string if provided
+    json_details = None
+    if details:
+        json_details = json.dumps(cap_event_details(details), default=json_serializer)
+        
+    query = """
+        UPDATE system_events
+        SET 
+            status = :status,
+            completed_at = :completed_at,
+            details = :details,
+            error_message = :error_message
+        WHERE id = :event_id
+    """
+    
+    params = {
+        "event_id": event_id,
+        "status": status,
+        "completed_at": completed_at,
+        "details": json_details,
+        "error_message": error_message
+    }
+    
+    await database.execute(query, params)
+
+
 async def record_system_event(
     database,
     event_type: str, 
@@ -105,6 +465,9 @@ async def record_system_event(
     """
     Record a system event in the database
     
+    The event is queued and written in the background (see SystemEventRecorder)
+    unless SYSTEM_EVENTS_BUFFERED is disabled.
+    
     Args:
         database: Database connection
         event_type: Type of event (e.g., price_update, portfolio_calculation)
@@ -115,27 +478,9 @@ async def record_system_event(
         ID of the created event record or None if recording failed
     """
     try:
-        # Convert details to JSON string if provided
-        json_details = None
-        if details:
-            json_details = json.dumps(details, default=json_serializer)
-        
-        query = """
-            INSERT INTO system_events
-            (event_type, status, started_at, details)
-            VALUES (:event_type, :status, :started_at, :details)
-            RETURNING id
-        """
-        
-        params = {
-            "event_type": event_type,
-            "status": status,
-            "started_at": datetime.utcnow(),
-            "details": json_details
-        }
-        
-        event_id = await database.fetch_val(query, params)
-        return event_id
+        if SYSTEM_EVENTS_BUFFERED:
+            return await SystemEventRecorder.get_instance().record(database, event_type, status, details)
+        return await _record_system_event_now(database, event_type, status, details)
     except Exception as e:
         logger.error(f"Failed to record system event: {str(e)}")
         # Don't raise the exception - we don't want event recording to break main functionality
@@ -151,6 +496,9 @@ async def update_system_event(
     """
     Update a system event record
     
+    Updates are queued like inserts; successive updates of the same event are
+    coalesced so only the latest state is written.
+    
     Args:
         database: Database connection
         event_id: ID of the event to update
@@ -159,42 +507,17 @@ async def update_system_event(
         error_message: Error message if the event failed
         
     Returns:
-        True if the update was successful, False otherwise
+        True if the update was accepted, False otherwise
     """
     try:
         if not event_id:
             return False
-            
-        if status == "completed" or status == "failed":
-            completed_at = datetime.utcnow()
-        else:
-            completed_at = None
         
-        # Convert details to JSON string if provided
-        json_details = None
-        if details:
-            json_details = json.dumps(details, default=json_serializer)
-            
-        query = """
-            UPDATE system_events
-            SET 
-                status = :status,
-                completed_at = :completed_at,
-                details = :details,
-                error_message = :error_message
-            WHERE id = :event_id
-        """
-        
-        params = {
-            "event_id": event_id,
-            "status": status,
-            "completed_at": completed_at,
-            "details": json_details,
-            "error_message": error_message
-        }
-        
-        await database.execute(query, params)
+        if SYSTEM_EVENTS_BUFFERED:
+            SystemEventRecorder.get_instance().update(database, event_id, status, details, error_message)
+        else:
+            await _update_system_event_now(database, event_id, status, details, error_message)
         return True
     except Exception as e:
         logger.error(f"Failed to update system event: {str(e)}")
-        return False
\ No newline at end of file
+        return False
@@ -160,6 +160,15 @@ ACCOUNT_TYPES = list(dict.fromkeys(ACCOUNT_TYPES))
 # Other constants
 METAL_UNITS = ['oz', 'g', 'kg', 'lb', 'item']
 
+# Metal type -> futures ticker used for pricing (same set as the positions template)
+METAL_TICKERS = {
+    'Gold': 'GC=F',
+    'Silver': 'SI=F',
+    'Platinum': 'PL=F',
+    'Palladium': 'PA=F',
+    'Copper': 'HG=F'
+}
+
 CASH_TYPES = ['Savings', 'Checking', 'Money Market', 'CD', 'Treasury', 'Other']
 
 INTEREST_PERIODS = ['daily', 'monthly', 'quarterly', 'annually', 'at_maturity', 'none']
@@ -0,0 +1,275 @@
+"""
+NYSE trading calendar (holidays, early closes, session bounds).
+
+Holidays and 13:00 early closes are derived by rule, plus a table of one-off
+closures, for MARKET_CALENDAR_FIRST_YEAR..MARKET_CALENDAR_LAST_YEAR and
+precomputed when the calendar is built:
+
+    _trading_days   sorted list of every session date in the range
+    _index          session date -> position in _trading_days
+    _next_index     day offset from the first date -> position of the first
+                    session on or after that day
+
+so is_trading_day, session_bounds, next_open, last_close and trading_days are
+dict/list lookups rather than walks over the calendar. Dates outside the table
+fall back to computing that year's holidays on demand.
+
+All datetimes are US/Eastern; naive datetimes are taken to be Eastern already.
+"""
+import os
+import logging
+from datetime import date, datetime, time as dt_time, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("market_calendar")
+
+eastern = pytz.timezone("US/Eastern")
+
+MARKET_OPEN = dt_time(9, 30)  # 9:30 AM ET
+MARKET_CLOSE = dt_time(16, 0)  # 4:00 PM ET
+MARKET_EARLY_CLOSE = dt_time(13, 0)  # 1:00 PM ET on half days
+
+MARKET_CALENDAR_FIRST_YEAR = int(os.getenv("MARKET_CALENDAR_FIRST_YEAR", "2000"))
+MARKET_CALENDAR_LAST_YEAR = int(os.getenv("MARKET_CALENDAR_LAST_YEAR", str(date.today().year + 10)))
+
+# Unscheduled closures the rules below can't know about
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11): "September 11 attacks",
+    date(2001, 9, 12): "September 11 attacks",
+    date(2001, 9, 13): "September 11 attacks",
+    date(2001, 9, 14): "September 11 attacks",
+    date(2004, 6, 11): "National Day of Mourning for President Reagan",
+    date(2007, 1, 2): "National Day of Mourning for President Ford",
+    date(2012, 10, 29): "Hurricane Sandy",
+    date(2012, 10, 30): "Hurricane Sandy",
+    date(2018, 12, 5): "National Day of Mourning for President George H.W. Bush",
+    date(2025, 1, 9): "National Day of Mourning for President Carter",
+}
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th `weekday` (0 = Monday) of the month; n = -1 for the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _easter(year: int) -> date:
+    """Western Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=None)
+def holidays_for_year(year: int) -> Dict[date, str]:
+    """Full-day closures falling in `year`"""
+    holidays = {}
+
+    # A Saturday New Year's Day is not observed on the Friday before (that's the previous year-end)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+    if year >= 1998:
+        holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[_easter(year) - timedelta(days=2)] = "Good Friday"
+    holidays[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    holidays[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    holidays[_observed(date(year, 12, 25))] = "Christmas Day"
+
+    holidays.update((day, name) for day, name in SPECIAL_CLOSURES.items() if day.year == year)
+    return holidays
+
+
+@lru_cache(maxsize=None)
+def early_closes_for_year(year: int) -> Dict[date, str]:
+    """13:00 closes falling in `year`"""
+    holidays = holidays_for_year(year)
+    candidates = {
+        date(year, 7, 3): "Day before Independence Day",
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1): "Day after Thanksgiving",
+        date(year, 12, 24): "Christmas Eve",
+    }
+    return {
+        day: name for day, name in candidates.items()
+        if day.weekday() < 5 and day not in holidays
+    }
+
+
+class MarketCalendar:
+    """Precomputed NYSE session table with constant-time lookups"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so the table is built once per process"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, first_year: int = MARKET_CALENDAR_FIRST_YEAR, last_year: int = MARKET_CALENDAR_LAST_YEAR):
+        self.first_day = date(first_year, 1, 1)
+        self.last_day = date(last_year, 12, 31)
+
+        self._holidays: Dict[date, str] = {}
+        self._early_closes: Dict[date, str] = {}
+        for year in range(first_year, last_year + 1):
+            self._holidays.update(holidays_for_year(year))
+            self._early_closes.update(early_closes_for_year(year))
+
+        self._trading_days: List[date] = []
+        self._index: Dict[date, int] = {}
+        self._next_index: List[int] = []
+        day = self.first_day
+        while day <= self.last_day:
+            # The next session appended gets this position, whether it's today or later
+            self._next_index.append(len(self._trading_days))
+            if day.weekday() < 5 and day not in self._holidays:
+                self._index[day] = len(self._trading_days)
+                self._trading_days.append(day)
+            day += timedelta(days=1)
+
+        logger.info(
+            f"Market calendar built for {first_year}-{last_year}: "
+            f"{len(self._trading_days)} sessions, {len(self._holidays)} holidays, "
+            f"{len(self._early_closes)} early closes"
+        )
+
+    # ----- days -----
+
+    def _in_table(self, day: date) -> bool:
+        return self.first_day <= day <= self.last_day
+
+    def is_trading_day(self, day: date) -> bool:
+        if self._in_table(day):
+            return day in self._index
+        return day.weekday() < 5 and day not in holidays_for_year(day.year)
+
+    def is_early_close(self, day: date) -> bool:
+        if self._in_table(day):
+            return day in self._early_closes
+        return day in early_closes_for_year(day.year)
+
+    def holiday_name(self, day: date) -> Optional[str]:
+        """Name of the closure on `day`, or None (weekends aren't holidays)"""
+        if self._in_table(day):
+            return self._holidays.get(day)
+        return holidays_for_year(day.year).get(day)
+
+    def next_trading_day(self, day: date, inclusive: bool = False) -> date:
+        """First session after `day` (or on it, when inclusive)"""
+        if not inclusive:
+            day += timedelta(days=1)
+        if self._in_table(day):
+            position = self._next_index[(day - self.first_day).days]
+            if position < len(self._trading_days):
+                return self._trading_days[position]
+            day = self.last_day + timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def previous_trading_day(self, day: date, inclusive: bool = False) -> date:
+        """Last session before `day` (or on it, when inclusive)"""
+        if not inclusive:
+            day -= timedelta(days=1)
+        if self._in_table(day):
+            position = self._index.get(day)
+            if position is None:
+                position = self._next_index[(day - self.first_day).days] - 1
+            if position >= 0:
+                return self._trading_days[position]
+            day = self.first_day - timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def trading_days(self, start: date, end: date) -> List[date]:
+        """Every session in [start, end], in order"""
+        if start > end:
+            return []
+        if self._in_table(start) and self._in_table(end):
+            first = self._next_index[(start - self.first_day).days]
+            last = self._next_index[(end - self.first_day).days]
+            if end in self._index:
+                last += 1
+            return self._trading_days[first:last]
+        days = []
+        day = start
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    # ----- sessions -----
+
+    def session_bounds(self, day: date) -> Optional[Tuple[datetime, datetime]]:
+        """(open, close) for `day` in US/Eastern, or None when there's no session"""
+        if not self.is_trading_day(day):
+            return None
+        close = MARKET_EARLY_CLOSE if self.is_early_close(day) else MARKET_CLOSE
+        return (
+            eastern.localize(datetime.combine(day, MARKET_OPEN)),
+            eastern.localize(datetime.combine(day, close)),
+        )
+
+    @staticmethod
+    def _eastern(at: Optional[datetime]) -> datetime:
+        if at is None:
+            return datetime.now(eastern)
+        if at.tzinfo is None:
+            return eastern.localize(at)
+        return at.astimezone(eastern)
+
+    def is_session_open(self, at: Optional[datetime] = None) -> bool:
+        """Whether the market is open at `at` (default now)"""
+        at = self._eastern(at)
+        bounds = self.session_bounds(at.date())
+        return bounds is not None and bounds[0] <= at <= bounds[1]
+
+    def next_open(self, at: Optional[datetime] = None) -> datetime:
+        """Start of the first session that hasn't opened yet at `at` (default now)"""
+        at = self._eastern(at)
+        day = at.date()
+        if self.is_trading_day(day) and at < self.session_bounds(day)[0]:
+            return self.session_bounds(day)[0]
+        return self.session_bounds(self.next_trading_day(day))[0]
+
+    def last_close(self, at: Optional[datetime] = None) -> datetime:
+        """End of the most recent session that had closed by `at` (default now)"""
+        at = self._eastern(at)
+        day = at.date()
+        if self.is_trading_day(day) and at >= self.session_bounds(day)[1]:
+            return self.session_bounds(day)[1]
+        return self.session_bounds(self.previous_trading_day(day))[1]
@@ -0,0 +1,383 @@
+"""
+Prometheus Metrics for NestEgg
+
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format (version 0.0.4) by `GET /metrics`, without a client library. Samples
+are plain int/float updates made on the event loop thread, so recording takes
+no locks: a histogram observation is one bisect over the bucket bounds and two
+additions. Cumulative bucket counts are only computed at scrape time.
+
+Gauges that mirror state kept elsewhere (database pool, Redis hit ratio) are
+produced by collectors that run on each scrape.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("metrics")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # optional bearer token for scrapers
+METRICS_PREFIX = "nestegg"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; covers fast cached endpoints up to slow bulk jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROVIDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _label_string(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter keyed by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_label_string(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram
+
+    Each label combination keeps a flat list of per-bucket counts (the last
+    slot is +Inf) plus the running sum.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._counts: Dict[Tuple, List[int]] = {}
+        self._sums: Dict[Tuple, float] = {}
+
+    def observe(self, value: float, *labels):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.bounds) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.bounds, value)] += 1
+        self._sums[labels] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, counts in list(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_string(self.labelnames, labels, le)} {cumulative}")
+            label_string = _label_string(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_string} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{label_string} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics and scrape-time collectors"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every module records into the same registry"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Text exposition of every metric plus whatever the collectors report"""
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry.get_instance()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status_class"),
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status code",
+    ("method", "route", "status"),
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",),
+))
+HTTP_COALESCED_REQUESTS = REGISTRY.register(Counter(
+    "http_coalesced_requests_total",
+    "Coalescable GETs by role: leader (ran the endpoint), follower (reused a leader's response), fallback",
+    ("route", "role"),
+))
+PROVIDER_CALL_DURATION = REGISTRY.register(Histogram(
+    "provider_call_duration_seconds", "Market data provider call latency",
+    ("provider", "operation"), buckets=PROVIDER_BUCKETS,
+))
+PROVIDER_CALLS = REGISTRY.register(Counter(
+    "provider_calls_total", "Market data provider calls by outcome",
+    ("provider", "operation", "outcome"),
+))
+JOB_DURATION = REGISTRY.register(Histogram(
+    "job_duration_seconds", "Background job duration", ("job",), buckets=JOB_BUCKETS,
+))
+JOB_RUNS = REGISTRY.register(Counter(
+    "job_runs_total", "Background job runs by final status", ("job", "status"),
+))
+JOB_ROWS = REGISTRY.register(Counter(
+    "job_rows_processed_total", "Rows processed by background jobs", ("job",),
+))
+JOB_LAST_SUCCESS = REGISTRY.register(Gauge(
+    "job_last_success_timestamp_seconds", "Unix time of the last successful run", ("job",),
+))
+
+
+def observe_provider_call(provider: str, operation: str, seconds: float, success: bool = True):
+    """Record one outbound call to a market data provider"""
+    if not METRICS_ENABLED:
+        return
+    PROVIDER_CALL_DURATION.observe(seconds, provider, operation)
+    PROVIDER_CALLS.inc(provider, operation, "success" if success else "failure")
+
+
+def observe_job(job: str, seconds: float, status: str = "completed", rows: Optional[int] = None):
+    """Record one run of a background job"""
+    if not METRICS_ENABLED:
+        return
+    JOB_DURATION.observe(seconds, job)
+    JOB_RUNS.inc(job, status)
+    if rows:
+        JOB_ROWS.inc(job, amount=rows)
+    if status == "completed":
+        JOB_LAST_SUCCESS.set(time.time(), job)
+
+
+def track_job(job: str, rows_key: Optional[str] = None):
+    """
+    Decorator that times an async job method and records its outcome
+
+    Args:
+        job: Job label
+        rows_key: Key of the job's result dict holding the number of rows processed
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status, rows = "failed", None
+            try:
+                result = await func(*args, **kwargs)
+                if isinstance(result, dict):
+                    status = result.get("status") or "completed"
+                    rows = result.get(rows_key) if rows_key else None
+                else:
+                    status = "completed"
+                return result
+            finally:
+                observe_job(job, time.perf_counter() - started, status,
+                            rows if isinstance(rows, int) else None)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per route template
+
+    The route is read from the scope after the router has matched it, so
+    `/accounts/{account_id}` is one series no matter how many ids are hit.
+    Unrouted paths (404s, scanners) share a single series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "")
+        status_holder = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec(method)
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            status = status_holder[0]
+            HTTP_REQUEST_DURATION.observe(elapsed, method, route, f"{status // 100}xx")
+            HTTP_REQUESTS.inc(method, route, status)
+
+
+# ----- scrape-time collectors -----
+
+def collect_database_pool() -> List[_Metric]:
+    """Pool size/utilization and per-consumer counters from the shared pool"""
+    # Imported here so API clients can record metrics without loading the database stack
+    from backend.core_db import pool_stats, consumer_stats
+
+    pool = pool_stats()
+    connections = Gauge("db_pool_connections", "Connections in the shared pool by state", ("state",))
+    limits = Gauge("db_pool_limit_connections", "Configured pool bounds", ("bound",))
+    utilization = Gauge("db_pool_utilization_ratio", "In-use connections over the pool maximum")
+    limits.set(pool["min_size"], "min")
+    limits.set(pool["max_size"], "max")
+    if pool["connected"]:
+        connections.set(pool["in_use"], "in_use")
+        connections.set(pool["idle"], "idle")
+        utilization.set(pool["in_use"] / pool["max_size"] if pool["max_size"] else 0)
+
+    calls = Counter("db_consumer_queries_total", "Queries issued per pool consumer", ("consumer",))
+    errors = Counter("db_consumer_errors_total", "Failed queries per pool consumer", ("consumer",))
+    acquire = Counter("db_consumer_acquire_seconds_total", "Time spent waiting for a connection", ("consumer",))
+    query = Counter("db_consumer_query_seconds_total", "Time spent running queries", ("consumer",))
+    in_flight = Gauge("db_consumer_in_flight", "Queries currently running per consumer", ("consumer",))
+    for name, stats in consumer_stats().items():
+        calls.inc(name, amount=stats["calls"])
+        errors.inc(name, amount=stats["errors"])
+        acquire.inc(name, amount=stats["acquire_seconds"])
+        query.inc(name, amount=stats["query_seconds"])
+        in_flight.set(stats["in_flight"], name)
+    return [connections, limits, utilization, calls, errors, acquire, query, in_flight]
+
+
+def collect_cache() -> List[_Metric]:
+    """Hit/miss counters and hit ratio of the Redis cache"""
+    from backend.utils.redis_cache import RedisCache
+
+    stats = RedisCache.get_instance().stats
+    lookups = Counter("cache_lookups_total", "Redis cache lookups by result", ("result",))
+    for result in ("hit", "miss", "error", "unavailable"):
+        lookups.inc(result, amount=stats[result])
+    ratio = Gauge("cache_hit_ratio", "Hits over hits plus misses since start")
+    answered = stats["hit"] + stats["miss"]
+    ratio.set(stats["hit"] / answered if answered else 0)
+    return [lookups, ratio]
+
+
+REGISTRY.register_collector(collect_database_pool)
+REGISTRY.register_collector(collect_cache)
+
+
+def render_metrics() -> str:
+    """Body for `GET /metrics`"""
+    return REGISTRY.render()
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0") -> asyncio.AbstractServer:
+    """
+    Serve the exposition on a bare port, for processes without an HTTP app
+    (the scheduler). Every request gets the metrics regardless of path.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = render_metrics().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                + f"Content-Type: {CONTENT_TYPE}; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Metrics request failed: {str(e)}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Metrics exposition listening on {host}:{port}")
+    return server
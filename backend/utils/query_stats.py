@@ -0,0 +1,216 @@
+"""
+Query Statistics for NestEgg
+
+Records every query that goes through the shared database pool (see
+core_db.DatabaseConsumer): wall time, row count, a normalized SQL fingerprint
+and the endpoint (or job consumer) that issued it. Keeps a rolling window of
+durations per fingerprint for p50/p95/p99 and logs slow statements with their
+parameters redacted.
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import deque, Counter
+from contextvars import ContextVar
+from typing import Any, Optional, Dict, List
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("query_stats")
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+QUERY_STATS_WINDOW = int(os.getenv("QUERY_STATS_WINDOW", "1000"))  # durations kept per fingerprint
+QUERY_STATS_MAX_FINGERPRINTS = 2000
+_FINGERPRINT_CACHE_SIZE = 4096
+_OVERFLOW_FINGERPRINT = "<other queries>"
+
+# ASGI scope of the request being served, set by the HTTP middleware in main.py
+current_request_scope: ContextVar[Optional[dict]] = ContextVar("current_request_scope", default=None)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_BIND_PARAMS = re.compile(r"(?<!:):[A-Za-z_]\w*|\$\d+|%\(\w+\)s")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_fingerprint_cache: Dict[str, str] = {}
+
+
+def fingerprint(query: Any) -> str:
+    """
+    Normalize a statement so calls differing only in literals/parameters group together
+
+    Literals, numbers and bind parameters become `?`, IN-lists collapse to
+    `(?)`, comments are dropped and whitespace is collapsed.
+    """
+    sql = query if isinstance(query, str) else str(query)
+    cached = _fingerprint_cache.get(sql)
+    if cached is not None:
+        return cached
+
+    normalized = _COMMENTS.sub(" ", sql)
+    normalized = _STRINGS.sub("?", normalized)
+    normalized = _BIND_PARAMS.sub("?", normalized)
+    normalized = _NUMBERS.sub("?", normalized)
+    normalized = _IN_LISTS.sub("(?)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+
+    if len(_fingerprint_cache) >= _FINGERPRINT_CACHE_SIZE:
+        _fingerprint_cache.clear()
+    _fingerprint_cache[sql] = normalized
+    return normalized
+
+
+def redact_params(values: Any) -> Any:
+    """Describe parameters by type/size only, never by value"""
+    if values is None:
+        return None
+    if isinstance(values, dict):
+        return {key: redact_params(value) if isinstance(value, (dict, list)) else f"<{type(value).__name__}>"
+                for key, value in values.items()}
+    if isinstance(values, (list, tuple)):
+        return f"<{type(values).__name__} len={len(values)}>"
+    return f"<{type(values).__name__}>"
+
+
+def current_endpoint(default: str) -> str:
+    """Route template of the current request, or `default` outside a request"""
+    scope = current_request_scope.get()
+    if not scope:
+        return default
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}".strip()
+
+
+class _QueryStat:
+    __slots__ = ("fingerprint", "fingerprint_id", "count", "errors", "total_ms", "max_ms",
+                 "rows", "durations", "endpoints")
+
+    def __init__(self, normalized: str):
+        self.fingerprint = normalized
+        self.fingerprint_id = hashlib.md5(normalized.encode()).hexdigest()[:12]
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.durations = deque(maxlen=QUERY_STATS_WINDOW)
+        self.endpoints = Counter()
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.durations)
+
+        def percentile(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+        return {
+            "fingerprint_id": self.fingerprint_id,
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "mean_rows": round(self.rows / self.count, 1) if self.count else None,
+            "top_endpoints": self.endpoints.most_common(5),
+        }
+
+
+class QueryStats:
+    """In-memory per-fingerprint query statistics (one instance per process)"""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so every pool consumer reports into the same table"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.stats: Dict[str, _QueryStat] = {}
+        self.started_at = time.time()
+        self.slow_queries = 0
+
+    def record(self, query: Any, values: Any, duration_ms: float, rows: Optional[int],
+               consumer: str, error: bool = False):
+        """Record one statement execution"""
+        normalized = fingerprint(query)
+        stat = self.stats.get(normalized)
+        if stat is None:
+            if len(self.stats) >= QUERY_STATS_MAX_FINGERPRINTS:
+                normalized = _OVERFLOW_FINGERPRINT
+                stat = self.stats.get(normalized)
+            if stat is None:
+                stat = self.stats[normalized] = _QueryStat(normalized)
+
+        endpoint = current_endpoint(f"consumer:{consumer}")
+        stat.count += 1
+        stat.total_ms += duration_ms
+        stat.max_ms = max(stat.max_ms, duration_ms)
+        stat.durations.append(duration_ms)
+        stat.endpoints[endpoint] += 1
+        if rows:
+            stat.rows += rows
+        if error:
+            stat.errors += 1
+
+        if duration_ms >= SLOW_QUERY_MS:
+            self.slow_queries += 1
+            logger.warning(
+                f"Slow query {duration_ms:.0f}ms rows={rows} endpoint={endpoint} "
+                f"fingerprint={stat.fingerprint_id}: {normalized[:500]} params={redact_params(values)}"
+            )
+
+    def top(self, limit: int = 20, sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Top-N fingerprints by total_ms, p95_ms, p99_ms, max_ms, count or rows"""
+        summaries = [stat.summary() for stat in self.stats.values()]
+        summaries.sort(key=lambda s: s.get(sort_by) or 0, reverse=True)
+        return summaries[:limit]
+
+    def reset(self):
+        self.stats.clear()
+        self.slow_queries = 0
+        self.started_at = time.time()
+
+
+def record_query(query: Any, values: Any, duration_ms: float, rows: Optional[int],
+                 consumer: str, error: bool = False):
+    """Record a statement if query statistics are enabled; never raises"""
+    if not QUERY_STATS_ENABLED:
+        return
+    try:
+        QueryStats.get_instance().record(query, values, duration_ms, rows, consumer, error)
+    except Exception as e:
+        logger.debug(f"Failed to record query stats: {str(e)}")
+
+
+class RequestScopeMiddleware:
+    """ASGI middleware that exposes the current request to query attribution"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # The router adds the matched route to this same scope dict later on
+        token = current_request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_scope.reset(token)
@@ -45,6 +45,8 @@ class RedisCache:
         """Initialize Redis connection if enabled"""
         self.enabled = REDIS_ENABLED
         self.client = None
+        # Lookup outcomes, exported as cache hit ratio by utils/metrics.py
+        self.stats = {"hit": 0, "miss": 0, "error": 0, "unavailable": 0}
         
         if self.enabled:
             try:
@@ -96,6 +98,7 @@ class RedisCache:
             Cached value or None if not found
         """
         if not self.is_available():
+            self.stats["unavailable"] += 1
             return None
         
         try:
@@ -104,6 +107,7 @@ class RedisCache:
             value = self.client.get(prefixed_key)
             
             if value:
+                self.stats["hit"] += 1
                 try:
                     # First try to unpickle complex objects
                     return pickle.loads(value)
@@ -114,8 +118,10 @@ class RedisCache:
                     except:
                         # Return raw value if neither works
                         return value
+            self.stats["miss"] += 1
             return None
         except Exception as e:
+            self.stats["error"] += 1
             logger.error(f"Error getting from cache ({key}): {str(e)}")
             return None
     
@@ -0,0 +1,138 @@
+"""
+Request coalescing for identical concurrent GETs
+
+A dashboard open in several tabs (or React running an effect twice) sends the
+same reporting request several times at once. For GETs under
+REQUEST_COALESCING_PATHS, the first request for a key becomes the leader and
+runs the endpoint; identical requests arriving while it is in flight await it
+and replay its response instead of running the same query set again.
+
+The key is the credential (Authorization header, hashed), the path and the
+sorted query parameters. Requests are only merged when they carry the same
+token, so a response can never reach a different user; two tabs holding
+different tokens for one user simply don't coalesce. Nothing is cached: the
+entry is dropped as soon as the leader finishes.
+
+Followers run the endpoint themselves (role "fallback") when the leader
+failed, was cancelled, or produced a response larger than
+REQUEST_COALESCING_MAX_BYTES.
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from backend.utils.metrics import HTTP_COALESCED_REQUESTS, METRICS_ENABLED, UNMATCHED_ROUTE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("request_coalescing")
+
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+REQUEST_COALESCING_PATHS = tuple(
+    p.strip() for p in os.getenv(
+        "REQUEST_COALESCING_PATHS", "/datastore/,/accounts/all/detailed,/portfolio/snapshots"
+    ).split(",") if p.strip()
+)
+REQUEST_COALESCING_MAX_BYTES = int(os.getenv("REQUEST_COALESCING_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+def coalescing_key(scope) -> Optional[str]:
+    """Key for a coalescable request, or None when it must run on its own"""
+    if scope.get("method") != "GET" or not scope.get("path", "").startswith(REQUEST_COALESCING_PATHS):
+        return None
+    authorization = dict(scope.get("headers") or []).get(b"authorization")
+    if not authorization:
+        return None
+    query = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+    digest = hashlib.sha256()
+    for part in (authorization, scope["path"].encode(), urlencode(query).encode()):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _copy_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    copied = dict(message)
+    if "headers" in copied:
+        copied["headers"] = list(copied["headers"])
+    return copied
+
+
+class _Flight:
+    """One in-flight leader and the response it is recording"""
+
+    def __init__(self):
+        self.done = asyncio.get_running_loop().create_future()
+        self.messages: List[Dict[str, Any]] = []
+        self.size = 0
+        self.followers = 0
+
+
+class RequestCoalescingMiddleware:
+    """ASGI middleware that merges identical in-flight GETs"""
+
+    def __init__(self, app):
+        self.app = app
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {"leaders": 0, "followers": 0, "fallbacks": 0}
+
+    async def __call__(self, scope, receive, send):
+        key = coalescing_key(scope) if scope["type"] == "http" and REQUEST_COALESCING_ENABLED else None
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            await self._follow(flight, scope, receive, send)
+            return
+
+        flight = self._flights[key] = _Flight()
+        self.stats["leaders"] += 1
+
+        async def send_and_record(message):
+            if flight.messages is not None:
+                flight.size += len(message.get("body", b""))
+                if flight.size > REQUEST_COALESCING_MAX_BYTES:
+                    flight.messages = None
+                else:
+                    # Outer middleware (CORS) edits headers in place, so keep our own copy
+                    flight.messages.append(_copy_message(message))
+            await send(message)
+
+        completed = False
+        try:
+            await self.app(scope, receive, send_and_record)
+            completed = True
+        finally:
+            del self._flights[key]
+            # Followers copy the leader's route so per-route metrics stay correct
+            flight.done.set_result((scope.get("route"), scope.get("endpoint"), flight.messages if completed else None))
+            self._record(scope.get("route"), "leader")
+            if flight.followers:
+                logger.debug(f"Coalesced {flight.followers} requests into {scope['path']}")
+
+    async def _follow(self, flight: _Flight, scope, receive, send):
+        flight.followers += 1
+        route, endpoint, messages = await asyncio.shield(flight.done)
+        if route is not None:
+            scope["route"] = route
+            scope["endpoint"] = endpoint
+        if messages is None:
+            self.stats["fallbacks"] += 1
+            self._record(route, "fallback")
+            await self.app(scope, receive, send)
+            return
+        self.stats["followers"] += 1
+        self._record(route, "follower")
+        for message in messages:
+            await send(_copy_message(message))
+
+    @staticmethod
+    def _record(route, role: str):
+        if METRICS_ENABLED:
+            HTTP_COALESCED_REQUESTS.inc(getattr(route, "path", None) or UNMATCHED_ROUTE, role)
@@ -1,17 +1,40 @@
 # backend/webhooks_clerk.py
+"""
+Clerk webhook receiver.
+
+Verified events are written to the `clerk_webhook_events` table and ACKed;
+ClerkWebhookQueue workers (one per app process, started by the app lifespan)
+claim due rows with FOR UPDATE SKIP LOCKED and apply them. That makes
+delivery durable across restarts, and the unique svix_id turns Svix retries
+into no-ops.
+
+Other events carry the Clerk user id as their `entity_key` and are applied
+in arrival order per user: a row is not claimed while an earlier row for the
+same user is still pending (e.g. waiting on retry backoff) or processing, so
+a stale user.updated can't land after a newer one.
+
+session.activity events are held for CLERK_ACTIVITY_COALESCE_SECONDS; when
+the first one for a user comes due, every pending activity event for that
+user is claimed with it and only the newest is applied, so a busy session
+costs one users/user_sessions write per window instead of one per event.
+"""
 import os
 import json
+import time
 import logging
 import ipaddress
 import asyncio
+import contextvars
 from datetime import date
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
+import sqlalchemy
 from fastapi import APIRouter, Request, HTTPException
 from starlette.responses import Response
-from svix.webhooks import Webhook, WebhookVerificationError
 
-from backend.core_db import database, users
+from backend.core_db import get_database, metadata, users
+
+database = get_database("clerk_webhooks")
 
 logger = logging.getLogger("clerk_webhooks")
 
@@ -19,6 +42,49 @@ CLERK_WEBHOOK_SECRET = os.getenv("CLERK_WEBHOOK_SECRET")  # Clerk > Webhooks > S
 if not CLERK_WEBHOOK_SECRET:
     logger.warning("clerk.webhook.missing_secret_env")
 
+CLERK_WEBHOOK_POLL_SECONDS = float(os.getenv("CLERK_WEBHOOK_POLL_SECONDS", "2"))
+CLERK_WEBHOOK_BATCH_SIZE = int(os.getenv("CLERK_WEBHOOK_BATCH_SIZE", "50"))
+CLERK_WEBHOOK_MAX_ATTEMPTS = int(os.getenv("CLERK_WEBHOOK_MAX_ATTEMPTS", "8"))
+CLERK_WEBHOOK_LOCK_TIMEOUT_SECONDS = int(os.getenv("CLERK_WEBHOOK_LOCK_TIMEOUT_SECONDS", "300"))
+CLERK_WEBHOOK_RETENTION_DAYS = int(os.getenv("CLERK_WEBHOOK_RETENTION_DAYS", "7"))  # svix_id dedupe horizon
+CLERK_ACTIVITY_COALESCE_SECONDS = float(os.getenv("CLERK_ACTIVITY_COALESCE_SECONDS", "30"))
+PRUNE_INTERVAL_SECONDS = 3600
+
+SESSION_ACTIVITY_EVENTS = ("session.activity", "session.activity_recorded")
+
+# Durable inbox; created by `python -m backend.migrations.create_tables`
+clerk_webhook_events = sqlalchemy.Table(
+    "clerk_webhook_events", metadata,
+    sqlalchemy.Column("id", sqlalchemy.BigInteger, primary_key=True),
+    sqlalchemy.Column("svix_id", sqlalchemy.Text, unique=True, nullable=False),
+    sqlalchemy.Column("event_type", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("payload", sqlalchemy.dialects.postgresql.JSONB, nullable=False),
+    sqlalchemy.Column("coalesce_key", sqlalchemy.Text, nullable=True),
+    sqlalchemy.Column("entity_key", sqlalchemy.Text, nullable=True),
+    # pending -> processing -> done | coalesced | failed (after CLERK_WEBHOOK_MAX_ATTEMPTS)
+    sqlalchemy.Column("status", sqlalchemy.Text, nullable=False, server_default=sqlalchemy.text("'pending'")),
+    sqlalchemy.Column("attempts", sqlalchemy.Integer, nullable=False, server_default=sqlalchemy.text("0")),
+    sqlalchemy.Column("available_at", sqlalchemy.DateTime(timezone=True), nullable=False, server_default=sqlalchemy.text("now()")),
+    sqlalchemy.Column("locked_at", sqlalchemy.DateTime(timezone=True), nullable=True),
+    sqlalchemy.Column("received_at", sqlalchemy.DateTime(timezone=True), nullable=False, server_default=sqlalchemy.text("now()")),
+    sqlalchemy.Column("processed_at", sqlalchemy.DateTime(timezone=True), nullable=True),
+    sqlalchemy.Column("error", sqlalchemy.Text, nullable=True),
+    sqlalchemy.Index("ix_clerk_webhook_events_due", "available_at", postgresql_where=sqlalchemy.text("status = 'pending'")),
+    sqlalchemy.Index("ix_clerk_webhook_events_coalesce", "coalesce_key", postgresql_where=sqlalchemy.text("status = 'pending'")),
+    sqlalchemy.Index("ix_clerk_webhook_events_entity", "entity_key", "id",
+                     postgresql_where=sqlalchemy.text("status IN ('pending', 'processing')")),
+)
+
+# Columns added after the table first shipped; create_tables only creates missing tables
+CLERK_WEBHOOK_EVENTS_UPGRADE_SQL = [
+    "ALTER TABLE clerk_webhook_events ADD COLUMN IF NOT EXISTS entity_key TEXT",
+    """
+    CREATE INDEX IF NOT EXISTS ix_clerk_webhook_events_entity
+        ON clerk_webhook_events (entity_key, id)
+        WHERE status IN ('pending', 'processing')
+    """,
+]
+
 router = APIRouter()
 
 
@@ -45,6 +111,9 @@ def _ts_to_tz(ms_or_s):
 
 
 def _verify_clerk_signature(headers: dict, body: bytes) -> None:
+    # svix is slow to import (~250ms); only load it when a webhook arrives
+    from svix.webhooks import Webhook, WebhookVerificationError
+
     if not CLERK_WEBHOOK_SECRET:
         raise HTTPException(status_code=500, detail="CLERK_WEBHOOK_SECRET not configured")
 
@@ -364,7 +433,14 @@ async def _handle_session_created(db, payload):
     await _update_users_last_login_from_session(db, fields)
 
 
-async def _handle_session_updated(db, payload):
+async def _handle_session_updated(db, payload, update_status: bool = True, update_user: bool = True):
+    """
+    Apply a session.updated / session.activity payload.
+
+    Activity events may be applied well after they were sent (see the
+    coalescing window), so they pass update_status=False and never move a
+    session's status, e.g. back to "active" after session.ended.
+    """
     s = payload.get("data") or {}
     act = (s.get("latest_activity") or {})
     s_id = s.get("id")
@@ -390,7 +466,7 @@ async def _handle_session_updated(db, payload):
                updated_at     = now()
          WHERE clerk_session_id = :clerk_session_id
     """, {
-        "status": s.get("status"),
+        "status": s.get("status") if update_status else None,
         "last_active_at": _ts_to_tz(s.get("last_active_at")),
         "device_type": act.get("device_type"),
         "is_mobile": act.get("is_mobile"),
@@ -404,6 +480,9 @@ async def _handle_session_updated(db, payload):
         "clerk_session_id": s_id,
     })
 
+    if not update_user:
+        return
+
     # Keep users table fresh on activity as well (last_active moves)
     row = await db.fetch_one(
         "SELECT user_id FROM user_sessions WHERE clerk_session_id = :sid",
@@ -449,23 +528,324 @@ async def _handle_session_ended(db, payload):
 # ------------- event dispatcher -------------
 
 async def _process_clerk_event(etype: str, data: Dict[str, Any], full_payload: Dict[str, Any], svix_id: Optional[str]):
-    await _ensure_db_connected()
-    try:
-        if etype in ("user.created", "user.updated"):
-            await _upsert_user_from_clerk_user(data); return
-        if etype.startswith("subscription."):
-            await _sync_subscription_to_user(data); return
-        if etype in ("session.created", "session.created_web"):
-            await _handle_session_created(database, full_payload); return
-        if etype in ("session.updated", "session.activity", "session.activity_recorded"):
-            await _handle_session_updated(database, full_payload); return
-        if etype in ("session.ended", "session.removed", "session.revoked"):
-            await _handle_session_ended(database, full_payload); return
-
-        logger.info("clerk.webhook.ignored", extra={"type": etype, "svix_id": svix_id})
-    except Exception:
-        # Log but don't re-raise (outside request lifecycle)
-        logger.exception("clerk.webhook.background_error", extra={"type": etype, "svix_id": svix_id})
+    """Apply one event; errors propagate so the queue can retry the row"""
+    if etype in ("user.created", "user.updated"):
+        await _upsert_user_from_clerk_user(data); return
+    if etype.startswith("subscription."):
+        await _sync_subscription_to_user(data); return
+    if etype in ("session.created", "session.created_web"):
+        await _handle_session_created(database, full_payload); return
+    if etype == "session.updated":
+        await _handle_session_updated(database, full_payload); return
+    if etype in SESSION_ACTIVITY_EVENTS:
+        await _handle_session_updated(database, full_payload, update_status=False); return
+    if etype in ("session.ended", "session.removed", "session.revoked"):
+        await _handle_session_ended(database, full_payload); return
+
+    logger.info("clerk.webhook.ignored", extra={"type": etype, "svix_id": svix_id})
+
+
+async def _process_session_activity(payloads: List[Dict[str, Any]]) -> None:
+    """
+    Apply a coalesced group of one user's activity events (oldest first).
+
+    Each session gets its newest payload; the users row is written once, from
+    the newest payload overall.
+    """
+    latest_by_session: Dict[str, Dict[str, Any]] = {}
+    for payload in payloads:
+        latest_by_session[(payload.get("data") or {}).get("id")] = payload
+    newest = payloads[-1]
+    for payload in latest_by_session.values():
+        await _handle_session_updated(database, payload, update_status=False, update_user=payload is newest)
+
+
+def _coalesce_key(etype: str, data: Dict[str, Any]) -> Optional[str]:
+    if etype in SESSION_ACTIVITY_EVENTS and data.get("user_id"):
+        return f"session_activity:{data['user_id']}"
+    return None
+
+
+def _entity_key(etype: str, data: Dict[str, Any]) -> Optional[str]:
+    """Clerk user an event applies to; its events are applied one at a time, in order"""
+    if etype in SESSION_ACTIVITY_EVENTS:
+        return None  # coalesced instead, and never moves a session's status
+    if etype.startswith("user."):
+        clerk_user_id = data.get("id")
+    elif etype.startswith("subscription."):
+        clerk_user_id = data.get("user_id") or data.get("owner_id") or (data.get("payer") or {}).get("user_id")
+    else:
+        clerk_user_id = data.get("user_id")
+    return f"user:{clerk_user_id}" if clerk_user_id else None
+
+
+async def install_clerk_webhook_ordering(db) -> None:
+    """Add entity_key (and its index) to an existing clerk_webhook_events table"""
+    for statement in CLERK_WEBHOOK_EVENTS_UPGRADE_SQL:
+        await db.execute(statement)
+
+
+# ------------- durable queue -------------
+
+class ClerkWebhookQueue:
+    """
+    Postgres-backed inbox for Clerk events.
+
+    enqueue() is called by the route; start()/stop() are owned by the app
+    lifespan. Any number of processes can run workers against the same table.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern so the route and the lifespan share one worker"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._next_prune = 0.0
+        self.stats = {"enqueued": 0, "duplicates": 0, "processed": 0, "coalesced": 0, "retried": 0, "failed": 0}
+
+    # ----- producer -----
+
+    async def enqueue(self, svix_id: str, etype: str, payload: Dict[str, Any]) -> bool:
+        """
+        Persist an event unless this svix_id was seen before
+
+        Returns:
+            False for a duplicate delivery
+        """
+        data = payload.get("data") or {}
+        coalesce_key = _coalesce_key(etype, data)
+        event_id = await database.fetch_val(
+            """
+            INSERT INTO clerk_webhook_events (svix_id, event_type, payload, coalesce_key, entity_key, available_at)
+            VALUES (:svix_id, :event_type, CAST(:payload AS JSONB), :coalesce_key, :entity_key,
+                    now() + make_interval(secs => :delay))
+            ON CONFLICT (svix_id) DO NOTHING
+            RETURNING id
+            """,
+            {
+                "svix_id": svix_id,
+                "event_type": etype,
+                "payload": json.dumps(payload),
+                "coalesce_key": coalesce_key,
+                "entity_key": _entity_key(etype, data),
+                "delay": CLERK_ACTIVITY_COALESCE_SECONDS if coalesce_key else 0.0,
+            }
+        )
+        if event_id is None:
+            self.stats["duplicates"] += 1
+            return False
+
+        self.stats["enqueued"] += 1
+        if not coalesce_key and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    # ----- worker lifecycle -----
+
+    def start(self):
+        """Start the worker on the running loop (idempotent)"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            # Empty context so the worker gets its own pooled connection
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+        return self._task
+
+    async def stop(self, timeout: float = 10.0):
+        """Let the current batch finish; unclaimed rows stay queued for the next start"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        except Exception:
+            logger.exception("clerk.webhook.worker_stop_error")
+        self._task = None
+
+    async def _run(self):
+        logger.info("clerk.webhook.worker_started")
+        while not self._stopping:
+            claimed = 0
+            try:
+                claimed = await self.process_due()
+                if time.time() >= self._next_prune:
+                    await self._prune()
+            except Exception:
+                logger.exception("clerk.webhook.worker_error")
+            if claimed and not self._stopping:
+                continue  # more rows may be due, including later events of users just applied
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), CLERK_WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    # ----- consumer -----
+
+    async def _claim(self) -> List[Dict[str, Any]]:
+        """
+        Claim due rows (and stale claims of dead workers), then all pending siblings of due activity rows
+
+        A row whose user has an earlier row still pending or processing is left
+        for a later batch, so at most one event per user is in flight.
+        """
+        claim_set = """
+            SET status = 'processing', locked_at = now(), attempts = e.attempts + 1
+            FROM claimable c
+            WHERE e.id = c.id
+            RETURNING e.id, e.svix_id, e.event_type, e.payload, e.coalesce_key, e.attempts
+        """
+        rows = await database.fetch_all(
+            """
+            WITH claimable AS (
+                SELECT id FROM clerk_webhook_events
+                WHERE ((status = 'pending' AND available_at <= now())
+                       OR (status = 'processing' AND locked_at < now() - make_interval(secs => :lock_timeout)))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM clerk_webhook_events earlier
+                      WHERE earlier.entity_key = clerk_webhook_events.entity_key
+                        AND earlier.id < clerk_webhook_events.id
+                        AND earlier.status IN ('pending', 'processing')
+                  )
+                ORDER BY id
+                LIMIT :batch
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE clerk_webhook_events e
+            """ + claim_set,
+            {"lock_timeout": CLERK_WEBHOOK_LOCK_TIMEOUT_SECONDS, "batch": CLERK_WEBHOOK_BATCH_SIZE}
+        )
+        claimed = [dict(row) for row in rows]
+
+        keys = sorted({row["coalesce_key"] for row in claimed if row["coalesce_key"]})
+        if keys:
+            siblings = await database.fetch_all(
+                """
+                WITH claimable AS (
+                    SELECT id FROM clerk_webhook_events
+                    WHERE status = 'pending' AND coalesce_key = ANY(:keys)
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE clerk_webhook_events e
+                """ + claim_set,
+                {"keys": keys}
+            )
+            claimed.extend(dict(row) for row in siblings)
+
+        for row in claimed:
+            if isinstance(row["payload"], str):
+                row["payload"] = json.loads(row["payload"])
+        claimed.sort(key=lambda row: row["id"])
+        return claimed
+
+    async def process_due(self) -> int:
+        """Claim and apply one batch; returns the number of rows claimed"""
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+
+        # Units of work: single events, or every claimed row of one coalesce key
+        units: List[List[Dict[str, Any]]] = []
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in claimed:
+            key = row["coalesce_key"]
+            if key is None:
+                units.append([row])
+            elif key in groups:
+                groups[key].append(row)
+            else:
+                groups[key] = [row]
+                units.append(groups[key])
+
+        done: List[int] = []
+        coalesced: List[int] = []
+        for unit in units:
+            newest = unit[-1]
+            try:
+                if newest["coalesce_key"]:
+                    await _process_session_activity([row["payload"] for row in unit])
+                else:
+                    payload = newest["payload"]
+                    await _process_clerk_event(newest["event_type"], payload.get("data") or {}, payload, newest["svix_id"])
+            except Exception as e:
+                logger.exception("clerk.webhook.process_error",
+                                 extra={"type": newest["event_type"], "svix_id": newest["svix_id"]})
+                await self._retry_or_fail(unit, repr(e))
+                continue
+            done.append(newest["id"])
+            coalesced.extend(row["id"] for row in unit[:-1])
+
+        if not done:
+            return len(claimed)
+        await database.execute(
+            """
+            UPDATE clerk_webhook_events
+               SET status = CASE WHEN id = ANY(:coalesced) THEN 'coalesced' ELSE 'done' END,
+                   processed_at = now(),
+                   locked_at = NULL,
+                   error = NULL
+             WHERE id = ANY(:ids)
+            """,
+            {"ids": done + coalesced, "coalesced": coalesced}
+        )
+        self.stats["processed"] += len(done)
+        self.stats["coalesced"] += len(coalesced)
+        if coalesced:
+            logger.info("clerk.webhook.coalesced", extra={"events": len(done) + len(coalesced), "applied": len(done)})
+        return len(claimed)
+
+    async def _retry_or_fail(self, unit: List[Dict[str, Any]], error: str):
+        """Back off exponentially; give up after CLERK_WEBHOOK_MAX_ATTEMPTS"""
+        attempts = max(row["attempts"] for row in unit)
+        failed = attempts >= CLERK_WEBHOOK_MAX_ATTEMPTS
+        await database.execute(
+            """
+            UPDATE clerk_webhook_events
+               SET status = :status,
+                   available_at = now() + make_interval(secs => :delay),
+                   locked_at = NULL,
+                   error = :error
+             WHERE id = ANY(:ids)
+            """,
+            {
+                "status": "failed" if failed else "pending",
+                "delay": float(min(2 ** attempts, 3600)),
+                "error": error[:2000],
+                "ids": [row["id"] for row in unit],
+            }
+        )
+        self.stats["failed" if failed else "retried"] += len(unit)
+
+    async def _prune(self):
+        """Forget finished events once Svix can no longer redeliver them"""
+        self._next_prune = time.time() + PRUNE_INTERVAL_SECONDS
+        await database.execute(
+            """
+            DELETE FROM clerk_webhook_events
+            WHERE status IN ('done', 'coalesced')
+              AND received_at < now() - make_interval(days => :days)
+            """,
+            {"days": CLERK_WEBHOOK_RETENTION_DAYS}
+        )
+
+    async def depth(self) -> Dict[str, int]:
+        """Row counts by status, for health checks"""
+        rows = await database.fetch_all(
+            "SELECT status, COUNT(*) AS count FROM clerk_webhook_events GROUP BY status"
+        )
+        return {row["status"]: row["count"] for row in rows}
 
 
 # ------------- route -------------
@@ -483,11 +863,12 @@ async def clerk_webhook(request: Request):
         raise HTTPException(status_code=400, detail="Bad payload")
 
     etype = (payload.get("type") or "").strip()
-    data: Dict[str, Any] = payload.get("data") or {}
     svix_id = request.headers.get("svix-id")
 
     logger.info("clerk.webhook.received", extra={"type": etype, "svix_id": svix_id})
 
-    # Schedule async processing and ACK immediately so Clerk marks success
-    asyncio.create_task(_process_clerk_event(etype, data, payload, svix_id))
+    # Persist before ACKing: if this fails Svix gets a 5xx and redelivers
+    await _ensure_db_connected()
+    if not await ClerkWebhookQueue.get_instance().enqueue(svix_id, etype, payload):
+        logger.info("clerk.webhook.duplicate", extra={"type": etype, "svix_id": svix_id})
     return Response(status_code=204)